@@ -2,15 +2,10 @@ import streamlit as st
 import pandas as pd
 import os
 from datetime import datetime
+from functools import partial
 from dotenv import load_dotenv
 from unidecode import unidecode
 
-try:
-    import plotly.graph_objects as go
-    PLOTLY_AVAILABLE = True
-except ImportError:
-    PLOTLY_AVAILABLE = False
-
 try:
     from streamlit_option_menu import option_menu
     OPTION_MENU_AVAILABLE = True
@@ -24,29 +19,48 @@ load_dotenv()
 _LOGO_PATH = os.path.join(os.path.dirname(__file__), "Logo de CIMA Analytics y SynAppsSys.png")
 _DEFAULT_LOGO = open(_LOGO_PATH, "rb").read() if os.path.exists(_LOGO_PATH) else None
 
-from main import main_kpi, main_comparativo, heatmap_ventas
-from main import kpi_cpc, reporte_ejecutivo, ytd_lineas, ytd_productos, reporte_consolidado
-from main import vendedores_cxc, herramientas_financieras, ingesta_cfdi
-from main import universo_cfdi
-from main import fiscal
-from main import mapa_clientes
-from main import knowledge_base
-from main import data_assistant
-from main import wiki_problemas
-from main import carga_inteligente_datos
+from utils.paginas import pagina
+
+# Páginas: cada módulo de main/ se importa al navegar a él por primera vez
+main_kpi = pagina("main_kpi")
+main_comparativo = pagina("main_comparativo")
+heatmap_ventas = pagina("heatmap_ventas")
+kpi_cpc = pagina("kpi_cpc")
+reporte_ejecutivo = pagina("reporte_ejecutivo")
+ytd_lineas = pagina("ytd_lineas")
+ytd_productos = pagina("ytd_productos")
+reporte_consolidado = pagina("reporte_consolidado")
+vendedores_cxc = pagina("vendedores_cxc")
+herramientas_financieras = pagina("herramientas_financieras")
+ingesta_cfdi = pagina("ingesta_cfdi")
+universo_cfdi = pagina("universo_cfdi")
+fiscal = pagina("fiscal")
+mapa_clientes = pagina("mapa_clientes")
+knowledge_base = pagina("knowledge_base")
+data_assistant = pagina("data_assistant")
+wiki_problemas = pagina("wiki_problemas")
+carga_inteligente_datos = pagina("carga_inteligente_datos")
+
 from utils.data_cleaner import limpiar_columnas_texto, detectar_duplicados_similares
-from utils.data_normalizer import normalizar_columnas, homologar_columnas, validar_template
+from utils.data_normalizer import normalizar_columnas, homologar_columnas, tipar_columnas_carga, validar_template
 from utils.logger import configurar_logger, log_dataframe_info, log_execution_time
 from utils.filters import (
-    aplicar_filtro_fechas, 
-    aplicar_filtro_cliente, 
-    aplicar_filtro_monto,
+    VistaFiltrada,
+    filtrar_vista_fechas,
+    filtrar_vista_cliente,
+    filtrar_vista_monto,
     aplicar_filtro_categoria_riesgo,
     mostrar_resumen_filtros,
     render_filtros_inline,
 )
-from utils.export_helper import crear_excel_metricas_cxc, crear_reporte_html
-from utils.cache_helper import GestorCache, decorador_medicion_tiempo
+from utils.export_helper import (
+    crear_excel_metricas_cxc,
+    crear_reporte_html,
+    exportar_detalle_comprimido,
+    requiere_export_alterno,
+)
+from utils.export_jobs import MIME_EXCEL, mostrar_trabajo_export, obtener_cola_exportaciones
+from utils.cache_helper import GestorCache, decorador_medicion_tiempo, memo_vistas
 from utils.auth import AuthManager, UserRole, get_current_user, check_session_expiry, logout
 from utils.admin_panel import mostrar_info_usuario, mostrar_panel_usuarios, mostrar_panel_configuracion
 from utils.roi_tracker import init_roi_tracker
@@ -835,6 +849,9 @@ modo_debug = st.sidebar.checkbox(
     help="Muestra secciones de diagnóstico (columnas detectadas, etc.)"
 )
 st.session_state["modo_debug"] = modo_debug
+if modo_debug:
+    with st.sidebar.expander("⚡ Memoización de vistas", expanded=False):
+        memo_vistas.mostrar_estadisticas()
 
 # ── Auto-carga desde Neon (tenant isolation por empresa_id) ──────────────────
 _empresa_id_actual = st.session_state.get("empresa_id")
@@ -1056,9 +1073,6 @@ if archivo:
             if total_errores == 0 and total_advertencias == 0:
                 st.success("✅ Todas las columnas críticas presentes")
 
-        if "fecha" in df.columns:
-            df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
-
         # Aplicar normalización de columnas de texto
         columnas_a_normalizar = ['agente', 'vendedor', 'ejecutivo', 'linea_producto', 
                                   'linea_de_negocio', 'cliente', 'producto']
@@ -1084,6 +1098,15 @@ if archivo:
                 if duplicados_totales > 0:
                     st.sidebar.info("💡 Edita config/aliases.json para unificar")
 
+        # Tipado único: texto Arrow, fechas a datetime, enteros reducidos
+        df, reporte_memoria = tipar_columnas_carga(df)
+        if modo_debug:
+            st.sidebar.caption(
+                f"🧮 Memoria: {reporte_memoria['antes_bytes'] / 1e6:.1f} MB → "
+                f"{reporte_memoria['despues_bytes'] / 1e6:.1f} MB "
+                f"(-{reporte_memoria['ahorro_pct']}%)"
+            )
+
         st.session_state["df"] = df
         st.session_state["_df_fuente"] = "excel"
         st.session_state["archivo_path"] = archivo
@@ -1502,19 +1525,31 @@ with st.sidebar:
             except Exception as _e:
                 logger.exception(f"Error cargando CxC para exportación: {_e}")
 
+            # Los reportes se generan en segundo plano (utils.export_jobs) y se
+            # reutilizan mientras no cambien los datos ni las secciones
+            _cola_export = obtener_cola_exportaciones()
+
             # ── Excel ─────────────────────────────────────────────────────
             if _exp_cxc_proc is not None and _exp_metricas is not None:
-                try:
-                    _excel_buf = crear_excel_metricas_cxc(_exp_metricas, _exp_cxc_proc)
-                    st.download_button(
-                        label="📊 Excel",
-                        data=_excel_buf,
-                        file_name="reporte_cxc.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                mostrar_trabajo_export(
+                    _cola_export.enviar(
+                        "excel_cxc", _exp_cxc_proc, _exp_metricas,
+                        partial(crear_excel_metricas_cxc, _exp_metricas, _exp_cxc_proc),
+                    ),
+                    "📊 Excel", "reporte_cxc.xlsx", MIME_EXCEL,
+                    use_container_width=True,
+                )
+
+                # Detalle muy grande: alternativa comprimida además del Excel
+                if requiere_export_alterno(_exp_cxc_proc):
+                    mostrar_trabajo_export(
+                        _cola_export.enviar(
+                            "csv_zip_cxc", _exp_cxc_proc, (),
+                            partial(exportar_detalle_comprimido, _exp_cxc_proc, "detalle_cxc", "csv"),
+                        ),
+                        "🗜️ Detalle CxC (CSV .zip)", "detalle_cxc.zip", "application/zip",
                         use_container_width=True,
                     )
-                except Exception as _e:
-                    st.warning(f"⚠️ Excel no disponible: {_e}")
             else:
                 st.caption("⚠️ Sin datos CxC para Excel")
 
@@ -1538,21 +1573,19 @@ with st.sidebar:
                 if _inc_top: _secciones.append('top_clientes')
 
                 if _secciones:
-                    try:
-                        _html = crear_reporte_html(
-                            _exp_metricas, _exp_cxc_proc,
-                            df_ventas=st.session_state.get("df"),
-                            secciones=_secciones,
-                        )
-                        st.download_button(
-                            label="🌐 Descargar HTML",
-                            data=_html,
-                            file_name="reporte_ejecutivo.html",
-                            mime="text/html",
-                            use_container_width=True,
-                        )
-                    except Exception as _e:
-                        st.warning(f"⚠️ HTML no disponible: {_e}")
+                    _df_ventas_exp = st.session_state.get("df")
+                    mostrar_trabajo_export(
+                        _cola_export.enviar(
+                            "html_ejecutivo", (_exp_cxc_proc, _df_ventas_exp), (_exp_metricas, _secciones),
+                            partial(
+                                crear_reporte_html, _exp_metricas, _exp_cxc_proc,
+                                df_ventas=_df_ventas_exp, secciones=_secciones,
+                            ),
+                            con_progreso=False,
+                        ),
+                        "🌐 Descargar HTML", "reporte_ejecutivo.html", "text/html",
+                        use_container_width=True,
+                    )
                 else:
                     st.warning("⚠️ Selecciona al menos una sección")
 
@@ -1716,12 +1749,19 @@ _filtros_vista = _cfg_vista["filtros"]
 _desc_vista    = _cfg_vista.get("descripcion", "")
 _ayuda_vista   = _cfg_vista.get("ayuda", {})
 
-# ── Filtros en sidebar (expander colapsable al final del menú) ────────────
-if "df" not in st.session_state or not _filtros_vista:
-    if "df" in st.session_state:
-        st.session_state["df_original_pre_filtro"] = st.session_state["df"].copy()
-elif "df" in st.session_state:
-    st.session_state["df_original_pre_filtro"] = st.session_state["df"].copy()
+# ── Vista filtrada: frame base inmutable + filtros como máscaras ──────────
+# El df cargado se conserva como base (sin copias por rerun); los filtros de
+# la vista se registran como máscaras y los módulos reciben `vista.df`.
+if "df" in st.session_state:
+    _vista = st.session_state.get("vista_filtrada")
+    if _vista is None or not _vista.es_derivado(st.session_state["df"]):
+        # Dataset nuevo (archivo subido o CFDI recargado): pasa a ser la base
+        _vista = VistaFiltrada(st.session_state["df"])
+        st.session_state["vista_filtrada"] = _vista
+    # Mismo dataset (o re-leído en el rerun): se parte de la base y sus máscaras
+    st.session_state["df"] = _vista.base
+    if not _filtros_vista:
+        _vista.iniciar()
 
 # Información contextual según el menú seleccionado
 st.sidebar.markdown("---")
@@ -2007,14 +2047,69 @@ if st.session_state.get("mostrar_widgets_flotantes", True):
   except Exception:
       pass  # Widget silencioso si falla
 
+# =====================================================================
+# FILTROS DE DATOS — área de contenido, encima de cada sección
+# =====================================================================
+if "df" in st.session_state and _filtros_vista:
+    _vista = st.session_state["vista_filtrada"]
+    _vista.iniciar()
+
+    with st.expander("🔍 Filtrar datos", expanded=False):
+        col_izq, col_der = st.columns([3, 1])
+        with col_der:
+            if st.button("🗑️ Quitar filtros", use_container_width=True, key="content_limpiar_filtros"):
+                for _k in list(st.session_state.keys()):
+                    if _k.startswith("filtro_") or _k.startswith("inline_filtro_"):
+                        del st.session_state[_k]
+                st.rerun()
+
+        if "fecha" in _filtros_vista and "fecha" in _vista.base.columns:
+            st.markdown("**📅 Rango de fechas**")
+            filtrar_vista_fechas(_vista, "fecha")
+            st.markdown("---")
+
+        if "cliente" in _filtros_vista and "cliente" in _vista.base.columns:
+            st.markdown("**👤 Filtrar por cliente**")
+            filtrar_vista_cliente(_vista, "cliente")
+            st.markdown("---")
+
+        if "monto" in _filtros_vista:
+            _col_v = st.session_state.get("columna_ventas")
+            if _col_v and _col_v in _vista.base.columns:
+                st.markdown("**💲 Filtrar por monto de venta**")
+                filtrar_vista_monto(_vista, _col_v)
+
+        if "año" in _filtros_vista and "año" in _vista.base.columns:
+            st.markdown("---")
+            st.markdown("**📅 Año base (comparativo)**")
+            _años_disp = sorted(_vista.columna("año").dropna().unique())
+            if _años_disp:
+                _año_actual = st.session_state.get("año_base", _años_disp[-1])
+                _idx_actual = _años_disp.index(_año_actual) if _año_actual in _años_disp else len(_años_disp) - 1
+                _año_sel = st.selectbox(
+                    "Año principal para análisis",
+                    _años_disp,
+                    index=_idx_actual,
+                    key="año_base_filtro",
+                    label_visibility="collapsed",
+                    help="Año de referencia en el comparativo Año vs Año",
+                )
+                st.session_state["año_base"] = _año_sel
+
+        if _vista.hay_filtros:
+            pct = _vista.n_filtradas / _vista.n_total * 100
+            st.success(f"✅ Mostrando {_vista.n_filtradas:,} de {_vista.n_total:,} registros ({pct:.0f}%)")
+
+    st.session_state["df"] = _vista.df
+
 if st.session_state.get("mostrar_widgets_flotantes", True):
   try:
-    if "df" in st.session_state and "df_original_pre_filtro" in st.session_state:
-        _df_filt    = st.session_state["df"]
-        _df_orig    = st.session_state["df_original_pre_filtro"]
-        _n_filt     = len(_df_filt)
-        _n_orig     = len(_df_orig)
-        _activos    = _n_filt < _n_orig
+    if "df" in st.session_state and "vista_filtrada" in st.session_state:
+        # Conteos leídos de la máscara: no materializa el subconjunto
+        _vista      = st.session_state["vista_filtrada"]
+        _n_filt     = _vista.n_filtradas
+        _n_orig     = _vista.n_total
+        _activos    = _vista.hay_filtros
         _pct        = (_n_filt / _n_orig * 100) if _n_orig > 0 else 100
 
         # Leer keys de filtro del session_state
@@ -2098,61 +2193,6 @@ if st.session_state.get("mostrar_widgets_flotantes", True):
   except Exception:
       pass  # Widget silencioso si falla
 
-# =====================================================================
-# FILTROS DE DATOS — área de contenido, encima de cada sección
-# =====================================================================
-if "df" in st.session_state and _filtros_vista:
-    _df_orig = st.session_state.get("df_original_pre_filtro", st.session_state["df"].copy())
-    st.session_state["df_original_pre_filtro"] = _df_orig
-    _df_filt = _df_orig.copy()
-
-    with st.expander("🔍 Filtrar datos", expanded=False):
-        col_izq, col_der = st.columns([3, 1])
-        with col_der:
-            if st.button("🗑️ Quitar filtros", use_container_width=True, key="content_limpiar_filtros"):
-                for _k in list(st.session_state.keys()):
-                    if _k.startswith("filtro_") or _k.startswith("inline_filtro_"):
-                        del st.session_state[_k]
-                st.rerun()
-
-        if "fecha" in _filtros_vista and "fecha" in _df_filt.columns:
-            st.markdown("**📅 Rango de fechas**")
-            _df_filt = aplicar_filtro_fechas(_df_filt, "fecha")
-            st.markdown("---")
-
-        if "cliente" in _filtros_vista and "cliente" in _df_filt.columns:
-            st.markdown("**👤 Filtrar por cliente**")
-            _df_filt = aplicar_filtro_cliente(_df_filt, "cliente")
-            st.markdown("---")
-
-        if "monto" in _filtros_vista:
-            _col_v = st.session_state.get("columna_ventas")
-            if _col_v and _col_v in _df_filt.columns:
-                st.markdown("**💲 Filtrar por monto de venta**")
-                _df_filt = aplicar_filtro_monto(_df_filt, _col_v)
-
-        if "año" in _filtros_vista and "año" in _df_filt.columns:
-            st.markdown("---")
-            st.markdown("**📅 Año base (comparativo)**")
-            _años_disp = sorted(_df_filt["año"].dropna().unique())
-            if _años_disp:
-                _año_actual = st.session_state.get("año_base", _años_disp[-1])
-                _idx_actual = _años_disp.index(_año_actual) if _año_actual in _años_disp else len(_años_disp) - 1
-                _año_sel = st.selectbox(
-                    "Año principal para análisis",
-                    _años_disp,
-                    index=_idx_actual,
-                    key="año_base_filtro",
-                    label_visibility="collapsed",
-                    help="Año de referencia en el comparativo Año vs Año",
-                )
-                st.session_state["año_base"] = _año_sel
-
-        if len(_df_filt) < len(_df_orig):
-            pct = len(_df_filt) / len(_df_orig) * 100
-            st.success(f"✅ Mostrando {len(_df_filt):,} de {len(_df_orig):,} registros ({pct:.0f}%)")
-
-    st.session_state["df"] = _df_filt
 
 # =====================================================================
 # HELPER: ensamblado de df_cxc desde Excel (fuente única de verdad)
@@ -13,8 +13,10 @@ import os
 import json
 from io import StringIO
 from datetime import date
+from functools import lru_cache, partial
 from typing import Optional
 import streamlit as st
+import numpy as np
 import pandas as pd
 
 try:
@@ -727,29 +729,91 @@ def _render_smart_table(df: pd.DataFrame):
     st.dataframe(_format_numeric_display_dataframe(display_df), use_container_width=True, hide_index=True)
 
 
+_COUNT_KEYWORDS = (
+    'num_', 'count', 'cantidad', 'total_clientes', 'total_facturas', 'conteo', 'registros', 'facturas', 'ranking',
+)
+_MONEY_KEYWORDS = (
+    'total', 'monto', 'facturacion', 'venta', 'ventas', 'ventas_mes', 'importe',
+    'saldo', 'mxn', 'compra', 'cobrado', 'promedio', 'media', 'desviacion',
+    'minimo', 'maximo', 'precio', 'mediana', 'percentil', 'acumulado',
+    'promedio_movil', 'monetario', 'ingreso', 'valor',
+)
+_NULL_TEXT_VALUES = {"": None, "None": None, "nan": None, "NaN": None, "NULL": None, "null": None}
+_NUMERIC_FORMATS = {
+    'percent': ("%,.1f%%", lambda x: f"{round(x, 2):,.2f}%"),
+    'money': ("$%,.2f", lambda x: f"${x:,.2f}"),
+    'count': ("%,.0f", lambda x: f"{int(x):,}"),
+    'number': ("%,.2f", lambda x: f"{x:,.2f}"),
+}
+
+
+@lru_cache(maxsize=1024)
+def _numeric_kind_for_name(col_name: str) -> Optional[str]:
+    """Clasifica una columna por su nombre: 'percent', 'money', 'count' o None."""
+    col_lower = col_name.lower()
+    is_count = any(kw in col_lower for kw in _COUNT_KEYWORDS)
+    if 'pct' in col_lower or 'porcentaje' in col_lower or '%' in col_name:
+        return 'percent'
+    if not is_count and any(kw in col_lower for kw in _MONEY_KEYWORDS):
+        return 'money'
+    if is_count:
+        return 'count'
+    return None
+
+
+def _infer_numeric_columns(df: pd.DataFrame) -> list:
+    """
+    Inferencia única de columnas numéricas, compartida por coerción, column_config y formato.
+
+    Retorna una lista de tuplas ``(posición, kind, valores)`` con ``kind`` en
+    percent/money/count/number y ``valores`` como Series float64 (o None si la
+    columna no es numérica). Las columnas ya numéricas no se re-escanean; las
+    de texto/Decimal con nombre numérico se convierten en una sola pasada
+    vectorizada con ``pd.to_numeric``.
+    """
+    inferred = []
+    for pos, (col, series) in enumerate(df.items()):
+        name_kind = _numeric_kind_for_name(str(col))
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_numeric_dtype(series):
+            inferred.append((pos, name_kind or 'number', series.astype('float64')))
+        elif name_kind is not None and (
+            pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+        ):
+            inferred.append((pos, name_kind, _parse_numeric_text(series)))
+    return inferred
+
+
+def _parse_numeric_text(series: pd.Series) -> Optional[pd.Series]:
+    """Convierte texto/Decimal con $ , % a float64; None si menos del 80% es numérico."""
+    numeric_series = pd.to_numeric(series, errors='coerce')
+    pending = numeric_series.isna() & series.notna()
+    if pending.any():
+        cleaned = (
+            series[pending].astype(str).str.strip()
+            .str.replace(r"[$,%]", "", regex=True)
+            .replace(_NULL_TEXT_VALUES)
+        )
+        numeric_series = numeric_series.astype('float64')
+        numeric_series[pending] = pd.to_numeric(cleaned, errors='coerce')
+        non_null_count = series.notna().sum() - cleaned.isna().sum()
+    else:
+        non_null_count = series.notna().sum()
+
+    if non_null_count == 0:
+        return None
+    if numeric_series.notna().sum() / non_null_count < 0.8:
+        return None
+    return numeric_series.astype('float64')
+
+
 def _build_numeric_column_config(df: pd.DataFrame) -> dict:
     """Construye un formato consistente para números en tablas del asistente."""
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    count_keywords = ['num_', 'count', 'cantidad', 'total_clientes', 'total_facturas', 'conteo', 'registros', 'facturas', 'ranking']
-    money_keywords = [
-        'total', 'monto', 'facturacion', 'venta', 'ventas', 'ventas_mes', 'importe',
-        'saldo', 'mxn', 'compra', 'cobrado', 'promedio', 'media', 'desviacion',
-        'minimo', 'maximo', 'precio', 'mediana', 'percentil', 'acumulado',
-        'promedio_movil', 'monetario', 'ingreso', 'valor'
-    ]
-
     col_config = {}
-    for col in numeric_cols:
-        is_count = any(kw in col.lower() for kw in count_keywords)
-        if 'pct' in col.lower() or 'porcentaje' in col.lower() or col.lower().endswith('_pct') or '%' in col:
-            col_config[col] = st.column_config.NumberColumn(format="%,.1f%%")
-        elif not is_count and any(kw in col.lower() for kw in money_keywords):
-            col_config[col] = st.column_config.NumberColumn(format="$%,.2f")
-        elif is_count:
-            col_config[col] = st.column_config.NumberColumn(format="%,.0f")
-        else:
-            col_config[col] = st.column_config.NumberColumn(format="%,.2f")
-
+    for pos, kind, _values in _infer_numeric_columns(df):
+        if pd.api.types.is_numeric_dtype(df.iloc[:, pos]):
+            col_config[df.columns[pos]] = st.column_config.NumberColumn(format=_NUMERIC_FORMATS[kind][0])
     return col_config
 
 
@@ -758,45 +822,12 @@ def _coerce_numeric_like_columns(df: pd.DataFrame) -> pd.DataFrame:
     if df is None or df.empty:
         return df
 
-    count_keywords = ['num_', 'count', 'cantidad', 'total_clientes', 'total_facturas', 'conteo', 'registros', 'facturas', 'ranking']
-    money_keywords = [
-        'total', 'monto', 'facturacion', 'venta', 'ventas', 'ventas_mes', 'importe',
-        'saldo', 'mxn', 'compra', 'cobrado', 'promedio', 'media', 'desviacion',
-        'minimo', 'maximo', 'precio', 'mediana', 'percentil', 'acumulado',
-        'promedio_movil', 'monetario', 'ingreso', 'valor'
-    ]
-
     converted_df = df.copy()
-    for col in converted_df.columns:
-        if pd.api.types.is_numeric_dtype(converted_df[col]):
-            continue
-
-        col_lower = str(col).lower()
-        looks_numeric = any(kw in col_lower for kw in count_keywords + money_keywords) or \
-                        'pct' in col_lower or 'porcentaje' in col_lower or col_lower.endswith('_pct')
-        if not looks_numeric:
-            continue
-
-        raw_series = converted_df[col].astype(str).str.strip()
-        cleaned_series = (
-            raw_series
-            .str.replace("$", "", regex=False)
-            .str.replace(",", "", regex=False)
-            .str.replace("%", "", regex=False)
-            .replace({"": None, "None": None, "nan": None, "NaN": None, "NULL": None, "null": None})
-        )
-        numeric_series = pd.to_numeric(cleaned_series, errors='coerce')
-
-        non_null_count = cleaned_series.notna().sum()
-        if non_null_count == 0:
+    for pos, _kind, values in _infer_numeric_columns(df):
+        if values is None or pd.api.types.is_numeric_dtype(df.iloc[:, pos]):
             continue
-
-        parse_ratio = numeric_series.notna().sum() / non_null_count
-        if parse_ratio < 0.8:
-            continue
-
         # Usar dtypes numpy (float64) para que select_dtypes(include='number') los detecte
-        converted_df[col] = numeric_series.astype('float64')
+        converted_df.isetitem(pos, values)
 
     return converted_df
 
@@ -804,55 +835,34 @@ def _coerce_numeric_like_columns(df: pd.DataFrame) -> pd.DataFrame:
 def _format_numeric_display_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """Aplica formato visible a columnas numéricas para tablas del asistente.
 
-    Itera sobre TODOS los nombres de columna (no solo select_dtypes) para que
-    columnas Decimal de psycopg2 –almacenadas como object– también reciban formato.
+    Usa la misma inferencia que ``_coerce_numeric_like_columns`` para que
+    columnas Decimal de psycopg2 –almacenadas como object– también reciban
+    formato. El formateo se hace sobre valores únicos (factorize) y los
+    valores no numéricos se muestran como texto.
     """
-    count_keywords = ['num_', 'count', 'cantidad', 'total_clientes', 'total_facturas', 'conteo', 'registros', 'facturas', 'ranking']
-    money_keywords = [
-        'total', 'monto', 'facturacion', 'venta', 'ventas', 'ventas_mes', 'importe',
-        'saldo', 'mxn', 'compra', 'cobrado', 'promedio', 'media', 'desviacion',
-        'minimo', 'maximo', 'precio', 'mediana', 'percentil', 'acumulado',
-        'promedio_movil', 'monetario', 'ingreso', 'valor'
-    ]
-
     display_df = df.copy()
 
-    for col in display_df.columns:
-        col_lower = col.lower()
-        is_count   = any(kw in col_lower for kw in count_keywords)
-        is_percent = 'pct' in col_lower or 'porcentaje' in col_lower or col_lower.endswith('_pct') or '%' in col
-        is_money   = not is_count and any(kw in col_lower for kw in money_keywords)
+    for pos, kind, values in _infer_numeric_columns(df):
+        original = df.iloc[:, pos]
+        if values is None:
+            values = pd.to_numeric(original, errors='coerce').astype('float64')
+        fmt = _NUMERIC_FORMATS[kind][1]
+
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        finite = np.isfinite(uniques)
+        labels = np.array(
+            [fmt(x) if ok else "" for x, ok in zip(uniques.tolist(), finite)] + [""],
+            dtype=object,
+        )
+        formatted = labels[codes]
 
-        if not (is_count or is_percent or is_money):
-            # Solo formatear si la columna ya es numérica
-            if not pd.api.types.is_numeric_dtype(display_df[col]):
-                continue
+        # Valores no convertibles: se muestran como texto (vacío si son nulos)
+        fallback = values.isna().to_numpy() | ~np.isfinite(values.fillna(0).to_numpy())
+        if fallback.any():
+            raw = original.to_numpy()[fallback]
+            formatted[fallback] = ["" if pd.isna(v) else str(v) for v in raw]
 
-        def _safe_fmt(value, fmt):
-            try:
-                v = float(value)
-                if pd.isna(v):
-                    return ""
-                return fmt(v)
-            except (ValueError, TypeError):
-                return str(value) if value is not None else ""
-
-        if is_percent:
-            display_df[col] = display_df[col].map(
-                lambda v: _safe_fmt(v, lambda x: f"{round(x, 2):,.2f}%")
-            )
-        elif is_money:
-            display_df[col] = display_df[col].map(
-                lambda v: _safe_fmt(v, lambda x: f"${x:,.2f}")
-            )
-        elif is_count:
-            display_df[col] = display_df[col].map(
-                lambda v: _safe_fmt(v, lambda x: f"{int(x):,}")
-            )
-        else:
-            display_df[col] = display_df[col].map(
-                lambda v: _safe_fmt(v, lambda x: f"{x:,.2f}")
-            )
+        display_df.isetitem(pos, formatted)
 
     return display_df
 
@@ -1066,8 +1076,11 @@ def _render_plotly_chart_and_save(fig, use_container_width=True, stable_key: str
     diferencia; el contador se reinicia en run() en cada ciclo de Streamlit.
     """
     import hashlib
+    from utils.render_figuras import renderizador
     # Guardar en session_state para uso posterior (ej. PDF)
     st.session_state['last_plotly_fig'] = fig
+    # Arrancar kaleido en segundo plano: el PDF no paga el arranque de Chromium
+    renderizador.precalentar()
 
     # Clave estable: hash del título del gráfico + posición en el render actual
     if stable_key:
@@ -3913,28 +3926,36 @@ def _render_result_message(msg: dict, msg_idx: int = 0):
         # ============================================================
         # Generar PDF y CSV DESPUÉS de _auto_chart (para tener la fig)
         # ============================================================
-        pdf_bytes = None
-        pdf_error = None
-        try:
-            from utils.export_helper import crear_reporte_pdf_ejecutivo
-            
-            # Recuperar figura guardada por _auto_chart
-            fig_for_pdf = st.session_state.get('last_plotly_fig', None)
-            
-            # Generar PDF
-            pdf_bytes = crear_reporte_pdf_ejecutivo(
-                pregunta=msg.get("question", question),
-                interpretacion=msg.get("content", ""),
+        from utils.export_helper import crear_reporte_pdf_ejecutivo
+        from utils.export_jobs import mostrar_trabajo_export, obtener_cola_exportaciones
+        from utils.render_figuras import huella_figura
+
+        # Recuperar figura guardada por _auto_chart
+        fig_for_pdf = st.session_state.get('last_plotly_fig', None)
+        has_chart = fig_for_pdf is not None
+        empresa_pdf = st.session_state.get("empresa_actual", {}).get("nombre", "CIMA")
+        parametros_pdf = (
+            msg.get("question", question), msg.get("content", ""), msg.get("sql", ""),
+            chart_type, empresa_pdf,
+            huella_figura(fig_for_pdf) if has_chart else None,
+        )
+
+        # El PDF se genera en segundo plano y se reutiliza en cada rerun del historial
+        trabajo_pdf = obtener_cola_exportaciones().enviar(
+            "pdf_asistente", df, parametros_pdf,
+            partial(
+                crear_reporte_pdf_ejecutivo,
+                pregunta=parametros_pdf[0],
+                interpretacion=parametros_pdf[1],
                 df=df,
-                sql=msg.get("sql", ""),
+                sql=parametros_pdf[2],
                 chart_type=chart_type,
-                empresa=st.session_state.get("empresa_actual", {}).get("nombre", "CIMA"),
-                fig=fig_for_pdf
-            )
-        except Exception as e:
-            logger.error(f"Error generando PDF: {e}")
-            pdf_error = str(e)
-        
+                empresa=empresa_pdf,
+                fig=fig_for_pdf,
+            ),
+            con_progreso=False,
+        )
+
         # Generar CSV
         csv = df.to_csv(index=False)
 
@@ -3943,30 +3964,17 @@ def _render_result_message(msg: dict, msg_idx: int = 0):
         col_export_pdf, col_export_csv, col_spacer = st.columns([2, 2, 6])
         
         with col_export_pdf:
-            if pdf_bytes:
-                # Detectar si se incluyó gráfica
-                has_chart = fig_for_pdf is not None
-                
-                # Mostrar botón de descarga
-                if st.download_button(
-                    "📄 Generar Reporte PDF",
-                    pdf_bytes,
-                    "reporte_ejecutivo.pdf",
-                    "application/pdf",
-                    key=f"btn_pdf_{msg_idx}_{hash(msg.get('sql', ''))}",
-                    use_container_width=True
-                ):
-                    # Track ROI cuando se hace clic
-                    _track_pdf_roi(has_chart=has_chart)
-            else:
-                st.button(
-                    "📄 PDF no disponible", 
-                    disabled=True, 
-                    use_container_width=True,
-                    key=f"btn_pdf_disabled_{msg_idx}_{hash(msg.get('sql', ''))}"
-                )
-                if pdf_error:
-                    st.caption(f"⚠️ Error: {pdf_error[:50]}...")
+            # Track ROI cuando se hace clic (callback: también desde el fragmento de progreso)
+            mostrar_trabajo_export(
+                trabajo_pdf,
+                "📄 Generar Reporte PDF",
+                "reporte_ejecutivo.pdf",
+                "application/pdf",
+                key=f"btn_pdf_{msg_idx}_{hash(msg.get('sql', ''))}",
+                on_click=_track_pdf_roi,
+                kwargs={"has_chart": has_chart},
+                use_container_width=True,
+            )
         
         with col_export_csv:
             st.download_button(
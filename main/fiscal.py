@@ -9,8 +9,9 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import psycopg2
 from utils.logger import configurar_logger
+from utils.neon_consultas import Consulta, cargar_consultas, mostrar_tiempos
+from utils.formatos import columna_numerica, formatos_styler, formatear_serie
 
 logger = configurar_logger("fiscal", nivel="INFO")
 
@@ -25,9 +26,8 @@ def _get_neon_url() -> str | None:
     return url
 
 
-def _cargar_fiscal(empresa_id: str, neon_url: str) -> pd.DataFrame:
-    """Carga detalle fiscal por factura (Ingresos vigentes)."""
-    query = """
+# Carga detalle fiscal por factura (Ingresos vigentes).
+_SQL_FISCAL = """
         SELECT
             uuid_sat,
             fecha_emision::date                                 AS fecha,
@@ -49,26 +49,10 @@ def _cargar_fiscal(empresa_id: str, neon_url: str) -> pd.DataFrame:
           AND estatus = 'vigente'
         ORDER BY fecha_emision DESC
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, (empresa_id,))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando fiscal: {e}")
-        st.error(f"❌ Error al consultar la base de datos: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
-
-
-def _cargar_tendencia_fiscal(empresa_id: str, neon_url: str) -> pd.DataFrame:
-    """Tendencia mensual de base gravable e IVA."""
-    query = """
+
+
+# Tendencia mensual de base gravable e IVA.
+_SQL_TENDENCIA_FISCAL = """
         SELECT
             DATE_TRUNC('month', fecha_emision)::date           AS mes,
             COUNT(*)                                            AS num_facturas,
@@ -84,25 +68,10 @@ def _cargar_tendencia_fiscal(empresa_id: str, neon_url: str) -> pd.DataFrame:
         GROUP BY 1
         ORDER BY 1 DESC
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, (empresa_id,))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando tendencia fiscal: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
-
-
-def _cargar_retenciones(empresa_id: str, neon_url: str) -> pd.DataFrame:
-    """Carga facturas con retenciones (IVA retenido, ISR retenido)."""
-    query = """
+
+
+# Carga facturas con retenciones (IVA retenido, ISR retenido).
+_SQL_RETENCIONES = """
         SELECT
             uuid_sat,
             fecha_emision::date                                      AS fecha,
@@ -125,25 +94,10 @@ def _cargar_retenciones(empresa_id: str, neon_url: str) -> pd.DataFrame:
           AND (iva_retenido > 0 OR isr_retenido > 0)
         ORDER BY fecha_emision DESC
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, (empresa_id,))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando retenciones: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
-
-
-def _cargar_nomina(empresa_id: str, neon_url: str) -> pd.DataFrame:
-    """Carga CFDIs de nómina (tipo_comprobante = 'N')."""
-    query = """
+
+
+# Carga CFDIs de nómina (tipo_comprobante = 'N').
+_SQL_NOMINA = """
         SELECT
             uuid_sat,
             fecha_emision::date                                 AS fecha,
@@ -160,25 +114,10 @@ def _cargar_nomina(empresa_id: str, neon_url: str) -> pd.DataFrame:
           AND estatus = 'vigente'
         ORDER BY fecha_emision DESC
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, (empresa_id,))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando nómina: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
-
-
-def _cargar_tendencia_nomina(empresa_id: str, neon_url: str) -> pd.DataFrame:
-    """Tendencia mensual de nómina: percepciones, deducciones, ISR, neto."""
-    query = """
+
+
+# Tendencia mensual de nómina: percepciones, deducciones, ISR, neto.
+_SQL_TENDENCIA_NOMINA = """
         SELECT
             DATE_TRUNC('month', fecha_emision)::date           AS mes,
             COUNT(*)                                            AS num_recibos,
@@ -194,27 +133,24 @@ def _cargar_tendencia_nomina(empresa_id: str, neon_url: str) -> pd.DataFrame:
         GROUP BY 1
         ORDER BY 1 DESC
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, (empresa_id,))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando tendencia nómina: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
+
+
+def _consultas_nomina(empresa_id: str) -> list[Consulta]:
+    """Consultas independientes de la vista de nómina."""
+    params = (empresa_id,)
+    return [
+        Consulta("nomina", _SQL_NOMINA, params),
+        Consulta("tendencia_nomina", _SQL_TENDENCIA_NOMINA, params),
+    ]
 
 
 def _run_nomina(empresa_id: str, empresa_nombre: str, neon_url: str):
     """Vista de desglose fiscal — Nómina."""
     with st.spinner("Consultando nómina..."):
-        df_nom = _cargar_nomina(empresa_id, neon_url)
-        df_tend = _cargar_tendencia_nomina(empresa_id, neon_url)
+        resultados = cargar_consultas(empresa_id, neon_url, _consultas_nomina(empresa_id))
+    mostrar_tiempos(resultados)
+    df_nom = resultados["nomina"].df
+    df_tend = resultados["tendencia_nomina"].df
 
     if df_nom.empty:
         st.info(
@@ -270,14 +206,14 @@ def _run_nomina(empresa_id: str, empresa_nombre: str, neon_url: str):
                 x=df_t["mes"], y=df_t["percepciones_mxn"],
                 name="Percepciones (bruto)",
                 marker_color="#2196F3",
-                text=df_t["percepciones_mxn"].apply(lambda x: f"${x:,.0f}"),
+                text=formatear_serie(df_t["percepciones_mxn"], "moneda_entera"),
                 textposition="inside",
             ))
             fig_bar.add_trace(go.Bar(
                 x=df_t["mes"], y=df_t["deducciones_mxn"],
                 name="Deducciones",
                 marker_color="#F44336",
-                text=df_t["deducciones_mxn"].apply(lambda x: f"${x:,.0f}"),
+                text=formatear_serie(df_t["deducciones_mxn"], "moneda_entera"),
                 textposition="inside",
             ))
             fig_bar.add_trace(go.Bar(
@@ -324,9 +260,13 @@ def _run_nomina(empresa_id: str, empresa_nombre: str, neon_url: str):
                 "Mes", "Recibos", "Empleados",
                 "Percepciones", "Deducciones", "ISR retenido", "Neto pagado"
             ]
-            for col in ["Percepciones", "Deducciones", "ISR retenido", "Neto pagado"]:
-                disp_t[col] = disp_t[col].apply(lambda x: f"${x:,.2f}")
-            st.dataframe(disp_t, use_container_width=True, hide_index=True)
+            st.dataframe(
+                disp_t, use_container_width=True, hide_index=True,
+                column_config={
+                    col: columna_numerica("moneda", col)
+                    for col in ["Percepciones", "Deducciones", "ISR retenido", "Neto pagado"]
+                },
+            )
 
     # ── Tab 2: Por Empleado ───────────────────────────────────────────────────
     with tab_emp:
@@ -377,14 +317,17 @@ def _run_nomina(empresa_id: str, empresa_nombre: str, neon_url: str):
             fig_isr.update_layout(showlegend=False, height=350)
             st.plotly_chart(fig_isr, use_container_width=True)
 
-        disp_emp = df_emp.copy()
-        for col in ["percepciones", "deducciones", "isr", "neto"]:
-            disp_emp[col] = disp_emp[col].apply(lambda x: f"${x:,.2f}")
-        disp_emp.columns = [
+        disp_emp = df_emp.set_axis([
             "RFC", "Empleado", "Recibos",
             "Percepciones", "Deducciones", "ISR retenido", "Neto pagado", "% Deducción"
-        ]
-        st.dataframe(disp_emp, use_container_width=True, hide_index=True)
+        ], axis=1)
+        st.dataframe(
+            disp_emp, use_container_width=True, hide_index=True,
+            column_config={
+                col: columna_numerica("moneda", col)
+                for col in ["Percepciones", "Deducciones", "ISR retenido", "Neto pagado"]
+            },
+        )
 
     # ── Tab 3: Detalle recibos ────────────────────────────────────────────────
     with tab_det:
@@ -410,12 +353,12 @@ def _run_nomina(empresa_id: str, empresa_nombre: str, neon_url: str):
             "Neto pagado", "Moneda", "UUID SAT"
         ]
         st.dataframe(
-            disp_det.style.format({
-                "Percepciones":  "${:,.2f}",
-                "Deducciones":   "${:,.2f}",
-                "ISR retenido":  "${:,.2f}",
-                "Neto pagado":   "${:,.2f}",
-            }),
+            disp_det.style.format(formatos_styler({
+                "Percepciones":  "moneda",
+                "Deducciones":   "moneda",
+                "ISR retenido":  "moneda",
+                "Neto pagado":   "moneda",
+            })),
             use_container_width=True, hide_index=True, height=480,
         )
         csv_n = df_det.to_csv(index=False).encode("utf-8")
@@ -430,16 +373,13 @@ def _run_nomina(empresa_id: str, empresa_nombre: str, neon_url: str):
 
 
 
-def _cargar_impuestos_por_concepto(empresa_id: str, neon_url: str) -> pd.DataFrame:
-    """
-    Consolida impuestos estimados por clave de producto SAT.
-
-    Usa cfdi_conceptos JOIN cfdi_ventas para distribuir la base gravable
-    por concepto según objeto_imp:
-      - '02' → gravado (tasa IVA implícita del comprobante)
-      - '01' → exento / no objeto
-    """
-    query = """
+# Consolida impuestos estimados por clave de producto SAT.
+#
+# Usa cfdi_conceptos JOIN cfdi_ventas para distribuir la base gravable
+# por concepto según objeto_imp:
+# - '02' → gravado (tasa IVA implícita del comprobante)
+# - '01' → exento / no objeto
+_SQL_IMPUESTOS_POR_CONCEPTO = """
         SELECT
             cc.clave_prod_serv,
             cc.descripcion,
@@ -466,29 +406,47 @@ def _cargar_impuestos_por_concepto(empresa_id: str, neon_url: str) -> pd.DataFra
         ORDER BY base_mxn DESC
         LIMIT 500
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, (empresa_id,))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando impuestos por concepto: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
+
+
+# KPIs de retenciones globales (todos los registros, no solo los que tienen)
+_SQL_RETENCIONES_KPI = """
+        SELECT
+            COUNT(*) FILTER (WHERE iva_retenido > 0 OR isr_retenido > 0) AS facturas_con_ret,
+            ROUND(SUM(iva_retenido  * COALESCE(tipo_cambio,1)), 2)        AS total_iva_ret,
+            ROUND(SUM(isr_retenido  * COALESCE(tipo_cambio,1)), 2)        AS total_isr_ret,
+            ROUND(SUM((iva_retenido + isr_retenido) * COALESCE(tipo_cambio,1)), 2) AS total_ret,
+            ROUND(SUM(impuestos * COALESCE(tipo_cambio,1)), 2)            AS total_iva_tras
+        FROM cfdi_ventas
+        WHERE empresa_id = %s
+          AND tipo_comprobante = 'I'
+          AND estatus = 'vigente'
+    """
+
+
+def _consultas_ventas(empresa_id: str) -> list[Consulta]:
+    """Consultas independientes de la vista de ventas (se ejecutan en paralelo)."""
+    params = (empresa_id,)
+    return [
+        Consulta("fiscal", _SQL_FISCAL, params),
+        Consulta("tendencia_fiscal", _SQL_TENDENCIA_FISCAL, params),
+        Consulta("retenciones", _SQL_RETENCIONES, params),
+        Consulta("retenciones_kpi", _SQL_RETENCIONES_KPI, params),
+        Consulta("impuestos_por_concepto", _SQL_IMPUESTOS_POR_CONCEPTO, params),
+    ]
 
 
 def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
     """Vista de desglose fiscal — Ventas / Ingresos (tipo_comprobante='I')."""
     with st.spinner("Consultando base de datos..."):
-        df           = _cargar_fiscal(empresa_id, neon_url)
-        df_tendencia = _cargar_tendencia_fiscal(empresa_id, neon_url)
-        df_ret       = _cargar_retenciones(empresa_id, neon_url)
-        df_conceptos = _cargar_impuestos_por_concepto(empresa_id, neon_url)
+        resultados = cargar_consultas(empresa_id, neon_url, _consultas_ventas(empresa_id))
+    mostrar_tiempos(resultados)
+    if not resultados["fiscal"].ok:
+        st.error(f"❌ Error al consultar la base de datos: {resultados['fiscal'].error}")
+    df           = resultados["fiscal"].df
+    df_tendencia = resultados["tendencia_fiscal"].df
+    df_ret       = resultados["retenciones"].df
+    df_conceptos = resultados["impuestos_por_concepto"].df
+    df_ret_kpi   = resultados["retenciones_kpi"].df
 
     if df.empty:
         st.info("📭 No hay facturas de ingreso registradas para esta empresa.")
@@ -544,14 +502,14 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
                 x=df_t["mes"], y=df_t["base_gravable_mxn"],
                 name="Base gravable (sin IVA)",
                 marker_color="#2196F3",
-                text=df_t["base_gravable_mxn"].apply(lambda x: f"${x:,.0f}"),
+                text=formatear_serie(df_t["base_gravable_mxn"], "moneda_entera"),
                 textposition="inside",
             ))
             fig_stack.add_trace(go.Bar(
                 x=df_t["mes"], y=df_t["iva_mxn"],
                 name="IVA trasladado",
                 marker_color="#FF9800",
-                text=df_t["iva_mxn"].apply(lambda x: f"${x:,.0f}"),
+                text=formatear_serie(df_t["iva_mxn"], "moneda_entera"),
                 textposition="inside",
             ))
             fig_stack.update_layout(
@@ -589,9 +547,13 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
                 "Mes", "Facturas", "Base gravable", "IVA",
                 "Descuentos", "Total c/IVA", "Tasa IVA %"
             ]
-            for col in ["Base gravable", "IVA", "Descuentos", "Total c/IVA"]:
-                disp_t[col] = disp_t[col].apply(lambda x: f"${x:,.2f}")
-            st.dataframe(disp_t, use_container_width=True, hide_index=True)
+            st.dataframe(
+                disp_t, use_container_width=True, hide_index=True,
+                column_config={
+                    col: columna_numerica("moneda", col)
+                    for col in ["Base gravable", "IVA", "Descuentos", "Total c/IVA"]
+                },
+            )
 
     # ── Tab 2: Por Cliente ───────────────────────────────────────────────────
     with tab2:
@@ -617,7 +579,7 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
                 title=f"Top {top_n} clientes por IVA generado (MXN)",
                 color="iva",
                 color_continuous_scale="Blues",
-                text=df_top["iva"].apply(lambda x: f"${x:,.0f}"),
+                text=formatear_serie(df_top["iva"], "moneda_entera"),
             )
             fig_cli.update_traces(textposition="outside")
             fig_cli.update_layout(showlegend=False, height=420,
@@ -638,11 +600,14 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
             st.plotly_chart(fig_pie, use_container_width=True)
 
         # Tabla clientes
-        disp_cli = df_cli.copy()
-        for col in ["base_gravable", "iva", "total"]:
-            disp_cli[col] = disp_cli[col].apply(lambda x: f"${x:,.2f}")
-        disp_cli.columns = ["RFC", "Cliente", "Facturas", "Base gravable", "IVA", "Total c/IVA"]
-        st.dataframe(disp_cli, use_container_width=True, hide_index=True)
+        disp_cli = df_cli.set_axis(["RFC", "Cliente", "Facturas", "Base gravable", "IVA", "Total c/IVA"], axis=1)
+        st.dataframe(
+            disp_cli, use_container_width=True, hide_index=True,
+            column_config={
+                col: columna_numerica("moneda", col)
+                for col in ["Base gravable", "IVA", "Total c/IVA"]
+            },
+        )
 
     # ── Tab 3: Por Línea de Negocio ──────────────────────────────────────────
     with tab3:
@@ -680,13 +645,13 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
         fig_bar.add_trace(go.Bar(
             y=df_linea_sorted["linea_negocio"], x=df_linea_sorted["base_gravable"],
             name="Base gravable", orientation="h", marker_color="#2196F3",
-            text=df_linea_sorted["base_gravable"].apply(lambda x: f"${x:,.0f}"),
+            text=formatear_serie(df_linea_sorted["base_gravable"], "moneda_entera"),
             textposition="inside",
         ))
         fig_bar.add_trace(go.Bar(
             y=df_linea_sorted["linea_negocio"], x=df_linea_sorted["iva"],
             name="IVA", orientation="h", marker_color="#FF9800",
-            text=df_linea_sorted["iva"].apply(lambda x: f"${x:,.0f}"),
+            text=formatear_serie(df_linea_sorted["iva"], "moneda_entera"),
             textposition="inside",
         ))
         fig_bar.update_layout(
@@ -698,11 +663,14 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
         )
         st.plotly_chart(fig_bar, use_container_width=True)
 
-        disp_lin = df_linea.copy()
-        for col in ["base_gravable", "iva", "total"]:
-            disp_lin[col] = disp_lin[col].apply(lambda x: f"${x:,.2f}")
-        disp_lin.columns = ["Línea de negocio", "Facturas", "Base gravable", "IVA", "Total c/IVA"]
-        st.dataframe(disp_lin, use_container_width=True, hide_index=True)
+        disp_lin = df_linea.set_axis(["Línea de negocio", "Facturas", "Base gravable", "IVA", "Total c/IVA"], axis=1)
+        st.dataframe(
+            disp_lin, use_container_width=True, hide_index=True,
+            column_config={
+                col: columna_numerica("moneda", col)
+                for col in ["Base gravable", "IVA", "Total c/IVA"]
+            },
+        )
 
     # ── Tab 4: Detalle ───────────────────────────────────────────────────────
     with tab4:
@@ -736,12 +704,12 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
         ]
 
         st.dataframe(
-            disp_det.style.format({
-                "Base gravable": "${:,.2f}",
-                "Descuento":     "${:,.2f}",
-                "IVA":           "${:,.2f}",
-                "Total c/IVA":   "${:,.2f}",
-            }),
+            disp_det.style.format(formatos_styler({
+                "Base gravable": "moneda",
+                "Descuento":     "moneda",
+                "IVA":           "moneda",
+                "Total c/IVA":   "moneda",
+            })),
             use_container_width=True,
             hide_index=True,
             height=480,
@@ -760,28 +728,7 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
         st.subheader("Retenciones fiscales — IVA retenido e ISR retenido")
 
         # KPIs de retenciones globales (todos los registros, no solo los que tienen)
-        conn_r = None
-        try:
-            conn_r = psycopg2.connect(neon_url)
-            cur_r = conn_r.cursor()
-            cur_r.execute("""
-                SELECT
-                    COUNT(*) FILTER (WHERE iva_retenido > 0 OR isr_retenido > 0) AS facturas_con_ret,
-                    ROUND(SUM(iva_retenido  * COALESCE(tipo_cambio,1)), 2)        AS total_iva_ret,
-                    ROUND(SUM(isr_retenido  * COALESCE(tipo_cambio,1)), 2)        AS total_isr_ret,
-                    ROUND(SUM((iva_retenido + isr_retenido) * COALESCE(tipo_cambio,1)), 2) AS total_ret,
-                    ROUND(SUM(impuestos * COALESCE(tipo_cambio,1)), 2)            AS total_iva_tras
-                FROM cfdi_ventas
-                WHERE empresa_id = %s
-                  AND tipo_comprobante = 'I'
-                  AND estatus = 'vigente'
-            """, (empresa_id,))
-            kpi = cur_r.fetchone()
-        except Exception:
-            kpi = None
-        finally:
-            if conn_r:
-                conn_r.close()
+        kpi = tuple(df_ret_kpi.iloc[0]) if not df_ret_kpi.empty else None
 
         if kpi:
             n_ret, iva_ret, isr_ret, tot_ret, iva_tras = kpi
@@ -851,14 +798,14 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
                 "Total retenido", "Total c/IVA", "UUID SAT"
             ]
             st.dataframe(
-                disp_ret.style.format({
-                    "Subtotal":        "${:,.2f}",
-                    "IVA trasladado":  "${:,.2f}",
-                    "IVA retenido":    "${:,.2f}",
-                    "ISR retenido":    "${:,.2f}",
-                    "Total retenido":  "${:,.2f}",
-                    "Total c/IVA":     "${:,.2f}",
-                }),
+                disp_ret.style.format(formatos_styler({
+                    "Subtotal":        "moneda",
+                    "IVA trasladado":  "moneda",
+                    "IVA retenido":    "moneda",
+                    "ISR retenido":    "moneda",
+                    "Total retenido":  "moneda",
+                    "Total c/IVA":     "moneda",
+                })),
                 use_container_width=True,
                 hide_index=True,
                 height=420,
@@ -934,10 +881,10 @@ def _run_ventas(empresa_id: str, empresa_nombre: str, neon_url: str):
                 "Base (MXN)", "IVA est. (MXN)",
             ]
             st.dataframe(
-                disp_c.style.format({
-                    "Base (MXN)":     "${:,.2f}",
-                    "IVA est. (MXN)": "${:,.2f}",
-                }),
+                disp_c.style.format(formatos_styler({
+                    "Base (MXN)":     "moneda",
+                    "IVA est. (MXN)": "moneda",
+                })),
                 use_container_width=True,
                 hide_index=True,
                 height=450,
@@ -1,13 +1,14 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
 import plotly.graph_objects as go
 import io
 import logging
 import unicodedata
 from utils.auth import get_current_user
+from utils.sales_cube import obtener_cubo
+from utils.cache_helper import memo_vistas
+from utils.formatos import columna_numerica
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +60,42 @@ def obtener_mapa_columnas():
     }
 
 
+def reducir_a_cubo_diario(df):
+    """
+    Sustituye las transacciones por el cubo diario (fecha × línea × segmentos).
+
+    El heatmap solo suma importes por período y línea, así que el agregado
+    diario (cacheado por dataset) da los mismos totales con muchas menos filas.
+    Si faltan fecha, línea o importe se devuelve el df original para que las
+    validaciones de siempre reporten el problema.
+    """
+    nombres_originales = dict(zip(clean_columns(df.columns), df.columns))
+    if 'fecha' not in nombres_originales:
+        return df
+
+    encabezados = pd.DataFrame(columns=list(nombres_originales))
+    mapa_columnas = obtener_mapa_columnas()
+    detectadas = {
+        clave: detectar_columna(encabezados, mapa_columnas[clave])
+        for clave in ("linea", "importe", "cliente", "vendedor", "canal", "region")
+    }
+    if detectadas["linea"] is None or detectadas["importe"] is None:
+        return df
+
+    dimensiones = [
+        nombres_originales[detectadas[clave]]
+        for clave in ("linea", "cliente", "vendedor", "canal", "region")
+        if detectadas[clave] is not None
+    ]
+    cubo = obtener_cubo(
+        df,
+        nombres_originales[detectadas["importe"]],
+        columna_fecha=nombres_originales['fecha'],
+        dimensiones=dimensiones,
+    )
+    return cubo.diario.rename(columns={original: limpio for limpio, original in nombres_originales.items()})
+
+
 def preparar_dataframe_base(df):
     df = df.copy()
     df.columns = clean_columns(df.columns)
@@ -211,6 +248,18 @@ def construir_tabla_pivot(df, columna_linea, columna_importe):
     return pivot_table, df_period_order
 
 
+def construir_vista_periodos(df, periodo_tipo, columna_linea, columna_importe):
+    """Periodos, etiquetas y pivot período × línea de la vista ya filtrada."""
+    df, growth_lag_secuencial, growth_lag_yoy = construir_periodo_y_lags(df, periodo_tipo)
+
+    # Convertir a string antes de concatenar para evitar errores de tipo
+    df['periodo_etiqueta'] = df['periodo_id'].astype(str) + " - " + df['periodo'].astype(str)
+    df = df.sort_values('periodo_inicio')
+
+    pivot_table, df_period_order = construir_tabla_pivot(df, columna_linea, columna_importe)
+    return df, growth_lag_secuencial, growth_lag_yoy, pivot_table, df_period_order
+
+
 def obtener_offset_comparacion(periodo_tipo, tipo_comparacion):
     if tipo_comparacion == "Período anterior":
         if periodo_tipo == "Mensual":
@@ -222,44 +271,65 @@ def obtener_offset_comparacion(periodo_tipo, tipo_comparacion):
     return pd.DateOffset(years=1), "vs mismo período año anterior"
 
 
-def calcular_tabla_crecimiento(df_filtered, df_period_order, periodo_tipo, tipo_comparacion):
-    offset, comparacion_label = obtener_offset_comparacion(periodo_tipo, tipo_comparacion)
-
-    periodos_ordenados = df_period_order.loc[df_filtered.index].sort_values()
-    etiquetas_ordenadas = periodos_ordenados.index.tolist()
-    etiqueta_por_periodo = {periodo: etiqueta for etiqueta, periodo in periodos_ordenados.items()}
-
-    growth_table = pd.DataFrame(index=etiquetas_ordenadas, columns=df_filtered.columns, dtype=float)
-    status_table = pd.DataFrame(index=etiquetas_ordenadas, columns=df_filtered.columns, dtype=object)
-
-    for etiqueta_actual in etiquetas_ordenadas:
-        periodo_actual = df_period_order.loc[etiqueta_actual]
-        if pd.isna(periodo_actual):
-            continue
-
-        periodo_base = periodo_actual - offset
-        etiqueta_base = etiqueta_por_periodo.get(periodo_base)
-
-        if etiqueta_base is None:
-            status_table.loc[etiqueta_actual] = 'sin_comparable'
-            continue
-
-        valores_actuales = df_filtered.loc[etiqueta_actual]
-        valores_base = df_filtered.loc[etiqueta_base]
-
-        base_limpia = valores_base.replace(0, np.nan)
-        crecimiento = ((valores_actuales - valores_base) / base_limpia) * 100
-
-        crecimiento[(valores_base == 0) & (valores_actuales > 0)] = np.inf
-        crecimiento[(valores_base == 0) & (valores_actuales == 0)] = np.nan
-        growth_table.loc[etiqueta_actual] = crecimiento
+# Frecuencia de la rejilla de períodos y desfase (en períodos) por tipo de comparación
+REJILLA_PERIODOS = {
+    "Mensual": ("MS", {"Período anterior": 1, "Mismo período año anterior": 12}),
+    "Trimestral": ("QS-JAN", {"Período anterior": 1, "Mismo período año anterior": 4}),
+    "Anual": ("YS", {"Período anterior": 1, "Mismo período año anterior": 1}),
+}
 
-        estados = pd.Series('comparable', index=df_filtered.columns, dtype=object)
-        estados[(valores_base == 0) & (valores_actuales > 0)] = 'nuevo'
-        estados[(valores_base == 0) & (valores_actuales == 0)] = 'sin_actividad'
-        status_table.loc[etiqueta_actual] = estados
 
-    return growth_table.reindex(df_filtered.index), status_table.reindex(df_filtered.index), comparacion_label
+def calcular_tabla_crecimiento(df_filtered, df_period_order, periodo_tipo, tipo_comparacion):
+    _, comparacion_label = obtener_offset_comparacion(periodo_tipo, tipo_comparacion)
+
+    periodos = pd.DatetimeIndex(df_period_order.reindex(df_filtered.index))
+    valores = df_filtered.to_numpy(dtype=float)
+    n_lineas = valores.shape[1]
+
+    # Posición de cada fila en la rejilla completa de períodos (-1 si no aplica)
+    posiciones = np.full(len(periodos), -1)
+    base = np.full(valores.shape, np.nan)
+    con_base = np.zeros(len(periodos), dtype=bool)
+
+    frecuencia, lags = REJILLA_PERIODOS.get(periodo_tipo, (None, {}))
+    lag = lags.get(tipo_comparacion, lags.get("Mismo período año anterior"))
+    if frecuencia and not periodos.isna().all():
+        rejilla = pd.date_range(periodos.min(), periodos.max(), freq=frecuencia)
+        posiciones = rejilla.get_indexer(periodos)
+        en_rejilla = posiciones >= 0
+
+        # Matriz sobre la rejilla completa: los períodos faltantes quedan sin fila
+        completa = np.full((len(rejilla), n_lineas), np.nan)
+        presente = np.zeros(len(rejilla), dtype=bool)
+        completa[posiciones[en_rejilla]] = valores[en_rejilla]
+        presente[posiciones[en_rejilla]] = True
+
+        # shift(lag) sobre la rejilla: la base de cada período está `lag` filas antes
+        base_completa = np.full_like(completa, np.nan)
+        base_presente = np.zeros_like(presente)
+        if lag < len(rejilla):
+            base_completa[lag:] = completa[:-lag]
+            base_presente[lag:] = presente[:-lag]
+
+        base[en_rejilla] = base_completa[posiciones[en_rejilla]]
+        con_base[en_rejilla] = base_presente[posiciones[en_rejilla]]
+
+    base_cero = base == 0
+    nuevo = base_cero & (valores > 0)
+    sin_actividad = base_cero & (valores == 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crecimiento = (valores - base) / np.where(base_cero, np.nan, base) * 100
+    crecimiento[nuevo] = np.inf
+    crecimiento[~con_base] = np.nan
+
+    estados = np.select([nuevo, sin_actividad], ['nuevo', 'sin_actividad'], 'comparable').astype(object)
+    estados[~con_base] = 'sin_comparable'
+    estados[periodos.isna()] = np.nan
+
+    growth_table = pd.DataFrame(crecimiento, index=df_filtered.index, columns=df_filtered.columns, dtype=float)
+    status_table = pd.DataFrame(estados, index=df_filtered.index, columns=df_filtered.columns, dtype=object)
+    return growth_table, status_table, comparacion_label
 
 
 def construir_resumen_heatmap(df_filtered, growth_table=None):
@@ -384,7 +454,7 @@ def run(df):
         " rebotes y caídas en la secuencia temporal seleccionada."
     )
 
-    df, error_preparacion = preparar_dataframe_base(df)
+    df, error_preparacion = preparar_dataframe_base(reducir_a_cubo_diario(df))
     if error_preparacion:
         st.error(error_preparacion)
         if df is not None:
@@ -447,13 +517,12 @@ def run(df):
     if periodo_tipo == "Rango Personalizado":
         df = df[(df['fecha'] >= pd.to_datetime(start_date)) & (df['fecha'] <= pd.to_datetime(end_date))]
 
-    df, growth_lag_secuencial, growth_lag_yoy = construir_periodo_y_lags(df, periodo_tipo)
-
-    # Convertir a string antes de concatenar para evitar errores de tipo
-    df['periodo_etiqueta'] = df['periodo_id'].astype(str) + " - " + df['periodo'].astype(str)
-    df = df.sort_values('periodo_inicio')
-
-    pivot_table, df_period_order = construir_tabla_pivot(df, columna_linea, columna_importe)
+    # La huella del df ya filtrado (corte comercial + rango) y el tipo de
+    # periodo identifican el pivot; los controles visuales no lo recalculan
+    df, growth_lag_secuencial, growth_lag_yoy, pivot_table, df_period_order = memo_vistas.obtener_o_calcular(
+        "heatmap_ventas.pivot", df, (periodo_tipo, columna_linea, columna_importe),
+        lambda: construir_vista_periodos(df, periodo_tipo, columna_linea, columna_importe),
+    )
 
     lineas_disponibles = list(pivot_table.columns)
 
@@ -602,6 +671,10 @@ def run(df):
             st.write(TITULOS_HEATMAP["insights"])
             st.info("\n".join(f"- {insight}" for insight in insights_heatmap))
 
+        # Diferidos: seaborn + matplotlib suman ~0.4 s de import
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
         fig, ax = plt.subplots(figsize=(max(10, len(top_lineas)*1.5), max(5, len(df_filtered.index)*0.6)))
         sns.heatmap(
             df_filtered,
@@ -726,10 +799,14 @@ def run(df):
                 })
                 df_lineas_tabla['% del Total'] = (df_lineas_tabla['Ventas'] / ventas_linea.sum() * 100).round(2)
                 df_lineas_tabla['% Acumulado'] = df_lineas_tabla['% del Total'].cumsum().round(2)
-                df_lineas_tabla['Ventas'] = df_lineas_tabla['Ventas'].apply(lambda x: f"${x:,.2f}")
-                df_lineas_tabla['% del Total'] = df_lineas_tabla['% del Total'].apply(lambda x: f"{x:.2f}%")
-                df_lineas_tabla['% Acumulado'] = df_lineas_tabla['% Acumulado'].apply(lambda x: f"{x:.2f}%")
-                st.dataframe(df_lineas_tabla, use_container_width=True, hide_index=True)
+                st.dataframe(
+                    df_lineas_tabla, use_container_width=True, hide_index=True,
+                    column_config={
+                        'Ventas': columna_numerica('moneda', 'Ventas'),
+                        '% del Total': columna_numerica('porcentaje_2', '% del Total'),
+                        '% Acumulado': columna_numerica('porcentaje_2', '% Acumulado'),
+                    },
+                )
 
             st.write("---")
             st.subheader(TITULOS_HEATMAP["pareto"])
@@ -867,8 +944,10 @@ def run(df):
                         'Período': serie_linea.index,
                         'Ventas': serie_linea.values,
                     })
-                    df_detalle_linea['Ventas'] = df_detalle_linea['Ventas'].apply(lambda x: f"${x:,.2f}")
-                    st.dataframe(df_detalle_linea, use_container_width=True, hide_index=True)
+                    st.dataframe(
+                        df_detalle_linea, use_container_width=True, hide_index=True,
+                        column_config={'Ventas': columna_numerica('moneda', 'Ventas')},
+                    )
 
         user = get_current_user()
         puede_exportar = user and user.can_export()
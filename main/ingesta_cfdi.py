@@ -24,6 +24,8 @@ import plotly.graph_objects as go
 
 # Importar ROI Tracker
 from utils.roi_tracker import init_roi_tracker
+from utils.formatos import columna_numerica
+from utils.neon_consultas import invalidar_version
 
 # Importar módulos CFDI
 try:
@@ -349,9 +351,10 @@ def mostrar_distribuciones(df_conceptos: pd.DataFrame):
         
         # Tabla completa
         with st.expander("📋 Ver todos los clientes"):
-            df_display = df_receptor.copy()
-            df_display['Total Facturado'] = df_display['Total Facturado'].apply(lambda x: f"${x:,.2f}")
-            st.dataframe(df_display, use_container_width=True, hide_index=True)
+            st.dataframe(
+                df_receptor, use_container_width=True, hide_index=True,
+                column_config={'Total Facturado': columna_numerica('moneda', 'Total Facturado')},
+            )
     
     with tab2:
         st.markdown("### 📦 Distribución por Producto/Servicio")
@@ -398,10 +401,13 @@ def mostrar_distribuciones(df_conceptos: pd.DataFrame):
         
         # Tabla completa
         with st.expander("📋 Ver todos los productos"):
-            df_display = df_producto.copy()
-            df_display['Total Facturado'] = df_display['Total Facturado'].apply(lambda x: f"${x:,.2f}")
-            df_display['Cantidad Total'] = df_display['Cantidad Total'].apply(lambda x: f"{x:,.2f}")
-            st.dataframe(df_display, use_container_width=True, hide_index=True)
+            st.dataframe(
+                df_producto, use_container_width=True, hide_index=True,
+                column_config={
+                    'Total Facturado': columna_numerica('moneda', 'Total Facturado'),
+                    'Cantidad Total': columna_numerica('decimal_2', 'Cantidad Total'),
+                },
+            )
     
     with tab3:
         st.markdown("### 📅 Evolución Mensual")
@@ -448,9 +454,10 @@ def mostrar_distribuciones(df_conceptos: pd.DataFrame):
         
         # Tabla
         with st.expander("📋 Ver datos mensuales"):
-            df_display = df_mes.copy()
-            df_display['Total Facturado'] = df_display['Total Facturado'].apply(lambda x: f"${x:,.2f}")
-            st.dataframe(df_display, use_container_width=True, hide_index=True)
+            st.dataframe(
+                df_mes, use_container_width=True, hide_index=True,
+                column_config={'Total Facturado': columna_numerica('moneda', 'Total Facturado')},
+            )
 
 
 def mostrar_analisis_avanzados(df_conceptos: pd.DataFrame):
@@ -1190,6 +1197,8 @@ def main():
                             ventas_list=ventas_parseadas,
                             skip_duplicates=True
                         )
+                        # Fiscal / Universo vuelven a consultar esta empresa
+                        invalidar_version(empresa_id)
                         
                         st.success(
                             f"💾 Guardado en Neon: "
@@ -4,9 +4,8 @@ import numpy as np
 import os
 from unidecode import unidecode
 from datetime import datetime
-from utils.formatos import now_mx
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
+from functools import partial
+from utils.formatos import now_mx, columna_numerica, formatos_styler
 import plotly.graph_objects as go
 import plotly.express as px
 
@@ -22,6 +21,7 @@ from utils.cxc_helper import (
     obtener_semaforo_morosidad, obtener_semaforo_riesgo, obtener_semaforo_concentracion
 )
 from utils.cxc_aging_engine import prepare_cxc_metrics  # fuente única de verdad CxC
+from utils.cache_helper import memo_vistas
 from utils.cxc_metricas_cliente import (
     calcular_metricas_por_cliente, obtener_top_n_clientes, obtener_facturas_cliente
 )
@@ -283,7 +283,13 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
         # prepare_cxc_metrics aplica la misma lógica que Reporte Ejecutivo y
         # Reporte Consolidado, garantizando métricas consistentes.
         # ---------------------------------------------------------------------
-        cxc_m = prepare_cxc_metrics(df_deudas)
+        # Memoizado por huella de la cartera + fecha de corte: los reruns por
+        # widgets de visualización no recalculan el aging
+        fecha_corte = pd.Timestamp.today().normalize()
+        cxc_m = memo_vistas.obtener_o_calcular(
+            "kpi_cpc.cxc_metrics", df_deudas, (fecha_corte,),
+            lambda: prepare_cxc_metrics(df_deudas, fecha_corte=fecha_corte),
+        )
         df_deudas   = cxc_m['df_prep']       # con dias_overdue calculado
         df_np        = cxc_m['df_np']         # registros no pagados
         mask_pagado  = cxc_m['mask_pagado']
@@ -423,7 +429,10 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
         resumen_view.subheader("📊 Análisis Detallado de Antigüedad por Cliente")
         
         # Calcular métricas por cliente con 3 métodos
-        df_metricas_cliente = calcular_metricas_por_cliente(df_np)
+        df_metricas_cliente = memo_vistas.obtener_o_calcular(
+            "kpi_cpc.metricas_cliente", df_np, (),
+            lambda: calcular_metricas_por_cliente(df_np),
+        )
         
         if not df_metricas_cliente.empty:
             # Selector de modo de visualización
@@ -529,33 +538,29 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
             if df_display_raw is not None and not df_display_raw.empty:
                 st.write(titulo_tabla)
                 
-                # Formatear DataFrame para display
-                df_display = df_display_raw.copy()
-                df_display['saldo_total'] = df_display['saldo_total'].apply(lambda x: f"${x:,.0f}")
-                df_display['num_facturas'] = df_display['num_facturas'].apply(lambda x: f"{_safe_int(x):,}")
-                df_display['dias_promedio_ponderado'] = df_display['dias_promedio_ponderado'].apply(lambda x: f"{x:,.1f}")
-                df_display['dias_factura_mas_antigua'] = df_display['dias_factura_mas_antigua'].apply(lambda x: f"{x:,.0f}")
-                df_display['dias_factura_mas_reciente'] = df_display['dias_factura_mas_reciente'].apply(lambda x: f"{x:,.0f}")
-                
+                # Formato en el cliente: las columnas siguen siendo numéricas
                 st.dataframe(
-                    df_display,
+                    df_display_raw,
                     use_container_width=True,
                     hide_index=True,
                     column_config={
                         "deudor": st.column_config.TextColumn("Cliente", width="large"),
-                        "saldo_total": st.column_config.TextColumn("Saldo Total", width="medium"),
-                        "num_facturas": st.column_config.TextColumn("# Facturas", width="small"),
-                        "dias_promedio_ponderado": st.column_config.TextColumn(
+                        "saldo_total": columna_numerica("moneda_entera", "Saldo Total", width="medium"),
+                        "num_facturas": columna_numerica("entero", "# Facturas", width="small"),
+                        "dias_promedio_ponderado": columna_numerica(
+                            "decimal",
                             "📊 Días Promedio Ponderado", 
                             width="medium",
                             help="Promedio de días vencidos ponderado por monto de cada factura"
                         ),
-                        "dias_factura_mas_antigua": st.column_config.TextColumn(
+                        "dias_factura_mas_antigua": columna_numerica(
+                            "entero",
                             "⏰ Días Factura Más Antigua", 
                             width="medium",
                             help="Días vencidos de la factura más vieja del cliente"
                         ),
-                        "dias_factura_mas_reciente": st.column_config.TextColumn(
+                        "dias_factura_mas_reciente": columna_numerica(
+                            "entero",
                             "🆕 Días Factura Más Reciente", 
                             width="medium",
                             help="Días vencidos de la factura más nueva del cliente"
@@ -637,17 +642,13 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
                         col_d3.metric("📊 Días Prom. Ponderado", f"{r['dias_promedio_ponderado']:,.0f}")
                         col_d4.metric("⏰ Factura Más Antigua", f"{r['dias_factura_mas_antigua']:,.0f} días")
 
-                    # Formatear tabla de facturas
-                    df_facturas_display = df_facturas.copy()
-                    if 'saldo_adeudado' in df_facturas_display.columns:
-                        df_facturas_display['saldo_adeudado'] = df_facturas_display['saldo_adeudado'].apply(
-                            lambda x: f"${x:,.0f}" if pd.notna(x) else "-"
-                        )
+                    # Tabla de facturas (formato en el cliente)
+                    df_facturas_display = df_facturas
 
                     # Mapa de colores para la columna rango
                     col_config_facturas = {}
                     if 'saldo_adeudado' in df_facturas_display.columns:
-                        col_config_facturas["saldo_adeudado"] = st.column_config.TextColumn("Saldo", width="medium")
+                        col_config_facturas["saldo_adeudado"] = columna_numerica("moneda_entera", "Saldo", width="medium")
                     if 'factura' in df_facturas_display.columns:
                         col_config_facturas["factura"] = st.column_config.TextColumn("Factura", width="medium")
                     if 'fecha' in df_facturas_display.columns:
@@ -1116,6 +1117,7 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
         clientes_view.header("📋 Dashboard de Cobranza Proactiva")
 
         from utils.export_helper import crear_excel_cobranza_semanal
+        from utils.export_jobs import MIME_EXCEL, mostrar_trabajo_export, obtener_cola_exportaciones
 
         # ── Calcular score de prioridad enriquecido ──────────────────────────
         # Score 0-100 basado en 4 factores:
@@ -1214,14 +1216,7 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
         df_tabla = df_vista[[
             'nivel', 'deudor', 'monto', 'dias_max', 'dias_prom',
             'documentos', 'pct_riesgo', 'score', 'accion'
-        ]].copy()
-
-        df_tabla['monto'] = df_tabla['monto'].apply(lambda x: f"${x:,.0f}")
-        df_tabla['dias_max'] = df_tabla['dias_max'].apply(lambda x: f"{x:,.0f}")
-        df_tabla['dias_prom'] = df_tabla['dias_prom'].apply(lambda x: f"{x:,.1f}")
-        df_tabla['documentos'] = df_tabla['documentos'].apply(lambda x: f"{_safe_int(x):,}")
-        df_tabla['pct_riesgo'] = df_tabla['pct_riesgo'].apply(lambda x: f"{x:.1f}%")
-        df_tabla['score'] = df_tabla['score'].apply(lambda x: f"{x:,.1f}")
+        ]]
 
         clientes_view.dataframe(
             df_tabla,
@@ -1230,12 +1225,12 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
             column_config={
                 "nivel":      st.column_config.TextColumn("Prioridad",       width="small"),
                 "deudor":     st.column_config.TextColumn("Cliente",         width="large"),
-                "monto":      st.column_config.TextColumn("Saldo ($)",       width="medium"),
-                "dias_max":   st.column_config.TextColumn("Días Máx.",       width="small"),
-                "dias_prom":  st.column_config.TextColumn("Días Prom.",      width="small"),
-                "documentos": st.column_config.TextColumn("# Docs",          width="small"),
-                "pct_riesgo": st.column_config.TextColumn("% Saldo >90d",    width="small"),
-                "score":      st.column_config.TextColumn("Score",           width="small"),
+                "monto":      columna_numerica("moneda_entera", "Saldo ($)",  width="medium"),
+                "dias_max":   columna_numerica("entero", "Días Máx.",         width="small"),
+                "dias_prom":  columna_numerica("decimal", "Días Prom.",       width="small"),
+                "documentos": columna_numerica("entero", "# Docs",            width="small"),
+                "pct_riesgo": columna_numerica("porcentaje", "% Saldo >90d",  width="small"),
+                "score":      columna_numerica("decimal", "Score",            width="small"),
                 "accion":     st.column_config.TextColumn("Acción Recomendada", width="large"),
             },
         )
@@ -1284,23 +1279,28 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
                 if nivel_export:
                     df_export_cobranza = df_prioridades[
                         df_prioridades['nivel'].isin(nivel_export)
-                    ].copy()
-                    try:
-                        excel_bytes = crear_excel_cobranza_semanal(df_export_cobranza)
-                        fecha_archivo = now_mx().strftime("%Y%m%d")
-                        clientes_view.download_button(
-                            label=f"⬇️ Descargar Excel ({len(df_export_cobranza)} clientes)",
-                            data=excel_bytes,
-                            file_name=f"cobranza_semanal_{fecha_archivo}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True,
-                        )
-                        clientes_view.caption(
-                            "El Excel incluye: semáforo de colores por prioridad, "
-                            "acción recomendada y columnas vacías para Gestor, Notas y Fecha de Compromiso."
-                        )
-                    except Exception as e:
-                        clientes_view.error(f"Error al generar Excel: {e}")
+                    ]
+                    fecha_archivo = now_mx().strftime("%Y%m%d")
+                    # Se genera en segundo plano; los reruns reutilizan el archivo
+                    trabajo_cobranza = obtener_cola_exportaciones().enviar(
+                        "excel_cobranza_semanal",
+                        df_export_cobranza,
+                        {"fecha": fecha_archivo},
+                        partial(crear_excel_cobranza_semanal, df_export_cobranza),
+                        con_progreso=False,
+                    )
+                    mostrar_trabajo_export(
+                        trabajo_cobranza,
+                        f"⬇️ Descargar Excel ({len(df_export_cobranza)} clientes)",
+                        f"cobranza_semanal_{fecha_archivo}.xlsx",
+                        MIME_EXCEL,
+                        contenedor=clientes_view,
+                        use_container_width=True,
+                    )
+                    clientes_view.caption(
+                        "El Excel incluye: semáforo de colores por prioridad, "
+                        "acción recomendada y columnas vacías para Gestor, Notas y Fecha de Compromiso."
+                    )
                 else:
                     clientes_view.info("Selecciona al menos un nivel para habilitar la descarga.")
         else:
@@ -1348,7 +1348,7 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
         # Top 5 deudores con tabla mejorada
         clientes_view.dataframe(top_deudores.reset_index().rename(
             columns={'deudor': 'Cliente (Col F)', 'saldo_adeudado': 'Monto Adeudado ($)'}
-        ).style.format({'Monto Adeudado ($)': '${:,.2f}'}))
+        ).style.format(formatos_styler({'Monto Adeudado ($)': 'moneda'})))
 
         # Gráfico de concentración
         clientes_view.bar_chart(top_deudores)
@@ -1506,18 +1506,21 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
                     'pct_concentracion', 'clientes', 'docs'
                 ]].copy()
                 
-                df_display['total'] = df_display['total'].apply(lambda x: f"${x:,.2f}")
-                df_display['% del Total'] = df_display['% del Total'].apply(lambda x: f"{x:.1f}%")
-                df_display['pct_morosidad'] = df_display['pct_morosidad'].apply(lambda x: f"{x:.1f}%")
-                df_display['pct_alto_riesgo'] = df_display['pct_alto_riesgo'].apply(lambda x: f"{x:.1f}%")
-                df_display['pct_concentracion'] = df_display['pct_concentracion'].apply(lambda x: f"{x:.1f}%")
-                
                 df_display.columns = [
                     'Línea', 'Monto Total', '% Total', 'Severidad de Mora', '🚦 Severidad',
                     'Riesgo Alto', '🚦 Riesgo Alto', 'Concentración', 'Clientes', 'Docs'
                 ]
                 
-                riesgo_view.dataframe(df_display, width='stretch', hide_index=True)
+                riesgo_view.dataframe(
+                    df_display, width='stretch', hide_index=True,
+                    column_config={
+                        'Monto Total': columna_numerica('moneda', 'Monto Total'),
+                        '% Total': columna_numerica('porcentaje', '% Total'),
+                        'Severidad de Mora': columna_numerica('porcentaje', 'Severidad de Mora'),
+                        'Riesgo Alto': columna_numerica('porcentaje', 'Riesgo Alto'),
+                        'Concentración': columna_numerica('porcentaje', 'Concentración'),
+                    },
+                )
                 
                 # =====================================================================
                 # SISTEMA DE SCORING Y PRIORIZACIÓN DE RIESGOS
@@ -1758,15 +1761,19 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
                 
                 # Mostrar tabla resumen (reemplaza tarjetas HTML)
                 seguimiento_view.write("### 📋 Resumen Detallado por Categoría")
-                resumen_tabla = riesgo_df.copy()
-                resumen_tabla['Monto'] = resumen_tabla['saldo_adeudado'].apply(lambda x: f"${x:,.2f}")
-                resumen_tabla['% del Total'] = resumen_tabla['porcentaje'].apply(lambda x: f"{x:.1f}%")
-                resumen_tabla = resumen_tabla[['nivel_riesgo', 'Monto', '% del Total']]
+                resumen_tabla = riesgo_df[['nivel_riesgo', 'saldo_adeudado', 'porcentaje']]
                 resumen_tabla.columns = ['Categoría', 'Monto Adeudado', '% del Total']
-                seguimiento_view.dataframe(resumen_tabla, width='stretch', hide_index=True)
+                seguimiento_view.dataframe(
+                    resumen_tabla, width='stretch', hide_index=True,
+                    column_config={
+                        'Monto Adeudado': columna_numerica('moneda', 'Monto Adeudado'),
+                        '% del Total': columna_numerica('porcentaje', '% del Total'),
+                    },
+                )
                 
                 # Gráfico de barras con colores por categoría
                 seguimiento_view.write("### 📊 Distribución de Deuda por Antigüedad")
+                import matplotlib.pyplot as plt  # diferido: ~0.3 s de import
                 fig, ax = plt.subplots(figsize=(12, 5), dpi=120)
                 # Asignar colores según severidad de cada categoría — orden explícito
                 _cat_order = list(riesgo_df['nivel_riesgo'])
@@ -1870,6 +1877,7 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
                 
                     # Crear gráfico de barras apiladas
                     seguimiento_view.write("### 📊 Distribución por Agente y Antigüedad")
+                    import matplotlib.pyplot as plt
                     fig, ax = plt.subplots(figsize=(12, 6), dpi=120)
 
                     # Preparar datos para el gráfico usando constantes — orden explícito
@@ -1900,13 +1908,13 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
                     resumen_agente = agente_categoria.copy()
                     resumen_agente = resumen_agente.sort_values('Total', ascending=False)
                 
-                    # Formatear valores
-                    for col in resumen_agente.columns:
-                        if col != 'Total':
-                            resumen_agente[col] = resumen_agente[col].apply(lambda x: f"${x:,.2f}" if x > 0 else "")
-                    resumen_agente['Total'] = resumen_agente['Total'].apply(lambda x: f"${x:,.2f}")
+                    # Categorías sin saldo en blanco; el formato lo aplica el Styler
+                    categorias = [col for col in resumen_agente.columns if col != 'Total']
+                    resumen_agente[categorias] = resumen_agente[categorias].where(resumen_agente[categorias] > 0)
                 
-                    seguimiento_view.dataframe(resumen_agente)
+                    seguimiento_view.dataframe(resumen_agente.style.format(
+                        formatos_styler({col: 'moneda' for col in resumen_agente.columns}), na_rep=""
+                    ))
                 
                     # =====================================================================
                     # EFICIENCIA DE COBRANZA POR AGENTE
@@ -2051,18 +2059,21 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
                         'dias_promedio', 'casos_criticos', 'pct_criticos', 'clientes', 'total'
                     ]].copy()
                 
-                    df_ef_table['score'] = df_ef_table['score'].apply(lambda x: f"{x:.1f}")
-                    df_ef_table['efectividad'] = df_ef_table['efectividad'].apply(lambda x: f"{x:.1f}%")
-                    df_ef_table['dias_promedio'] = df_ef_table['dias_promedio'].apply(lambda x: f"{x:.0f} días")
-                    df_ef_table['pct_criticos'] = df_ef_table['pct_criticos'].apply(lambda x: f"{x:.1f}%")
-                    df_ef_table['total'] = df_ef_table['total'].apply(lambda x: f"${x:,.2f}")
-                
                     df_ef_table.columns = [
                         'Agente', 'Score', '🚦 Score', 'Efectividad', '🚦 Efectividad',
                         'Días Prom.', 'Casos >90d', '% Críticos', 'Clientes', 'Cartera Total'
                     ]
                 
-                    seguimiento_view.dataframe(df_ef_table, width='stretch', hide_index=True)
+                    seguimiento_view.dataframe(
+                        df_ef_table, width='stretch', hide_index=True,
+                        column_config={
+                            'Score': columna_numerica('decimal', 'Score'),
+                            'Efectividad': columna_numerica('porcentaje', 'Efectividad'),
+                            'Días Prom.': columna_numerica('dias', 'Días Prom.'),
+                            '% Críticos': columna_numerica('porcentaje', '% Críticos'),
+                            'Cartera Total': columna_numerica('moneda', 'Cartera Total'),
+                        },
+                    )
                 
                     # Ranking y reconocimiento
                     seguimiento_view.write("### 🏆 Ranking de Eficiencia")
@@ -2110,8 +2121,10 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
                         .reset_index()
                     )
                     resumen_simple.columns = ['Agente', 'Cartera Total']
-                    resumen_simple['Cartera Total'] = resumen_simple['Cartera Total'].apply(lambda x: f"${x:,.2f}")
-                    seguimiento_view.dataframe(resumen_simple, width='stretch', hide_index=True)
+                    seguimiento_view.dataframe(
+                        resumen_simple, width='stretch', hide_index=True,
+                        column_config={'Cartera Total': columna_numerica('moneda', 'Cartera Total')},
+                    )
         else:
             seguimiento_view.warning("ℹ️ No se encontró columna de vendedor/agente en el archivo CxC")
             seguimiento_view.info(f"📋 **Columnas disponibles:** {', '.join(df_deudas.columns.tolist())}")
@@ -2155,15 +2168,11 @@ def run(archivo, habilitar_ia=False, openai_api_key=None):
         if 'dias_vencido' in cols:
             column_config_deudor['dias_vencido'] = st.column_config.NumberColumn("Días Vencidos", width="small")
 
-        df_deudor_display = deudor_df[cols].copy()
+        df_deudor_display = deudor_df[cols]
         if 'saldo_adeudado' in df_deudor_display.columns:
-            df_deudor_display['saldo_adeudado'] = df_deudor_display['saldo_adeudado'].apply(lambda x: f"${x:,.2f}")
-            column_config_deudor['saldo_adeudado'] = st.column_config.TextColumn("Saldo Adeudado", width="medium")
+            column_config_deudor['saldo_adeudado'] = columna_numerica("moneda", "Saldo Adeudado", width="medium")
         if 'dias_vencido' in df_deudor_display.columns:
-            df_deudor_display['dias_vencido'] = df_deudor_display['dias_vencido'].apply(
-                lambda x: "-" if pd.isna(x) else f"{x:,.0f}"
-            )
-            column_config_deudor['dias_vencido'] = st.column_config.TextColumn("Días Vencidos", width="small")
+            column_config_deudor['dias_vencido'] = columna_numerica("entero", "Días Vencidos", width="small")
         
         if sort_col and len(cols) > 0:
             seguimiento_view.dataframe(
@@ -5,6 +5,8 @@ import altair as alt
 import pandas as pd
 import streamlit as st
 
+from utils.sales_cube import obtener_cubo
+
 
 MESES = {
     1: "Ene", 2: "Feb", 3: "Mar", 4: "Abr", 5: "May", 6: "Jun",
@@ -163,11 +165,13 @@ def run(df, año_base=None):
         st.error("No se pudieron identificar las columnas necesarias: valor_mxn, año y mes/fecha.")
         return
 
-    pivot_ventas = df.groupby(["año", "mes"], as_index=False)["valor_mxn"].sum()
+    # Un solo agregado año×mes (cacheado por dataset) alimenta todas las vistas
+    cubo = obtener_cubo(df, "valor_mxn", columna_fecha=None, dimensiones=())
+    pivot_ventas = cubo.totales(["año", "mes"])[["año", "mes", "valor_mxn"]]
     historico = _construir_historico(pivot_ventas)
     df_chart = historico.reset_index().melt(id_vars="año", var_name="mes", value_name="valor_mxn")
 
-    anios_disponibles = sorted(df["año"].dropna().unique(), reverse=True)
+    anios_disponibles = sorted(pivot_ventas["año"].unique(), reverse=True)
     if len(anios_disponibles) < 2:
         st.info("Se necesitan al menos dos años para comparar.")
         return
@@ -322,7 +326,7 @@ def run(df, año_base=None):
     with tab_historico:
         st.subheader("Panorama histórico de todos los años")
 
-        df_heatmap = df.groupby(["año", "mes"], as_index=False)["valor_mxn"].sum()
+        df_heatmap = pivot_ventas.copy()
         df_heatmap["Mes"] = df_heatmap["mes"].map(MESES)
         df_heatmap["Año"] = df_heatmap["año"].astype(str)
         df_heatmap = df_heatmap.rename(columns={"valor_mxn": "Ventas USD"})
@@ -333,8 +337,7 @@ def run(df, año_base=None):
             horizontal=True,
         )
 
-        df_acumulado = df.groupby(["año", "mes"], as_index=False)["valor_mxn"].sum().sort_values(["año", "mes"])
-        df_acumulado["Ventas Acumuladas"] = df_acumulado.groupby("año")["valor_mxn"].cumsum()
+        df_acumulado = cubo.serie_mensual().rename(columns={"acumulado": "Ventas Acumuladas"})
         df_acumulado["Mes"] = df_acumulado["mes"].map(MESES)
         df_acumulado["Año"] = df_acumulado["año"].astype(str)
 
@@ -348,12 +351,10 @@ def run(df, año_base=None):
                 st.altair_chart(_crear_chart_acumulado_historico(df_acumulado), width='stretch')
 
         resumen_anual = (
-            df.groupby("año", as_index=False)
-            .agg(
-                ventas_totales=("valor_mxn", "sum"),
-                operaciones=("valor_mxn", "count"),
-            )
+            cubo.totales(["año"])
+            .rename(columns={"valor_mxn": "ventas_totales"})
             .sort_values("año", ascending=False)
+            .reset_index(drop=True)
         )
         resumen_anual["ticket_promedio"] = resumen_anual["ventas_totales"] / resumen_anual["operaciones"]
         resumen_anual["variacion_vs_prev"] = resumen_anual["ventas_totales"].pct_change(periods=-1) * 100
@@ -5,22 +5,18 @@ Muestra burbujas en el mapa de México proporcionales al monto facturado.
 """
 
 import os
-import time
-from pathlib import Path
 
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import psycopg2
-import requests
 import streamlit as st
 
+from utils import cp_geo
 from utils.logger import configurar_logger
 
 logger = configurar_logger("mapa_clientes", nivel="INFO")
 
-_COORDS_PATH = Path(__file__).parent.parent / "data" / "cp_coords.csv"
-
 # ---------------------------------------------------------------------------
 # Mapa de CPs → Estado (rangos aproximados según SEPOMEX)
 # ---------------------------------------------------------------------------
@@ -73,6 +69,43 @@ def _cp_a_estado(cp: str) -> str:
     return "Otro"
 
 
+# Centro aproximado de cada estado, para CPs que aún no están en el índice
+_CENTROS_ESTADO = {
+    "Aguascalientes": (21.88, -102.29),
+    "Baja California": (30.84, -115.28),
+    "Baja California Sur": (26.04, -111.67),
+    "Campeche": (19.83, -90.53),
+    "Chiapas": (16.75, -93.12),
+    "Chihuahua": (28.63, -106.07),
+    "Ciudad de México": (19.43, -99.13),
+    "Coahuila": (27.06, -101.71),
+    "Colima": (19.24, -103.72),
+    "Durango": (24.02, -104.66),
+    "Estado de México": (19.35, -99.63),
+    "Guanajuato": (21.02, -101.26),
+    "Guerrero": (17.44, -99.55),
+    "Hidalgo": (20.09, -98.76),
+    "Jalisco": (20.66, -103.35),
+    "Michoacán": (19.57, -101.71),
+    "Morelos": (18.68, -99.10),
+    "Nayarit": (21.75, -104.85),
+    "Nuevo León": (25.59, -99.99),
+    "Oaxaca": (17.07, -96.72),
+    "Puebla": (19.04, -98.21),
+    "Querétaro": (20.59, -100.39),
+    "Quintana Roo": (19.18, -88.48),
+    "San Luis Potosí": (22.16, -100.99),
+    "Sinaloa": (25.17, -107.48),
+    "Sonora": (29.30, -110.33),
+    "Tabasco": (17.84, -92.62),
+    "Tamaulipas": (24.27, -98.84),
+    "Tlaxcala": (19.32, -98.24),
+    "Veracruz": (19.17, -96.13),
+    "Yucatán": (20.71, -89.09),
+    "Zacatecas": (22.77, -102.58),
+}
+
+
 # ---------------------------------------------------------------------------
 # Carga de datos
 # ---------------------------------------------------------------------------
@@ -139,59 +172,21 @@ def _cargar_datos(empresa_id: str, neon_url: str, anio: int | None = None) -> pd
 # ---------------------------------------------------------------------------
 # Geocodificación
 # ---------------------------------------------------------------------------
-@st.cache_data(ttl=3600 * 24 * 30, show_spinner=False)
-def _geocodificar_cp_online(cp: str) -> tuple[float | None, float | None]:
-    """Geocodifica un CP vía Nominatim (resultado cacheado 30 días)."""
-    try:
-        resp = requests.get(
-            "https://nominatim.openstreetmap.org/search",
-            params={"country": "mx", "postalcode": cp, "format": "json", "limit": 1},
-            headers={"User-Agent": "fradma-dashboard/1.0"},
-            timeout=6,
-        )
-        data = resp.json()
-        if data:
-            return float(data[0]["lat"]), float(data[0]["lon"])
-    except Exception:
-        pass
-    return None, None
-
-
 def _cargar_coords(cps: list[str]) -> pd.DataFrame:
     """
-    Retorna DataFrame (cp, lat, lon).
-    Lee primero del CSV pre-geocodificado; los CPs faltantes se geocodifican
-    online con Nominatim (respetando 1 req/s).
+    Retorna DataFrame (cp, lat, lon, aproximada).
+    Busca en el índice offline de CPs (utils.cp_geo); los CPs que no están se
+    ubican en el centro de su estado (aproximada=True) y se encolan para
+    geocodificarse en línea en segundo plano, sin bloquear el render.
     """
-    known: dict[str, tuple[float, float]] = {}
-
-    if _COORDS_PATH.exists():
-        try:
-            df_csv = pd.read_csv(_COORDS_PATH, dtype={"cp": str})
-            df_csv = df_csv.dropna(subset=["lat", "lon"])
-            known = {row["cp"]: (row["lat"], row["lon"]) for _, row in df_csv.iterrows()}
-        except Exception as e:
-            logger.warning(f"Error leyendo cp_coords.csv: {e}")
-
-    missing = [cp for cp in cps if cp not in known]
-
-    if missing:
-        msg = st.empty()
-        msg.info(f"Geocodificando {len(missing)} CP(s) nuevos, un momento...")
-        for cp in missing:
-            lat, lon = _geocodificar_cp_online(cp)
-            if lat is not None:
-                known[cp] = (lat, lon)
-            time.sleep(1.1)
-        msg.empty()
-
-    rows = [
-        {"cp": cp, "lat": known[cp][0], "lon": known[cp][1]}
-        if cp in known
-        else {"cp": cp, "lat": None, "lon": None}
-        for cp in cps
-    ]
-    return pd.DataFrame(rows)
+    df = cp_geo.buscar_coords(cps)
+    faltantes = df["lat"].isna()
+    if faltantes.any():
+        centros = df.loc[faltantes, "cp"].map(lambda cp: _CENTROS_ESTADO.get(_cp_a_estado(cp)))
+        df.loc[faltantes, "lat"] = centros.map(lambda c: c[0] if c else None)
+        df.loc[faltantes, "lon"] = centros.map(lambda c: c[1] if c else None)
+    df["aproximada"] = faltantes & df["lat"].notna()
+    return df
 
 
 # ---------------------------------------------------------------------------
@@ -234,6 +229,8 @@ def run():
     df = df.merge(df_coords, on="cp", how="left")
     df_map = df.dropna(subset=["lat", "lon"]).copy()
     sin_coords = len(df) - len(df_map)
+    aproximados = df.loc[df["aproximada"], "cp"].tolist()
+    en_cola = cp_geo.rellenar_en_segundo_plano(aproximados) if aproximados else 0
 
     # ---- KPIs ----
     cps_activos = df["cp"].nunique()
@@ -252,7 +249,7 @@ def run():
 
     # ---- Mapa ----
     if df_map.empty:
-        st.warning("No se pudieron geocodificar los CPs. Revisa la conexión a internet.")
+        st.warning("No se pudieron ubicar los CPs en el mapa.")
     else:
         df_map["total_mxn_fmt"] = df_map["total_mxn"].apply(lambda x: f"${x:,.2f}")
         df_map["cliente_hover"] = df_map["cliente_principal"].fillna("Mostrador")
@@ -302,6 +299,11 @@ def run():
 
         if sin_coords > 0:
             st.caption(f"ℹ️ {sin_coords} CP(s) sin coordenadas disponibles no se muestran en el mapa.")
+        if aproximados:
+            nota = f"ℹ️ {len(aproximados)} CP(s) se muestran en el centro de su estado (ubicación aproximada)."
+            if en_cola:
+                nota += " Se están geocodificando en segundo plano; recarga en unos minutos para verlos en su ubicación."
+            st.caption(nota)
 
     st.divider()
 
@@ -26,6 +26,7 @@ from utils.cxc_aging_engine import prepare_cxc_metrics  # fuente única de verda
 from utils.data_normalizer import normalizar_datos_cxc, normalizar_columna_fecha, detectar_columnas_cxc
 from utils.constantes import DIAS_CREDITO_ESTANDAR
 from utils.auth import get_current_user
+from utils.sales_cube import obtener_cubo
 
 # Configurar logger
 logger = configurar_logger("reporte_consolidado", nivel="INFO")
@@ -73,9 +74,13 @@ def agrupar_por_periodo(df, tipo_periodo='mensual'):
     Returns:
         DataFrame agrupado con período como índice
     """
-    df = df.copy()
-    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-    df = df.dropna(subset=['fecha'])
+    if 'ventas_usd' in df.columns:
+        # Solo se suman ventas por período: basta el cubo diario (cacheado por dataset)
+        df = obtener_cubo(df, 'ventas_usd', dimensiones=()).diario.copy()
+    else:
+        df = df.copy()
+        df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+        df = df.dropna(subset=['fecha'])
     
     if tipo_periodo == 'semanal':
         df['periodo'] = df['fecha'].dt.to_period('W').dt.start_time
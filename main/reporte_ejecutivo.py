@@ -12,6 +12,7 @@ from utils.formatos import formato_moneda, formato_porcentaje, formato_compacto,
 from utils.logger import configurar_logger
 from utils.ai_helper_premium import generar_insights_ejecutivo_consolidado
 from utils.cxc_aging_engine import prepare_cxc_metrics  # fuente única de verdad CxC
+from utils.cache_helper import memo_vistas
 from utils.roi_tracker import init_roi_tracker
 from main.acciones_recomendadas import generar_acciones_recomendadas, render_acciones_recomendadas
 
@@ -299,8 +300,12 @@ def mostrar_reporte_ejecutivo(df_ventas, df_cxc, habilitar_ia=False, openai_api_
         ventas_mes_actual = total_ventas
         _desc_periodo = ""
 
-    # CxC: calcular métricas con fuente única de verdad
-    cxc = prepare_cxc_metrics(df_cxc)
+    # CxC: calcular métricas con fuente única de verdad (memoizadas por cartera + fecha de corte)
+    fecha_corte = pd.Timestamp.today().normalize()
+    cxc = memo_vistas.obtener_o_calcular(
+        "reporte_ejecutivo.cxc_metrics", df_cxc, (fecha_corte,),
+        lambda: prepare_cxc_metrics(df_cxc, fecha_corte=fecha_corte),
+    )
     df_cxc_local = cxc["df_prep"]
     df_cxc_np = cxc["df_np"]
     mask_pagado = cxc["mask_pagado"]
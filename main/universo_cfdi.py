@@ -8,8 +8,8 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-import psycopg2
 from utils.logger import configurar_logger
+from utils.neon_consultas import Consulta, cargar_consultas, mostrar_tiempos
 
 logger = configurar_logger("universo_cfdi", nivel="INFO")
 
@@ -44,9 +44,8 @@ def _get_neon_url() -> str | None:
     return url
 
 
-def _cargar_datos(empresa_id: str, neon_url: str) -> pd.DataFrame:
-    """Carga el resumen de CFDIs por tipo y estatus desde Neon."""
-    query = """
+# Carga el resumen de CFDIs por tipo y estatus desde Neon.
+_SQL_RESUMEN = """
         SELECT
             tipo_comprobante,
             estatus,
@@ -63,26 +62,10 @@ def _cargar_datos(empresa_id: str, neon_url: str) -> pd.DataFrame:
         GROUP BY tipo_comprobante, estatus, moneda, metodo_pago
         ORDER BY cantidad DESC
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, (empresa_id,))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando universo CFDI: {e}")
-        st.error(f"❌ Error al consultar la base de datos: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
-
-
-def _cargar_detalle(empresa_id: str, neon_url: str,
-                    tipo: str | None, estatus: str | None) -> pd.DataFrame:
-    """Carga detalle individual de CFDIs con filtros opcionales."""
+
+
+def _consulta_detalle(empresa_id: str, tipo: str | None, estatus: str | None) -> Consulta:
+    """Detalle individual de CFDIs con filtros opcionales."""
     conditions = ["empresa_id = %s"]
     params: list = [empresa_id]
     if tipo:
@@ -114,25 +97,11 @@ def _cargar_detalle(empresa_id: str, neon_url: str,
         ORDER BY fecha_emision DESC
         LIMIT 5000
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando detalle: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
-
-
-def _cargar_tendencia(empresa_id: str, neon_url: str) -> pd.DataFrame:
-    """Tendencia mensual de CFDIs emitidos (vigentes vs cancelados)."""
-    query = """
+    return Consulta("detalle", query, tuple(params))
+
+
+# Tendencia mensual de CFDIs emitidos (vigentes vs cancelados).
+_SQL_TENDENCIA = """
         SELECT
             DATE_TRUNC('month', fecha_emision)::date AS mes,
             tipo_comprobante,
@@ -144,25 +113,10 @@ def _cargar_tendencia(empresa_id: str, neon_url: str) -> pd.DataFrame:
         GROUP BY 1, 2, 3
         ORDER BY 1 DESC
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, (empresa_id,))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando tendencia: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
-
-
-def _cargar_pue_ppd(empresa_id: str, neon_url: str) -> pd.DataFrame:
-    """Carga análisis PUE/PPD con estado de complementos de pago."""
-    query = """
+
+
+# Carga análisis PUE/PPD con estado de complementos de pago.
+_SQL_PUE_PPD = """
         SELECT
             cv.uuid_sat,
             cv.serie,
@@ -194,21 +148,6 @@ def _cargar_pue_ppd(empresa_id: str, neon_url: str) -> pd.DataFrame:
                  cv.estatus, cv.moneda, cv.total, cv.tipo_cambio
         ORDER BY cv.fecha_emision DESC
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(neon_url)
-        cur = conn.cursor()
-        cur.execute(query, (empresa_id,))
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        return pd.DataFrame(rows, columns=cols)
-    except Exception as e:
-        logger.error(f"Error cargando PUE/PPD: {e}")
-        st.error(f"❌ Error al consultar PUE/PPD: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
 
 
 def _clasificar_ppd(row) -> str:
@@ -240,10 +179,21 @@ def run():
         return
 
     # ─── Carga ───────────────────────────────────────────────────────────────
+    params = (empresa_id,)
     with st.spinner("Consultando base de datos..."):
-        df_resumen   = _cargar_datos(empresa_id, neon_url)
-        df_tendencia = _cargar_tendencia(empresa_id, neon_url)
-        df_ppd       = _cargar_pue_ppd(empresa_id, neon_url)
+        resultados = cargar_consultas(empresa_id, neon_url, [
+            Consulta("resumen", _SQL_RESUMEN, params),
+            Consulta("tendencia", _SQL_TENDENCIA, params),
+            Consulta("pue_ppd", _SQL_PUE_PPD, params),
+        ])
+    mostrar_tiempos(resultados)
+    if not resultados["resumen"].ok:
+        st.error(f"❌ Error al consultar la base de datos: {resultados['resumen'].error}")
+    if not resultados["pue_ppd"].ok:
+        st.error(f"❌ Error al consultar PUE/PPD: {resultados['pue_ppd'].error}")
+    df_resumen   = resultados["resumen"].df
+    df_tendencia = resultados["tendencia"].df
+    df_ppd       = resultados["pue_ppd"].df
 
     if df_resumen.empty:
         st.info("📭 No hay CFDIs registrados para esta empresa.")
@@ -458,7 +408,8 @@ def run():
         est_filter  = None if sel_est_det == "Todos" else sel_est_det
 
         with st.spinner("Cargando detalle..."):
-            df_det = _cargar_detalle(empresa_id, neon_url, tipo_filter, est_filter)
+            consulta = _consulta_detalle(empresa_id, tipo_filter, est_filter)
+            df_det = cargar_consultas(empresa_id, neon_url, [consulta])["detalle"].df
 
         if df_det.empty:
             st.info("No hay registros con esos filtros.")
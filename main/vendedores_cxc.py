@@ -19,7 +19,10 @@ from utils.formatos import now_mx
 from unidecode import unidecode
 import re
 
+from utils.data_cleaner import normalizar_serie
 from utils.cxc_helper import preparar_datos_cxc, calcular_dias_overdue
+from utils.modelo_unificado import clasificar_buckets_aging
+from utils.cache_helper import memo_vistas
 from utils.auth import get_current_user
 from utils.data_normalizer import normalizar_columnas, homologar_columnas
 from utils.logger import configurar_logger
@@ -29,6 +32,9 @@ logger = configurar_logger("vendedores_cxc", nivel="INFO")
 
 # ── Helpers internos ──────────────────────────────────────────────────────────
 
+_RE_NO_ALFANUMERICO = re.compile(r'[^a-z0-9\s]')
+_RE_ESPACIOS = re.compile(r'\s+')
+
 def _normalizar_nombre_cliente(texto: str) -> str:
     """
     Normaliza nombre de cliente para mejorar matching entre archivos.
@@ -44,9 +50,9 @@ def _normalizar_nombre_cliente(texto: str) -> str:
     # Minúsculas
     texto = texto.lower()
     # Eliminar caracteres especiales (mantener solo letras, números y espacios)
-    texto = re.sub(r'[^a-z0-9\s]', '', texto)
+    texto = _RE_NO_ALFANUMERICO.sub('', texto)
     # Eliminar espacios extra
-    texto = re.sub(r'\s+', ' ', texto)
+    texto = _RE_ESPACIOS.sub(' ', texto)
     # Trim
     texto = texto.strip()
     return texto
@@ -134,6 +140,20 @@ def _score_calidad(pct_vigente: float, pct_1_30: float | None = None,
 
 # ── Función principal ─────────────────────────────────────────────────────────
 
+def _mapa_cliente_vendedor(df_ventas: pd.DataFrame, col_cliente: str) -> pd.DataFrame:
+    """Mapa cliente normalizado → vendedor más frecuente en ventas."""
+    base = pd.DataFrame({
+        "_cliente_norm": normalizar_serie(df_ventas[col_cliente], _normalizar_nombre_cliente),
+        "vendedor": df_ventas["vendedor"],
+    })
+    return (
+        base.dropna(subset=["_cliente_norm", "vendedor"])
+        .groupby("_cliente_norm")["vendedor"]
+        .agg(lambda x: x.mode().iloc[0] if len(x) > 0 else None)
+        .reset_index()
+    )
+
+
 def run():
     st.title("👥 Vendedores + CxC")
     st.caption(
@@ -267,8 +287,12 @@ def run():
     col_vendedor_c = _detectar_col_vendedor(df_cxc_raw)
     col_cliente_c  = _detectar_col_cliente(df_cxc_raw)
 
-    # Preparar CxC (calcular dias_overdue)
-    _, df_np, _ = preparar_datos_cxc(df_cxc_raw)
+    # Preparar CxC (calcular dias_overdue), memoizado por cartera + fecha de corte
+    fecha_corte = pd.Timestamp.today().normalize()
+    _, df_np, _ = memo_vistas.obtener_o_calcular(
+        "vendedores_cxc.preparar_cxc", df_cxc_raw, (fecha_corte,),
+        lambda: preparar_datos_cxc(df_cxc_raw, fecha_corte=fecha_corte),
+    )
 
     # ── Detectar si hay columna vendedor en CxC ───────────────────────────────
     tiene_vendedor_cxc = col_vendedor_c is not None
@@ -294,20 +318,16 @@ def run():
         # Normalizar nombres de clientes en ambos DataFrames para mejorar matching
         logger.info("Normalizando nombres de clientes para matching...")
         
-        # Crear columna normalizada en ventas
-        df_ventas["_cliente_norm"] = df_ventas[col_cliente_v].apply(_normalizar_nombre_cliente)
-        
-        # Crear columna normalizada en CxC
+        # Crear columna normalizada en CxC (sin tocar el df_np memoizado)
         if col_cliente_c != "deudor":
             df_np = df_np.rename(columns={col_cliente_c: "deudor"})
-        df_np["_cliente_norm"] = df_np["deudor"].apply(_normalizar_nombre_cliente)
+        df_np = df_np.assign(_cliente_norm=normalizar_serie(df_np["deudor"], _normalizar_nombre_cliente))
         
         # Mapa cliente normalizado → vendedor desde ventas
-        mapa = (
-            df_ventas.dropna(subset=["_cliente_norm", "vendedor"])
-            .groupby("_cliente_norm")["vendedor"]
-            .agg(lambda x: x.mode().iloc[0] if len(x) > 0 else None)
-            .reset_index()
+        mapa = memo_vistas.obtener_o_calcular(
+            "vendedores_cxc.mapa_cliente_vendedor",
+            df_ventas[[col_cliente_v, "vendedor"]], (col_cliente_v,),
+            lambda: _mapa_cliente_vendedor(df_ventas, col_cliente_v),
         )
         
         # Merge por nombre normalizado
@@ -377,23 +397,9 @@ def run():
                     st.write("---")
                     st.write("### 🗓️ Mapa Temporal de Adeudos")
                     
-                    # Clasificar por rangos de antigüedad
-                    def clasificar_antiguedad_detallado(dias):
-                        if pd.isna(dias) or dias <= 0:
-                            return "Por vencer"
-                        elif dias <= 30:
-                            return "1-30 días"
-                        elif dias <= 60:
-                            return "31-60 días"
-                        elif dias <= 90:
-                            return "61-90 días"
-                        elif dias <= 180:
-                            return "91-180 días"
-                        else:
-                            return ">180 días"
-                    
-                    df_sin_match["rango_antiguedad"] = df_sin_match["dias_overdue"].apply(
-                        clasificar_antiguedad_detallado
+                    # Clasificar por rangos de antigüedad (sin días cuenta como por vencer)
+                    df_sin_match["rango_antiguedad"] = clasificar_buckets_aging(
+                        pd.to_numeric(df_sin_match["dias_overdue"], errors="coerce").fillna(0)
                     )
                     
                     # Calcular distribución
@@ -16,10 +16,15 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, date
+from functools import partial
 from utils.formatos import now_mx
 import io
 import os
 from utils.logger import configurar_logger
+from utils.export_helper import LibroExcelStreaming
+from utils.export_jobs import MIME_EXCEL, mostrar_trabajo_export, obtener_cola_exportaciones
+from utils.sales_cube import obtener_cubo
+from utils.ytd_engine import obtener_motor_ytd, series_acumuladas_mensuales
 from utils.ai_helper import generar_resumen_ejecutivo_ytd, validar_api_key
 from utils.auth import get_current_user
 from utils.filters_helper import obtener_lineas_filtradas, generar_contexto_filtros
@@ -70,11 +75,10 @@ def _normalizar_fecha_naive(fecha):
 
 def obtener_fecha_corte_efectiva(df, año, fecha_corte=None):
     """Obtiene una fecha de corte realista, acotada por los datos disponibles."""
-    df_año = df[df['fecha'].dt.year == año].copy()
-    if df_año.empty:
+    fecha_max_datos = _normalizar_fecha_naive(obtener_motor_ytd(df).fecha_maxima(año))
+    if fecha_max_datos is None:
         return _normalizar_fecha_naive(fecha_corte) or now_mx().replace(tzinfo=None)
 
-    fecha_max_datos = _normalizar_fecha_naive(df_año['fecha'].max())
     fecha_hoy = now_mx().replace(tzinfo=None)
     fecha_objetivo = _normalizar_fecha_naive(fecha_corte)
 
@@ -113,29 +117,17 @@ def calcular_ytd(df, año, fecha_corte=None):
         fecha_corte: Fecha límite (si None, usa fecha actual)
     
     Returns:
-        DataFrame filtrado con ventas YTD
+        DataFrame con ventas YTD, ordenado por fecha. Es una rebanada del
+        índice del motor YTD: copiar antes de modificar.
     """
+    motor = obtener_motor_ytd(df)
     fecha_corte = obtener_fecha_corte_efectiva(df, año, fecha_corte)
-    
-    # Filtrar año y hasta fecha de corte
-    df_año = df[df['fecha'].dt.year == año].copy()
-    df_ytd = df_año[df_año['fecha'] <= fecha_corte].copy()
-    
-    # Logging para debug
-    total_registros_año = len(df_año)
-    total_registros_ytd = len(df_ytd)
-    total_ventas = df_ytd['ventas_usd'].sum()
-    
-    logger.info(f"calcular_ytd() - Año: {año}, Fecha corte: {fecha_corte.strftime('%Y-%m-%d')}")
-    logger.info(f"  Registros totales del año {año}: {total_registros_año}")
-    logger.info(f"  Registros YTD hasta {fecha_corte.strftime('%Y-%m-%d')}: {total_registros_ytd}")
-    logger.info(f"  Total ventas YTD: ${total_ventas:,.2f}")
-    
-    if total_registros_ytd > 0:
-        fecha_min = df_ytd['fecha'].min()
-        fecha_max = df_ytd['fecha'].max()
-        logger.info(f"  Rango de fechas: {fecha_min.strftime('%Y-%m-%d')} a {fecha_max.strftime('%Y-%m-%d')}")
-    
+    df_ytd = motor.filas(año, fecha_corte)
+
+    logger.debug(
+        f"calcular_ytd() - Año: {año}, Fecha corte: {fecha_corte.strftime('%Y-%m-%d')}, "
+        f"registros: {len(df_ytd)}, total: ${motor.total(año, fecha_corte):,.2f}"
+    )
     return df_ytd
 
 def calcular_metricas_ytd(df_ytd, fecha_corte_efectiva=None):
@@ -177,16 +169,14 @@ def crear_grafico_lineas_acumulado(df, año_actual, año_anterior=None, fecha_co
     
     # Datos año actual
     df_actual = calcular_ytd(df, año_actual, fecha_corte_actual)
-    df_actual['mes'] = df_actual['fecha'].dt.month
     
-    # Agrupar por línea y mes
-    for linea in df_actual['linea_de_negocio'].unique():
-        df_linea = df_actual[df_actual['linea_de_negocio'] == linea]
-        ventas_mes = df_linea.groupby('mes')['ventas_usd'].sum().sort_index()
-        ventas_acumuladas = ventas_mes.cumsum()
+    # Acumulado mensual de todas las líneas en una sola pasada
+    acumulado_actual = series_acumuladas_mensuales(df_actual, 'linea_de_negocio')
+    for linea in acumulado_actual.columns:
+        ventas_acumuladas = acumulado_actual[linea].dropna()
         
         color = COLORES_LINEAS.get(linea, '#808080')
-        logger.info(f"YTD Gráfico - Línea: '{linea}' -> Color asignado: {color}")
+        logger.debug(f"YTD Gráfico - Línea: '{linea}' -> Color asignado: {color}")
         
         fig.add_trace(go.Scatter(
             x=ventas_acumuladas.index,
@@ -210,12 +200,10 @@ def crear_grafico_lineas_acumulado(df, año_actual, año_anterior=None, fecha_co
             fecha_corte_anterior = _fecha_equivalente_anio_previo(fecha_corte_actual, año_anterior)
 
         df_anterior = calcular_ytd(df, año_anterior, fecha_corte_anterior)
-        df_anterior['mes'] = df_anterior['fecha'].dt.month
         
-        for linea in df_anterior['linea_de_negocio'].unique():
-            df_linea = df_anterior[df_anterior['linea_de_negocio'] == linea]
-            ventas_mes = df_linea.groupby('mes')['ventas_usd'].sum().sort_index()
-            ventas_acumuladas = ventas_mes.cumsum()
+        acumulado_anterior = series_acumuladas_mensuales(df_anterior, 'linea_de_negocio')
+        for linea in acumulado_anterior.columns:
+            ventas_acumuladas = acumulado_anterior[linea].dropna()
             
             color = COLORES_LINEAS.get(linea, '#808080')
             
@@ -281,9 +269,9 @@ def crear_grafico_barras_comparativo(df, año_actual, año_anterior, usar_año_c
         usar_año_completo_anterior: Si True, usa todo el año anterior. Si False, usa YTD del año anterior
     """
     
-    # Calcular YTD para año actual
+    # Calcular YTD para año actual (totales por línea vía el motor YTD, sin recortar el df)
+    motor = obtener_motor_ytd(df)
     fecha_corte = _normalizar_fecha_naive(fecha_corte_actual) or obtener_fecha_corte_efectiva(df, año_actual)
-    df_actual = calcular_ytd(df, año_actual, fecha_corte)
     
     # Para año anterior: usar año completo o YTD según parámetro
     if usar_año_completo_anterior:
@@ -303,16 +291,13 @@ def crear_grafico_barras_comparativo(df, año_actual, año_anterior, usar_año_c
     
     logger.info(f"Fecha corte actual: {fecha_corte.strftime('%Y-%m-%d')}, anterior: {fecha_corte_anterior.strftime('%Y-%m-%d')}")
     
-    df_anterior = calcular_ytd(df, año_anterior, fecha_corte_anterior)
-    
-    logger.info(f"Registros - Año {año_actual}: {len(df_actual)}, Año {año_anterior}: {len(df_anterior)}")
-    logger.info(f"Total ventas - Año {año_actual}: ${df_actual['ventas_usd'].sum():,.2f}, Año {año_anterior}: ${df_anterior['ventas_usd'].sum():,.2f}")
+    logger.info(f"Total ventas - Año {año_actual}: ${motor.total(año_actual, fecha_corte):,.2f}, Año {año_anterior}: ${motor.total(año_anterior, fecha_corte_anterior):,.2f}")
     
     # Agrupar por línea
-    ventas_actual = df_actual.groupby('linea_de_negocio')['ventas_usd'].sum().reset_index()
+    ventas_actual = motor.totales_por('linea_de_negocio', año_actual, fecha_corte).reset_index()
     ventas_actual.columns = ['linea_de_negocio', 'ventas_actual']
     
-    ventas_anterior = df_anterior.groupby('linea_de_negocio')['ventas_usd'].sum().reset_index()
+    ventas_anterior = motor.totales_por('linea_de_negocio', año_anterior, fecha_corte_anterior).reset_index()
     ventas_anterior.columns = ['linea_de_negocio', 'ventas_anterior']
     
     # Merge
@@ -467,6 +452,7 @@ def crear_grafico_comparativo_anos_completos(df, años_disponibles, fecha_corte_
     años_a_mostrar = sorted(años_a_mostrar)  # Ordenar ascendente para el gráfico
     
     fecha_referencia = _normalizar_fecha_naive(fecha_corte_actual)
+    motor = obtener_motor_ytd(df)
 
     # Calcular ventas por año usando el mismo corte equivalente para todos
     ventas_por_año = []
@@ -479,8 +465,7 @@ def crear_grafico_comparativo_anos_completos(df, años_disponibles, fecha_corte_
         else:
             fecha_corte_hist = None
 
-        df_año = calcular_ytd(df, año, fecha_corte_hist)
-        total_año = df_año['ventas_usd'].sum()
+        total_año = motor.total(año, obtener_fecha_corte_efectiva(df, año, fecha_corte_hist))
         ventas_por_año.append({
             'año': str(año),
             'ventas': total_año
@@ -597,9 +582,7 @@ def crear_tabla_top_clientes(df_ytd, n=10):
 def exportar_excel_ytd(df_ytd, año, comparativo_df=None, fecha_corte=None, modo_comparacion="ytd_equivalente"):
     """Genera archivo Excel con reporte YTD completo."""
     
-    output = io.BytesIO()
-    
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+    with LibroExcelStreaming("reporte_ytd") as libro:
         # Hoja 1: Resumen Ejecutivo
         metricas = calcular_metricas_ytd(df_ytd)
         resumen_data = {
@@ -623,7 +606,7 @@ def exportar_excel_ytd(df_ytd, año, comparativo_df=None, fecha_corte=None, modo
             ]
         }
         df_resumen = pd.DataFrame(resumen_data)
-        df_resumen.to_excel(writer, sheet_name='Resumen Ejecutivo', index=False)
+        libro.escribir_dataframe('Resumen Ejecutivo', df_resumen)
         
         # Hoja 2: Ventas por Línea
         ventas_linea = df_ytd.groupby('linea_de_negocio')['ventas_usd'].sum().reset_index()
@@ -631,37 +614,38 @@ def exportar_excel_ytd(df_ytd, año, comparativo_df=None, fecha_corte=None, modo
         ventas_linea['Participación %'] = (ventas_linea['Ventas USD YTD'] / 
                                             ventas_linea['Ventas USD YTD'].sum() * 100).round(2)
         ventas_linea = ventas_linea.sort_values('Ventas USD YTD', ascending=False)
-        ventas_linea.to_excel(writer, sheet_name='Por Línea', index=False)
+        libro.escribir_dataframe('Por Línea', ventas_linea)
         
         # Hoja 3: Desglose Mensual
-        df_ytd_copy = df_ytd.copy()
-        df_ytd_copy['mes'] = df_ytd_copy['fecha'].dt.month
-        desglose_mes = df_ytd_copy.groupby(['linea_de_negocio', 'mes'])['ventas_usd'].sum().reset_index()
+        desglose_mes = (
+            df_ytd.groupby([df_ytd['linea_de_negocio'], df_ytd['fecha'].dt.month.rename('mes')])['ventas_usd']
+            .sum()
+            .reset_index()
+        )
         pivot_mes = desglose_mes.pivot(index='linea_de_negocio', columns='mes', values='ventas_usd').fillna(0)
         pivot_mes.columns = [f'Mes {int(m)}' for m in pivot_mes.columns]
         pivot_mes['Total'] = pivot_mes.sum(axis=1)
-        pivot_mes.to_excel(writer, sheet_name='Desglose Mensual')
+        libro.escribir_dataframe('Desglose Mensual', pivot_mes, index=True)
         
         # Hoja 4: Comparativo (si existe)
         if comparativo_df is not None:
-            comparativo_df.to_excel(writer, sheet_name='Comparativo Años', index=False)
+            libro.escribir_dataframe('Comparativo Años', comparativo_df)
         
         # Hoja 5: Top Productos
         if 'producto' in df_ytd.columns:
             top_prod = df_ytd.groupby(['producto', 'linea_de_negocio'])['ventas_usd'].sum().reset_index()
             top_prod = top_prod.sort_values('ventas_usd', ascending=False).head(20)
             top_prod.columns = ['Producto', 'Línea', 'Ventas USD']
-            top_prod.to_excel(writer, sheet_name='Top Productos', index=False)
+            libro.escribir_dataframe('Top Productos', top_prod)
         
         # Hoja 6: Top Clientes
         if 'cliente' in df_ytd.columns:
             top_cli = df_ytd.groupby(['cliente', 'linea_de_negocio'])['ventas_usd'].sum().reset_index()
             top_cli = top_cli.sort_values('ventas_usd', ascending=False).head(20)
             top_cli.columns = ['Cliente', 'Línea', 'Ventas USD']
-            top_cli.to_excel(writer, sheet_name='Top Clientes', index=False)
+            libro.escribir_dataframe('Top Clientes', top_cli)
     
-    output.seek(0)
-    return output
+        return io.BytesIO(libro.cerrar())
 
 def run(df, habilitar_ia=False, openai_api_key=None):
     """
@@ -753,6 +737,12 @@ def run(df, habilitar_ia=False, openai_api_key=None):
     # Asegurar que fecha es datetime
     df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
     df = df.dropna(subset=['fecha'])
+
+    # Las vistas YTD solo suman ventas por fecha y dimensión comercial: se
+    # trabaja sobre el cubo diario (cacheado por dataset). Las transacciones
+    # originales se conservan únicamente para la descarga de datos brutos.
+    df_transacciones = df
+    df = obtener_cubo(df_transacciones, 'ventas_usd').diario
     
     # Obtener años disponibles
     años_disponibles = sorted(df['fecha'].dt.year.unique(), reverse=True)
@@ -1483,25 +1473,41 @@ def run(df, habilitar_ia=False, openai_api_key=None):
                         fecha_corte_actual=fecha_corte_actual,
                     )
 
-                excel_buffer = exportar_excel_ytd(
-                    df_ytd_actual,
-                    año_actual,
-                    comparativo_df_export,
-                    fecha_corte=fecha_corte_actual,
-                    modo_comparacion=modo_comparacion,
+                # Se genera en segundo plano; los reruns reutilizan el archivo
+                fecha_reporte = now_mx().strftime('%Y%m%d')
+                trabajo_excel = obtener_cola_exportaciones().enviar(
+                    "excel_ytd_lineas",
+                    (df_ytd_actual, comparativo_df_export),
+                    (año_actual, fecha_corte_actual, modo_comparacion, fecha_reporte),
+                    partial(
+                        exportar_excel_ytd,
+                        df_ytd_actual,
+                        año_actual,
+                        comparativo_df_export,
+                        fecha_corte=fecha_corte_actual,
+                        modo_comparacion=modo_comparacion,
+                    ),
+                    con_progreso=False,
                 )
-
-                st.download_button(
-                    label="📥 Descargar Excel",
-                    data=excel_buffer,
-                    file_name=f"Reporte_YTD_{año_actual}_{now_mx().strftime('%Y%m%d')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                mostrar_trabajo_export(
+                    trabajo_excel,
+                    "📥 Descargar Excel",
+                    f"Reporte_YTD_{año_actual}_{fecha_reporte}.xlsx",
+                    MIME_EXCEL,
                 )
                 st.caption("Incluye: resumen ejecutivo, desglose mensual, comparativo y top productos/clientes")
 
             with col_exp2:
                 st.subheader("📊 Datos Brutos")
-                csv_buffer = df_ytd_actual.to_csv(index=False).encode('utf-8')
+                df_datos_brutos = df_transacciones[
+                    df_transacciones['linea_de_negocio'].isin(seleccion_lineas)
+                    & df_transacciones['fecha'].between(
+                        datetime(año_actual, 1, 1),
+                        pd.Timestamp(fecha_corte_actual).normalize() + pd.Timedelta(days=1),
+                        inclusive='left',
+                    )
+                ]
+                csv_buffer = df_datos_brutos.to_csv(index=False).encode('utf-8')
 
                 st.download_button(
                     label="📥 Descargar CSV",
@@ -1509,7 +1515,7 @@ def run(df, habilitar_ia=False, openai_api_key=None):
                     file_name=f"Datos_YTD_{año_actual}_{now_mx().strftime('%Y%m%d')}.csv",
                     mime="text/csv"
                 )
-                st.caption(f"Datos crudos YTD {año_actual} ({len(df_ytd_actual)} registros)")
+                st.caption(f"Datos crudos YTD {año_actual} ({len(df_datos_brutos)} registros)")
         else:
             st.warning("⚠️ Las funciones de exportación están disponibles solo para usuarios con rol **Analyst** o **Admin**")
             st.info("💡 Contacta al administrador para solicitar acceso a exportaciones")
@@ -16,10 +16,15 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, date
+from functools import partial
 from utils.formatos import now_mx
 import io
 import os
 from utils.logger import configurar_logger
+from utils.export_helper import LibroExcelStreaming
+from utils.export_jobs import MIME_EXCEL, mostrar_trabajo_export, obtener_cola_exportaciones
+from utils.sales_cube import obtener_cubo
+from utils.ytd_engine import obtener_motor_ytd, series_acumuladas_mensuales
 from utils.ai_helper import generar_resumen_ejecutivo_ytd, validar_api_key
 from utils.auth import get_current_user
 
@@ -68,11 +73,10 @@ def _normalizar_fecha_naive(fecha):
 
 def obtener_fecha_corte_efectiva(df, año, fecha_corte=None):
     """Obtiene una fecha de corte realista, acotada por los datos disponibles."""
-    df_año = df[df['fecha'].dt.year == año].copy()
-    if df_año.empty:
+    fecha_max_datos = _normalizar_fecha_naive(obtener_motor_ytd(df).fecha_maxima(año))
+    if fecha_max_datos is None:
         return _normalizar_fecha_naive(fecha_corte) or now_mx().replace(tzinfo=None)
 
-    fecha_max_datos = _normalizar_fecha_naive(df_año['fecha'].max())
     fecha_hoy = now_mx().replace(tzinfo=None)
     fecha_objetivo = _normalizar_fecha_naive(fecha_corte)
 
@@ -99,29 +103,17 @@ def calcular_ytd(df, año, fecha_corte=None):
         fecha_corte: Fecha límite (si None, usa fecha actual)
     
     Returns:
-        DataFrame filtrado con ventas YTD
+        DataFrame con ventas YTD, ordenado por fecha. Es una rebanada del
+        índice del motor YTD: copiar antes de modificar.
     """
+    motor = obtener_motor_ytd(df)
     fecha_corte = obtener_fecha_corte_efectiva(df, año, fecha_corte)
-    
-    # Filtrar año y hasta fecha de corte
-    df_año = df[df['fecha'].dt.year == año].copy()
-    df_ytd = df_año[df_año['fecha'] <= fecha_corte].copy()
-    
-    # Logging para debug
-    total_registros_año = len(df_año)
-    total_registros_ytd = len(df_ytd)
-    total_ventas = df_ytd['ventas_usd'].sum()
-    
-    logger.info(f"calcular_ytd() - Año: {año}, Fecha corte: {fecha_corte.strftime('%Y-%m-%d')}")
-    logger.info(f"  Registros totales del año {año}: {total_registros_año}")
-    logger.info(f"  Registros YTD hasta {fecha_corte.strftime('%Y-%m-%d')}: {total_registros_ytd}")
-    logger.info(f"  Total ventas YTD: ${total_ventas:,.2f}")
-    
-    if total_registros_ytd > 0:
-        fecha_min = df_ytd['fecha'].min()
-        fecha_max = df_ytd['fecha'].max()
-        logger.info(f"  Rango de fechas: {fecha_min.strftime('%Y-%m-%d')} a {fecha_max.strftime('%Y-%m-%d')}")
-    
+    df_ytd = motor.filas(año, fecha_corte)
+
+    logger.debug(
+        f"calcular_ytd() - Año: {año}, Fecha corte: {fecha_corte.strftime('%Y-%m-%d')}, "
+        f"registros: {len(df_ytd)}, total: ${motor.total(año, fecha_corte):,.2f}"
+    )
     return df_ytd
 
 def calcular_metricas_ytd(df_ytd, fecha_corte_efectiva=None):
@@ -169,8 +161,7 @@ def crear_grafico_temporal_producto(df, producto, año_actual, año_anterior=Non
     # Datos año actual
     df_actual = calcular_ytd(df_producto, año_actual, fecha_corte_actual)
     if not df_actual.empty:
-        df_actual['mes'] = df_actual['fecha'].dt.month
-        ventas_mes = df_actual.groupby('mes')['ventas_usd'].sum().sort_index()
+        ventas_mes = df_actual.groupby(df_actual['fecha'].dt.month)['ventas_usd'].sum().sort_index()
         ventas_acumuladas = ventas_mes.cumsum()
         
         fig.add_trace(go.Scatter(
@@ -197,8 +188,7 @@ def crear_grafico_temporal_producto(df, producto, año_actual, año_anterior=Non
 
         df_anterior = calcular_ytd(df_producto, año_anterior, fecha_corte_anterior)
         if not df_anterior.empty:
-            df_anterior['mes'] = df_anterior['fecha'].dt.month
-            ventas_mes_ant = df_anterior.groupby('mes')['ventas_usd'].sum().sort_index()
+            ventas_mes_ant = df_anterior.groupby(df_anterior['fecha'].dt.month)['ventas_usd'].sum().sort_index()
             ventas_acumuladas_ant = ventas_mes_ant.cumsum()
             
             fig.add_trace(go.Scatter(
@@ -406,17 +396,15 @@ def crear_grafico_lineas_acumulado(df, año_actual, año_anterior=None):
     fig = go.Figure()
     
     # Datos año actual
-    df_actual = df[df['fecha'].dt.year == año_actual].copy()
-    df_actual['mes'] = df_actual['fecha'].dt.month
+    motor = obtener_motor_ytd(df)
     
-    # Agrupar por producto y mes
-    for linea in df_actual['producto'].unique():
-        df_linea = df_actual[df_actual['producto'] == linea]
-        ventas_mes = df_linea.groupby('mes')['ventas_usd'].sum().sort_index()
-        ventas_acumuladas = ventas_mes.cumsum()
+    # Acumulado mensual de todos los productos en una sola pasada
+    acumulado_actual = series_acumuladas_mensuales(motor.filas(año_actual), 'producto')
+    for linea in acumulado_actual.columns:
+        ventas_acumuladas = acumulado_actual[linea].dropna()
         
         color = COLORES_LINEAS.get(linea, '#808080')
-        logger.info(f"YTD Gráfico - Línea: '{linea}' -> Color asignado: {color}")
+        logger.debug(f"YTD Gráfico - Línea: '{linea}' -> Color asignado: {color}")
         
         fig.add_trace(go.Scatter(
             x=ventas_acumuladas.index,
@@ -433,13 +421,9 @@ def crear_grafico_lineas_acumulado(df, año_actual, año_anterior=None):
     
     # Datos año anterior si existe
     if año_anterior:
-        df_anterior = df[df['fecha'].dt.year == año_anterior].copy()
-        df_anterior['mes'] = df_anterior['fecha'].dt.month
-        
-        for linea in df_anterior['producto'].unique():
-            df_linea = df_anterior[df_anterior['producto'] == linea]
-            ventas_mes = df_linea.groupby('mes')['ventas_usd'].sum().sort_index()
-            ventas_acumuladas = ventas_mes.cumsum()
+        acumulado_anterior = series_acumuladas_mensuales(motor.filas(año_anterior), 'producto')
+        for linea in acumulado_anterior.columns:
+            ventas_acumuladas = acumulado_anterior[linea].dropna()
             
             color = COLORES_LINEAS.get(linea, '#808080')
             
@@ -505,9 +489,9 @@ def crear_grafico_barras_comparativo(df, año_actual, año_anterior, usar_año_c
         usar_año_completo_anterior: Si True, usa todo el año anterior. Si False, usa YTD del año anterior
     """
     
-    # Calcular YTD para año actual
+    # Calcular YTD para año actual (totales por producto vía el motor YTD, sin recortar el df)
+    motor = obtener_motor_ytd(df)
     fecha_corte = _normalizar_fecha_naive(fecha_corte_actual) or obtener_fecha_corte_efectiva(df, año_actual)
-    df_actual = calcular_ytd(df, año_actual, fecha_corte)
     
     # Para año anterior: usar año completo o YTD según parámetro
     if usar_año_completo_anterior:
@@ -521,16 +505,13 @@ def crear_grafico_barras_comparativo(df, año_actual, año_anterior, usar_año_c
     
     logger.info(f"Fecha corte actual: {fecha_corte.strftime('%Y-%m-%d')}, anterior: {fecha_corte_anterior.strftime('%Y-%m-%d')}")
     
-    df_anterior = calcular_ytd(df, año_anterior, fecha_corte_anterior)
-    
-    logger.info(f"Registros - Año {año_actual}: {len(df_actual)}, Año {año_anterior}: {len(df_anterior)}")
-    logger.info(f"Total ventas - Año {año_actual}: ${df_actual['ventas_usd'].sum():,.2f}, Año {año_anterior}: ${df_anterior['ventas_usd'].sum():,.2f}")
+    logger.info(f"Total ventas - Año {año_actual}: ${motor.total(año_actual, fecha_corte):,.2f}, Año {año_anterior}: ${motor.total(año_anterior, fecha_corte_anterior):,.2f}")
     
     # Agrupar por producto
-    ventas_actual = df_actual.groupby('producto')['ventas_usd'].sum().reset_index()
+    ventas_actual = motor.totales_por('producto', año_actual, fecha_corte).reset_index()
     ventas_actual.columns = ['producto', 'ventas_actual']
     
-    ventas_anterior = df_anterior.groupby('producto')['ventas_usd'].sum().reset_index()
+    ventas_anterior = motor.totales_por('producto', año_anterior, fecha_corte_anterior).reset_index()
     ventas_anterior.columns = ['producto', 'ventas_anterior']
     
     # Merge
@@ -684,10 +665,10 @@ def crear_grafico_comparativo_anos_completos(df, años_disponibles):
     años_a_mostrar = sorted(años_a_mostrar)  # Ordenar ascendente para el gráfico
     
     # Calcular ventas totales por año
+    motor = obtener_motor_ytd(df)
     ventas_por_año = []
     for año in años_a_mostrar:
-        df_año = df[df['fecha'].dt.year == año]
-        total_año = df_año['ventas_usd'].sum()
+        total_año = motor.total(año)
         ventas_por_año.append({
             'año': str(año),
             'ventas': total_año
@@ -804,9 +785,7 @@ def crear_tabla_top_clientes(df_ytd, n=10):
 def exportar_excel_ytd(df_ytd, año, comparativo_df=None):
     """Genera archivo Excel con reporte YTD completo."""
     
-    output = io.BytesIO()
-    
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+    with LibroExcelStreaming("reporte_ytd") as libro:
         # Hoja 1: Resumen Ejecutivo
         metricas = calcular_metricas_ytd(df_ytd)
         resumen_data = {
@@ -826,7 +805,7 @@ def exportar_excel_ytd(df_ytd, año, comparativo_df=None):
             ]
         }
         df_resumen = pd.DataFrame(resumen_data)
-        df_resumen.to_excel(writer, sheet_name='Resumen Ejecutivo', index=False)
+        libro.escribir_dataframe('Resumen Ejecutivo', df_resumen)
         
         # Hoja 2: Ventas por Línea
         ventas_producto = df_ytd.groupby('producto')['ventas_usd'].sum().reset_index()
@@ -834,37 +813,38 @@ def exportar_excel_ytd(df_ytd, año, comparativo_df=None):
         ventas_producto['Participación %'] = (ventas_producto['Ventas USD YTD'] / 
                                             ventas_producto['Ventas USD YTD'].sum() * 100).round(2)
         ventas_producto = ventas_producto.sort_values('Ventas USD YTD', ascending=False)
-        ventas_producto.to_excel(writer, sheet_name='Por Producto', index=False)
+        libro.escribir_dataframe('Por Producto', ventas_producto)
         
         # Hoja 3: Desglose Mensual
-        df_ytd_copy = df_ytd.copy()
-        df_ytd_copy['mes'] = df_ytd_copy['fecha'].dt.month
-        desglose_mes = df_ytd_copy.groupby(['producto', 'mes'])['ventas_usd'].sum().reset_index()
+        desglose_mes = (
+            df_ytd.groupby([df_ytd['producto'], df_ytd['fecha'].dt.month.rename('mes')])['ventas_usd']
+            .sum()
+            .reset_index()
+        )
         pivot_mes = desglose_mes.pivot(index='producto', columns='mes', values='ventas_usd').fillna(0)
         pivot_mes.columns = [f'Mes {int(m)}' for m in pivot_mes.columns]
         pivot_mes['Total'] = pivot_mes.sum(axis=1)
-        pivot_mes.to_excel(writer, sheet_name='Desglose Mensual')
+        libro.escribir_dataframe('Desglose Mensual', pivot_mes, index=True)
         
         # Hoja 4: Comparativo (si existe)
         if comparativo_df is not None:
-            comparativo_df.to_excel(writer, sheet_name='Comparativo Años', index=False)
+            libro.escribir_dataframe('Comparativo Años', comparativo_df)
         
         # Hoja 5: Top Productos
         if 'producto' in df_ytd.columns:
             top_prod = df_ytd.groupby('producto')['ventas_usd'].sum().reset_index()
             top_prod = top_prod.sort_values('ventas_usd', ascending=False).head(20)
             top_prod.columns = ['Producto', 'Ventas USD']
-            top_prod.to_excel(writer, sheet_name='Top Productos', index=False)
+            libro.escribir_dataframe('Top Productos', top_prod)
         
         # Hoja 6: Top Clientes
         if 'cliente' in df_ytd.columns:
             top_cli = df_ytd.groupby(['cliente', 'producto'])['ventas_usd'].sum().reset_index()
             top_cli = top_cli.sort_values('ventas_usd', ascending=False).head(20)
             top_cli.columns = ['Cliente', 'Producto', 'Ventas USD']
-            top_cli.to_excel(writer, sheet_name='Top Clientes', index=False)
+            libro.escribir_dataframe('Top Clientes', top_cli)
     
-    output.seek(0)
-    return output
+        return io.BytesIO(libro.cerrar())
 
 def run(df, habilitar_ia=False, openai_api_key=None):
     """
@@ -958,6 +938,12 @@ def run(df, habilitar_ia=False, openai_api_key=None):
     # Asegurar que fecha es datetime
     df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
     df = df.dropna(subset=['fecha'])
+
+    # Las vistas YTD solo suman ventas por fecha y dimensión comercial: se
+    # trabaja sobre el cubo diario (cacheado por dataset). Las transacciones
+    # originales se conservan únicamente para la descarga de datos brutos.
+    df_transacciones = df
+    df = obtener_cubo(df_transacciones, 'ventas_usd').diario
     
     # Obtener años disponibles
     años_disponibles = sorted(df['fecha'].dt.year.unique(), reverse=True)
@@ -1033,9 +1019,10 @@ def run(df, habilitar_ia=False, openai_api_key=None):
         productos_disponibles = sorted(df['producto'].unique())
         
         # Calcular producto con más ventas para usarlo como default
-        df_temp_ytd = calcular_ytd(df, año_actual)
-        if not df_temp_ytd.empty:
-            ventas_por_producto = df_temp_ytd.groupby('producto')['ventas_usd'].sum().sort_values(ascending=False)
+        ventas_por_producto = obtener_motor_ytd(df).totales_por(
+            'producto', año_actual, obtener_fecha_corte_efectiva(df, año_actual)
+        ).sort_values(ascending=False)
+        if not ventas_por_producto.empty:
             producto_default = ventas_por_producto.index[0] if len(ventas_por_producto) > 0 else productos_disponibles[0]
         else:
             producto_default = productos_disponibles[0] if productos_disponibles else None
@@ -1428,7 +1415,7 @@ def run(df, habilitar_ia=False, openai_api_key=None):
     
     st.markdown("---")
 
-    df_todos_productos = df.copy()
+    df_todos_productos = df
     fecha_corte_contexto = obtener_fecha_corte_efectiva(df_todos_productos, año_actual)
 
     if periodo_treemap == "ytd_actual":
@@ -1633,16 +1620,15 @@ def run(df, habilitar_ia=False, openai_api_key=None):
                 st.markdown("---")
                 st.subheader(f"📊 Comparativo {año_actual} vs {año_anterior}")
 
-                df_anterior_producto = df[(df['fecha'].dt.year == año_anterior) & (df['producto'] == producto_seleccionado)].copy()
+                motor_producto = obtener_motor_ytd(df_filtrado)
 
-                if not df_anterior_producto.empty:
+                if motor_producto.fecha_maxima(año_anterior) is not None:
                     if modo_comparacion == "año_completo":
                         fecha_corte_anterior = datetime(año_anterior, 12, 31)
                     else:
                         fecha_corte_anterior = _fecha_equivalente_anio_previo(fecha_corte_actual, año_anterior)
 
-                    df_ytd_anterior_producto = calcular_ytd(df_anterior_producto, año_anterior, fecha_corte_anterior)
-                    ventas_anterior_producto = df_ytd_anterior_producto['ventas_usd'].sum()
+                    ventas_anterior_producto = motor_producto.total(año_anterior, fecha_corte_anterior)
                     ventas_actual_producto = df_ytd_actual['ventas_usd'].sum()
 
                     if ventas_anterior_producto > 0:
@@ -1798,9 +1784,12 @@ def run(df, habilitar_ia=False, openai_api_key=None):
                         st.metric("Ticket Promedio", f"${ticket_promedio:,.0f}")
 
             with subtab_clientes_detalle:
-                clientes_detalle = df_analisis_clientes.groupby('cliente').agg({
-                    'ventas_usd': ['sum', 'count', 'mean']
-                }).reset_index()
+                # Filas del cubo diario: las transacciones vienen en 'operaciones'
+                clientes_detalle = df_analisis_clientes.groupby('cliente').agg(
+                    total_ventas=('ventas_usd', 'sum'),
+                    transacciones=('operaciones', 'sum'),
+                ).reset_index()
+                clientes_detalle['ticket_promedio'] = clientes_detalle['total_ventas'] / clientes_detalle['transacciones']
 
                 clientes_detalle.columns = ['Cliente', 'Total Ventas', 'Num. Transacciones', 'Ticket Promedio']
                 clientes_detalle = clientes_detalle.sort_values('Total Ventas', ascending=False)
@@ -1933,18 +1922,37 @@ def run(df, habilitar_ia=False, openai_api_key=None):
                         fecha_corte_actual=fecha_corte_actual,
                     )
 
-                excel_buffer = exportar_excel_ytd(df_ytd_actual, año_actual, comparativo_df_export)
-                st.download_button(
-                    label="📥 Descargar Excel",
-                    data=excel_buffer,
-                    file_name=f"Reporte_YTD_{año_actual}_{now_mx().strftime('%Y%m%d')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                # Se genera en segundo plano; los reruns reutilizan el archivo
+                fecha_reporte = now_mx().strftime('%Y%m%d')
+                trabajo_excel = obtener_cola_exportaciones().enviar(
+                    "excel_ytd_productos",
+                    (df_ytd_actual, comparativo_df_export),
+                    (año_actual, fecha_reporte),
+                    partial(
+                        exportar_excel_ytd,
+                        df_ytd_actual, año_actual, comparativo_df_export,
+                    ),
+                    con_progreso=False,
+                )
+                mostrar_trabajo_export(
+                    trabajo_excel,
+                    "📥 Descargar Excel",
+                    f"Reporte_YTD_{año_actual}_{fecha_reporte}.xlsx",
+                    MIME_EXCEL,
                 )
                 st.caption("Incluye: resumen ejecutivo, desglose mensual y comparativo del producto")
 
             with col_exp2:
                 st.subheader("📊 Datos Brutos")
-                csv_buffer = df_ytd_actual.to_csv(index=False).encode('utf-8')
+                df_datos_brutos = df_transacciones[
+                    (df_transacciones['producto'] == producto_seleccionado)
+                    & df_transacciones['fecha'].between(
+                        datetime(año_actual, 1, 1),
+                        pd.Timestamp(fecha_corte_actual).normalize() + pd.Timedelta(days=1),
+                        inclusive='left',
+                    )
+                ]
+                csv_buffer = df_datos_brutos.to_csv(index=False).encode('utf-8')
                 st.download_button(
                     label=f"📥 CSV - YTD {año_actual}",
                     data=csv_buffer,
@@ -1952,10 +1960,16 @@ def run(df, habilitar_ia=False, openai_api_key=None):
                     mime="text/csv",
                     key="csv_ytd_actual"
                 )
-                st.caption(f"Datos YTD {año_actual} ({len(df_ytd_actual)} registros)")
+                st.caption(f"Datos YTD {año_actual} ({len(df_datos_brutos)} registros)")
 
                 if periodo_clientes != "ytd_actual":
-                    csv_periodo = df_analisis_clientes.to_csv(index=False).encode('utf-8')
+                    # Mismo periodo que el análisis de clientes, pero con las
+                    # transacciones originales (el análisis usa el cubo diario).
+                    mascara_clientes = df_transacciones['producto'] == producto_seleccionado
+                    if periodo_clientes == "año_especifico":
+                        mascara_clientes &= df_transacciones['fecha'].dt.year == año_clientes
+                    df_export_clientes = df_transacciones[mascara_clientes]
+                    csv_periodo = df_export_clientes.to_csv(index=False).encode('utf-8')
                     if periodo_clientes == "historico_completo":
                         label_csv = "📥 CSV - Clientes Histórico Completo"
                         fname_csv = f"Clientes_Historico_{producto_seleccionado}_{now_mx().strftime('%Y%m%d')}.csv"
@@ -1970,7 +1984,7 @@ def run(df, habilitar_ia=False, openai_api_key=None):
                         mime="text/csv",
                         key="csv_periodo_clientes"
                     )
-                    st.caption(f"Datos del análisis de clientes ({len(df_analisis_clientes)} registros)")
+                    st.caption(f"Datos del análisis de clientes ({len(df_export_clientes)} registros)")
         else:
             st.warning("⚠️ Las funciones de exportación están disponibles solo para usuarios con rol **Analyst** o **Admin**")
             st.info("💡 Contacta al administrador para solicitar acceso a exportaciones")
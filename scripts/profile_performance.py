@@ -25,6 +25,10 @@ from utils.cxc_helper import (
     obtener_semaforo_riesgo,
     obtener_semaforo_concentracion
 )
+from utils.knowledge_base import Document, SearchEngine
+from utils.ytd_engine import series_acumuladas_mensuales
+from utils.cxc_metricas_cliente import calcular_metricas_por_cliente
+from utils.data_cleaner import detectar_duplicados_similares, normalizar_texto
 from utils.formatos import (
     formato_moneda,
     formato_numero,
@@ -186,6 +190,293 @@ def benchmark_operaciones():
         print("   ⚠️ Performance general necesita OPTIMIZACIÓN (>1s)")
 
 
+def generar_corpus_knowledge_base(n_docs: int = 10000, seed: int = 42) -> list:
+    """Genera documentos Markdown sintéticos para el benchmark de búsqueda."""
+    rng = np.random.default_rng(seed)
+    silabas = np.array(['ca', 'fac', 'tu', 'ra', 'clien', 'te', 'ven', 'ta', 'sal', 'do',
+                        'por', 'co', 'brar', 'fis', 'cal', 'in', 'gre', 'so', 'mar', 'gen'])
+    vocabulario = sorted({''.join(rng.choice(silabas, size=rng.integers(2, 6))) for _ in range(40000)})
+    vocabulario = np.array(vocabulario)
+    # Frecuencias tipo Zipf: pocas palabras muy comunes y una cola larga
+    pesos = 1.0 / np.arange(1, len(vocabulario) + 1)
+    pesos = rng.permutation(pesos / pesos.sum())
+
+    def _palabras(n: int) -> np.ndarray:
+        return rng.choice(vocabulario, size=n, p=pesos)
+
+    documentos = []
+    for i in range(n_docs):
+        secciones = []
+        for j in range(int(rng.integers(2, 6))):
+            palabras = _palabras(int(rng.integers(20, 120)))
+            secciones.append({
+                "heading": ' '.join(_palabras(3)),
+                "content": ' '.join(palabras),
+                "level": 2,
+                "line_number": j * 10 + 1,
+            })
+        contenido = '\n\n'.join(f"## {s['heading']}\n{s['content']}" for s in secciones)
+        documentos.append(Document(
+            id=f"doc{i:05d}",
+            title=' '.join(_palabras(4)),
+            path=f"docs/DOC_{i:05d}.md",
+            content=contenido,
+            category="general",
+            sections=secciones,
+            metadata={},
+            word_count=len(contenido.split()),
+            last_modified="2026-01-01T00:00:00",
+            checksum=str(i),
+        ))
+    return documentos
+
+
+def benchmark_knowledge_base(n_docs: int = 10000, n_queries: int = 200) -> dict:
+    """Mide p50/p99 de search_time_ms (SearchStats) sobre un corpus sintético."""
+    import time
+
+    print(f"\n\n🔎 BENCHMARK KNOWLEDGE BASE ({n_docs:,} documentos)")
+    print("="*80)
+
+    documentos = generar_corpus_knowledge_base(n_docs)
+    engine = SearchEngine()
+    inicio = time.perf_counter()
+    for doc in documentos:
+        engine._add_document(doc, mtime=0.0)
+    tiempo_indexado = time.perf_counter() - inicio
+
+    rng = np.random.default_rng(7)
+    vocabulario = sorted(engine._inverted_index)
+    for _ in range(n_queries):
+        tokens = list(rng.choice(vocabulario, size=int(rng.integers(1, 4))))
+        tokens[0] = tokens[0][:5]  # al menos un prefijo por consulta
+        engine.search(' '.join(tokens))
+
+    tiempos = np.array([s.search_time_ms for s in engine.get_search_history(n_queries)])
+    resultado = {
+        "documentos": n_docs,
+        "tokens_unicos": len(vocabulario),
+        "indexado_s": tiempo_indexado,
+        "p50_ms": float(np.percentile(tiempos, 50)),
+        "p99_ms": float(np.percentile(tiempos, 99)),
+    }
+    print(f"✓ Indexado incremental: {tiempo_indexado:.2f}s ({len(vocabulario):,} tokens únicos)")
+    print(f"✓ search_time_ms ({n_queries} consultas): p50={resultado['p50_ms']:.2f}ms  "
+          f"p99={resultado['p99_ms']:.2f}ms")
+    return resultado
+
+
+def _series_acumuladas_por_bucle(df: pd.DataFrame, dimension: str) -> dict:
+    """Versión previa de las curvas YTD: un filtro + groupby + cumsum por grupo."""
+    series = {}
+    for valor in df[dimension].unique():
+        df_grupo = df[df[dimension] == valor]
+        series[valor] = df_grupo.groupby(df_grupo['fecha'].dt.month)['ventas_usd'].sum().sort_index().cumsum()
+    return series
+
+
+def benchmark_series_acumuladas(n_filas: int = 1_000_000, n_lineas: int = 50) -> dict:
+    """Compara el bucle por línea contra series_acumuladas_mensuales (una pasada)."""
+    import time
+
+    print(f"\n\n📈 BENCHMARK CURVAS ACUMULADAS YTD ({n_filas:,} filas, {n_lineas} líneas)")
+    print("="*80)
+
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({
+        'fecha': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, n_filas), unit='D'),
+        'linea_de_negocio': rng.choice([f'Linea {i:02d}' for i in range(n_lineas)], n_filas),
+        'ventas_usd': rng.uniform(10, 10000, n_filas),
+    })
+
+    inicio = time.perf_counter()
+    por_bucle = _series_acumuladas_por_bucle(df, 'linea_de_negocio')
+    tiempo_bucle = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vectorizado = series_acumuladas_mensuales(df, 'linea_de_negocio')
+    tiempo_vectorizado = time.perf_counter() - inicio
+
+    for linea, serie in por_bucle.items():
+        np.testing.assert_allclose(vectorizado[linea].dropna().to_numpy(), serie.to_numpy())
+
+    resultado = {
+        "filas": n_filas,
+        "lineas": n_lineas,
+        "bucle_s": tiempo_bucle,
+        "vectorizado_s": tiempo_vectorizado,
+        "aceleracion": tiempo_bucle / tiempo_vectorizado if tiempo_vectorizado > 0 else float('inf'),
+    }
+    print(f"✓ Bucle por línea:  {tiempo_bucle*1000:.1f}ms")
+    print(f"✓ Una sola pasada:  {tiempo_vectorizado*1000:.1f}ms ({resultado['aceleracion']:.1f}x)")
+    return resultado
+
+
+def _metricas_por_cliente_por_bucle(df: pd.DataFrame) -> pd.DataFrame:
+    """Versión previa de calcular_metricas_por_cliente: un dict por grupo del groupby."""
+    metricas = []
+    for cliente, grupo in df.groupby('deudor'):
+        saldo_total = grupo['saldo_adeudado'].sum()
+        dias_x_monto = (grupo['dias_overdue'] * grupo['saldo_adeudado']).sum()
+        dias_promedio_ponderado = dias_x_monto / saldo_total if saldo_total > 0 else 0
+
+        if dias_promedio_ponderado <= 0:
+            rango = "Vigente"
+        elif dias_promedio_ponderado <= 30:
+            rango = "0-30 días"
+        elif dias_promedio_ponderado <= 60:
+            rango = "31-60 días"
+        elif dias_promedio_ponderado <= 90:
+            rango = "61-90 días"
+        else:
+            rango = ">90 días"
+
+        metricas.append({
+            'deudor': cliente,
+            'saldo_total': saldo_total,
+            'num_facturas': len(grupo),
+            'dias_promedio_ponderado': round(dias_promedio_ponderado, 1),
+            'dias_factura_mas_antigua': int(grupo['dias_overdue'].max()),
+            'dias_factura_mas_reciente': int(grupo['dias_overdue'].min()),
+            'rango_antiguedad': rango
+        })
+    return pd.DataFrame(metricas).sort_values('saldo_total', ascending=False)
+
+
+def generar_cartera_deudores(n_deudores: int, facturas_por_deudor: int = 4, seed: int = 42) -> pd.DataFrame:
+    """Cartera sintética con `n_deudores` clientes y ~`facturas_por_deudor` facturas c/u."""
+    rng = np.random.default_rng(seed)
+    n_filas = n_deudores * facturas_por_deudor
+    return pd.DataFrame({
+        'deudor': np.char.add('Cliente ', rng.integers(0, n_deudores, n_filas).astype(str)),
+        'saldo_adeudado': rng.choice([0.0, 0.0, 250.0, 1200.5, 9800.0, 45000.0], n_filas)
+                          + rng.uniform(0, 100, n_filas).round(2),
+        'dias_overdue': rng.integers(-30, 240, n_filas),
+    })
+
+
+def benchmark_metricas_por_cliente(tamanos=(10_000, 100_000), facturas_por_deudor: int = 4) -> list:
+    """Compara el bucle por deudor contra calcular_metricas_por_cliente (groupby().agg)."""
+    import time
+
+    print("\n\n👥 BENCHMARK MÉTRICAS POR CLIENTE (CxC)")
+    print("="*80)
+
+    resultados = []
+    for n_deudores in tamanos:
+        df = generar_cartera_deudores(n_deudores, facturas_por_deudor)
+
+        inicio = time.perf_counter()
+        por_bucle = _metricas_por_cliente_por_bucle(df)
+        tiempo_bucle = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        agregado = calcular_metricas_por_cliente(df)
+        tiempo_agregado = time.perf_counter() - inicio
+
+        # Mismo frame; solo cambia el orden de suma dentro de cada grupo (diferencias de 1 ulp
+        # en saldo_total), que puede intercambiar deudores con saldos prácticamente empatados
+        pd.testing.assert_frame_equal(agregado.sort_index(), por_bucle.sort_index())
+
+        resultado = {
+            "deudores": n_deudores,
+            "filas": len(df),
+            "bucle_s": tiempo_bucle,
+            "agregado_s": tiempo_agregado,
+            "aceleracion": tiempo_bucle / tiempo_agregado if tiempo_agregado > 0 else float('inf'),
+        }
+        resultados.append(resultado)
+        print(f"✓ {n_deudores:,} deudores ({len(df):,} facturas): bucle {tiempo_bucle*1000:.1f}ms  "
+              f"groupby().agg {tiempo_agregado*1000:.1f}ms ({resultado['aceleracion']:.1f}x)")
+    return resultados
+
+
+def generar_nombres_clientes(n_nombres: int, pct_variantes: float = 0.1, seed: int = 42) -> tuple:
+    """
+    Catálogo sintético de razones sociales con variantes por error de dedo.
+
+    Returns:
+        (nombres, variantes) donde `variantes` son pares (original, variante)
+    """
+    import random
+
+    rng = random.Random(seed)
+    consonantes = ["b", "c", "d", "f", "g", "j", "l", "m", "n", "p", "r", "s", "t", "v", "z",
+                   "ch", "br", "tr", "gr", "pl", "rr", "ll", "qu", "x"]
+    vocales = ["a", "e", "i", "o", "u", "ia", "ue", "io"]
+    giros = ["Comercializadora", "Distribuidora", "Grupo", "Industrias", "Servicios", "Aceros",
+             "Transportes", "Constructora", "Farmacia", "Abarrotes", "", "", ""]
+    sufijos = ["SA de CV", "S de RL de CV", "SAPI de CV", "SC", "", ""]
+
+    def palabra():
+        return ''.join(rng.choice(consonantes) + rng.choice(vocales) for _ in range(rng.randint(2, 4))).capitalize()
+
+    nombres, variantes = [], []
+    while len(nombres) < n_nombres:
+        partes = [rng.choice(giros), palabra(), palabra() if rng.random() < 0.7 else "", rng.choice(sufijos)]
+        nombre = ' '.join(p for p in partes if p)
+        nombres.append(nombre)
+        if rng.random() < pct_variantes and len(nombres) < n_nombres:
+            letras = list(nombre)
+            for _ in range(rng.choice([1, 1, 1, 2])):
+                pos = rng.randrange(len(letras))
+                operacion = rng.random()
+                if operacion < 0.33:
+                    letras[pos] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+                elif operacion < 0.66:
+                    del letras[pos]
+                else:
+                    letras.insert(pos, rng.choice("abcdefghijklmnopqrstuvwxyz"))
+            nombres.append(''.join(letras))
+            variantes.append((nombre, nombres[-1]))
+    return nombres, variantes
+
+
+def benchmark_duplicados_similares(tamanos=(1_000, 10_000, 50_000), umbral: float = 0.85) -> list:
+    """
+    Tiempo de detectar_duplicados_similares por tamaño de catálogo y recall
+    sobre las variantes sembradas (las que superan el umbral).
+    """
+    import time
+    from difflib import SequenceMatcher
+
+    print("\n\n🔁 BENCHMARK DUPLICADOS SIMILARES (bloqueo por n-gramas)")
+    print("="*80)
+
+    resultados = []
+    for n_nombres in tamanos:
+        nombres, variantes = generar_nombres_clientes(n_nombres, seed=n_nombres)
+
+        inicio = time.perf_counter()
+        duplicados = detectar_duplicados_similares(pd.Series(nombres), umbral_similitud=umbral)
+        tiempo = time.perf_counter() - inicio
+
+        encontrados = {frozenset((a, b)) for a, b, _ in duplicados}
+        esperados = [
+            frozenset(par) for par in variantes
+            if par[0] != par[1] and SequenceMatcher(None, normalizar_texto(par[0]), normalizar_texto(par[1])).ratio() >= umbral
+        ]
+        recall = sum(par in encontrados for par in esperados) / len(esperados) if esperados else 1.0
+
+        resultado = {
+            "nombres": n_nombres,
+            "tiempo_s": tiempo,
+            "pares_reportados": len(duplicados),
+            "recall_variantes": recall,
+            # Pares que compararía la versión exhaustiva
+            "pares_exhaustivos": n_nombres * (n_nombres - 1) // 2,
+        }
+        resultados.append(resultado)
+        print(f"✓ {n_nombres:,} nombres: {tiempo:.2f}s  ({len(duplicados):,} pares, "
+              f"recall variantes {recall:.1%}, exhaustivo = {resultado['pares_exhaustivos']:,} pares)")
+
+    for previo, actual in zip(resultados, resultados[1:]):
+        escala = actual["nombres"] / previo["nombres"]
+        print(f"   ×{escala:.0f} nombres → ×{actual['tiempo_s'] / previo['tiempo_s']:.1f} tiempo "
+              f"(cuadrático sería ×{escala ** 2:.0f})")
+    return resultados
+
+
 if __name__ == "__main__":
     print("🚀 Iniciando análisis de performance...\n")
     
@@ -198,6 +489,10 @@ if __name__ == "__main__":
         
         # Benchmarks
         benchmark_operaciones()
+        benchmark_knowledge_base()
+        benchmark_series_acumuladas()
+        benchmark_metricas_por_cliente()
+        benchmark_duplicados_similares()
         
         print("\n" + "="*80)
         print("✅ Análisis de performance completado")
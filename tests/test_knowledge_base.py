@@ -368,6 +368,111 @@ class TestSearchEngine:
         assert len(snippet) > 0  # Devuelve inicio del contenido
 
 
+# =====================================================================
+# TESTS: Índice incremental y persistencia
+# =====================================================================
+
+class TestIncrementalIndex:
+    """El índice se actualiza en sitio y se puede restaurar desde disco."""
+
+    @staticmethod
+    def _snapshot(eng):
+        return {token: dict(postings) for token, postings in eng._inverted_index.items()}
+
+    def test_incremental_matches_full_rebuild(self, engine, temp_docs_dir):
+        doc = next(d for d in engine.documents.values() if d.path.endswith("TESTING_GUIDE.md"))
+        engine.save_document(doc.id, doc.content + "\n\n## Regresión\n\nPruebas de humo nocturnas.")
+        engine.remove_document(next(d.id for d in engine.documents.values() if d.path.endswith("PRICING_STRATEGY.md")))
+
+        incremental = self._snapshot(engine)
+        engine._build_inverted_index()
+
+        assert incremental == self._snapshot(engine)
+        assert "nocturnas" in incremental
+        assert "pricing" not in incremental
+
+    def test_postings_store_weighted_term_frequency(self, temp_docs_dir):
+        eng = SearchEngine()
+        doc = eng.index_file(os.path.join(temp_docs_dir, "TESTING_GUIDE.md"))
+
+        # 1 vez en el título (3.0), 2 en headings (2.0 c/u) y 3 en el contenido (1.0 c/u)
+        assert eng._inverted_index["tests"] == {doc.id: 2.0 + 3.0}
+        assert isinstance(eng._inverted_index["guía"][doc.id], float)
+
+    def test_warm_start_reuses_unchanged_files(self, temp_docs_dir, monkeypatch):
+        cache_path = os.path.join(temp_docs_dir, ".cache", "kb.json")
+        files = sorted(str(p) for p in Path(temp_docs_dir).rglob("*.md"))
+
+        cold = SearchEngine()
+        cold.sync_files(files)
+        assert cold.save_index(cache_path)
+
+        parsed = []
+        original_parse = MarkdownParser.parse_file
+        monkeypatch.setattr(
+            MarkdownParser, "parse_file",
+            staticmethod(lambda fp: parsed.append(fp) or original_parse(fp)),
+        )
+
+        warm = SearchEngine()
+        assert warm.load_index(cache_path)
+        changed = os.path.join(temp_docs_dir, "ARCHITECTURE.md")
+        os.utime(changed, (os.path.getmtime(changed) + 10,) * 2)
+        stats = warm.sync_files([f for f in files if not f.endswith("PRICING_STRATEGY.md")])
+
+        assert parsed == [changed]
+        assert stats == {"reused": len(files) - 2, "parsed": 1, "removed": 1}
+        assert [r.document.title for r in warm.search("cobertura")] == ["Guía de Testing"]
+
+
+class TestRanking:
+    """Prefijos con vocabulario ordenado y ranking BM25."""
+
+    @staticmethod
+    def _doc(doc_id, content, title="Doc"):
+        return Document(
+            id=doc_id, title=title, path=f"{doc_id}.md", content=content, category="general",
+            sections=[{"heading": "Intro", "content": content, "level": 1, "line_number": 1}],
+            metadata={}, word_count=len(content.split()), last_modified="", checksum=doc_id,
+        )
+
+    def test_prefix_terms_uses_sorted_vocabulary(self, engine):
+        terms = engine._prefix_terms("arq")
+
+        assert terms == sorted(t for t in engine._inverted_index if t.startswith("arq"))
+        assert "arquitectura" in terms
+        assert engine._prefix_terms("zzzz") == []
+
+    def test_prefix_terms_follow_incremental_updates(self):
+        eng = SearchEngine()
+        eng._add_document(self._doc("a", "conciliación bancaria"), mtime=0.0)
+        assert eng._prefix_terms("conc") == ["conciliación"]
+
+        eng._add_document(self._doc("b", "concentración de cartera"), mtime=0.0)
+        eng.remove_document("a")
+
+        assert eng._prefix_terms("conc") == ["concentración"]
+
+    def test_bm25_prefers_shorter_document_with_same_frequency(self):
+        eng = SearchEngine()
+        eng._add_document(self._doc("corto", "cobranza vencida"), mtime=0.0)
+        eng._add_document(self._doc("largo", "cobranza " + "relleno " * 200), mtime=0.0)
+        eng._add_document(self._doc("otro", "inventario"), mtime=0.0)
+
+        results = eng.search("cobranza")
+
+        assert [r.document.id for r in results] == ["corto", "largo"]
+        assert eng._doc_lengths["largo"] > eng._doc_lengths["corto"]
+
+    def test_benchmark_reports_search_time_percentiles(self):
+        from scripts.profile_performance import benchmark_knowledge_base
+
+        resultado = benchmark_knowledge_base(n_docs=300, n_queries=20)
+
+        assert resultado["documentos"] == 300
+        assert 0 <= resultado["p50_ms"] <= resultado["p99_ms"]
+
+
 # =====================================================================
 # TESTS: Singleton / Cache
 # =====================================================================
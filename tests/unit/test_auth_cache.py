@@ -0,0 +1,127 @@
+"""
+tests/unit/test_auth_cache.py
+
+Camino caliente de utils/auth.py:
+- Bootstrap del esquema una vez por proceso, con tabla de versión
+- Caché con TTL de empresas por usuario, invalidada al asignar/revocar acceso
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import utils.auth as auth_module
+from utils.auth import AUTH_SCHEMA_VERSION, AuthManager
+
+
+@pytest.fixture(autouse=True)
+def estado_limpio(monkeypatch):
+    monkeypatch.setattr(auth_module, "_bootstrap_hecho", False)
+    monkeypatch.setattr(auth_module, "_membership_cache", {})
+
+
+@pytest.fixture
+def auth_manager(monkeypatch):
+    monkeypatch.setattr(AuthManager, "_ensure_schema", lambda self: True)
+    monkeypatch.setattr(AuthManager, "_ensure_admin", lambda self: None)
+    monkeypatch.setattr(AuthManager, "_ensure_default_empresa", lambda self: None)
+    return AuthManager()
+
+
+def test_bootstrap_una_vez_por_proceso(monkeypatch):
+    llamadas = []
+    monkeypatch.setattr(AuthManager, "_ensure_schema", lambda self: llamadas.append("schema") or True)
+    monkeypatch.setattr(AuthManager, "_ensure_admin", lambda self: llamadas.append("admin"))
+    monkeypatch.setattr(AuthManager, "_ensure_default_empresa", lambda self: llamadas.append("empresa"))
+
+    AuthManager()
+    AuthManager()
+    assert llamadas == ["schema", "admin", "empresa"]
+
+
+def test_bootstrap_se_reintenta_si_falla_el_esquema(monkeypatch):
+    llamadas = []
+    monkeypatch.setattr(AuthManager, "_ensure_schema", lambda self: llamadas.append(1) and False)
+    monkeypatch.setattr(AuthManager, "_ensure_admin", lambda self: None)
+    monkeypatch.setattr(AuthManager, "_ensure_default_empresa", lambda self: None)
+
+    AuthManager()
+    AuthManager()
+    assert len(llamadas) == 2
+
+
+def _manager_sin_bootstrap():
+    with patch.object(AuthManager, "_bootstrap", lambda self: None):
+        return AuthManager()
+
+
+@pytest.mark.parametrize("version, manda_ddl", [(0, True), (AUTH_SCHEMA_VERSION, False)])
+def test_ensure_schema_respeta_version(version, manda_ddl):
+    manager = _manager_sin_bootstrap()
+    with patch("utils.auth._get_conn") as mock_conn:
+        cur = MagicMock()
+        cur.fetchone.return_value = (version,)
+        mock_conn.return_value.cursor.return_value = cur
+        assert manager._ensure_schema() is True
+
+    sentencias = [c.args[0] for c in cur.execute.call_args_list]
+    assert "auth_schema_version" in sentencias[0]
+    assert any("CREATE TABLE IF NOT EXISTS users" in s for s in sentencias) is manda_ddl
+    mock_conn.return_value.commit.assert_called_once()
+
+
+def test_ensure_schema_sin_bd_devuelve_false():
+    manager = _manager_sin_bootstrap()
+    with patch("utils.auth._get_conn", side_effect=KeyError("NEON_DATABASE_URL")):
+        assert manager._ensure_schema() is False
+
+
+def _conn_con_empresas(filas):
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = filas
+    conn.cursor.return_value.rowcount = 1
+    return conn
+
+
+def test_empresas_cacheadas_hasta_invalidar(auth_manager):
+    filas = [{"id": "e1", "rfc": "AAA010101AAA", "razon_social": "Uno",
+              "plan": "essential", "status": "activo", "role_en_empresa": "viewer"}]
+    with patch("utils.auth._get_conn", return_value=_conn_con_empresas(filas)) as mock_conn:
+        primera = auth_manager.get_user_empresas("ana")
+        segunda = auth_manager.get_user_empresas("ana")
+        assert primera == segunda == filas
+        assert mock_conn.call_count == 1
+
+        # La copia devuelta no altera la caché
+        primera[0]["razon_social"] = "cambiada"
+        assert auth_manager.get_user_empresas("ana")[0]["razon_social"] == "Uno"
+
+        ok, _ = auth_manager.add_user_empresa("ana", "e2", "viewer", "admin")
+        assert ok
+        auth_manager.get_user_empresas("ana")
+        # add_user_empresa (1) + recarga tras invalidar (1)
+        assert mock_conn.call_count == 3
+
+        ok, _ = auth_manager.remove_user_empresa("ana", "e2")
+        assert ok
+        auth_manager.get_user_empresas("ana")
+        assert mock_conn.call_count == 5
+
+
+def test_empresas_expiran_por_ttl(auth_manager, monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(auth_module.time, "monotonic", lambda: reloj[0])
+    with patch("utils.auth._get_conn", return_value=_conn_con_empresas([])) as mock_conn:
+        auth_manager.get_user_empresas("ana")
+        reloj[0] += auth_module.MEMBERSHIP_CACHE_TTL_SECONDS - 1
+        auth_manager.get_user_empresas("ana")
+        assert mock_conn.call_count == 1
+        reloj[0] += 2
+        auth_manager.get_user_empresas("ana")
+        assert mock_conn.call_count == 2
+
+
+def test_error_de_bd_no_se_cachea(auth_manager):
+    with patch("utils.auth._get_conn", side_effect=RuntimeError("sin red")):
+        assert auth_manager.get_user_empresas("ana") == []
+    with patch("utils.auth._get_conn", return_value=_conn_con_empresas([{"id": "e1"}])):
+        assert auth_manager.get_user_empresas("ana") == [{"id": "e1"}]
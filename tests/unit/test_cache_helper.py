@@ -0,0 +1,99 @@
+"""
+Tests unitarios para utils/cache_helper.py
+Huella de DataFrames y memoización por sesión de resultados intermedios.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.cache_helper import MemoSesion, calcular_hash_dataframe, huella_dataframe
+
+
+@pytest.fixture
+def cartera():
+    rng = np.random.default_rng(21)
+    n = 2000
+    return pd.DataFrame({
+        "deudor": rng.choice([f"Cliente {i}" for i in range(60)], n),
+        "saldo_adeudado": rng.uniform(0, 90_000, n).round(2),
+        "vencimiento": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 400, n), unit="D"),
+    })
+
+
+class TestHuellaDataframe:
+    """Tests para huella_dataframe / calcular_hash_dataframe"""
+
+    def test_copias_comparten_huella(self, cartera):
+        assert huella_dataframe(cartera) == huella_dataframe(cartera.copy())
+        assert calcular_hash_dataframe(cartera) == huella_dataframe(cartera)
+        assert len(calcular_hash_dataframe(cartera)) == 16
+
+    def test_cambios_de_valor_orden_o_columnas_cambian_la_huella(self, cartera):
+        base = huella_dataframe(cartera)
+
+        modificado = cartera.copy()
+        modificado.loc[10, "saldo_adeudado"] += 0.01
+        invertido = cartera.iloc[::-1].reset_index(drop=True)
+        renombrado = cartera.rename(columns={"deudor": "cliente"})
+
+        assert len({base, huella_dataframe(modificado), huella_dataframe(invertido), huella_dataframe(renombrado)}) == 4
+
+    def test_celdas_no_hasheables(self):
+        df = pd.DataFrame({"tags": [["a"], ["b", "c"]], "n": [1, 2]})
+
+        assert huella_dataframe(df) == huella_dataframe(df.copy())
+        assert huella_dataframe(df) != huella_dataframe(pd.DataFrame({"tags": [["a"], ["b"]], "n": [1, 2]}))
+
+
+class TestMemoSesion:
+    """Tests para MemoSesion (session_state inyectado)"""
+
+    def test_reutiliza_por_huella_y_estado(self, cartera):
+        memo = MemoSesion(session_state={})
+        llamadas = []
+
+        def calcular():
+            llamadas.append(1)
+            return cartera.groupby("deudor")["saldo_adeudado"].sum()
+
+        primero = memo.obtener_o_calcular("aging", cartera, {"corte": pd.Timestamp("2025-06-30")}, calcular)
+        segundo = memo.obtener_o_calcular("aging", cartera.copy(), {"corte": pd.Timestamp("2025-06-30")}, calcular)
+        memo.obtener_o_calcular("aging", cartera, {"corte": pd.Timestamp("2025-07-31")}, calcular)
+
+        assert segundo is primero
+        assert len(llamadas) == 2
+
+        stats = memo.estadisticas()
+        assert stats["aging"]["hits"] == 1
+        assert stats["aging"]["misses"] == 2
+        assert stats["total"]["entradas"] == 2
+
+    def test_estado_con_listas_y_sets_equivale_a_tuplas(self, cartera):
+        memo = MemoSesion(session_state={})
+
+        memo.obtener_o_calcular("pivot", cartera, (["Ana", "Luis"], {"Norte"}), lambda: 1)
+        resultado = memo.obtener_o_calcular("pivot", cartera, (("Ana", "Luis"), frozenset({"Norte"})), lambda: 2)
+
+        assert resultado == 1
+
+    def test_limite_lru_descarta_la_entrada_menos_usada(self, cartera):
+        memo = MemoSesion(max_entradas=2, session_state={})
+
+        memo.obtener_o_calcular("x", cartera, (1,), lambda: "uno")
+        memo.obtener_o_calcular("x", cartera, (2,), lambda: "dos")
+        memo.obtener_o_calcular("x", cartera, (1,), lambda: "nuevo uno")  # hit: pasa al final
+        memo.obtener_o_calcular("x", cartera, (3,), lambda: "tres")
+
+        assert memo.obtener_o_calcular("x", cartera, (1,), lambda: "recalculado") == "uno"
+        assert memo.obtener_o_calcular("x", cartera, (2,), lambda: "recalculado") == "recalculado"
+
+    def test_limpiar_reinicia_entradas_y_contadores(self, cartera):
+        estado = {}
+        memo = MemoSesion(session_state=estado)
+        memo.obtener_o_calcular("x", [cartera, None], (), lambda: 1)
+
+        memo.limpiar()
+
+        assert MemoSesion.CLAVE_ENTRADAS not in estado
+        assert memo.estadisticas()["total"]["misses"] == 0
@@ -0,0 +1,110 @@
+"""
+Tests unitarios para utils/cp_geo.py
+Índice offline CP → coordenadas y backfill en línea en segundo plano.
+"""
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from main import mapa_clientes
+from utils import cp_geo
+from utils.cp_geo import IndiceCP, RellenoCoordenadas, construir_indice
+
+CSV = (
+    "cp,lat,lon,display\n"
+    "44100,20.67,-103.35,Guadalajara\n"
+    "01070,19.34,-99.18,Álvaro Obregón\n"
+    "64000,,,sin resultado\n"
+    "44100,20.68,-103.34,Guadalajara (corregido)\n"
+)
+
+
+@pytest.fixture
+def rutas(tmp_path):
+    csv_path = tmp_path / "cp_coords.csv"
+    csv_path.write_text(CSV, encoding="utf-8")
+    return csv_path, tmp_path / "cp_coords.npy"
+
+
+def test_construir_y_buscar(rutas):
+    csv_path, npy_path = rutas
+    assert construir_indice(csv_path, npy_path) == 2
+
+    indice = IndiceCP.cargar(npy_path, csv_path)
+    assert isinstance(indice._datos, np.memmap)
+    assert list(indice._cps) == [1070, 44100]
+
+    df = indice.buscar(["44100", "01070", "64000", "1070", "abc", "99999"])
+    assert list(df["cp"]) == ["44100", "01070", "64000", "1070", "abc", "99999"]
+    assert df["lat"].iloc[0] == pytest.approx(20.68, abs=1e-4)  # gana la última fila
+    assert df["lon"].iloc[1] == pytest.approx(-99.18, abs=1e-4)
+    assert df["lat"].iloc[2:].isna().all()
+
+
+def test_reconstruye_si_el_csv_es_mas_reciente(rutas):
+    csv_path, npy_path = rutas
+    construir_indice(csv_path, npy_path)
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("64000,25.67,-100.31,Monterrey\n")
+    marca = npy_path.stat().st_mtime + 10
+    os.utime(csv_path, (marca, marca))
+
+    df = IndiceCP.cargar(npy_path, csv_path).buscar(["64000"])
+    assert df["lat"].iloc[0] == pytest.approx(25.67, abs=1e-4)
+
+
+def test_sin_archivos_indice_vacio(tmp_path):
+    indice = IndiceCP.cargar(tmp_path / "no.npy", tmp_path / "no.csv")
+    assert len(indice) == 0
+    assert indice.buscar(["44100"])["lat"].isna().all()
+
+
+def test_relleno_no_bloquea_y_anexa(rutas):
+    csv_path, npy_path = rutas
+    construir_indice(csv_path, npy_path)
+    indice = IndiceCP.cargar(npy_path, csv_path)
+
+    liberar = threading.Event()
+    llamadas = []
+
+    def geocodificar(cp):
+        liberar.wait(5)
+        llamadas.append(cp)
+        return None if cp == "00000" else (25.67, -100.31, "Monterrey")
+
+    relleno = RellenoCoordenadas(indice, geocodificar, pausa=0, csv_path=csv_path)
+    assert relleno.encolar(["64000", "00000", "64000"]) == 2
+    # El geocodificador sigue esperando: encolar ya regresó
+    assert indice.buscar(["64000"])["lat"].isna().all()
+
+    liberar.set()
+    relleno.esperar(5)
+    assert llamadas == ["64000", "00000"]
+    assert relleno.pendientes() == 0
+    assert indice.buscar(["64000"])["lat"].iloc[0] == pytest.approx(25.67)
+    assert csv_path.read_text(encoding="utf-8").endswith("64000,25.67,-100.31,Monterrey\n")
+
+    # Los CPs sin resultado no se vuelven a pedir
+    assert relleno.encolar(["00000"]) == 0
+    relleno.esperar(5)
+    assert llamadas == ["64000", "00000"]
+
+
+def test_cargar_coords_usa_centro_del_estado(rutas, monkeypatch):
+    csv_path, npy_path = rutas
+    construir_indice(csv_path, npy_path)
+    monkeypatch.setattr(cp_geo, "_indice", IndiceCP.cargar(npy_path, csv_path))
+
+    df = mapa_clientes._cargar_coords(["01070", "45000", "abc"]).set_index("cp")
+    assert not df.loc["01070", "aproximada"]
+    assert df.loc["01070", "lat"] == pytest.approx(19.34, abs=1e-4)
+    assert df.loc["45000", "aproximada"]
+    assert (df.loc["45000", "lat"], df.loc["45000", "lon"]) == mapa_clientes._CENTROS_ESTADO["Jalisco"]
+    assert not df.loc["abc", "aproximada"] and np.isnan(df.loc["abc", "lat"])
+
+
+def test_rellenar_desactivado(monkeypatch):
+    monkeypatch.setattr(cp_geo, "GEOCODIFICACION_ONLINE", False)
+    assert cp_geo.rellenar_en_segundo_plano(["64000"]) == 0
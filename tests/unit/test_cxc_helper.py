@@ -19,9 +19,13 @@ from utils.cxc_helper import (
     obtener_semaforo_riesgo,
     obtener_semaforo_concentracion,
     excluir_pagados,
-    detectar_columna
+    detectar_columna,
+    clasificar_antiguedad
+)
+from utils.constantes import (
+    UmbralesCxC, ScoreSalud,
+    BINS_ANTIGUEDAD, LABELS_ANTIGUEDAD, BINS_ANTIGUEDAD_AGENTES, LABELS_ANTIGUEDAD_AGENTES
 )
-from utils.constantes import UmbralesCxC, ScoreSalud
 
 
 class TestDetectarColumna:
@@ -427,3 +431,21 @@ class TestCalcularMetricasBasicas:
         assert metricas['pct_vigente'] == 100.0
         assert metricas['pct_vencida'] == 0.0
         assert metricas['pct_critica'] == 0.0
+
+
+class TestClasificarAntiguedad:
+    """Tests para clasificar_antiguedad (clasificador vectorizado compartido)."""
+
+    @pytest.mark.parametrize("tipo, bins, labels", [
+        ('completo', BINS_ANTIGUEDAD, LABELS_ANTIGUEDAD),
+        ('agentes', BINS_ANTIGUEDAD_AGENTES, LABELS_ANTIGUEDAD_AGENTES),
+    ])
+    def test_equivale_a_pd_cut(self, tipo, bins, labels):
+        df = pd.DataFrame(
+            {'dias_overdue': [np.nan, -10, 0, 0.5, 30, 30.5, 60, 90, 91, 180, 181, 999]},
+            index=range(100, 112),
+        )
+
+        obtenido = clasificar_antiguedad(df, tipo=tipo)
+
+        pd.testing.assert_series_equal(obtenido, pd.cut(df['dias_overdue'], bins=bins, labels=labels))
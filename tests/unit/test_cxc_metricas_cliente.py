@@ -191,6 +191,44 @@ def test_metricas_ordenamiento_por_saldo_desc(df_cxc_multiples_clientes):
     assert resultado.iloc[0]['saldo_total'] == 75000
 
 
+def test_metricas_coinciden_con_bucle_por_deudor():
+    """Test: groupby().agg devuelve el mismo frame (valores, dtypes, orden e índice) que el bucle."""
+    from scripts.profile_performance import _metricas_por_cliente_por_bucle
+    from utils.cxc_metricas_cliente import calcular_metricas_por_cliente
+
+    df_test = pd.DataFrame({
+        'deudor': ['D', 'A', 'B', 'A', 'C', 'D', 'E', 'E', 'B', 'F'],
+        'saldo_adeudado': [500, 1200, 0, 800, 3000, 700, -50, 0, 0, 999],
+        'dias_overdue': [95, -3, 40, 31, 60, 90, 12, 200, 10, 0],
+    })
+
+    resultado = calcular_metricas_por_cliente(df_test)
+
+    pd.testing.assert_frame_equal(resultado, _metricas_por_cliente_por_bucle(df_test))
+    # Saldo no positivo: promedio 0 → Vigente, aunque haya facturas vencidas
+    assert resultado.set_index('deudor').loc['E', 'rango_antiguedad'] == 'Vigente'
+
+
+def test_clasificar_rango_antiguedad_limites():
+    """Test: Límites cerrados a la derecha; NaN cae en '>90 días' como en la versión escalar."""
+    from utils.cxc_metricas_cliente import clasificar_rango_antiguedad
+
+    resultado = clasificar_rango_antiguedad([-5, 0, 0.1, 30, 30.5, 60, 61, 90, 90.01, float('nan')])
+
+    assert list(resultado) == ['Vigente', 'Vigente', '0-30 días', '0-30 días', '31-60 días',
+                               '31-60 días', '61-90 días', '61-90 días', '>90 días', '>90 días']
+
+
+def test_benchmark_metricas_por_cliente_reporta_tiempos():
+    """Test: El benchmark compara ambas versiones y reporta tiempos por tamaño."""
+    from scripts.profile_performance import benchmark_metricas_por_cliente
+
+    resultados = benchmark_metricas_por_cliente(tamanos=(200,), facturas_por_deudor=3)
+
+    assert resultados[0]['deudores'] == 200
+    assert resultados[0]['bucle_s'] > 0 and resultados[0]['agregado_s'] > 0
+
+
 def test_metricas_dataframe_vacio():
     """Test: Retorna DataFrame vacío si input está vacío."""
     from utils.cxc_metricas_cliente import calcular_metricas_por_cliente
@@ -304,3 +342,4 @@ def test_obtener_facturas_cliente_filtra_correctamente():
     # Buscar 'Cliente A' debe retornar 2 facturas
     resultado = obtener_facturas_cliente(df_test, 'Cliente A')
     assert len(resultado) == 2
+    assert list(resultado['rango']) == ['0-30 días', '0-30 días']
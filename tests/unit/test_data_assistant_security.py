@@ -274,6 +274,40 @@ def test_format_numeric_display_dataframe_renders_visible_thousand_separators():
     assert formatted_df.loc[0, "registros"] == "27"
 
 
+def test_numeric_inference_coerces_decimal_and_text_but_not_dates():
+    from decimal import Decimal
+
+    df = pd.DataFrame({
+        "monto": [Decimal("10.50"), Decimal("2000"), None],
+        "ventas_texto": ["$1,234.50", "99", ""],
+        "fecha_venta": pd.to_datetime(["2024-01-01", "2024-02-01", "2024-03-01"]),
+        "cliente": ["A", "B", "C"],
+    })
+
+    coerced = data_assistant._coerce_numeric_like_columns(df)
+
+    assert coerced["monto"].dtype == "float64"
+    assert coerced["monto"].tolist()[:2] == [10.5, 2000.0]
+    assert coerced["ventas_texto"].tolist()[:2] == [1234.5, 99.0]
+    assert pd.api.types.is_datetime64_any_dtype(coerced["fecha_venta"])
+    assert coerced["cliente"].tolist() == ["A", "B", "C"]
+    assert set(data_assistant._build_numeric_column_config(coerced)) == {"monto", "ventas_texto"}
+
+
+def test_format_numeric_display_dataframe_handles_decimal_nulls_and_text():
+    from decimal import Decimal
+
+    df = pd.DataFrame({
+        "monto": [Decimal("1500.5"), None, "n/d"],
+        "crecimiento_pct": [12.345, 12.345, float("nan")],
+    })
+
+    formatted_df = data_assistant._format_numeric_display_dataframe(df)
+
+    assert formatted_df["monto"].tolist() == ["$1,500.50", "", "n/d"]
+    assert formatted_df["crecimiento_pct"].tolist() == ["12.35%", "12.35%", ""]
+
+
 def test_append_chat_message_caps_session_history(monkeypatch):
     monkeypatch.setattr(data_assistant.st, "session_state", {"nl2sql_messages": []}, raising=False)
 
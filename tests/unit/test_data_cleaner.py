@@ -0,0 +1,155 @@
+"""
+Tests unitarios para utils/data_cleaner.py
+Normalización de texto por valores únicos, aliases y limpieza de columnas.
+"""
+
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import data_cleaner
+from utils.data_cleaner import (
+    aplicar_aliases,
+    detectar_duplicados_similares,
+    limpiar_cache_normalizacion,
+    limpiar_columnas_texto,
+    normalizar_serie,
+    normalizar_texto,
+)
+
+
+@pytest.fixture(autouse=True)
+def cache_limpio():
+    limpiar_cache_normalizacion()
+    yield
+    limpiar_cache_normalizacion()
+
+
+@pytest.fixture
+def agentes():
+    rng = np.random.default_rng(5)
+    variantes = ["José García", "JOSE GARCIA", "  josé   garcía ", "María López", "MARIA LOPEZ", None, np.nan, "Agente 7"]
+    return pd.Series(rng.choice(np.array(variantes, dtype=object), 5000), name="agente")
+
+
+def test_normalizar_serie_coincide_con_apply(agentes):
+    esperado = agentes.apply(normalizar_texto)
+
+    pd.testing.assert_series_equal(normalizar_serie(agentes), esperado, check_dtype=False)
+    como_string = agentes.astype("string")
+    assert normalizar_serie(como_string).dropna().tolist() == como_string.apply(normalizar_texto).dropna().tolist()
+
+
+def test_tipos_mezclados_no_se_fusionan():
+    serie = pd.Series([1, 1.0, True, "1", 1], dtype=object)
+
+    assert normalizar_serie(serie).tolist() == serie.apply(normalizar_texto).tolist()
+    assert normalizar_serie(serie).tolist() == ["1", "1.0", "true", "1", "1"]
+
+
+def test_normaliza_cada_valor_distinto_una_sola_vez(agentes, monkeypatch):
+    llamadas = []
+
+    def contar(texto):
+        llamadas.append(texto)
+        return normalizar_texto(texto)
+
+    normalizar_serie(agentes, contar)
+    primera = len(llamadas)
+    normalizar_serie(agentes.iloc[::-1], contar)
+
+    nulos = int(agentes.isna().sum())
+    # 6 valores distintos no nulos; los nulos se pasan directo sin caché
+    assert primera == 6 + nulos
+    assert len(llamadas) == primera + nulos
+
+
+def test_aplicar_aliases_mapea_variantes(agentes):
+    aliases = {"Jose G.": ["jose garcia"], "Maria L.": ["MARÍA LÓPEZ"]}
+
+    resultado = aplicar_aliases(agentes, aliases)
+
+    esperado = agentes.apply(lambda x: {"jose garcia": "Jose G.", "maria lopez": "Maria L."}.get(
+        normalizar_texto(x), normalizar_texto(x)))
+    pd.testing.assert_series_equal(resultado, esperado, check_dtype=False)
+
+
+def test_limpiar_columnas_texto_no_modifica_original():
+    df = pd.DataFrame({"agente": ["José García", "MARIA LOPEZ"], "valor_mxn": [100, 200]})
+
+    limpio = limpiar_columnas_texto(df, columnas=["agente"], usar_aliases=False)
+
+    assert limpio["agente"].tolist() == ["jose garcia", "maria lopez"]
+    assert df["agente"].tolist() == ["José García", "MARIA LOPEZ"]
+
+
+def test_cache_acotado(monkeypatch):
+    monkeypatch.setattr(data_cleaner, "MAX_TEXTOS_NORMALIZADOS_EN_CACHE", 3)
+
+    normalizar_serie(pd.Series([f"Cliente {i}" for i in range(10)]))
+
+    assert data_cleaner._normalizadores_cacheados[normalizar_texto].cache_info().currsize == 3
+
+
+def _duplicados_por_pares(serie, umbral=0.85):
+    """Comparación exhaustiva original, como referencia."""
+    valores = serie.dropna().unique()
+    duplicados = []
+    for i, val1 in enumerate(valores):
+        for val2 in valores[i + 1:]:
+            similitud = SequenceMatcher(None, normalizar_texto(val1), normalizar_texto(val2)).ratio()
+            if similitud >= umbral:
+                duplicados.append((val1, val2, round(similitud, 2)))
+    return sorted(duplicados, key=lambda x: x[2], reverse=True)
+
+
+@pytest.fixture
+def catalogo_clientes():
+    from scripts.profile_performance import generar_nombres_clientes
+
+    nombres, variantes = generar_nombres_clientes(400, pct_variantes=0.2, seed=9)
+    return pd.Series(nombres + ["José García", "JOSE GARCIA", None, "jose  garcia"]), variantes
+
+
+def test_duplicados_exhaustivo_coincide_con_comparacion_por_pares(catalogo_clientes, monkeypatch):
+    serie = catalogo_clientes[0].iloc[:150]
+    serie = pd.concat([serie, catalogo_clientes[0].iloc[-4:]])
+    monkeypatch.setattr(data_cleaner, "LIMITE_COMPARACION_EXHAUSTIVA", 1_000)
+
+    assert detectar_duplicados_similares(serie) == _duplicados_por_pares(serie)
+
+
+def test_duplicados_por_bloqueo_encuentra_variantes(catalogo_clientes, monkeypatch):
+    serie, variantes = catalogo_clientes
+    monkeypatch.setattr(data_cleaner, "LIMITE_COMPARACION_EXHAUSTIVA", 10)
+    avances = []
+
+    resultado = detectar_duplicados_similares(serie, progreso=lambda hechos, total: avances.append((hechos, total)))
+
+    encontrados = {frozenset((a, b)) for a, b, _ in resultado}
+    assert all(
+        SequenceMatcher(None, normalizar_texto(a), normalizar_texto(b)).ratio() >= 0.85 for a, b, _ in resultado
+    )
+    assert all(frozenset(par) in encontrados for par in variantes if par[0] != par[1])
+    assert {frozenset(("José García", "JOSE GARCIA")), frozenset(("JOSE GARCIA", "jose  garcia"))} <= encontrados
+    assert avances[-1][0] == avances[-1][1]
+    assert [s for _, _, s in resultado] == sorted((s for _, _, s in resultado), reverse=True)
+
+
+def test_duplicados_con_pool_de_procesos(catalogo_clientes, monkeypatch):
+    serie = catalogo_clientes[0]
+    monkeypatch.setattr(data_cleaner, "LIMITE_COMPARACION_EXHAUSTIVA", 10)
+    monkeypatch.setattr(data_cleaner, "TAMANO_LOTE_SIMILITUD", 50)
+
+    assert detectar_duplicados_similares(serie, n_procesos=2) == detectar_duplicados_similares(serie)
+
+
+def test_benchmark_duplicados_reporta_escalamiento():
+    from scripts.profile_performance import benchmark_duplicados_similares
+
+    resultados = benchmark_duplicados_similares(tamanos=(400, 800))
+
+    assert [r["nombres"] for r in resultados] == [400, 800]
+    assert all(r["recall_variantes"] >= 0.9 for r in resultados)
@@ -1,7 +1,8 @@
 """
 Tests extendidos para utils/data_normalizer.py
 Cubre funciones adicionales: normalizar_columna_saldo, normalizar_columna_valor,
-limpiar_valores_monetarios, detectar_columnas_cxc, excluir_pagados, normalizar_columna_fecha
+limpiar_valores_monetarios, detectar_columnas_cxc, excluir_pagados, normalizar_columna_fecha,
+tipar_columnas_carga
 
 Objetivo: Aumentar coverage de 25.93% a 80%+
 """
@@ -14,7 +15,8 @@ from utils.data_normalizer import (
     limpiar_valores_monetarios,
     detectar_columnas_cxc,
     excluir_pagados,
-    normalizar_columna_fecha
+    normalizar_columna_fecha,
+    tipar_columnas_carga,
 )
 
 
@@ -220,3 +222,77 @@ class TestNormalizarColumnaFecha:
         
         assert pd.api.types.is_datetime64_any_dtype(df_norm['fecha'])
         assert len(df_norm) == 2
+
+
+class TestTiparColumnasCarga:
+    """Tests para tipar_columnas_carga()"""
+
+    @pytest.fixture
+    def df_cargado(self):
+        return pd.DataFrame({
+            'fecha': ['2024-01-05', '2024-02-10', 'sin fecha', '2024-03-01'],
+            'fecha_de_pago': ['2024-02-05', None, '2024-04-10', '2024-04-01'],
+            'fecha_texto': ['enero', 'febrero', 'marzo', 'abril'],
+            'cliente': ['ACME', 'Beta', None, 'ACME'],
+            'vendedor': ['ana', 'luis', 'ana', 'ana'],
+            'producto': ['P1', 2, 'P3', 'P1'],
+            'folio': [1001, 1002, 1003, 1004],
+            'ventas_usd': [100.25, 200.5, 50.0, 75.125],
+        })
+
+    def test_tipa_texto_fechas_y_enteros(self, df_cargado):
+        """Test: Texto a Arrow, fechas a datetime, enteros a int32; flotantes intactos."""
+        df, reporte = tipar_columnas_carga(df_cargado)
+
+        assert pd.api.types.is_string_dtype(df['cliente'])
+        assert not pd.api.types.is_object_dtype(df['cliente'])
+        assert pd.api.types.is_datetime64_any_dtype(df['fecha'])
+        assert pd.isna(df['fecha'].iloc[2])
+        assert pd.api.types.is_datetime64_any_dtype(df['fecha_de_pago'])
+        assert df['folio'].dtype == 'int32'
+        assert df['ventas_usd'].dtype == 'float64'
+        # Columnas mixtas o que no parsean como fecha se dejan como estaban
+        assert df['producto'].dtype == object
+        assert df['fecha_texto'].dtype == object
+        assert set(reporte['columnas']) == {'fecha', 'fecha_de_pago', 'cliente', 'vendedor', 'folio'}
+        assert reporte['despues_bytes'] < reporte['antes_bytes']
+
+    def test_cantidades_e_importes_enteros_no_desbordan(self):
+        """Test: Solo los códigos bajan a int32; cantidad * precio sigue en int64."""
+        df_cargado = pd.DataFrame({
+            'folio': [1, 2],
+            'cantidad': [60000, 70000],
+            'precio_unitario': [50000, 40000],
+        })
+
+        df, _ = tipar_columnas_carga(df_cargado)
+
+        assert df['folio'].dtype == 'int32'
+        assert df['cantidad'].dtype == 'int64'
+        importe = df['cantidad'] * df['precio_unitario']
+        assert importe.tolist() == [3_000_000_000, 2_800_000_000]
+        assert importe.sum() == 5_800_000_000
+
+    def test_conserva_semantica_de_object(self, df_cargado):
+        """Test: Máscaras, NaN, groupby y asignación se comportan igual que con object."""
+        df, _ = tipar_columnas_carga(df_cargado)
+
+        mask = df['cliente'] == 'ACME'
+        assert mask.dtype == bool
+        assert df.loc[mask, 'ventas_usd'].sum() == pytest.approx(175.375)
+        assert df['cliente'].isna().sum() == 1
+        assert df.groupby('cliente')['ventas_usd'].sum().to_dict() == \
+            df_cargado.groupby('cliente')['ventas_usd'].sum().to_dict()
+
+        df['cliente'] = df['cliente'].fillna('Sin cliente')
+        df.loc[0, 'vendedor'] = 'nuevo vendedor'
+        assert df['cliente'].iloc[2] == 'Sin cliente'
+        assert df['vendedor'].iloc[0] == 'nuevo vendedor'
+
+    def test_no_modifica_el_original(self, df_cargado):
+        """Test: El DataFrame de entrada conserva sus dtypes."""
+        dtypes = df_cargado.dtypes.copy()
+
+        tipar_columnas_carga(df_cargado)
+
+        pd.testing.assert_series_equal(df_cargado.dtypes, dtypes)
@@ -0,0 +1,130 @@
+"""
+Tests unitarios para utils/export_helper.py
+Exportación a Excel con memoria acotada y alternativas comprimidas.
+"""
+import io
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import export_helper
+from utils.export_helper import (
+    LibroExcelStreaming,
+    crear_excel_cobranza_semanal,
+    crear_excel_metricas_cxc,
+    exportar_detalle_comprimido,
+    requiere_export_alterno,
+    ultimas_exportaciones,
+)
+
+
+@pytest.fixture
+def df_detalle():
+    n = 2_500
+    return pd.DataFrame({
+        'deudor': [f"Cliente {i % 40}" for i in range(n)],
+        'saldo_adeudado': np.round(np.linspace(10, 5_000, n), 2),
+        'dias_overdue': [np.nan if i % 7 == 0 else float(i % 120) for i in range(n)],
+        'fecha': pd.date_range('2025-01-01', periods=n, freq='h'),
+    })
+
+
+def test_escribe_por_bloques_en_orden(df_detalle):
+    with LibroExcelStreaming("prueba", filas_por_bloque=300) as libro:
+        libro.escribir_dataframe('Datos', df_detalle, ancho_max=40)
+        contenido = libro.cerrar()
+
+    leido = pd.read_excel(io.BytesIO(contenido), sheet_name='Datos', engine='openpyxl')
+    assert len(leido) == len(df_detalle)
+    assert leido['deudor'].tolist() == df_detalle['deudor'].tolist()
+    assert leido['dias_overdue'].isna().sum() == df_detalle['dias_overdue'].isna().sum()
+    assert (leido['fecha'] == df_detalle['fecha']).all()
+
+
+def test_directorio_temporal_se_elimina(df_detalle):
+    with LibroExcelStreaming("prueba") as libro:
+        libro.escribir_dataframe('Datos', df_detalle.head(10))
+        libro.cerrar()
+        tmpdir = os.path.dirname(libro.ruta)
+        assert os.path.isdir(tmpdir)
+    assert not os.path.exists(tmpdir)
+
+
+def test_objetos_sin_tipo_excel_como_texto():
+    df = pd.DataFrame({'a': [[1, 2], {'k': 1}], 'b': [1, 2]})
+    with LibroExcelStreaming("prueba") as libro:
+        libro.escribir_dataframe('Datos', df)
+        contenido = libro.cerrar()
+    leido = pd.read_excel(io.BytesIO(contenido), engine='openpyxl')
+    assert leido['a'].tolist() == ['[1, 2]', "{'k': 1}"]
+
+
+def test_metricas_cxc_hojas_y_detalle(df_detalle):
+    metricas = {'total_adeudado': 1000, 'vigente': 600, 'vencida': 400,
+                'pct_vigente': 60.0, 'pct_vencida': 40.0, 'clasificacion_salud': 'Bueno'}
+    df_ant = pd.DataFrame({'rango': ['0-30', '>90'], 'saldo': [10.0, 20.0]})
+
+    contenido = crear_excel_metricas_cxc(metricas, df_detalle, df_antiguedad=df_ant)
+
+    hojas = pd.read_excel(io.BytesIO(contenido), sheet_name=None, engine='openpyxl')
+    assert list(hojas) == ['Resumen Ejecutivo', 'Detalle CxC', 'Antigüedad']
+    detalle = hojas['Detalle CxC']
+    assert len(detalle) == len(df_detalle)
+    # dias_overdue sin nulos y entero, como antes
+    assert detalle['dias_overdue'].tolist() == df_detalle['dias_overdue'].fillna(0).astype(int).tolist()
+    # El DataFrame de entrada no se modifica
+    assert df_detalle['dias_overdue'].isna().any()
+
+    stats = ultimas_exportaciones(1)[-1]
+    assert stats.nombre == 'reporte_cxc'
+    assert stats.bytes == len(contenido)
+    assert stats.filas == len(df_detalle) + len(df_ant)
+
+
+def test_cobranza_semanal_ordenada():
+    df = pd.DataFrame({
+        'deudor': ['A', 'B', 'C'],
+        'monto': [100.0, 300.0, 200.0],
+        'dias_max': [10, 95, 40],
+        'documentos': [1, 3, 2],
+        'score': [20.0, 90.0, 55.0],
+        'nivel': ['🟢 BAJA', '🔴 URGENTE', '🟡 MEDIA'],
+        'nivel_num': [4, 1, 3],
+    })
+    contenido = crear_excel_cobranza_semanal(df)
+    lista = pd.read_excel(io.BytesIO(contenido), sheet_name='Lista Cobranza', header=2, engine='openpyxl')
+    assert lista['Cliente'].tolist() == ['B', 'C', 'A']
+    resumen = pd.read_excel(io.BytesIO(contenido), sheet_name='Resumen', header=2, engine='openpyxl')
+    assert resumen.iloc[-1]['Saldo Total ($)'] == 600.0
+
+
+@pytest.mark.parametrize("formato", ["csv", "parquet"])
+def test_detalle_comprimido_ida_y_vuelta(df_detalle, formato):
+    if formato == "parquet" and not export_helper.PYARROW_AVAILABLE:
+        pytest.skip("pyarrow no instalado")
+    contenido = exportar_detalle_comprimido(df_detalle, "detalle", formato, filas_por_bloque=700)
+
+    with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+        assert zf.namelist() == [f"detalle.{formato}"]
+        with zf.open(f"detalle.{formato}") as f:
+            if formato == "csv":
+                leido = pd.read_csv(f, encoding="utf-8-sig", parse_dates=['fecha'])
+            else:
+                leido = pd.read_parquet(io.BytesIO(f.read()))
+    pd.testing.assert_frame_equal(leido, df_detalle, check_dtype=False)
+    assert ultimas_exportaciones(1)[-1].formato == f"{formato}.zip"
+
+
+def test_detalle_comprimido_formato_invalido(df_detalle):
+    with pytest.raises(ValueError):
+        exportar_detalle_comprimido(df_detalle, formato="xls")
+
+
+def test_requiere_export_alterno(monkeypatch):
+    monkeypatch.setattr(export_helper, "MAX_FILAS_EXCEL_DETALLE", 5)
+    assert requiere_export_alterno(pd.DataFrame({'a': range(6)}))
+    assert not requiere_export_alterno(pd.DataFrame({'a': range(5)}))
+    assert not requiere_export_alterno(None)
@@ -0,0 +1,102 @@
+"""
+Tests unitarios para utils/export_jobs.py
+Cola de exportaciones en segundo plano.
+"""
+import io
+import threading
+from functools import partial
+
+import pandas as pd
+import pytest
+
+from utils.export_jobs import ERROR, LISTO, ColaExportaciones
+
+
+@pytest.fixture
+def cola():
+    return ColaExportaciones(max_hilos=2, max_trabajos=3)
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({'cliente': ['A', 'B'], 'saldo': [10.0, 20.0]})
+
+
+def test_genera_en_segundo_plano_y_reutiliza(cola, df):
+    llamadas = []
+
+    def generar(datos, progreso):
+        llamadas.append(1)
+        progreso(0.5, "Mitad")
+        return datos.to_csv(index=False)
+
+    trabajo = cola.enviar("csv", df, {"p": 1}, partial(generar, df))
+    cola.esperar(trabajo, timeout=5)
+    assert trabajo.estado == LISTO
+    assert trabajo.resultado == df.to_csv(index=False).encode("utf-8")
+    assert trabajo.progreso == 1.0
+    assert trabajo.duracion >= 0
+
+    # Mismos datos (otra copia) y parámetros: mismo trabajo, sin recalcular
+    otra = cola.enviar("csv", df.copy(), {"p": 1}, partial(generar, df))
+    assert otra is trabajo
+    assert len(llamadas) == 1
+
+    # Cambian los parámetros: trabajo nuevo
+    nuevo = cola.enviar("csv", df, {"p": 2}, partial(generar, df))
+    cola.esperar(nuevo, timeout=5)
+    assert nuevo is not trabajo
+    assert len(llamadas) == 2
+
+
+def test_no_bloquea_al_encolar(cola, df):
+    liberar = threading.Event()
+
+    def generar():
+        liberar.wait(5)
+        return b"ok"
+
+    trabajo = cola.enviar("lento", df, (), generar, con_progreso=False)
+    assert not trabajo.terminado
+    assert cola.obtener("lento", df) is trabajo
+    liberar.set()
+    cola.esperar(trabajo, timeout=5)
+    assert trabajo.resultado == b"ok"
+
+
+def test_bytesio_se_convierte(cola, df):
+    trabajo = cola.enviar("excel", df, (), lambda: io.BytesIO(b"xlsx"), con_progreso=False)
+    assert cola.esperar(trabajo, timeout=5).resultado == b"xlsx"
+
+
+def test_error_se_reintenta(cola, df):
+    intentos = []
+
+    def generar():
+        intentos.append(1)
+        if len(intentos) == 1:
+            raise ValueError("falló")
+        return b"ok"
+
+    trabajo = cola.enviar("pdf", df, (), generar, con_progreso=False)
+    cola.esperar(trabajo, timeout=5)
+    assert trabajo.estado == ERROR
+    assert "falló" in trabajo.error
+
+    reintento = cola.enviar("pdf", df, (), generar, con_progreso=False)
+    assert reintento is not trabajo
+    assert cola.esperar(reintento, timeout=5).resultado == b"ok"
+
+
+def test_limite_de_trabajos_terminados(cola, df):
+    trabajos = [
+        cola.esperar(cola.enviar("csv", df, {"i": i}, lambda: b"x", con_progreso=False), timeout=5)
+        for i in range(5)
+    ]
+    registrados = cola.trabajos()
+    assert len(registrados) <= 4
+    assert trabajos[-1] in registrados
+    assert trabajos[0] not in registrados
+
+    cola.limpiar()
+    assert cola.trabajos() == []
@@ -0,0 +1,127 @@
+"""
+Tests unitarios para utils.filters.
+
+Valida:
+- VistaFiltrada: máscaras memoizadas por estado, conteos sin materializar
+- filtrar_vista_*: equivalencia con el filtrado en cascada sobre copias
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import filters
+from utils.filters import (
+    VistaFiltrada,
+    filtrar_vista_cliente,
+    filtrar_vista_fechas,
+    filtrar_vista_monto,
+)
+
+
+@pytest.fixture
+def ventas():
+    rng = np.random.default_rng(5)
+    n = 3000
+    fechas = pd.Series(pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 500, n), unit="D"))
+    fechas[rng.random(n) < 0.02] = pd.NaT
+    return pd.DataFrame({
+        "fecha": fechas,
+        "cliente": rng.choice([f"Cliente {i}" for i in range(40)], n),
+        "ventas_usd": rng.uniform(100, 150_000, n).round(2),
+    })
+
+
+class TestVistaFiltrada:
+    """Tests para VistaFiltrada"""
+
+    def test_sin_filtros_devuelve_la_base_sin_copiar(self, ventas):
+        vista = VistaFiltrada(ventas)
+
+        assert vista.df is ventas
+        assert vista.n_filtradas == vista.n_total == len(ventas)
+        assert not vista.hay_filtros
+
+    def test_mascara_se_memoiza_por_estado(self, ventas):
+        vista = VistaFiltrada(ventas)
+        llamadas = []
+
+        def calcular():
+            llamadas.append(1)
+            return (ventas["cliente"] == "Cliente 3").to_numpy()
+
+        vista.aplicar("cliente", ("Cliente 3",), calcular)
+        primera = vista.df
+        vista.iniciar()
+        vista.aplicar("cliente", ("Cliente 3",), calcular)
+
+        assert len(llamadas) == 1
+        assert vista.df is primera
+        assert vista.n_filtradas == (ventas["cliente"] == "Cliente 3").sum()
+
+        vista.aplicar("cliente", ("Cliente 4",), lambda: (ventas["cliente"] == "Cliente 4").to_numpy())
+        assert vista.df is not primera
+
+    def test_mascaras_se_combinan_como_cascada(self, ventas):
+        vista = VistaFiltrada(ventas)
+        vista.aplicar("monto", (0, 50_000), lambda: ventas["ventas_usd"].between(0, 50_000).to_numpy())
+        vista.aplicar("cliente", ("Cliente 1", "Cliente 2"),
+                      lambda: ventas["cliente"].isin(["Cliente 1", "Cliente 2"]).to_numpy())
+
+        esperado = ventas[ventas["ventas_usd"].between(0, 50_000)]
+        esperado = esperado[esperado["cliente"].isin(["Cliente 1", "Cliente 2"])]
+
+        pd.testing.assert_frame_equal(vista.df, esperado)
+        assert vista.valores_unicos("cliente") == ["Cliente 1", "Cliente 2"]
+
+        vista.iniciar()
+        assert vista.df is ventas
+
+    def test_es_derivado_reconoce_el_mismo_dataset(self, ventas):
+        vista = VistaFiltrada(ventas)
+        vista.aplicar("cliente", ("Cliente 1",), lambda: (ventas["cliente"] == "Cliente 1").to_numpy())
+
+        assert vista.es_derivado(ventas)
+        assert vista.es_derivado(vista.df)
+        assert vista.es_derivado(ventas.copy())
+
+        distinto = ventas.copy()
+        distinto.loc[0, "ventas_usd"] += 1
+        assert not vista.es_derivado(distinto)
+
+
+class TestFiltrarVista:
+    """Tests para los widgets que registran máscaras (widgets con valores por defecto)"""
+
+    def test_fechas_rango_completo_descarta_nat(self, ventas):
+        vista = VistaFiltrada(ventas)
+
+        filtrar_vista_fechas(vista, "fecha")
+
+        pd.testing.assert_frame_equal(vista.df, ventas.dropna(subset=["fecha"]))
+
+    def test_fechas_rango_incluye_dias_completos(self, ventas, monkeypatch):
+        seleccion = iter([date(2024, 3, 1), date(2024, 3, 31)])
+        monkeypatch.setattr(filters.st, "date_input", lambda *a, **k: next(seleccion))
+        vista = VistaFiltrada(ventas)
+
+        filtrar_vista_fechas(vista, "fecha")
+
+        dias = ventas["fecha"].dt.date
+        esperado = ventas[(dias >= date(2024, 3, 1)) & (dias <= date(2024, 3, 31))]
+        pd.testing.assert_frame_equal(vista.df, esperado)
+
+    def test_cliente_y_monto_en_cascada(self, ventas, monkeypatch):
+        monkeypatch.setattr(filters.st, "multiselect", lambda *a, **k: ["Cliente 7", "Cliente 9"])
+        monkeypatch.setattr(filters.st, "slider", lambda *a, **k: (1_000.0, 20_000.0))
+        vista = VistaFiltrada(ventas)
+
+        filtrar_vista_cliente(vista, "cliente")
+        filtrar_vista_monto(vista, "ventas_usd")
+
+        esperado = ventas[ventas["cliente"].isin(["Cliente 7", "Cliente 9"])]
+        esperado = esperado[esperado["ventas_usd"].between(1_000, 20_000)]
+        pd.testing.assert_frame_equal(vista.df, esperado)
+        assert vista.n_filtradas == len(esperado)
@@ -1,10 +1,11 @@
 import pandas as pd
 
 from main import fiscal
+from utils import neon_consultas
 
 
-def test_query_conceptos_includes_join_and_objeto_imp_logic():
-    # Validamos indirectamente la consulta al forzar ejecución con cursor mock.
+def test_query_conceptos_includes_join_and_objeto_imp_logic(monkeypatch):
+    # Validamos la consulta al ejecutarla con una conexión simulada.
     captured = {"sql": "", "params": None}
 
     class FakeCursor:
@@ -26,6 +27,9 @@ def test_query_conceptos_includes_join_and_objeto_imp_logic():
         def fetchall(self):
             return []
 
+        def close(self):
+            return None
+
     class FakeConn:
         def cursor(self):
             return FakeCursor()
@@ -33,20 +37,28 @@ def test_query_conceptos_includes_join_and_objeto_imp_logic():
         def close(self):
             return None
 
-    original_connect = fiscal.psycopg2.connect
-    fiscal.psycopg2.connect = lambda _: FakeConn()
-    try:
-        df = fiscal._cargar_impuestos_por_concepto("empresa-x", "postgres://dummy")
-    finally:
-        fiscal.psycopg2.connect = original_connect
+    monkeypatch.setattr(neon_consultas, "obtener_conexion", lambda _: FakeConn())
+    consulta = next(c for c in fiscal._consultas_ventas("empresa-x") if c.id == "impuestos_por_concepto")
+    df = neon_consultas.ejecutar_consulta("postgres://dummy", consulta.sql, consulta.params)
 
     assert isinstance(df, pd.DataFrame)
+    assert list(df.columns) == [d[0] for d in FakeCursor.description]
     assert captured["params"] == ("empresa-x",)
     assert "FROM cfdi_conceptos cc" in captured["sql"]
     assert "JOIN cfdi_ventas cv ON cv.id = cc.cfdi_venta_id" in captured["sql"]
     assert "CASE WHEN cc.objeto_imp = '02'" in captured["sql"]
 
 
+def test_consultas_ventas_filtran_por_empresa():
+    consultas = fiscal._consultas_ventas("empresa-x")
+    assert [c.id for c in consultas] == [
+        "fiscal", "tendencia_fiscal", "retenciones", "retenciones_kpi", "impuestos_por_concepto",
+    ]
+    for consulta in consultas + fiscal._consultas_nomina("empresa-x"):
+        assert consulta.params == ("empresa-x",)
+        assert "empresa_id = %s" in consulta.sql
+
+
 def test_objeto_imp_exento_calculation_is_zero_iva():
     df = pd.DataFrame(
         {
@@ -4,7 +4,14 @@ Funciones de formateo de datos.
 """
 import pytest
 import math
+import numpy as np
+import pandas as pd
 from utils.formatos import (
+    FORMATOS_COLUMNA,
+    columna_numerica,
+    formatear_columnas,
+    formatear_serie,
+    formatos_styler,
     formato_moneda,
     formato_numero,
     formato_porcentaje,
@@ -182,3 +189,45 @@ class TestFormatoDeltaMoneda:
     
     def test_cero(self):
         assert formato_delta_moneda(0) == "$0.00"
+
+
+
+class TestFormatosColumna:
+    """Tests para el formato de tablas sin copias de texto."""
+
+    def test_formatear_serie_igual_a_lambda(self):
+        serie = pd.Series([1234.5, -0.004, 1e9, 0.0])
+        esperado = serie.apply(lambda x: f"${x:,.2f}")
+        assert formatear_serie(serie, "moneda").tolist() == esperado.tolist()
+
+    def test_formatear_serie_nulos_y_no_numericos(self):
+        serie = pd.Series([12.34, None, np.nan, "abc", np.inf], index=list("abcde"), name="pct")
+        resultado = formatear_serie(serie, "porcentaje", nulo="-")
+        assert resultado.tolist() == ["12.3%", "-", "-", "-", "-"]
+        assert list(resultado.index) == list("abcde")
+        assert resultado.name == "pct"
+
+    def test_formatear_columnas_no_muta(self):
+        df = pd.DataFrame({"saldo": [10.0, 2500.5], "dias": [3.0, 91.0], "cliente": ["A", "B"]})
+        resultado = formatear_columnas(df, {"saldo": "moneda_entera", "dias": "dias"})
+        assert resultado["saldo"].tolist() == ["$10", "$2,500"]
+        assert resultado["dias"].tolist() == ["3 días", "91 días"]
+        assert df["saldo"].dtype == "float64"
+
+    def test_formatos_styler(self):
+        assert formatos_styler({"total": "moneda", "pct": "porcentaje_2"}) == {
+            "total": "${:,.2f}",
+            "pct": "{:.2f}%",
+        }
+
+    @pytest.mark.parametrize("tipo", sorted(FORMATOS_COLUMNA))
+    def test_columna_numerica(self, tipo):
+        columna = columna_numerica(tipo, "Etiqueta", width="small")
+        formato, step, _ = FORMATOS_COLUMNA[tipo]
+        assert columna["label"] == "Etiqueta"
+        assert columna["type_config"]["format"] == formato
+        assert columna["type_config"].get("step") == step
+
+    def test_tipo_desconocido(self):
+        with pytest.raises(KeyError):
+            formatear_serie(pd.Series([1.0]), "inexistente")
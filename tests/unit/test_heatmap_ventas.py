@@ -610,6 +610,66 @@ class TestCalcularTablaCrecimientoReal:
         assert status_table.loc['24.02 - Feb', 'Linea A'] == 'comparable'
         assert growth_table.loc['24.02 - Feb', 'Linea A'] == pytest.approx(25.0, rel=0.01)
 
+    @staticmethod
+    def _tabla_crecimiento_por_periodo(df_filtered, df_period_order, periodo_tipo, tipo_comparacion):
+        """Implementación previa (un período por iteración), usada como referencia."""
+        from main.heatmap_ventas import obtener_offset_comparacion
+
+        offset, comparacion_label = obtener_offset_comparacion(periodo_tipo, tipo_comparacion)
+        periodos_ordenados = df_period_order.loc[df_filtered.index].sort_values()
+        etiquetas_ordenadas = periodos_ordenados.index.tolist()
+        etiqueta_por_periodo = {periodo: etiqueta for etiqueta, periodo in periodos_ordenados.items()}
+
+        growth_table = pd.DataFrame(index=etiquetas_ordenadas, columns=df_filtered.columns, dtype=float)
+        status_table = pd.DataFrame(index=etiquetas_ordenadas, columns=df_filtered.columns, dtype=object)
+
+        for etiqueta_actual in etiquetas_ordenadas:
+            periodo_actual = df_period_order.loc[etiqueta_actual]
+            if pd.isna(periodo_actual):
+                continue
+            etiqueta_base = etiqueta_por_periodo.get(periodo_actual - offset)
+            if etiqueta_base is None:
+                status_table.loc[etiqueta_actual] = 'sin_comparable'
+                continue
+
+            valores_actuales = df_filtered.loc[etiqueta_actual]
+            valores_base = df_filtered.loc[etiqueta_base]
+            crecimiento = ((valores_actuales - valores_base) / valores_base.replace(0, np.nan)) * 100
+            crecimiento[(valores_base == 0) & (valores_actuales > 0)] = np.inf
+            crecimiento[(valores_base == 0) & (valores_actuales == 0)] = np.nan
+            growth_table.loc[etiqueta_actual] = crecimiento
+
+            estados = pd.Series('comparable', index=df_filtered.columns, dtype=object)
+            estados[(valores_base == 0) & (valores_actuales > 0)] = 'nuevo'
+            estados[(valores_base == 0) & (valores_actuales == 0)] = 'sin_actividad'
+            status_table.loc[etiqueta_actual] = estados
+
+        return growth_table.reindex(df_filtered.index), status_table.reindex(df_filtered.index), comparacion_label
+
+    @pytest.mark.parametrize("periodo_tipo, freq", [("Mensual", "MS"), ("Trimestral", "QS"), ("Anual", "YS")])
+    @pytest.mark.parametrize("tipo_comparacion", ["Período anterior", "Mismo período año anterior"])
+    def test_coincide_celda_por_celda_con_calculo_por_periodo(self, periodo_tipo, freq, tipo_comparacion):
+        """Test: la versión vectorizada reproduce la tabla del recorrido por período."""
+        from main.heatmap_ventas import calcular_tabla_crecimiento
+
+        rng = np.random.default_rng(5)
+        periodos = pd.date_range('2019-01-01', periods=40, freq=freq)
+        periodos = periodos[rng.random(len(periodos)) > 0.2]  # huecos en la secuencia
+        etiquetas = [f"{p:%y.%m} - P{i}" for i, p in enumerate(periodos)]
+
+        valores = rng.choice([0, 0, 50, 120, 300, -40], size=(len(periodos), 25)).astype(float)
+        df_filtered = pd.DataFrame(valores, index=etiquetas, columns=[f"Linea {i}" for i in range(25)])
+        df_filtered = df_filtered.sample(frac=1, random_state=1)  # orden de filas arbitrario
+        df_period_order = pd.Series(periodos, index=etiquetas).reindex(df_filtered.index)
+
+        esperado = self._tabla_crecimiento_por_periodo(df_filtered, df_period_order, periodo_tipo, tipo_comparacion)
+        obtenido = calcular_tabla_crecimiento(df_filtered, df_period_order, periodo_tipo, tipo_comparacion)
+
+        pd.testing.assert_frame_equal(obtenido[0], esperado[0])
+        pd.testing.assert_frame_equal(obtenido[1], esperado[1])
+        assert obtenido[2] == esperado[2]
+        assert (obtenido[1] == 'comparable').any().any()
+
 
 class TestInsightsHeatmap:
     """Valida la síntesis automática de insights del heatmap."""
@@ -0,0 +1,99 @@
+"""
+Tests unitarios para utils/huella.py
+Huella por bloques de columna, cacheada por objeto y extensible tras un append.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import huella
+from utils.huella import huella_columnas, huella_dataframe, huella_tras_append, limpiar_cache_huellas
+
+
+@pytest.fixture(autouse=True)
+def bloques_chicos(monkeypatch):
+    # Bloques pequeños para ejercitar la reutilización con pocos datos
+    monkeypatch.setattr(huella, "FILAS_BLOQUE_HUELLA", 100)
+    limpiar_cache_huellas()
+    yield
+    limpiar_cache_huellas()
+
+
+@pytest.fixture
+def ventas():
+    rng = np.random.default_rng(13)
+    n = 1050
+    return pd.DataFrame({
+        "fecha": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D"),
+        "cliente": rng.choice([f"Cliente {i}" for i in range(30)], n),
+        "linea": pd.Categorical(rng.choice(["Dykem", "ACMOS"], n)),
+        "unidades": pd.array(rng.integers(0, 9, n), dtype="Int64"),
+        "ventas_usd": rng.uniform(10, 5000, n).round(2),
+    })
+
+
+@pytest.fixture
+def contador_bloques(monkeypatch):
+    llamadas = []
+    original = huella._digest_bloque
+    monkeypatch.setattr(huella, "_digest_bloque", lambda *a: llamadas.append(a[1:]) or original(*a))
+    return llamadas
+
+
+def test_huella_depende_del_contenido_no_del_objeto(ventas):
+    base = huella_dataframe(ventas)
+
+    assert huella_dataframe(ventas.copy()) == base
+
+    otro_valor = ventas.copy()
+    otro_valor.loc[1049, "cliente"] = "Cliente nuevo"
+    otro_orden = ventas.iloc[::-1].reset_index(drop=True)
+    otro_indice = ventas.set_axis(ventas.index + 1)
+    otro_dtype = ventas.astype({"ventas_usd": "float32"})
+
+    huellas = {base} | {huella_dataframe(d) for d in (otro_valor, otro_orden, otro_indice, otro_dtype)}
+    assert len(huellas) == 5
+
+
+def test_huella_se_cachea_en_el_objeto(ventas, contador_bloques):
+    primera = huella_dataframe(ventas)
+    calculados = len(contador_bloques)
+
+    assert huella_dataframe(ventas) == primera
+    assert len(contador_bloques) == calculados
+
+    # En sitio solo se detecta pidiendo recálculo explícito
+    ventas.loc[0, "ventas_usd"] += 1
+    assert huella_dataframe(ventas) == primera
+    assert huella_dataframe(ventas, usar_cache=False) != primera
+
+
+def test_append_rehashea_solo_el_bloque_incompleto_y_los_nuevos(ventas, contador_bloques):
+    huella_dataframe(ventas)
+    contador_bloques.clear()
+
+    extra = ventas.sample(130, random_state=1)
+    extendido = pd.concat([ventas, extra], ignore_index=True)
+    obtenida = huella_tras_append(ventas, extendido)
+
+    # 1050 → 1180 filas: se recalculan los bloques [1000, 1100) y [1100, 1180)
+    assert sorted({inicio for inicio, _ in contador_bloques}) == [1000, 1100]
+    assert obtenida == huella_dataframe(extendido.copy())
+
+
+def test_append_en_sitio_sobre_el_mismo_objeto(ventas):
+    huella_dataframe(ventas)
+    ventas.loc[len(ventas)] = ventas.iloc[0]
+
+    assert huella_dataframe(ventas) == huella_dataframe(ventas.copy())
+
+
+def test_huella_columnas_ignora_el_resto_del_frame(ventas):
+    sin_cliente = ventas.assign(cliente="otro")
+
+    assert huella_columnas(ventas, ["fecha", "ventas_usd"]) == huella_columnas(sin_cliente, ["fecha", "ventas_usd"])
+    assert huella_columnas(ventas, ["cliente"]) != huella_columnas(sin_cliente, ["cliente"])
+    assert huella_columnas(ventas, ["ventas_usd"], con_indice=False) == huella_columnas(
+        ventas.set_axis(ventas.index + 5), ["ventas_usd"], con_indice=False
+    )
@@ -0,0 +1,122 @@
+"""
+Tests unitarios para utils/paginas.py y el costo de importación de app.py.
+
+El arranque de app.py (login) no debe importar ninguna página de main/ ni
+dependencias pesadas; se mide con ``python -X importtime`` en un subproceso.
+"""
+import ast
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils import paginas
+from utils.paginas import PAGINAS, PaginaDiferida, cargar_pagina, pagina, tiempos_carga
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Ya cargadas por cualquier script de Streamlit: no cuentan contra el presupuesto
+BASE_STREAMLIT = ("streamlit", "pandas", "numpy")
+# Milisegundos para los imports de app.py fuera de BASE_STREAMLIT (~0.1 s hoy)
+PRESUPUESTO_IMPORT_MS = 600
+# Nada de esto debe importarse antes de navegar a una página
+PESADOS = ("openai", "matplotlib", "seaborn", "reportlab", "kaleido", "xlsxwriter", "sklearn")
+
+
+def _imports_de_app():
+    """Módulos que app.py importa a nivel de módulo (incluye bloques try)."""
+    with open(os.path.join(RAIZ, "app.py"), encoding="utf-8") as f:
+        arbol = ast.parse(f.read())
+    modulos = []
+    nodos = list(arbol.body)
+    while nodos:
+        nodo = nodos.pop(0)
+        if isinstance(nodo, ast.Try):
+            nodos.extend(nodo.body)
+        elif isinstance(nodo, ast.Import):
+            modulos.extend(alias.name for alias in nodo.names)
+        elif isinstance(nodo, ast.ImportFrom) and nodo.level == 0:
+            modulos.append(nodo.module)
+    return modulos
+
+
+def _importtime(codigo):
+    """
+    Ejecuta `codigo` con ``-X importtime`` y devuelve
+    {módulo: (nivel de anidamiento, microsegundos acumulados)}.
+    """
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ, capture_output=True, text=True, timeout=120,
+    )
+    assert salida.returncode == 0, salida.stderr[-2000:]
+    tiempos = {}
+    for linea in salida.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        nivel = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        tiempos[nombre.strip()] = (nivel, int(acumulado))
+    return tiempos
+
+
+@pytest.fixture(scope="module")
+def tiempos_arranque():
+    modulos = [m for m in _imports_de_app() if m.split(".")[0] not in BASE_STREAMLIT]
+    codigo = "import " + ", ".join(BASE_STREAMLIT) + "\n"
+    codigo += "\n".join(
+        f"try:\n    import {m}\nexcept ImportError:\n    pass" for m in modulos
+    )
+    return _importtime(codigo)
+
+
+def test_app_no_importa_paginas_al_arrancar():
+    assert not [m for m in _imports_de_app() if m == "main" or m.startswith("main.")]
+
+
+def test_arranque_sin_dependencias_pesadas(tiempos_arranque):
+    cargados = {nombre.split(".")[0] for nombre in tiempos_arranque}
+    assert not cargados & set(PESADOS)
+    assert not [nombre for nombre in tiempos_arranque if nombre.startswith("main.")]
+
+
+def test_arranque_dentro_del_presupuesto(tiempos_arranque):
+    total_ms = sum(
+        acumulado for nombre, (nivel, acumulado) in tiempos_arranque.items()
+        if nivel == 0 and nombre.split(".")[0] not in BASE_STREAMLIT
+    ) / 1000
+    assert total_ms < PRESUPUESTO_IMPORT_MS, f"imports de app.py: {total_ms:.0f} ms"
+
+
+@pytest.fixture
+def pagina_prueba(tmp_path, monkeypatch):
+    (tmp_path / "pagina_de_prueba.py").write_text("def run():\n    return 'ok'\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setitem(PAGINAS, "prueba", "pagina_de_prueba")
+    monkeypatch.delitem(sys.modules, "pagina_de_prueba", raising=False)
+    monkeypatch.setattr(paginas, "_tiempos_carga", {})
+    yield "prueba"
+    sys.modules.pop("pagina_de_prueba", None)
+
+
+def test_pagina_se_importa_al_primer_uso(pagina_prueba):
+    proxy = pagina(pagina_prueba)
+    assert not proxy.cargada
+    assert "pagina_de_prueba" not in sys.modules
+
+    assert proxy.run() == "ok"
+    assert proxy.cargada
+    assert cargar_pagina(pagina_prueba) is sys.modules["pagina_de_prueba"]
+    assert list(tiempos_carga()) == [pagina_prueba]
+
+
+def test_pagina_no_registrada():
+    with pytest.raises(KeyError):
+        PaginaDiferida("no_existe")
+
+
+def test_registro_apunta_a_modulos_existentes():
+    for modulo in PAGINAS.values():
+        ruta = os.path.join(RAIZ, *modulo.split(".")) + ".py"
+        assert os.path.exists(ruta), modulo
@@ -0,0 +1,102 @@
+"""
+Tests unitarios para utils/modelo_unificado.py
+Clasificadores vectorizados de estatus y aging frente a su versión escalar.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.modelo_unificado import (
+    aplicar_estatus_a_dataframe,
+    calcular_aging_real,
+    calcular_estatus_cxc,
+    clasificar_buckets_aging,
+    clasificar_estatus_vectorizado,
+)
+
+HOY = date(2025, 6, 15)
+
+
+def _bucket_escalar(dias, estatus):
+    """Lógica por fila original de calcular_aging_real."""
+    if estatus == "Pagada":
+        return "Pagada"
+    if pd.isna(dias):
+        return "Sin fecha"
+    if dias <= 0:
+        return "Por vencer"
+    if dias <= 30:
+        return "1-30 días"
+    if dias <= 60:
+        return "31-60 días"
+    if dias <= 90:
+        return "61-90 días"
+    if dias <= 180:
+        return "91-180 días"
+    return ">180 días"
+
+
+@pytest.fixture
+def cartera():
+    rng = np.random.default_rng(17)
+    n = 3000
+    saldos = rng.choice([0.0, 0.0, 150.5, 9800.0, -20.0, np.nan], n)
+    vencimientos = pd.Series(pd.Timestamp(HOY) + pd.to_timedelta(rng.integers(-400, 120, n), unit="D"))
+    vencimientos[rng.random(n) < 0.05] = pd.NaT
+    # Horas dentro del día: el estatus compara por fecha, no por hora
+    vencimientos = vencimientos + pd.to_timedelta(rng.integers(0, 24, n), unit="h")
+    return pd.DataFrame({"saldo_actual": saldos, "fecha_vencimiento": vencimientos})
+
+
+def test_estatus_vectorizado_coincide_con_escalar(cartera):
+    esperado = [
+        calcular_estatus_cxc(s, f, hoy=HOY)
+        for s, f in zip(cartera["saldo_actual"], cartera["fecha_vencimiento"])
+    ]
+
+    obtenido = clasificar_estatus_vectorizado(cartera["saldo_actual"], cartera["fecha_vencimiento"], HOY)
+
+    assert obtenido.tolist() == esperado
+
+
+def test_estatus_con_textos_y_zona_horaria():
+    saldos = pd.Series(["0", "1,200", "abc", "55", None, "10"])
+    fechas = pd.Series(["2025-06-15", "2025-07-01", "2025-07-01", "2025-06-14", "2025-07-01", "no es fecha"])
+
+    esperado = [calcular_estatus_cxc(s, f, hoy=HOY) for s, f in zip(saldos, fechas)]
+    assert clasificar_estatus_vectorizado(saldos, fechas, HOY).tolist() == esperado
+
+    con_zona = pd.Series(pd.to_datetime(["2025-06-15 23:30", "2025-06-14 08:00"]).tz_localize("America/Mexico_City"))
+    esperado_zona = [calcular_estatus_cxc(10, f, hoy=HOY) for f in con_zona]
+    assert clasificar_estatus_vectorizado([10, 10], con_zona, HOY).tolist() == esperado_zona
+
+
+def test_aplicar_estatus_usa_el_clasificador(cartera):
+    df = aplicar_estatus_a_dataframe(cartera, fecha_corte=HOY)
+
+    assert df["estatus"].tolist() == clasificar_estatus_vectorizado(
+        cartera["saldo_actual"], cartera["fecha_vencimiento"], HOY
+    ).tolist()
+
+
+def test_buckets_coinciden_con_escalar():
+    dias = pd.Series([np.nan, -5, 0, 1, 30, 31, 60, 61, 90, 91, 180, 181, 4000, 45, np.nan])
+    estatus = pd.Series(["Vigente", "Vigente", "Pagada", "Vencida", "Vencida", "Vencida", "Vencida", "Vencida",
+                         "Vencida", "Vencida", "Vencida", "Pagada", "Vencida", "Vencida", "Pagada"])
+
+    esperado = [_bucket_escalar(d, e) for d, e in zip(dias, estatus)]
+
+    assert clasificar_buckets_aging(dias, estatus).tolist() == esperado
+    assert clasificar_buckets_aging(dias).tolist()[1:4] == ["Por vencer", "Por vencer", "1-30 días"]
+
+
+def test_aging_real_coincide_con_logica_por_fila(cartera):
+    df = calcular_aging_real(cartera, fecha_corte=HOY)
+
+    esperado = [_bucket_escalar(d, e) for d, e in zip(df["dias_vencido"], df["estatus"])]
+
+    assert df["bucket"].tolist() == esperado
+    assert set(esperado) >= {"Pagada", "Sin fecha", "Por vencer", ">180 días"}
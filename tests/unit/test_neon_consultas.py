@@ -0,0 +1,134 @@
+"""
+Tests unitarios para utils/neon_consultas.py
+Carga concurrente y cacheada de consultas a Neon.
+"""
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from utils import neon_consultas
+from utils.neon_consultas import CargadorConsultas, Consulta
+
+
+class NeonFalso:
+    """Sustituye a `ejecutar_consulta`: cuenta llamadas y concurrencia."""
+
+    def __init__(self, demora=0.1):
+        self.demora = demora
+        self.version = "v1"
+        self.llamadas = []
+        self.fallar = set()
+        self.activos = 0
+        self.max_activos = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, neon_url, sql, params=()):
+        if sql is neon_consultas._SQL_VERSION_DATOS:
+            self.llamadas.append("version")
+            if "version" in self.fallar:
+                raise RuntimeError("sin red")
+            return pd.DataFrame([[self.version]], columns=["v"])
+        with self._lock:
+            self.activos += 1
+            self.max_activos = max(self.max_activos, self.activos)
+        try:
+            time.sleep(self.demora)
+            self.llamadas.append(sql)
+            if sql in self.fallar:
+                raise RuntimeError(f"falló {sql}")
+            return pd.DataFrame({"sql": [sql], "params": [params]})
+        finally:
+            with self._lock:
+                self.activos -= 1
+
+
+@pytest.fixture
+def neon(monkeypatch):
+    falso = NeonFalso()
+    monkeypatch.setattr(neon_consultas, "ejecutar_consulta", falso)
+    return falso
+
+
+@pytest.fixture
+def cargador():
+    return CargadorConsultas(max_hilos=4, max_resultados=8, ttl_version=60)
+
+
+CONSULTAS = [Consulta(f"q{i}", f"SELECT {i}", ("emp",)) for i in range(3)]
+
+
+def _consultas_a_neon(neon):
+    return [ll for ll in neon.llamadas if ll != "version"]
+
+
+def test_en_paralelo_y_en_orden(neon, cargador):
+    inicio = time.perf_counter()
+    resultados = cargador.cargar("emp", "dsn", CONSULTAS)
+    duracion = time.perf_counter() - inicio
+
+    assert list(resultados) == ["q0", "q1", "q2"]
+    assert resultados["q1"].df["sql"].iloc[0] == "SELECT 1"
+    assert neon.max_activos == 3
+    assert duracion < 3 * neon.demora
+    assert all(r.segundos >= neon.demora and not r.desde_cache for r in resultados.values())
+
+
+def test_cache_por_empresa_y_version(neon, cargador):
+    cargador.cargar("emp", "dsn", CONSULTAS)
+    segunda = cargador.cargar("emp", "dsn", CONSULTAS)
+    assert len(_consultas_a_neon(neon)) == 3
+    assert all(r.desde_cache for r in segunda.values())
+    # La versión se consultó una sola vez (TTL)
+    assert neon.llamadas.count("version") == 1
+
+    # Copias: modificar el resultado no altera la caché
+    segunda["q0"].df["sql"] = "otro"
+    assert cargador.cargar("emp", "dsn", CONSULTAS)["q0"].df["sql"].iloc[0] == "SELECT 0"
+
+    # Otra empresa no comparte resultados
+    cargador.cargar("otra", "dsn", [Consulta("q0", "SELECT 0", ("otra",))])
+    assert len(_consultas_a_neon(neon)) == 4
+
+
+def test_nueva_version_reconsulta(neon, cargador):
+    cargador.cargar("emp", "dsn", CONSULTAS)
+    neon.version = "v2"
+    # Dentro del TTL la versión no se revisa...
+    cargador.cargar("emp", "dsn", CONSULTAS)
+    assert len(_consultas_a_neon(neon)) == 3
+    # ...salvo que se invalide (p. ej. tras una ingesta)
+    cargador.invalidar_version("emp")
+    resultados = cargador.cargar("emp", "dsn", CONSULTAS)
+    assert len(_consultas_a_neon(neon)) == 6
+    assert not any(r.desde_cache for r in resultados.values())
+
+
+def test_errores_no_se_cachean(neon, cargador):
+    neon.fallar.add("SELECT 1")
+    resultados = cargador.cargar("emp", "dsn", CONSULTAS)
+    assert not resultados["q1"].ok
+    assert "falló" in resultados["q1"].error
+    assert resultados["q1"].df.empty
+    assert resultados["q0"].ok
+
+    neon.fallar.clear()
+    resultados = cargador.cargar("emp", "dsn", CONSULTAS)
+    assert resultados["q1"].ok and not resultados["q1"].desde_cache
+    assert resultados["q0"].desde_cache
+
+
+def test_sin_version_no_cachea(neon, cargador):
+    neon.fallar.add("version")
+    cargador.cargar("emp", "dsn", CONSULTAS[:1])
+    cargador.cargar("emp", "dsn", CONSULTAS[:1])
+    assert len(_consultas_a_neon(neon)) == 2
+
+
+def test_cache_acotada(neon, cargador):
+    for i in range(12):
+        cargador.cargar("emp", "dsn", [Consulta(f"q{i}", f"SELECT {i}", ("emp",))])
+    assert len(cargador._resultados) == 8
+    cargador.limpiar()
+    assert len(cargador._resultados) == 0
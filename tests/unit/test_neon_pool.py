@@ -0,0 +1,111 @@
+"""
+Tests unitarios para utils/neon_pool.py
+Pool de conexiones ociosas a Neon.
+"""
+import psycopg2.extensions
+import pytest
+
+from utils.neon_pool import ConexionPrestada, PoolConexiones
+
+
+class ConexionFalsa:
+    """Conexión psycopg2 simulada: estado de transacción y cierre."""
+
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+        self.commits = 0
+        self.info = type("Info", (), {"transaction_status": psycopg2.extensions.TRANSACTION_STATUS_IDLE})()
+
+    def cursor(self):
+        self.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        return object()
+
+    def commit(self):
+        self.commits += 1
+        self.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    p = PoolConexiones("postgres://falso", max_ociosas=2, max_inactividad=60)
+    p.creadas = []
+
+    def conectar():
+        conn = ConexionFalsa()
+        p.creadas.append(conn)
+        return conn
+
+    monkeypatch.setattr(p, "_conectar", conectar)
+    return p
+
+
+def test_close_devuelve_y_se_reutiliza(pool):
+    conn = pool.tomar()
+    assert isinstance(conn, ConexionPrestada)
+    conn.cursor()
+    conn.commit()
+    conn.close()
+    conn.close()  # idempotente, como en los call sites que cierran dos veces
+
+    otra = pool.tomar()
+    assert otra._conn is pool.creadas[0]
+    assert len(pool.creadas) == 1
+    stats = pool.estadisticas()
+    assert stats["conexiones"] == 1 and stats["reusos"] == 1
+
+
+def test_transaccion_abierta_se_revierte(pool):
+    conn = pool.tomar()
+    conn.cursor()  # deja la transacción abierta sin commit
+    conn.close()
+    assert pool.creadas[0].rollbacks == 1
+    assert not pool.creadas[0].closed
+
+
+def test_conexion_devuelta_no_se_usa(pool):
+    conn = pool.tomar()
+    conn.close()
+    assert conn.closed
+    with pytest.raises(psycopg2.InterfaceError):
+        conn.cursor()
+
+
+def test_descarta_cerradas_e_inactivas(pool, monkeypatch):
+    reloj = [0.0]
+    monkeypatch.setattr("utils.neon_pool.time.monotonic", lambda: reloj[0])
+    a, b = pool.tomar(), pool.tomar()
+    a.close(); b.close()
+    vieja, caida = pool.creadas
+    caida.closed = 1  # la más reciente se cayó
+    reloj[0] = 61.0   # la otra lleva más de max_inactividad sin uso
+
+    nueva = pool.tomar()
+    assert nueva._conn is pool.creadas[2]
+    assert vieja.closed
+    assert pool.estadisticas()["descartadas"] == 2
+
+
+def test_limite_de_ociosas(pool):
+    prestadas = [pool.tomar() for _ in range(3)]
+    for conn in prestadas:
+        conn.close()
+    assert pool.estadisticas()["ociosas"] == 2
+    assert pool.creadas[2].closed
+
+    pool.cerrar()
+    assert all(c.closed for c in pool.creadas)
+
+
+def test_context_manager_commit_y_devuelve(pool):
+    with pool.tomar() as conn:
+        conn.cursor()
+    assert pool.creadas[0].commits == 1
+    assert pool.estadisticas()["ociosas"] == 1
@@ -1,6 +1,7 @@
 import pytest
 
-from utils.nl2sql import NL2SQLEngine
+from utils import sql_ast
+from utils.nl2sql import NL2SQLEngine, validate_sql_static
 
 
 @pytest.fixture
@@ -32,6 +33,27 @@ def test_validate_sql_accepts_empresa_id_filter_for_tenant_scoped_tables(engine_
     assert err == "OK"
 
 
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT $$'$$; COMMIT; SET default_transaction_read_only = off; DELETE FROM cfdi_ventas; "
+        "COMMIT; SELECT '$$' AS x FROM cfdi_ventas LIMIT 1",
+        "SELECT $t$'$t$; DROP TABLE cfdi_ventas; SELECT '$t$' AS x FROM cfdi_ventas LIMIT 1",
+    ],
+)
+def test_validate_sql_rejects_dollar_quoted_payloads(sql):
+    assert validate_sql_static(sql)[0] is False
+    # El tokenizador delimita bien el literal y ve las sentencias ocultas
+    assert sql_ast.parse_sql(sql).statement_count > 1
+
+
+def test_validate_sql_rejects_dollar_quoting_without_forbidden_words():
+    is_valid, err = validate_sql_static("SELECT $$x$$ AS v FROM cfdi_ventas LIMIT 1")
+
+    assert is_valid is False
+    assert "$" in err
+
+
 def test_ensure_tenant_filter_injects_empresa_id_for_cfdi_ventas(engine_stub):
     empresa_id = "11111111-1111-1111-1111-111111111111"
 
@@ -91,3 +113,110 @@ def test_execute_query_fails_fast_when_tenant_filter_is_missing(engine_stub, mon
 
     with pytest.raises(RuntimeError, match="empresa_id"):
         engine_stub.execute_query("SELECT * FROM cfdi_ventas", empresa_id="11111111-1111-1111-1111-111111111111")
+
+
+class _FakeCursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.itersize = None
+        self.description = None
+        self._explain = None
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((self.name, sql))
+        if sql.startswith("EXPLAIN"):
+            self._explain = [[{"Plan": self.conn.plan}]]
+        elif self.name:
+            self.description = [("receptor_rfc",), ("total",)]
+
+    def fetchone(self):
+        return self._explain
+
+    def fetchmany(self, size):
+        self.conn.fetch_sizes.append(size)
+        return self.conn.rows[:size]
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self, plan, rows=()):
+        self.plan = plan
+        self.rows = list(rows)
+        self.executed = []
+        self.fetch_sizes = []
+
+    def cursor(self, name=None):
+        return _FakeCursor(self, name=name)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def bounded_engine(engine_stub, monkeypatch):
+    monkeypatch.setattr("utils.nl2sql.register_numeric_float_casts", lambda conn: None)
+    engine_stub.connection_string = "postgresql://test"
+    engine_stub.max_rows = 3
+    engine_stub.timeout = 5
+    engine_stub.max_plan_cost = 1000
+    engine_stub.max_plan_rows = 50_000
+    return engine_stub
+
+
+def test_execute_query_rejects_plan_above_cost_threshold(bounded_engine, monkeypatch):
+    conn = _FakeConnection({"Total Cost": 25_000.0, "Plan Rows": 4})
+    monkeypatch.setattr("utils.nl2sql.psycopg2.connect", lambda *_a, **_k: conn)
+
+    with pytest.raises(RuntimeError, match="costosa"):
+        bounded_engine.execute_query("SELECT receptor_rfc, total FROM cfdi_conceptos ORDER BY total DESC")
+
+    assert not any(name for name, _sql in conn.executed)
+
+
+def test_execute_query_rejects_plan_returning_too_many_rows(bounded_engine, monkeypatch):
+    plan = {"Total Cost": 10.0, "Plan Rows": 2_000_000, "Plans": [{"Plan Rows": 2_000_000}]}
+    conn = _FakeConnection(plan)
+    monkeypatch.setattr("utils.nl2sql.psycopg2.connect", lambda *_a, **_k: conn)
+
+    with pytest.raises(RuntimeError, match="demasiadas filas"):
+        bounded_engine.execute_query("SELECT receptor_rfc, total FROM cfdi_conceptos")
+
+
+def test_execute_query_accepts_aggregate_over_large_scan(bounded_engine, monkeypatch):
+    # Un SUM devuelve una fila aunque el recorrido debajo estime millones
+    plan = {
+        "Node Type": "Aggregate", "Total Cost": 900.0, "Plan Rows": 1,
+        "Plans": [{"Node Type": "Seq Scan", "Plan Rows": 20_000_000}],
+    }
+    conn = _FakeConnection(plan, rows=[("total", 1)])
+    monkeypatch.setattr("utils.nl2sql.psycopg2.connect", lambda *_a, **_k: conn)
+
+    df = bounded_engine.execute_query("SELECT SUM(importe) AS total FROM cfdi_conceptos")
+
+    assert len(df) == 1
+    assert any(name for name, _sql in conn.executed)
+
+
+def test_execute_query_caps_limit_and_fetches_through_server_cursor(bounded_engine, monkeypatch):
+    rows = [(f"RFC{i}", i) for i in range(10)]
+    conn = _FakeConnection({"Total Cost": 10.0, "Plan Rows": 4}, rows=rows)
+    monkeypatch.setattr("utils.nl2sql.psycopg2.connect", lambda *_a, **_k: conn)
+
+    df = bounded_engine.execute_query("SELECT receptor_rfc, total FROM cfdi_conceptos LIMIT 1000;")
+
+    named = [sql for name, sql in conn.executed if name]
+    assert named == ["SELECT receptor_rfc, total FROM cfdi_conceptos LIMIT 4"]
+    assert conn.fetch_sizes == [4]
+    assert list(df.columns) == ["receptor_rfc", "total"]
+    assert len(df) == 3
+
+
+def test_numeric_typecaster_returns_float_and_preserves_null():
+    from utils.nl2sql import _NUMERIC_FLOAT
+
+    assert _NUMERIC_FLOAT("1234.50", None) == 1234.5
+    assert isinstance(_NUMERIC_FLOAT("7", None), float)
+    assert _NUMERIC_FLOAT(None, None) is None
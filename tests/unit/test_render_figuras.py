@@ -0,0 +1,106 @@
+"""
+Tests unitarios para utils/render_figuras.py
+Render de figuras Plotly con pool de scopes y caché por huella.
+"""
+import threading
+import time
+
+import plotly.graph_objects as go
+import pytest
+
+from utils.render_figuras import RenderizadorFiguras, huella_figura
+
+
+class ScopeFalso:
+    """Scope de kaleido simulado: cuenta llamadas y concurrencia."""
+
+    activos = 0
+    max_activos = 0
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.llamadas = 0
+
+    def transform(self, figura, format, width, height, scale):
+        with ScopeFalso._lock:
+            ScopeFalso.activos += 1
+            ScopeFalso.max_activos = max(ScopeFalso.max_activos, ScopeFalso.activos)
+        time.sleep(0.02)
+        self.llamadas += 1
+        with ScopeFalso._lock:
+            ScopeFalso.activos -= 1
+        titulo = figura["layout"].get("title", {}).get("text", "")
+        return f"{format}:{width}x{height}@{scale}:{titulo}".encode()
+
+
+@pytest.fixture
+def renderizador(monkeypatch):
+    ScopeFalso.activos = ScopeFalso.max_activos = 0
+    r = RenderizadorFiguras(max_scopes=2, max_imagenes=3)
+    scopes = []
+
+    def crear():
+        scope = ScopeFalso()
+        scopes.append(scope)
+        return scope
+
+    monkeypatch.setattr(r, "_crear_scope", crear)
+    r.scopes_creados = scopes
+    return r
+
+
+def _figura(titulo):
+    return go.Figure(go.Bar(x=[1, 2, 3], y=[3, 1, 2]), layout={"title": {"text": titulo}})
+
+
+def test_huella_figura_estable():
+    assert huella_figura(_figura("A")) == huella_figura(_figura("A"))
+    assert huella_figura(_figura("A")) != huella_figura(_figura("B"))
+
+
+def test_memoiza_por_huella_y_dimensiones(renderizador):
+    png = renderizador.renderizar(_figura("A"), width=800, height=500, scale=2)
+    assert png == b"png:800x500@2:A"
+
+    # Otra instancia con el mismo contenido: hit de caché
+    assert renderizador.renderizar(_figura("A"), width=800, height=500, scale=2) == png
+    # Otras dimensiones: render nuevo
+    renderizador.renderizar(_figura("A"), width=400, height=300, scale=1)
+
+    stats = renderizador.estadisticas()
+    assert stats["renders"] == 2
+    assert stats["hits"] == 1
+    assert stats["tiempo_max"] >= stats["tiempo_promedio"] > 0
+
+
+def test_reutiliza_scopes_calientes(renderizador):
+    for i in range(5):
+        renderizador.renderizar(_figura(str(i)))
+    assert len(renderizador.scopes_creados) == 1
+    assert renderizador.scopes_creados[0].llamadas == 5
+
+
+def test_varias_en_paralelo_y_en_orden(renderizador):
+    figs = [_figura(str(i)) for i in range(6)]
+    pngs = renderizador.renderizar_varias(figs, width=10, height=10, scale=1)
+    assert pngs == [f"png:10x10@1:{i}".encode() for i in range(6)]
+    assert len(renderizador.scopes_creados) <= 2
+    assert ScopeFalso.max_activos <= 2
+
+
+def test_cache_acotada(renderizador):
+    for i in range(5):
+        renderizador.renderizar(_figura(str(i)))
+    assert renderizador.estadisticas()["imagenes_en_cache"] == 3
+    renderizador.limpiar_cache()
+    assert renderizador.estadisticas()["imagenes_en_cache"] == 0
+
+
+def test_error_se_cuenta(renderizador, monkeypatch):
+    def falla(*args, **kwargs):
+        raise RuntimeError("kaleido caído")
+
+    monkeypatch.setattr(renderizador, "_convertir", falla)
+    with pytest.raises(RuntimeError):
+        renderizador.renderizar(_figura("X"))
+    assert renderizador.estadisticas()["errores"] == 1
@@ -0,0 +1,107 @@
+"""
+Tests unitarios para utils/sales_cube.py
+Cubo de ventas precalculado compartido por YTD, Comparativo y Heatmap.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import sales_cube
+from utils.sales_cube import construir_cubo, obtener_cubo
+
+
+@pytest.fixture
+def ventas():
+    rng = np.random.default_rng(7)
+    n = 5000
+    return pd.DataFrame({
+        "fecha": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, n), unit="D"),
+        "linea_de_negocio": rng.choice(["Dykem", "ACMOS", "Kluber", None], n),
+        "producto": rng.choice([f"P{i}" for i in range(30)], n),
+        "cliente": rng.choice([f"C{i}" for i in range(80)], n),
+        "vendedor": rng.choice(["Ana", "Luis", "Eva"], n),
+        "ventas_usd": rng.uniform(10, 5000, n).round(2),
+    })
+
+
+@pytest.fixture(autouse=True)
+def cache_limpia():
+    sales_cube.limpiar_cache_cubos()
+    yield
+    sales_cube.limpiar_cache_cubos()
+
+
+def test_cubo_diario_conserva_totales_por_dimension(ventas):
+    ventas = pd.concat([ventas, ventas], ignore_index=True)
+    cubo = construir_cubo(ventas, "ventas_usd")
+
+    assert len(cubo.diario) <= len(ventas) // 2
+    assert cubo.diario["operaciones"].sum() == len(ventas)
+    assert cubo.diario["ventas_usd"].sum() == pytest.approx(ventas["ventas_usd"].sum())
+
+    esperado = ventas.groupby("cliente")["ventas_usd"].sum()
+    obtenido = cubo.totales(["cliente"]).set_index("cliente")["ventas_usd"]
+    pd.testing.assert_series_equal(obtenido, esperado, check_names=False)
+
+    # Las líneas sin valor no se pierden al agregar
+    sin_linea = ventas["linea_de_negocio"].isna()
+    assert cubo.diario["linea_de_negocio"].isna().sum() > 0
+    assert cubo.diario.loc[cubo.diario["linea_de_negocio"].isna(), "ventas_usd"].sum() == pytest.approx(
+        ventas.loc[sin_linea, "ventas_usd"].sum()
+    )
+
+
+def test_filtrar_y_rango_de_fechas_equivalen_al_df_crudo(ventas):
+    cubo = obtener_cubo(ventas, "ventas_usd").filtrar(linea_de_negocio=["Dykem", "ACMOS"])
+
+    mask = ventas["linea_de_negocio"].isin(["Dykem", "ACMOS"]) & ventas["fecha"].between("2024-01-01", "2024-06-15")
+    total = cubo.totales(desde="2024-01-01", hasta="2024-06-15")["ventas_usd"].iloc[0]
+
+    assert total == pytest.approx(ventas.loc[mask, "ventas_usd"].sum())
+
+
+def test_serie_mensual_acumula_dentro_de_cada_anio(ventas):
+    serie = construir_cubo(ventas, "ventas_usd").serie_mensual()
+
+    crudo = ventas.assign(año=ventas["fecha"].dt.year, mes=ventas["fecha"].dt.month)
+    esperado = crudo.groupby(["año", "mes"])["ventas_usd"].sum().groupby(level=0).cumsum()
+
+    np.testing.assert_allclose(serie["acumulado"].to_numpy(), esperado.to_numpy())
+
+
+def test_cubo_sin_fecha_usa_anio_y_mes():
+    df = pd.DataFrame({"año": [2024, 2024, 2025], "mes": [1, 1, 3], "valor_mxn": [100, 50, 25]})
+
+    cubo = construir_cubo(df, "valor_mxn", columna_fecha=None, dimensiones=())
+
+    assert cubo.mensual[["año", "mes", "valor_mxn", "operaciones"]].values.tolist() == [
+        [2024, 1, 150, 2],
+        [2025, 3, 25, 1],
+    ]
+
+
+def test_pareto_y_crecimiento_anual(ventas):
+    cubo = construir_cubo(ventas, "ventas_usd")
+
+    pareto = cubo.pareto("vendedor")
+    assert pareto["acumulado_pct"].iloc[-1] == pytest.approx(100)
+    assert pareto["ventas_usd"].is_monotonic_decreasing
+
+    anual = cubo.crecimiento_anual()
+    totales = ventas.groupby(ventas["fecha"].dt.year)["ventas_usd"].sum()
+    assert anual["crecimiento_pct"].iloc[1] == pytest.approx((totales.iloc[1] / totales.iloc[0] - 1) * 100)
+
+
+def test_obtener_cubo_reutiliza_copias_del_mismo_dataset(ventas, monkeypatch):
+    construcciones = []
+    original = sales_cube.construir_cubo
+    monkeypatch.setattr(sales_cube, "construir_cubo", lambda *a, **k: construcciones.append(1) or original(*a, **k))
+
+    primero = obtener_cubo(ventas, "ventas_usd")
+    assert obtener_cubo(ventas.copy(), "ventas_usd") is primero
+
+    modificado = ventas.copy()
+    modificado.loc[0, "ventas_usd"] += 1
+    assert obtener_cubo(modificado, "ventas_usd") is not primero
+    assert len(construcciones) == 2
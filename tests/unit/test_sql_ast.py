@@ -0,0 +1,247 @@
+import gc
+import random
+import time
+
+import pytest
+
+from utils import sql_ast
+from utils.nl2sql import MAX_SQL_LENGTH, NL2SQLEngine, validate_sql_static
+
+
+@pytest.fixture
+def engine_stub():
+    return object.__new__(NL2SQLEngine)
+
+
+def test_parse_sql_extracts_tables_aliases_and_ctes():
+    parsed = sql_ast.parse_sql(
+        "WITH base AS (SELECT * FROM cfdi_ventas v WHERE v.total > 0) "
+        "SELECT b.receptor_rfc, c.descripcion FROM base b "
+        "JOIN cfdi_conceptos AS c ON c.cfdi_venta_id = b.id LIMIT 10;"
+    )
+
+    assert parsed.ctes == {"base"}
+    assert parsed.table_names == {"cfdi_ventas", "cfdi_conceptos"}
+    assert [(r.name, r.alias) for r in parsed.top.tables] == [("base", "b"), ("cfdi_conceptos", "c")]
+    assert parsed.scopes[1].cte_name == "base"
+    assert parsed.scope_reading("cfdi_ventas") == 1
+
+
+def test_parse_sql_ignores_from_inside_extract_and_distinct_from():
+    parsed = sql_ast.parse_sql(
+        "SELECT EXTRACT(YEAR FROM fecha_emision) AS anio FROM cfdi_ventas "
+        "WHERE moneda IS DISTINCT FROM 'USD'"
+    )
+
+    assert [r.name for r in parsed.all_table_refs] == ["cfdi_ventas"]
+    assert parsed.top_level_table == "cfdi_ventas"
+
+
+def test_parse_sql_keeps_literals_out_of_code_and_statements():
+    parsed = sql_ast.parse_sql("SELECT 'a;b -- DROP' AS x FROM cfdi_ventas;")
+
+    assert parsed.statement_count == 1
+    assert "DROP" not in parsed.code
+    assert parsed.string_literals == ("a;b -- DROP",)
+
+
+def test_validate_sql_rejects_comma_joined_and_quoted_tables():
+    ok, msg = validate_sql_static("SELECT * FROM cfdi_ventas, usuarios LIMIT 1;")
+    assert ok is False
+    assert "usuarios" in msg
+
+    ok, msg = validate_sql_static('SELECT * FROM "usuarios" LIMIT 1;')
+    assert ok is False
+
+
+def test_add_condition_targets_scope_without_touching_within_group():
+    sql = (
+        "SELECT PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY total) "
+        "FROM cfdi_ventas GROUP BY receptor_rfc ORDER BY 1 LIMIT 5;"
+    )
+
+    updated = sql_ast.add_condition(sql, "tipo_comprobante = 'I'")
+
+    assert "WITHIN GROUP (ORDER BY total)" in updated
+    assert "FROM cfdi_ventas WHERE tipo_comprobante = 'I' GROUP BY receptor_rfc" in updated
+
+
+def test_ensure_tenant_filter_qualifies_each_scope(engine_stub):
+    empresa_id = "11111111-1111-1111-1111-111111111111"
+
+    sql = engine_stub._ensure_tenant_filter(
+        "SELECT c.descripcion FROM cfdi_conceptos c "
+        "JOIN cfdi_ventas v ON v.id = c.cfdi_venta_id "
+        "WHERE v.total > (SELECT AVG(p.monto) FROM cfdi_pagos p) LIMIT 10;",
+        empresa_id=empresa_id,
+    )
+
+    assert f"FROM cfdi_pagos p WHERE p.empresa_id = '{empresa_id}')" in sql
+    assert f"AND v.empresa_id = '{empresa_id}' LIMIT 10" in sql
+    assert engine_stub.validate_sql(sql, empresa_id=empresa_id) == (True, "OK")
+
+
+def test_parse_sql_splits_set_operation_branches():
+    parsed = sql_ast.parse_sql(
+        "SELECT uuid_sat FROM cfdi_ventas WHERE total > 0 "
+        "UNION ALL SELECT uuid_complemento FROM cfdi_pagos ORDER BY 1 LIMIT 5"
+    )
+
+    first, second = parsed.branches(0)
+    assert [r.name for r in first.tables] == ["cfdi_ventas"]
+    assert [r.name for r in second.tables] == ["cfdi_pagos"]
+    assert second.branch_of == 0 and second.parent is None
+    assert "limit" in second.clauses and "limit" not in first.clauses
+
+
+def test_ensure_tenant_filter_filters_each_union_branch_of_cte(engine_stub):
+    empresa_id = "11111111-1111-1111-1111-111111111111"
+
+    sql = engine_stub._ensure_tenant_filter(
+        "WITH totales AS (SELECT COUNT(*) AS n FROM cfdi_ventas UNION ALL SELECT COUNT(*) FROM cfdi_pagos) "
+        "SELECT SUM(n) AS total FROM totales LIMIT 10;",
+        empresa_id=empresa_id,
+    )
+
+    assert (
+        f"FROM cfdi_ventas WHERE cfdi_ventas.empresa_id = '{empresa_id}' UNION ALL "
+        f"SELECT COUNT(*) FROM cfdi_pagos WHERE cfdi_pagos.empresa_id = '{empresa_id}')"
+    ) in sql
+    assert engine_stub.validate_sql(sql, empresa_id=empresa_id) == (True, "OK")
+
+
+def test_ensure_tenant_filter_filters_unfiltered_union_branch(engine_stub):
+    empresa_id = "11111111-1111-1111-1111-111111111111"
+
+    sql = engine_stub._ensure_tenant_filter(
+        "SELECT uuid_sat FROM cfdi_ventas WHERE total>0 UNION ALL SELECT uuid_sat FROM cfdi_ventas",
+        empresa_id=empresa_id,
+    )
+
+    assert sql == (
+        f"SELECT uuid_sat FROM cfdi_ventas WHERE total>0 AND cfdi_ventas.empresa_id = '{empresa_id}' "
+        f"UNION ALL SELECT uuid_sat FROM cfdi_ventas WHERE cfdi_ventas.empresa_id = '{empresa_id}';"
+    )
+    assert engine_stub.validate_sql(sql, empresa_id=empresa_id) == (True, "OK")
+
+
+def test_validate_sql_requires_tenant_filter_in_every_branch(engine_stub):
+    empresa_id = "11111111-1111-1111-1111-111111111111"
+    sql = (
+        f"SELECT uuid_sat FROM cfdi_ventas WHERE empresa_id = '{empresa_id}' "
+        "UNION ALL SELECT uuid_sat FROM cfdi_ventas"
+    )
+
+    is_valid, err = engine_stub.validate_sql(sql, empresa_id=empresa_id)
+
+    assert is_valid is False
+    assert "empresa_id" in err
+
+
+def test_ensure_month_filter_replaces_extract_predicates_with_range(engine_stub):
+    sql = (
+        "SELECT SUM(total) FROM cfdi_ventas "
+        "WHERE EXTRACT(MONTH FROM fecha_emision) = 3 "
+        "AND EXTRACT(YEAR FROM fecha_emision) = EXTRACT(YEAR FROM CURRENT_DATE) "
+        "GROUP BY receptor_rfc;"
+    )
+
+    updated = engine_stub._ensure_month_filter("ventas de enero a marzo 2025", sql)
+
+    assert updated == (
+        "SELECT SUM(total) FROM cfdi_ventas "
+        "WHERE fecha_emision >= '2025-01-01' AND fecha_emision < '2025-04-01' "
+        "GROUP BY receptor_rfc;"
+    )
+
+
+def test_apply_sovereign_filter_clamps_model_dates(engine_stub):
+    sql = "SELECT * FROM cfdi_ventas WHERE fecha_emision >= '2020-01-01' AND fecha_emision < '2030-01-01'"
+
+    updated = engine_stub._apply_sovereign_filter(sql, {"desde": "2024-01-01", "hasta_excl": "2025-01-01"})
+
+    assert updated == "SELECT * FROM cfdi_ventas WHERE fecha_emision >= '2024-01-01' AND fecha_emision < '2025-01-01'"
+
+
+def test_apply_sovereign_filter_injects_range_inside_cte(engine_stub):
+    sql = "WITH b AS (SELECT * FROM cfdi_ventas WHERE total > 0) SELECT COUNT(*) FROM b;"
+
+    updated = engine_stub._apply_sovereign_filter(sql, {"desde": "2024-01-01", "hasta_excl": "2025-01-01"})
+
+    assert "FROM cfdi_ventas WHERE fecha_emision >= '2024-01-01' AND fecha_emision < '2025-01-01' AND total > 0)" in updated
+
+
+def test_fix_year_contradictions_drops_current_date_predicate(engine_stub):
+    sql = (
+        "SELECT * FROM cfdi_ventas WHERE EXTRACT(YEAR FROM fecha_emision) = 2025 "
+        "AND EXTRACT(YEAR FROM fecha_emision) = EXTRACT(YEAR FROM CURRENT_DATE) - 1 LIMIT 5;"
+    )
+
+    updated = engine_stub._fix_year_contradictions(sql, 2025)
+
+    assert updated == "SELECT * FROM cfdi_ventas WHERE EXTRACT(YEAR FROM fecha_emision) = 2025 LIMIT 5;"
+
+
+def _pathological_inputs(size):
+    rng = random.Random(size)
+    alphabet = "SELECT FROM WHERE ( ) ' \" -- /* , ; AS a_b 1.5 e' \\ EXTRACT"
+    return [
+        "a" * size,
+        "SELECT " + "(" * size,
+        "SELECT " + ")" * size,
+        "SELECT '" + "a''" * (size // 3),
+        "SELECT " + "x AS " * (size // 5),
+        "SELECT " + "EXTRACT(YEAR FROM " * (size // 18),
+        "SELECT " + ", " * (size // 2) + " FROM cfdi_ventas",
+        "SELECT 1 FROM cfdi_ventas v WHERE v.total IN (" * (size // 45)
+        + "SELECT 1" + ")" * (size // 45),
+        "".join(rng.choice(alphabet.split(" ") + [" "]) for _ in range(size // 3)),
+    ]
+
+
+def _max_parse_time(size):
+    engine = object.__new__(NL2SQLEngine)
+    empresa_id = "11111111-1111-1111-1111-111111111111"
+    worst = 0.0
+    gc.disable()  # medir el análisis, no las pausas del recolector
+    try:
+        for sql in _pathological_inputs(size):
+            sql_ast.parse_sql.cache_clear()
+            start = time.perf_counter()
+            sql_ast.parse_sql(sql)
+            validate_sql_static(sql[:MAX_SQL_LENGTH])
+            engine.validate_sql(sql[:MAX_SQL_LENGTH], empresa_id=empresa_id)
+            engine._ensure_tenant_filter(sql, empresa_id=empresa_id)
+            worst = max(worst, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return worst
+
+
+def test_fuzz_parse_scales_linearly_on_pathological_input():
+    small = max(_max_parse_time(1000), 1e-4)
+    large = _max_parse_time(16000)
+
+    # 16x más texto: un análisis lineal queda muy por debajo de 16² = 256x.
+    assert large / small < 64
+    assert large < 1.0
+
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        ("SELECT * FROM cfdi_ventas LIMIT 10;", "SELECT * FROM cfdi_ventas LIMIT 10"),
+        ("SELECT * FROM cfdi_ventas LIMIT 5000;", "SELECT * FROM cfdi_ventas LIMIT 1001"),
+        ("SELECT * FROM cfdi_ventas ORDER BY total DESC", "SELECT * FROM cfdi_ventas ORDER BY total DESC LIMIT 1001"),
+        (
+            "SELECT 1 FROM cfdi_ventas UNION ALL SELECT 2 FROM cfdi_pagos LIMIT 10",
+            "SELECT 1 FROM cfdi_ventas UNION ALL SELECT 2 FROM cfdi_pagos LIMIT 10",
+        ),
+        (
+            "SELECT * FROM (SELECT * FROM cfdi_ventas LIMIT 5) t OFFSET 2",
+            "SELECT * FROM (SELECT * FROM (SELECT * FROM cfdi_ventas LIMIT 5) t OFFSET 2) AS _nl2sql_acotado LIMIT 1001",
+        ),
+    ],
+)
+def test_cap_limit_bounds_only_the_top_level_query(sql, expected):
+    assert sql_ast.cap_limit(sql, 1001) == expected
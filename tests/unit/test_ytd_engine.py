@@ -0,0 +1,142 @@
+"""
+Tests unitarios para utils/ytd_engine.py
+Motor YTD: orden único por fecha y consultas por searchsorted.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.ytd_engine import MotorYTD, limpiar_cache_motores, obtener_motor_ytd, series_acumuladas_mensuales
+
+
+@pytest.fixture
+def ventas():
+    rng = np.random.default_rng(11)
+    n = 4000
+    df = pd.DataFrame({
+        "fecha": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 1000, n), unit="D"),
+        "linea_de_negocio": rng.choice(["Dykem", "ACMOS", "Kluber", None], n),
+        "producto": rng.choice([f"SKU-{i}" for i in range(25)], n),
+        "ventas_usd": rng.uniform(-50, 3000, n).round(2),
+    })
+    return df.sample(frac=1, random_state=3)  # desordenado a propósito
+
+
+@pytest.fixture(autouse=True)
+def cache_limpia():
+    limpiar_cache_motores()
+    yield
+    limpiar_cache_motores()
+
+
+def _ytd_ingenuo(df, año, corte):
+    return df[(df["fecha"].dt.year == año) & (df["fecha"] <= corte)]
+
+
+@pytest.mark.parametrize("año, corte", [
+    (2023, datetime(2023, 12, 31)),
+    (2024, datetime(2024, 2, 29)),
+    (2024, datetime(2024, 7, 15, 12, 30)),
+    (2025, datetime(2025, 1, 1)),
+    (2025, datetime(2026, 6, 1)),
+    (2022, datetime(2022, 6, 1)),
+])
+def test_motor_coincide_con_filtro_ingenuo(ventas, año, corte):
+    motor = MotorYTD(ventas)
+    esperado = _ytd_ingenuo(ventas, año, corte)
+
+    filas = motor.filas(año, corte)
+    assert sorted(filas.index) == sorted(esperado.index)
+    assert filas["fecha"].is_monotonic_increasing
+    assert motor.total(año, corte) == pytest.approx(esperado["ventas_usd"].sum())
+
+    por_linea = motor.totales_por("linea_de_negocio", año, corte)
+    pd.testing.assert_series_equal(
+        por_linea,
+        esperado.groupby("linea_de_negocio")["ventas_usd"].sum(),
+        check_names=False,
+    )
+
+
+def test_totales_por_dimension_en_varios_cortes(ventas):
+    motor = MotorYTD(ventas)
+
+    for corte in pd.date_range("2024-01-01", "2024-12-31", freq="17D"):
+        esperado = _ytd_ingenuo(ventas, 2024, corte).groupby("producto")["ventas_usd"].sum()
+        obtenido = motor.totales_por("producto", 2024, corte)
+        pd.testing.assert_series_equal(obtenido, esperado, check_names=False)
+
+
+def test_fecha_maxima_y_año_sin_datos(ventas):
+    motor = MotorYTD(ventas)
+
+    assert motor.años == [2023, 2024, 2025]
+    assert motor.fecha_maxima(2024) == ventas.loc[ventas["fecha"].dt.year == 2024, "fecha"].max()
+    assert motor.fecha_maxima(2019) is None
+    assert motor.filas(2019, datetime(2019, 5, 1)).empty
+    assert motor.total(2019) == 0
+    assert motor.totales_por("producto", 2019).empty
+
+
+def test_filas_son_rebanadas_sin_copia(ventas):
+    motor = MotorYTD(ventas)
+
+    a = motor.filas(2024, datetime(2024, 3, 1))
+    b = motor.filas(2024, datetime(2024, 9, 1))
+
+    assert np.shares_memory(a["ventas_usd"].to_numpy(), b["ventas_usd"].to_numpy())
+
+
+def test_obtener_motor_reutiliza_por_identidad(ventas):
+    motor = obtener_motor_ytd(ventas)
+
+    assert obtener_motor_ytd(ventas) is motor
+    assert obtener_motor_ytd(ventas.copy()) is not motor
+
+
+def test_series_acumuladas_mensuales_coincide_con_bucle_por_grupo(ventas):
+    from scripts.profile_performance import _series_acumuladas_por_bucle
+
+    df_2024 = MotorYTD(ventas).filas(2024, datetime(2024, 8, 20))
+    # Un producto sin ventas en mayo: su curva debe saltarse ese mes, como en el bucle
+    df_2024 = df_2024[~((df_2024["producto"] == "SKU-4") & (df_2024["fecha"].dt.month == 5))]
+
+    acumulado = series_acumuladas_mensuales(df_2024, "producto")
+    por_bucle = _series_acumuladas_por_bucle(df_2024, "producto")
+
+    assert list(acumulado.columns) == list(pd.unique(df_2024["producto"]))
+    for producto, serie in por_bucle.items():
+        obtenida = acumulado[producto].dropna()
+        assert list(obtenida.index) == list(serie.index)
+        np.testing.assert_allclose(obtenida.to_numpy(), serie.to_numpy())
+
+
+def test_series_acumuladas_mensuales_dimension_categorica(ventas):
+    df_2024 = MotorYTD(ventas).filas(2024, datetime(2024, 8, 20))
+    df_2024 = df_2024[~((df_2024["linea_de_negocio"] == "Kluber") & (df_2024["fecha"].dt.month == 5))]
+    categorica = df_2024.assign(
+        linea_de_negocio=pd.Categorical(
+            df_2024["linea_de_negocio"], categories=["Dykem", "ACMOS", "Kluber", "Sin uso"]
+        )
+    )
+
+    esperado = series_acumuladas_mensuales(df_2024, "linea_de_negocio")
+    obtenido = series_acumuladas_mensuales(categorica, "linea_de_negocio")
+
+    # Las combinaciones no observadas no se rellenan con 0: mayo sigue en NaN
+    assert np.isnan(obtenido.loc[5, "Kluber"])
+    assert "Sin uso" not in obtenido.columns
+    np.testing.assert_allclose(obtenido.to_numpy(), esperado.to_numpy())
+    assert list(obtenido.columns) == list(esperado.columns)
+
+
+def test_benchmark_series_acumuladas_reporta_tiempos():
+    from scripts.profile_performance import benchmark_series_acumuladas
+
+    resultado = benchmark_series_acumuladas(n_filas=20_000, n_lineas=8)
+
+    assert resultado["lineas"] == 8
+    assert resultado["bucle_s"] > 0 and resultado["vectorizado_s"] > 0
@@ -11,13 +11,21 @@ Funcionalidad:
 
 import json
 import os
-from openai import OpenAI
 from utils.logger import configurar_logger
 
 # Configurar logger
 logger = configurar_logger("ai_helper", nivel="INFO")
 
 
+def OpenAI(*args, **kwargs):
+    """
+    Cliente de OpenAI; el SDK (~0.5 s de import) se importa al primer uso
+    y no al cargar la página.
+    """
+    from openai import OpenAI as _OpenAI
+    return _OpenAI(*args, **kwargs)
+
+
 def validar_api_key(api_key: str) -> bool:
     """
     Valida que la API key de OpenAI sea válida.
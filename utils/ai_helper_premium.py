@@ -10,12 +10,17 @@ Funcionalidad:
 """
 
 import json
-from openai import OpenAI
 from utils.logger import configurar_logger
 
 logger = configurar_logger("ai_helper_premium", nivel="INFO")
 
 
+def OpenAI(*args, **kwargs):
+    """Cliente de OpenAI con import diferido del SDK (igual que en ai_helper)."""
+    from openai import OpenAI as _OpenAI
+    return _OpenAI(*args, **kwargs)
+
+
 def generar_insights_kpi_vendedores(
     num_vendedores: int,
     ticket_promedio_general: float,
@@ -10,6 +10,8 @@ Proporciona:
 """
 
 import os
+import threading
+import time
 import bcrypt
 import psycopg2
 import psycopg2.extras
@@ -18,6 +20,7 @@ from typing import Optional
 import streamlit as st
 from dataclasses import dataclass, field
 from utils.logger import configurar_logger
+from utils.neon_pool import obtener_conexion
 
 logger = configurar_logger("auth", nivel="INFO")
 
@@ -27,11 +30,34 @@ logger = configurar_logger("auth", nivel="INFO")
 MAX_LOGIN_ATTEMPTS: int = int(os.getenv("MAX_LOGIN_ATTEMPTS", "5"))
 SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", "28800"))   # 8 horas
 LOGIN_LOCKOUT_SECONDS: int = int(os.getenv("LOGIN_LOCKOUT_SECONDS", "900")) # 15 minutos
+# Vigencia de la caché usuario → empresas (se invalida al asignar/revocar acceso)
+MEMBERSHIP_CACHE_TTL_SECONDS: int = int(os.getenv("MEMBERSHIP_CACHE_TTL_SECONDS", "60"))
+
+# Versión del esquema de autenticación; subirla al cambiar el DDL de _ensure_schema
+AUTH_SCHEMA_VERSION = 1
+
+# El bootstrap (DDL + admin + empresa por defecto) corre una vez por proceso,
+# no en cada AuthManager() (app.py y el panel de admin crean uno por rerun)
+_bootstrap_lock = threading.Lock()
+_bootstrap_hecho = False
+
+# username → (monotonic de carga, empresas)
+_membership_cache: dict[str, tuple[float, list[dict]]] = {}
+_membership_lock = threading.Lock()
 
 
 def _get_conn():
-    """Obtiene conexión a Neon PostgreSQL."""
-    return psycopg2.connect(os.environ["NEON_DATABASE_URL"])
+    """Obtiene conexión a Neon PostgreSQL (prestada del pool del proceso)."""
+    return obtener_conexion(os.environ["NEON_DATABASE_URL"])
+
+
+def invalidar_cache_empresas(username: str = None) -> None:
+    """Olvida las empresas cacheadas de un usuario (o de todos)."""
+    with _membership_lock:
+        if username is None:
+            _membership_cache.clear()
+        else:
+            _membership_cache.pop(username, None)
 
 
 def _normalize_login_key(username: str) -> str:
@@ -89,16 +115,35 @@ class AuthManager:
 
     def __init__(self, db_path: str = None):
         # db_path ignorado (compatibilidad); siempre usa Neon
-        self._ensure_schema()
-        self._ensure_admin()
-        self._ensure_default_empresa()
+        self._bootstrap()
 
     # ------------------------------------------------------------------
     # Internals
     # ------------------------------------------------------------------
 
-    def _ensure_schema(self):
-        """Crea las tablas necesarias si no existen (idempotente)."""
+    def _bootstrap(self):
+        """Esquema, admin y empresa por defecto: una vez por proceso.
+
+        Si el esquema no se pudo asegurar (BD inaccesible) se reintenta en la
+        siguiente instancia.
+        """
+        global _bootstrap_hecho
+        if _bootstrap_hecho:
+            return
+        with _bootstrap_lock:
+            if _bootstrap_hecho:
+                return
+            esquema_ok = self._ensure_schema()
+            self._ensure_admin()
+            self._ensure_default_empresa()
+            _bootstrap_hecho = bool(esquema_ok)
+
+    def _ensure_schema(self) -> bool:
+        """Crea las tablas necesarias si no existen (idempotente).
+
+        La tabla auth_schema_version guarda la versión aplicada: si ya está en
+        AUTH_SCHEMA_VERSION no se vuelve a mandar el DDL.
+        """
         ddl = """
         CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
@@ -158,12 +203,31 @@ class AuthManager:
         try:
             conn = _get_conn()
             cur = conn.cursor()
-            cur.execute(ddl)
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS auth_schema_version (
+                    version     INTEGER PRIMARY KEY,
+                    applied_at  TIMESTAMP DEFAULT NOW()
+                );
+                SELECT COALESCE(MAX(version), 0) FROM auth_schema_version;
+                """
+            )
+            if cur.fetchone()[0] < AUTH_SCHEMA_VERSION:
+                # Serializa el DDL entre workers que arrancan a la vez
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext('auth_schema_version'))")
+                cur.execute(ddl)
+                cur.execute(
+                    "INSERT INTO auth_schema_version (version) VALUES (%s) ON CONFLICT DO NOTHING",
+                    (AUTH_SCHEMA_VERSION,),
+                )
+                logger.info(f"Esquema de auth actualizado a versión {AUTH_SCHEMA_VERSION}")
             conn.commit()
             cur.close()
             conn.close()
+            return True
         except Exception as e:
             logger.warning(f"_ensure_schema: {e}")
+            return False
 
     def _ensure_default_empresa(self):
         """Siembra la empresa por defecto desde env vars EMPRESA_RFC y EMPRESA_RAZON_SOCIAL.
@@ -209,6 +273,7 @@ class AuthManager:
                     (empresa_id, rfc),
                 )
                 conn.commit()
+                invalidar_cache_empresas("admin")
             cur.close()
             conn.close()
             logger.info(f"Empresa por defecto asegurada: RFC={rfc}")
@@ -518,6 +583,7 @@ class AuthManager:
                     )
                     conn2.commit()
                     cur2.close(); conn2.close()
+                    invalidar_cache_empresas(username)
                 except Exception as e2:
                     logger.warning(f"user_empresas insert error (no crítico): {e2}")
 
@@ -708,7 +774,14 @@ class AuthManager:
     def get_user_empresas(self, username: str) -> list[dict]:
         """Retorna todas las empresas a las que tiene acceso un usuario.
         [{id, rfc, razon_social, plan, status, role_en_empresa}]
+
+        Cacheado por MEMBERSHIP_CACHE_TTL_SECONDS; add_user_empresa y
+        remove_user_empresa invalidan la entrada del usuario.
         """
+        with _membership_lock:
+            cacheado = _membership_cache.get(username)
+        if cacheado and time.monotonic() - cacheado[0] < MEMBERSHIP_CACHE_TTL_SECONDS:
+            return [dict(e) for e in cacheado[1]]
         try:
             conn = _get_conn()
             cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
@@ -725,7 +798,10 @@ class AuthManager:
             )
             rows = cur.fetchall()
             cur.close(); conn.close()
-            return [dict(r) for r in rows]
+            empresas = [dict(r) for r in rows]
+            with _membership_lock:
+                _membership_cache[username] = (time.monotonic(), empresas)
+            return [dict(e) for e in empresas]
         except Exception as e:
             # Tabla puede no existir aún (antes de la migración)
             logger.warning(f"get_user_empresas fallback (¿falta migración?): {e}")
@@ -753,6 +829,7 @@ class AuthManager:
                 (username, empresa_id, role, granted_by),
             )
             conn.commit(); cur.close(); conn.close()
+            invalidar_cache_empresas(username)
             logger.info(f"Acceso empresa agregado: {username} → {empresa_id} ({role}) por {granted_by}")
             return True, f"Acceso a empresa asignado con rol {role}"
         except Exception as e:
@@ -776,6 +853,7 @@ class AuthManager:
                 cur.close(); conn.close()
                 return False, "Relación usuario-empresa no encontrada"
             conn.commit(); cur.close(); conn.close()
+            invalidar_cache_empresas(username)
             logger.info(f"Acceso empresa revocado: {username} → {empresa_id}")
             return True, "Acceso revocado"
         except Exception as e:
@@ -980,6 +1058,7 @@ class AuthManager:
                 return False, f"Solicitud de '{username}' no encontrada o ya procesada"
             conn.commit()
             cur.close(); conn.close()
+            invalidar_cache_empresas(username)
             logger.info(f"Solicitud rechazada/eliminada: {username} por {admin_username}")
             return True, f"Solicitud de '{username}' rechazada"
         except Exception as e:
@@ -7,17 +7,27 @@ reduciendo tiempos de carga y mejorando la experiencia de usuario.
 
 import streamlit as st
 import pandas as pd
-import hashlib
-from typing import Any, Optional, Callable
+import numpy as np
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Callable, Sequence, Union
 from functools import wraps
 import time
 
+from utils.huella import huella_dataframe
+
+# Resultados intermedios memoizados por sesión (LRU); cada entrada puede ser
+# un DataFrame completo, así que el límite es deliberadamente bajo
+MAX_ENTRADAS_MEMO = 24
+
 
 def calcular_hash_dataframe(df: pd.DataFrame) -> str:
     """
     Calcula un hash único para un DataFrame.
     
-    Útil para invalidación de caché cuando los datos cambian.
+    Útil para invalidación de caché cuando los datos cambian. Delega en
+    `utils.huella.huella_dataframe` sin reutilizar la huella cacheada del
+    objeto, para detectar también cambios hechos en sitio.
     
     Args:
         df: DataFrame de pandas
@@ -33,9 +43,7 @@ def calcular_hash_dataframe(df: pd.DataFrame) -> str:
         >>> hash1 != hash2
         True
     """
-    # Usar valores + columnas + shape para el hash
-    datos_str = f"{df.columns.tolist()}{df.shape}{df.values.tobytes()}"
-    return hashlib.md5(datos_str.encode()).hexdigest()[:16]
+    return huella_dataframe(df, usar_cache=False)
 
 
 def cache_con_timeout(ttl_segundos: int = 300):
@@ -259,9 +267,166 @@ class GestorCache:
         }
 
 
+def _congelar(valor: Any) -> Any:
+    """Convierte el estado de filtros en una tupla hasheable y estable."""
+    if isinstance(valor, pd.DataFrame):
+        return ("df", huella_dataframe(valor))
+    if isinstance(valor, dict):
+        return tuple(sorted((str(k), _congelar(v)) for k, v in valor.items()))
+    if isinstance(valor, (set, frozenset)):
+        return tuple(sorted((_congelar(v) for v in valor), key=repr))
+    if isinstance(valor, (list, tuple, pd.Index, np.ndarray)):
+        return tuple(_congelar(v) for v in valor)
+    if isinstance(valor, (date, datetime, pd.Timestamp)):
+        return pd.Timestamp(valor).isoformat()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+
+class MemoSesion:
+    """
+    Memoización por sesión de resultados intermedios de los módulos.
+
+    Cada resultado (tabla de aging, pivot, métricas por cliente...) se indexa
+    por nombre + huella de los DataFrames de entrada + estado de filtros, de
+    modo que una interacción que no cambia datos ni filtros (un toggle de
+    visualización, un expander) reutiliza el cálculo anterior. Las entradas
+    viven en ``st.session_state`` con límite LRU y contadores de hits/misses
+    por nombre.
+
+    Los resultados se comparten entre reruns: quien los reciba no debe
+    modificarlos en sitio.
+
+    Examples:
+        >>> metricas = memo_vistas.obtener_o_calcular(
+        ...     "kpi_cpc.metricas_cliente", df_np, (fecha_corte,),
+        ...     lambda: calcular_metricas_por_cliente(df_np),
+        ... )
+    """
+
+    CLAVE_ENTRADAS = "_memo_vistas"
+    CLAVE_STATS = "_memo_vistas_stats"
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS_MEMO, session_state=None):
+        self.max_entradas = max_entradas
+        self._session_state = session_state
+
+    @property
+    def _estado(self):
+        # Se resuelve en cada uso para respetar la sesión activa
+        return self._session_state if self._session_state is not None else st.session_state
+
+    def _entradas(self) -> "OrderedDict":
+        estado = self._estado
+        if self.CLAVE_ENTRADAS not in estado:
+            estado[self.CLAVE_ENTRADAS] = OrderedDict()
+        return estado[self.CLAVE_ENTRADAS]
+
+    def _stats(self, nombre: str) -> Dict[str, float]:
+        estado = self._estado
+        if self.CLAVE_STATS not in estado:
+            estado[self.CLAVE_STATS] = {}
+        return estado[self.CLAVE_STATS].setdefault(
+            nombre, {"hits": 0, "misses": 0, "tiempo_calculo": 0.0, "tiempo_ahorrado": 0.0}
+        )
+
+    def clave(
+        self,
+        nombre: str,
+        datos: Union[pd.DataFrame, Sequence[Optional[pd.DataFrame]], None],
+        estado: Any = (),
+    ) -> tuple:
+        """Clave de memo: nombre, huellas de los DataFrames de entrada y estado congelado."""
+        if datos is None or isinstance(datos, pd.DataFrame):
+            datos = (datos,)
+        huellas = tuple(huella_dataframe(d) if d is not None else None for d in datos)
+        return (nombre, huellas, _congelar(estado))
+
+    def obtener_o_calcular(
+        self,
+        nombre: str,
+        datos: Union[pd.DataFrame, Sequence[Optional[pd.DataFrame]], None],
+        estado: Any,
+        calcular: Callable[[], Any],
+    ) -> Any:
+        """
+        Devuelve el resultado memoizado o lo calcula y lo guarda.
+
+        Args:
+            nombre: Identificador del cálculo (p. ej. "kpi_cpc.cxc_metrics")
+            datos: DataFrame o secuencia de DataFrames de los que depende
+            estado: Filtros/parámetros que afectan el resultado (tupla, dict...)
+            calcular: Función sin argumentos que produce el resultado (solo en miss)
+
+        Returns:
+            Resultado memoizado o recién calculado
+        """
+        llave = self.clave(nombre, datos, estado)
+        entradas = self._entradas()
+        stats = self._stats(nombre)
+
+        if llave in entradas:
+            resultado, duracion = entradas[llave]
+            entradas.move_to_end(llave)
+            stats["hits"] += 1
+            stats["tiempo_ahorrado"] += duracion
+            return resultado
+
+        inicio = time.perf_counter()
+        resultado = calcular()
+        duracion = time.perf_counter() - inicio
+
+        stats["misses"] += 1
+        stats["tiempo_calculo"] += duracion
+        entradas[llave] = (resultado, duracion)
+        while len(entradas) > self.max_entradas:
+            entradas.popitem(last=False)
+        return resultado
+
+    def estadisticas(self) -> Dict[str, Dict[str, float]]:
+        """Hits, misses y tiempos por cálculo, más el total en la clave "total"."""
+        por_nombre = {n: dict(s) for n, s in self._estado.get(self.CLAVE_STATS, {}).items()}
+        total = {"hits": 0, "misses": 0, "tiempo_calculo": 0.0, "tiempo_ahorrado": 0.0}
+        for stats in por_nombre.values():
+            for campo in total:
+                total[campo] += stats[campo]
+        total["entradas"] = len(self._estado.get(self.CLAVE_ENTRADAS, ()))
+        por_nombre["total"] = total
+        return por_nombre
+
+    def mostrar_estadisticas(self):
+        """Muestra hits/misses de la memoización por cálculo."""
+        stats = self.estadisticas()
+        total = stats.pop("total")
+        if total["hits"] + total["misses"] == 0:
+            st.info("Sin estadísticas de memoización aún")
+            return
+
+        st.caption(
+            f"⚡ Memo: {total['hits']} hits · {total['misses']} misses · "
+            f"{total['entradas']}/{self.max_entradas} entradas · "
+            f"{total['tiempo_ahorrado']:.1f}s ahorrados"
+        )
+        st.dataframe(
+            pd.DataFrame.from_dict(stats, orient="index").sort_values("tiempo_ahorrado", ascending=False),
+            use_container_width=True,
+        )
+
+    def limpiar(self):
+        """Descarta los resultados memoizados y reinicia los contadores."""
+        estado = self._estado
+        for clave in (self.CLAVE_ENTRADAS, self.CLAVE_STATS):
+            if clave in estado:
+                del estado[clave]
+
+
 # Instancia global del gestor
 gestor_cache = GestorCache()
 
+# Memoización por sesión para los módulos (kpi_cpc, vendedores_cxc, reporte_ejecutivo, heatmap)
+memo_vistas = MemoSesion()
+
 
 if __name__ == "__main__":
     # Demo del sistema de caché
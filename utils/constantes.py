@@ -124,6 +124,31 @@ COLUMNAS_VENDEDOR = [
     'vendedor_asignado'
 ]
 
+# Columnas de texto repetitivo que se tipan al cargar (tipar_columnas_carga)
+COLUMNAS_TEXTO_TIPADAS = [
+    'cliente',
+    'vendedor',
+    'linea_de_negocio',
+    'producto',
+    'agente',
+    'moneda',
+    'metodo_pago',
+    'ejecutivo',
+    'linea_producto',
+]
+
+# Columnas enteras de identificadores/códigos que pueden bajar a int32 al
+# cargar. Importes y cantidades se quedan en int64: sus productos y sumas
+# desbordarían int32 sin aviso.
+COLUMNAS_ENTERAS_COMPACTAS = [
+    'folio',
+    'id_venta',
+    'id_factura',
+    'id_cxc',
+    'cliente_id',
+    'vendedor_id',
+]
+
 # =====================================================================
 # MAPA DE ALIAS → NOMBRE CANÓNICO
 # Cualquier alias en las listas se renombra al campo canónico.
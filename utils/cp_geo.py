@@ -0,0 +1,334 @@
+"""
+Índice offline de coordenadas por Código Postal (CP → lat/lon).
+
+El mapa de clientes necesita ubicar cientos de CPs en cada render. En lugar
+de recorrer ``data/cp_coords.csv`` fila por fila y geocodificar en línea los
+faltantes (Nominatim permite 1 req/s), las coordenadas se guardan en un
+índice binario compacto:
+
+- ``data/cp_coords.npy``: arreglo estructurado (cp int32, lat float32,
+  lon float32; 12 bytes por CP) ordenado por CP. Se abre con
+  ``np.load(mmap_mode="r")`` una vez por proceso y la búsqueda de todos los
+  CPs de una página es un solo ``np.searchsorted``.
+- El índice se construye a partir del CSV (``cp,lat,lon[,display]``) con
+  `construir_indice` o ``python -m utils.cp_geo [csv] [npy]``; si el CSV es
+  más reciente que el índice, se reconstruye al cargarlo.
+- La geocodificación en línea es opcional (`GEOCODIFICACION_ONLINE`) y corre
+  en un hilo de fondo (`RellenoCoordenadas`): nunca bloquea el render. Lo que
+  encuentra queda disponible de inmediato en el proceso y se anexa al CSV
+  para que el siguiente índice ya lo incluya.
+"""
+
+import csv
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.logger import configurar_logger
+
+logger = configurar_logger("cp_geo", nivel="INFO")
+
+_DATA_DIR = Path(__file__).parent.parent / "data"
+CSV_COORDS_PATH = _DATA_DIR / "cp_coords.csv"
+INDICE_COORDS_PATH = _DATA_DIR / "cp_coords.npy"
+
+DTYPE_INDICE = np.dtype([("cp", "<i4"), ("lat", "<f4"), ("lon", "<f4")])
+
+# Backfill en línea de los CPs que no están en el índice (MAPA_GEOCODIFICACION_ONLINE=0 lo apaga)
+GEOCODIFICACION_ONLINE: bool = os.getenv("MAPA_GEOCODIFICACION_ONLINE", "1") != "0"
+# Política de uso de Nominatim: máximo 1 petición por segundo
+PAUSA_NOMINATIM_SEG = 1.1
+
+Coordenada = Tuple[float, float, str]
+
+
+# ---------------------------------------------------------------------------
+# Construcción del índice
+# ---------------------------------------------------------------------------
+def _leer_csv(csv_path: Path) -> pd.DataFrame:
+    df = pd.read_csv(csv_path, dtype={"cp": str}, usecols=["cp", "lat", "lon"])
+    df = df.dropna(subset=["cp", "lat", "lon"])
+    df = df[df["cp"].str.fullmatch(r"\d{5}")]
+    # Si un CP aparece varias veces, gana la última fila (la más reciente del backfill)
+    return df.drop_duplicates(subset="cp", keep="last")
+
+
+def _a_arreglo(df: pd.DataFrame) -> np.ndarray:
+    datos = np.empty(len(df), dtype=DTYPE_INDICE)
+    datos["cp"] = df["cp"].astype(int).to_numpy()
+    datos["lat"] = df["lat"].astype(float).to_numpy()
+    datos["lon"] = df["lon"].astype(float).to_numpy()
+    datos.sort(order="cp")
+    return datos
+
+
+def construir_indice(
+    csv_path: Path = CSV_COORDS_PATH,
+    destino: Path = INDICE_COORDS_PATH,
+) -> int:
+    """
+    Genera el índice binario ordenado a partir del CSV de coordenadas.
+
+    Returns:
+        Número de CPs en el índice
+    """
+    datos = _a_arreglo(_leer_csv(Path(csv_path)))
+    destino = Path(destino)
+    temporal = destino.with_name(destino.name + ".tmp")
+    with open(temporal, "wb") as f:
+        np.save(f, datos)
+    os.replace(temporal, destino)
+    logger.info(f"Índice de CPs generado: {len(datos)} CPs → {destino}")
+    return len(datos)
+
+
+# ---------------------------------------------------------------------------
+# Consulta
+# ---------------------------------------------------------------------------
+class IndiceCP:
+    """Índice CP → (lat, lon) sobre un arreglo ordenado, más los CPs del backfill."""
+
+    def __init__(self, datos: np.ndarray):
+        self._datos = datos
+        self._cps = datos["cp"]
+        self._extra: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def cargar(
+        cls,
+        indice_path: Path = INDICE_COORDS_PATH,
+        csv_path: Path = CSV_COORDS_PATH,
+    ) -> "IndiceCP":
+        """
+        Abre el índice en modo memory-map; lo reconstruye si falta o si el CSV
+        es más reciente. Sin índice ni CSV devuelve un índice vacío.
+        """
+        indice_path, csv_path = Path(indice_path), Path(csv_path)
+        desactualizado = csv_path.exists() and (
+            not indice_path.exists()
+            or csv_path.stat().st_mtime > indice_path.stat().st_mtime
+        )
+        if desactualizado:
+            try:
+                construir_indice(csv_path, indice_path)
+            except OSError as e:
+                # Directorio de solo lectura: el índice vive en memoria este proceso
+                logger.warning(f"No se pudo escribir {indice_path.name}: {e}")
+                return cls(_a_arreglo(_leer_csv(csv_path)))
+            except Exception as e:
+                logger.warning(f"Error leyendo {csv_path.name}: {e}")
+        if indice_path.exists():
+            try:
+                return cls(np.load(indice_path, mmap_mode="r"))
+            except Exception as e:
+                logger.warning(f"Índice de CPs ilegible ({indice_path.name}): {e}")
+        return cls(np.empty(0, dtype=DTYPE_INDICE))
+
+    def __len__(self) -> int:
+        return len(self._datos) + len(self._extra)
+
+    def agregar(self, cp: str, lat: float, lon: float) -> None:
+        """Agrega un CP geocodificado en línea (visible de inmediato en este proceso)."""
+        with self._lock:
+            self._extra[cp] = (lat, lon)
+
+    def buscar(self, cps: Iterable[str]) -> pd.DataFrame:
+        """
+        Coordenadas de una lista de CPs.
+
+        Returns:
+            DataFrame (cp, lat, lon) en el orden recibido; lat/lon en NaN para
+            los CPs que no están en el índice.
+        """
+        serie = pd.Series(list(cps), dtype=object).astype(str).str.strip()
+        validos = serie.str.fullmatch(r"\d{5}").to_numpy(dtype=bool)
+        claves = np.full(len(serie), -1, dtype=np.int32)
+        claves[validos] = serie[validos].astype(int).to_numpy()
+
+        lat = np.full(len(serie), np.nan)
+        lon = np.full(len(serie), np.nan)
+        encontrados = np.zeros(len(serie), dtype=bool)
+        if len(self._cps):
+            pos = np.minimum(np.searchsorted(self._cps, claves), len(self._cps) - 1)
+            encontrados = validos & (self._cps[pos] == claves)
+            lat[encontrados] = self._datos["lat"][pos[encontrados]]
+            lon[encontrados] = self._datos["lon"][pos[encontrados]]
+
+        if self._extra:
+            with self._lock:
+                for i in np.flatnonzero(validos & ~encontrados):
+                    coords = self._extra.get(serie.iat[i])
+                    if coords is not None:
+                        lat[i], lon[i] = coords
+
+        return pd.DataFrame({"cp": serie.to_numpy(), "lat": lat, "lon": lon})
+
+
+# ---------------------------------------------------------------------------
+# Backfill en línea (hilo de fondo)
+# ---------------------------------------------------------------------------
+def geocodificar_nominatim(cp: str) -> Optional[Coordenada]:
+    """Geocodifica un CP mexicano vía Nominatim; None si no lo encontró."""
+    import requests
+
+    resp = requests.get(
+        "https://nominatim.openstreetmap.org/search",
+        params={"country": "mx", "postalcode": cp, "format": "json", "limit": 1},
+        headers={"User-Agent": "fradma-dashboard/1.0"},
+        timeout=6,
+    )
+    data = resp.json()
+    if not data:
+        return None
+    return float(data[0]["lat"]), float(data[0]["lon"]), data[0].get("display_name", "")
+
+
+class RellenoCoordenadas:
+    """
+    Cola de CPs por geocodificar en línea, atendida por un hilo daemon que
+    respeta la pausa entre peticiones. El hilo termina cuando la cola se vacía
+    y se vuelve a lanzar con el siguiente `encolar`.
+    """
+
+    def __init__(
+        self,
+        indice: IndiceCP,
+        geocodificar: Callable[[str], Optional[Coordenada]] = geocodificar_nominatim,
+        pausa: float = PAUSA_NOMINATIM_SEG,
+        csv_path: Optional[Path] = CSV_COORDS_PATH,
+    ):
+        self.indice = indice
+        self.geocodificar = geocodificar
+        self.pausa = pausa
+        self.csv_path = Path(csv_path) if csv_path else None
+        self._cola: deque = deque()
+        self._en_cola: set = set()
+        self._sin_resultado: set = set()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def encolar(self, cps: Iterable[str]) -> int:
+        """
+        Agrega a la cola los CPs que no están ya en ella ni fallaron antes.
+
+        Returns:
+            CPs pendientes de geocodificar (incluye los que ya estaban en cola)
+        """
+        with self._lock:
+            for cp in cps:
+                if cp not in self._en_cola and cp not in self._sin_resultado:
+                    self._en_cola.add(cp)
+                    self._cola.append(cp)
+            if self._cola and self._hilo is None:
+                self._hilo = threading.Thread(
+                    target=self._trabajar, name="cp-geocodificador", daemon=True,
+                )
+                self._hilo.start()
+            return len(self._en_cola)
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return len(self._en_cola)
+
+    def esperar(self, timeout: Optional[float] = None) -> None:
+        """Espera a que el hilo termine la cola (tests, scripts)."""
+        hilo = self._hilo
+        if hilo is not None:
+            hilo.join(timeout)
+
+    def _trabajar(self) -> None:
+        while True:
+            with self._lock:
+                if not self._cola:
+                    self._hilo = None
+                    return
+                cp = self._cola.popleft()
+            sin_resultado = False
+            try:
+                resultado = self.geocodificar(cp)
+                sin_resultado = resultado is None
+            except Exception as e:
+                # Error de red: el CP se puede volver a encolar más tarde
+                logger.warning(f"Geocodificación de CP {cp} falló: {e}")
+                resultado = None
+            if resultado is not None:
+                lat, lon, display = resultado
+                self.indice.agregar(cp, lat, lon)
+                self._anexar_csv(cp, lat, lon, display)
+            with self._lock:
+                self._en_cola.discard(cp)
+                if sin_resultado:
+                    self._sin_resultado.add(cp)
+            time.sleep(self.pausa)
+
+    def _anexar_csv(self, cp: str, lat: float, lon: float, display: str) -> None:
+        if self.csv_path is None:
+            return
+        try:
+            nuevo = not self.csv_path.exists()
+            with open(self.csv_path, "a", newline="", encoding="utf-8") as f:
+                escritor = csv.writer(f, lineterminator="\n")
+                if nuevo:
+                    escritor.writerow(["cp", "lat", "lon", "display"])
+                escritor.writerow([cp, lat, lon, display])
+        except OSError as e:
+            logger.warning(f"No se pudo anexar CP {cp} a {self.csv_path.name}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Instancias del proceso
+# ---------------------------------------------------------------------------
+_indice: Optional[IndiceCP] = None
+_relleno: Optional[RellenoCoordenadas] = None
+_instancias_lock = threading.Lock()
+
+
+def obtener_indice() -> IndiceCP:
+    """Índice del proceso (se carga al primer uso)."""
+    global _indice
+    with _instancias_lock:
+        if _indice is None:
+            inicio = time.perf_counter()
+            _indice = IndiceCP.cargar()
+            logger.info(
+                f"Índice de CPs cargado: {len(_indice)} CPs en "
+                f"{(time.perf_counter() - inicio) * 1000:.0f} ms"
+            )
+        return _indice
+
+
+def buscar_coords(cps: Iterable[str]) -> pd.DataFrame:
+    """Atajo a `obtener_indice().buscar`."""
+    return obtener_indice().buscar(cps)
+
+
+def rellenar_en_segundo_plano(cps: Iterable[str]) -> int:
+    """
+    Encola CPs para geocodificarlos en línea sin bloquear.
+
+    Returns:
+        CPs pendientes (0 si la geocodificación en línea está desactivada)
+    """
+    global _relleno
+    if not GEOCODIFICACION_ONLINE:
+        return 0
+    indice = obtener_indice()
+    with _instancias_lock:
+        if _relleno is None:
+            _relleno = RellenoCoordenadas(indice)
+    return _relleno.encolar(cps)
+
+
+if __name__ == "__main__":
+    # Regenerar el índice: python -m utils.cp_geo [cp_coords.csv] [cp_coords.npy]
+    origen = Path(sys.argv[1]) if len(sys.argv) > 1 else CSV_COORDS_PATH
+    destino = Path(sys.argv[2]) if len(sys.argv) > 2 else INDICE_COORDS_PATH
+    print(f"✅ {construir_indice(origen, destino)} CPs → {destino}")
@@ -20,6 +20,7 @@ from .constantes import (
     BINS_ANTIGUEDAD_AGENTES,
     LABELS_ANTIGUEDAD_AGENTES
 )
+from .modelo_unificado import codigos_antiguedad
 
 
 logger = configurar_logger("cxc_helper", nivel="INFO")
@@ -533,7 +534,7 @@ def clasificar_antiguedad(df: pd.DataFrame, columna_dias: str = 'dias_overdue',
         tipo: 'completo' (6 categorías) o 'agentes' (5 categorías)
         
     Returns:
-        pd.Series con categorías asignadas
+        pd.Series categórica ordenada (igual que ``pd.cut``), NaN sin dato
     """
     if tipo == 'agentes':
         bins = BINS_ANTIGUEDAD_AGENTES
@@ -542,11 +543,13 @@ def clasificar_antiguedad(df: pd.DataFrame, columna_dias: str = 'dias_overdue',
         bins = BINS_ANTIGUEDAD
         labels = LABELS_ANTIGUEDAD
     
-    return pd.cut(
-        df[columna_dias],
-        bins=bins,
-        labels=labels
+    # Mismo clasificador vectorizado que el aging del modelo unificado
+    categorias = pd.Categorical.from_codes(
+        codigos_antiguedad(df[columna_dias], bins),
+        categories=labels,
+        ordered=True,
     )
+    return pd.Series(categorias, index=df.index, name=columna_dias)
 
 
 def calcular_metricas_basicas(df_np: pd.DataFrame, columna_saldo: str = 'saldo_adeudado') -> Dict[str, float]:
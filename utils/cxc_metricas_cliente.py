@@ -3,14 +3,36 @@ Módulo para calcular métricas avanzadas de CxC agrupadas por cliente.
 
 Funciones:
 - calcular_metricas_por_cliente(): Calcula días vencidos por cliente usando 3 métodos
+- clasificar_rango_antiguedad(): Rango de antigüedad vectorizado (Vigente ... >90 días)
 """
 
+import numpy as np
 import pandas as pd
 from typing import Dict
 from utils.logger import configurar_logger
 
 logger = configurar_logger("cxc_metricas_cliente", nivel="INFO")
 
+# Rangos de antigüedad por cliente/factura: intervalos cerrados a la derecha
+BINS_RANGO_ANTIGUEDAD = [-np.inf, 0, 30, 60, 90, np.inf]
+LABELS_RANGO_ANTIGUEDAD = ["Vigente", "0-30 días", "31-60 días", "61-90 días", ">90 días"]
+
+
+def clasificar_rango_antiguedad(dias) -> np.ndarray:
+    """
+    Clasifica días vencidos en rangos de antigüedad con ``pd.cut``.
+
+    Equivale a la cadena ``<= 0 / <= 30 / <= 60 / <= 90 / resto``: los
+    valores NaN caen en ">90 días" (código -1 → última etiqueta), igual que
+    en la comparación escalar donde todas las condiciones son falsas.
+    """
+    codigos = pd.cut(
+        pd.Series(dias, dtype="float64"),
+        bins=BINS_RANGO_ANTIGUEDAD,
+        labels=LABELS_RANGO_ANTIGUEDAD,
+    ).cat.codes.to_numpy()
+    return np.asarray(LABELS_RANGO_ANTIGUEDAD, dtype=object)[codigos]
+
 
 def calcular_metricas_por_cliente(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -42,50 +64,35 @@ def calcular_metricas_por_cliente(df: pd.DataFrame) -> pd.DataFrame:
         logger.warning(f"Columnas faltantes para métricas por cliente: {missing}")
         return pd.DataFrame()
     
-    # Calcular métricas por cliente
-    metricas = []
-    
-    for cliente, grupo in df.groupby('deudor'):
-        saldo_total = grupo['saldo_adeudado'].sum()
-        num_facturas = len(grupo)
-        
-        # 1. Promedio ponderado por monto
-        dias_x_monto = (grupo['dias_overdue'] * grupo['saldo_adeudado']).sum()
-        dias_promedio_ponderado = dias_x_monto / saldo_total if saldo_total > 0 else 0
-        
-        # 2. Factura más antigua (max días)
-        dias_factura_mas_antigua = grupo['dias_overdue'].max()
-        
-        # 3. Factura más reciente (min días - última actividad)
-        dias_factura_mas_reciente = grupo['dias_overdue'].min()
-        
+    # Una sola pasada: agregaciones con nombre sobre el groupby
+    base = df[required_cols].assign(_dias_x_monto=df['dias_overdue'] * df['saldo_adeudado'])
+    agregado = base.groupby('deudor').agg(
+        saldo_total=('saldo_adeudado', 'sum'),
+        num_facturas=('saldo_adeudado', 'size'),
+        dias_x_monto=('_dias_x_monto', 'sum'),
+        dias_factura_mas_antigua=('dias_overdue', 'max'),  # peor caso
+        dias_factura_mas_reciente=('dias_overdue', 'min'),  # última actividad
+    )
+
+    # Promedio ponderado por monto (0 si el saldo del cliente no es positivo)
+    saldo_total = agregado['saldo_total'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ponderado = np.where(saldo_total > 0, agregado['dias_x_monto'].to_numpy(dtype='float64') / saldo_total, 0.0)
+
+    df_metricas = pd.DataFrame({
+        'deudor': agregado.index.to_numpy(dtype=object),
+        'saldo_total': agregado['saldo_total'].to_numpy(),
+        'num_facturas': agregado['num_facturas'].to_numpy(dtype='int64'),
+        'dias_promedio_ponderado': np.round(ponderado, 1),
+        'dias_factura_mas_antigua': agregado['dias_factura_mas_antigua'].astype('int64').to_numpy(),
+        'dias_factura_mas_reciente': agregado['dias_factura_mas_reciente'].astype('int64').to_numpy(),
         # Clasificar por el promedio ponderado (métrica más realista)
-        if dias_promedio_ponderado <= 0:
-            rango = "Vigente"
-        elif dias_promedio_ponderado <= 30:
-            rango = "0-30 días"
-        elif dias_promedio_ponderado <= 60:
-            rango = "31-60 días"
-        elif dias_promedio_ponderado <= 90:
-            rango = "61-90 días"
-        else:
-            rango = ">90 días"
-        
-        metricas.append({
-            'deudor': cliente,
-            'saldo_total': saldo_total,
-            'num_facturas': num_facturas,
-            'dias_promedio_ponderado': round(dias_promedio_ponderado, 1),
-            'dias_factura_mas_antigua': int(dias_factura_mas_antigua),
-            'dias_factura_mas_reciente': int(dias_factura_mas_reciente),
-            'rango_antiguedad': rango
-        })
-    
-    df_metricas = pd.DataFrame(metricas)
-    
+        'rango_antiguedad': clasificar_rango_antiguedad(ponderado),
+    })
+
     # Ordenar por saldo total descendente
     df_metricas = df_metricas.sort_values('saldo_total', ascending=False)
-    
+
     return df_metricas
 
 
@@ -172,21 +179,9 @@ def obtener_facturas_cliente(df: pd.DataFrame, nombre_cliente: str) -> pd.DataFr
 
     df_detalle = df_cliente[cols_output].rename(columns=rename_map).copy()
 
-    # Clasificar rango individual de cada factura
-    def _rango(dias):
-        if dias <= 0:
-            return 'Vigente'
-        elif dias <= 30:
-            return '0-30 días'
-        elif dias <= 60:
-            return '31-60 días'
-        elif dias <= 90:
-            return '61-90 días'
-        else:
-            return '>90 días'
-
     if 'dias_overdue' in df_detalle.columns:
-        df_detalle['rango'] = df_detalle['dias_overdue'].apply(_rango)
+        # Clasificar rango individual de cada factura
+        df_detalle['rango'] = clasificar_rango_antiguedad(df_detalle['dias_overdue'])
         df_detalle = df_detalle.sort_values('dias_overdue', ascending=False)
 
     df_detalle = df_detalle.reset_index(drop=True)
@@ -3,11 +3,26 @@ Módulo de limpieza y normalización de datos para Fradma Dashboard.
 Maneja nombres con variaciones de acentos, mayúsculas y errores tipográficos.
 """
 
+import numpy as np
 import pandas as pd
 from unidecode import unidecode
+from collections import Counter, defaultdict
+from functools import lru_cache
 import json
 import os
 
+# Textos normalizados que se recuerdan entre llamadas (por función normalizadora)
+MAX_TEXTOS_NORMALIZADOS_EN_CACHE = 200_000
+_normalizadores_cacheados = {}
+
+# Detección de duplicados: comparación de todos los pares solo con pocos valores
+LIMITE_COMPARACION_EXHAUSTIVA = 300
+CLAVES_NGRAMA_POR_TEXTO = 6
+MAX_TEXTOS_POR_BLOQUE = 100
+MIN_CLAVES_COMPARTIDAS = 2
+VENTANA_VECINDARIO = 4
+TAMANO_LOTE_SIMILITUD = 2_000
+
 
 def normalizar_texto(texto):
     """
@@ -38,6 +53,72 @@ def normalizar_texto(texto):
     return texto_str
 
 
+def _normalizador_cacheado(funcion):
+    """Versión con LRU acotado de `funcion`, compartida entre llamadas."""
+    cacheado = _normalizadores_cacheados.get(funcion)
+    if cacheado is None:
+        # typed=True: 1, 1.0 y True no deben compartir resultado
+        cacheado = lru_cache(maxsize=MAX_TEXTOS_NORMALIZADOS_EN_CACHE, typed=True)(funcion)
+        _normalizadores_cacheados[funcion] = cacheado
+    return cacheado
+
+
+def normalizar_serie(serie, funcion=normalizar_texto):
+    """
+    Aplica `funcion` a una Serie evaluándola solo sobre los valores únicos.
+
+    La columna se factoriza, cada valor distinto se normaliza una vez
+    (memoizado en un LRU acotado que se conserva entre llamadas) y los
+    resultados se reparten de vuelta por código. Equivale a
+    ``serie.apply(funcion)`` pero con O(valores distintos) llamadas Python
+    en lugar de O(filas). Los nulos se pasan tal cual a `funcion`. Las
+    columnas object que no son solo texto se procesan con ``apply``:
+    factorize no distingue 1, 1.0 y True.
+
+    Args:
+        serie: pd.Series a normalizar
+        funcion: Normalizador escalar (por defecto normalizar_texto)
+
+    Returns:
+        pd.Series de dtype object con el mismo índice y nombre
+
+    Example:
+        normalizar_serie(pd.Series(["José", "JOSÉ", None]))
+        # -> ["jose", "jose", None]
+    """
+    # factorize une valores iguales de distinto tipo (1, 1.0, True) que el
+    # normalizador convierte en textos distintos: columnas object que no son
+    # solo texto van celda por celda
+    if serie.dtype == object and pd.api.types.infer_dtype(serie, skipna=True) not in ("string", "empty"):
+        return serie.apply(funcion)
+
+    try:
+        codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    except TypeError:
+        # Celdas no hasheables (listas, dicts): sin factorizar
+        return serie.apply(funcion)
+
+    normalizador = _normalizador_cacheado(funcion)
+    normalizados = np.empty(len(unicos), dtype=object)
+    normalizados[:] = [normalizador(valor) for valor in unicos]
+
+    resultado = np.empty(len(serie), dtype=object)
+    validos = codigos >= 0
+    resultado[validos] = normalizados[codigos[validos]]
+    if not validos.all():
+        valores = serie.to_numpy(dtype=object)
+        resultado[~validos] = [funcion(valor) for valor in valores[~validos]]
+
+    return pd.Series(resultado, index=serie.index, name=serie.name, dtype=object)
+
+
+def limpiar_cache_normalizacion():
+    """Descarta los textos normalizados en memoria."""
+    for cacheado in _normalizadores_cacheados.values():
+        cacheado.cache_clear()
+    _normalizadores_cacheados.clear()
+
+
 def cargar_aliases(archivo_aliases='config/aliases.json'):
     """
     Carga el archivo de aliases/mapeos desde JSON.
@@ -85,8 +166,12 @@ def aplicar_aliases(serie, aliases_dict):
         for variante in variantes:
             mapeo[normalizar_texto(variante)] = valor_correcto
     
-    # Aplicar mapeo
-    return serie.apply(lambda x: mapeo.get(normalizar_texto(x), normalizar_texto(x)))
+    # Normalizar una vez por valor distinto y mapear solo las variantes conocidas
+    normalizada = normalizar_serie(serie, normalizar_texto)
+    con_alias = normalizada.isin(list(mapeo))
+    if con_alias.any():
+        normalizada[con_alias] = normalizada[con_alias].map(mapeo)
+    return normalizada
 
 
 def limpiar_columnas_texto(df, columnas=None, usar_aliases=True):
@@ -129,34 +214,146 @@ def limpiar_columnas_texto(df, columnas=None, usar_aliases=True):
                 df_limpio[col] = aplicar_aliases(df_limpio[col], aliases[col])
             else:
                 # Solo normalización automática
-                df_limpio[col] = df_limpio[col].apply(normalizar_texto)
+                df_limpio[col] = normalizar_serie(df_limpio[col], normalizar_texto)
     
     return df_limpio
 
 
-def detectar_duplicados_similares(serie, umbral_similitud=0.85):
+def _similitud_par(par):
+    """Ratio de SequenceMatcher con cotas baratas previas (worker de pool)."""
+    from difflib import SequenceMatcher
+
+    texto_a, texto_b, umbral = par
+    largo_a, largo_b = len(texto_a), len(texto_b)
+    # real_quick_ratio: cota superior exacta solo con longitudes
+    if largo_a + largo_b == 0 or 2 * min(largo_a, largo_b) / (largo_a + largo_b) < umbral:
+        return 0.0
+    matcher = SequenceMatcher(None, texto_a, texto_b)
+    if matcher.quick_ratio() < umbral:
+        return 0.0
+    return matcher.ratio()
+
+
+def _puntuar_pares(pares, umbral, n_procesos=None, progreso=None):
+    """Calcula la similitud de cada par, opcionalmente en un pool de procesos."""
+    total = len(pares)
+    tarea = [(a, b, umbral) for a, b in pares]
+    tamano_lote = max(1, min(TAMANO_LOTE_SIMILITUD, total))
+
+    if n_procesos and n_procesos > 1 and total > tamano_lote:
+        from concurrent.futures import ProcessPoolExecutor
+
+        similitudes = []
+        with ProcessPoolExecutor(max_workers=n_procesos) as pool:
+            for inicio, lote in enumerate(pool.map(_similitud_par, tarea, chunksize=tamano_lote)):
+                similitudes.append(lote)
+                if progreso and (inicio + 1) % tamano_lote == 0:
+                    progreso(inicio + 1, total)
+    else:
+        similitudes = []
+        for inicio in range(0, total, tamano_lote):
+            similitudes.extend(_similitud_par(par) for par in tarea[inicio:inicio + tamano_lote])
+            if progreso:
+                progreso(min(inicio + tamano_lote, total), total)
+
+    if progreso:
+        progreso(total, total)
+    return similitudes
+
+
+def _ngramas(texto, n=3):
+    relleno = f"\x02{texto}\x03"
+    return {relleno[i:i + n] for i in range(max(1, len(relleno) - n + 1))}
+
+
+def _pares_candidatos(textos):
+    """
+    Pares (i, j) de textos con i < j que vale la pena puntuar.
+
+    Combina dos bloqueos:
+    - n-gramas raros: cada texto se indexa por sus `CLAVES_NGRAMA_POR_TEXTO`
+      trigramas menos frecuentes (ignorando los que solo aparecen en él y los
+      presentes en más de `MAX_TEXTOS_POR_BLOQUE` textos); dos textos son
+      candidatos si comparten al menos `MIN_CLAVES_COMPARTIDAS` de esas
+      claves. Un error de dedo cambia pocos trigramas y deja casi intactos
+      los raros.
+    - vecindario ordenado: tras ordenar los textos al derecho y al revés se
+      compara cada uno con los `VENTANA_VECINDARIO` siguientes. Cubre nombres
+      formados solo por palabras frecuentes ("grupo norte sa de cv").
+    """
+    gramas = [_ngramas(texto) for texto in textos]
+    frecuencia = Counter(g for conjunto in gramas for g in conjunto)
+
+    pares = set()
+    indice = defaultdict(list)
+    for i, conjunto in enumerate(gramas):
+        claves = sorted(
+            (frecuencia[g], g) for g in conjunto if 1 < frecuencia[g] <= MAX_TEXTOS_POR_BLOQUE
+        )[:CLAVES_NGRAMA_POR_TEXTO]
+        coincidencias = Counter()
+        for _, clave in claves:
+            bloque = indice[clave]
+            coincidencias.update(bloque)
+            bloque.append(i)
+        minimo = min(MIN_CLAVES_COMPARTIDAS, len(claves))
+        pares.update((j, i) for j, n in coincidencias.items() if n >= minimo)
+
+    for llave in (lambda k: textos[k], lambda k: textos[k][::-1]):
+        orden = sorted(range(len(textos)), key=llave)
+        for pos, i in enumerate(orden):
+            for j in orden[pos + 1:pos + 1 + VENTANA_VECINDARIO]:
+                pares.add((min(i, j), max(i, j)))
+
+    return sorted(pares)
+
+
+def detectar_duplicados_similares(serie, umbral_similitud=0.85, n_procesos=None, progreso=None):
     """
     Detecta valores similares que probablemente son duplicados.
     Útil para sugerir aliases al usuario.
-    
+
+    Con hasta `LIMITE_COMPARACION_EXHAUSTIVA` valores únicos se comparan todos
+    los pares. Con más, primero se generan candidatos por bloqueo
+    (`_pares_candidatos`) y solo esos se puntúan, así el costo crece con el
+    número de pares plausibles y no con n². El bloqueo puede omitir pares
+    cuyo parecido venga solo de palabras muy comunes.
+
     Args:
         serie: pd.Series con valores a analizar
         umbral_similitud: Umbral de similitud (0-1)
-        
+        n_procesos: Procesos para puntuar los pares (None = en el proceso actual)
+        progreso: Callback opcional ``progreso(pares_puntuados, total_pares)``
+
     Returns:
         Lista de tuplas con posibles duplicados [(valor1, valor2, similitud)]
     """
-    from difflib import SequenceMatcher
-    
     valores_unicos = serie.dropna().unique()
+
+    # Valores que normalizan igual se puntúan una sola vez (similitud 1.0)
+    grupos = {}
+    for posicion, valor in enumerate(valores_unicos):
+        grupos.setdefault(normalizar_texto(valor), []).append(posicion)
+    textos = list(grupos)
+    posiciones = list(grupos.values())
+
     duplicados_potenciales = []
-    
-    for i, val1 in enumerate(valores_unicos):
-        for val2 in valores_unicos[i+1:]:
-            similitud = SequenceMatcher(None, 
-                                       normalizar_texto(val1), 
-                                       normalizar_texto(val2)).ratio()
-            if similitud >= umbral_similitud:
-                duplicados_potenciales.append((val1, val2, round(similitud, 2)))
-    
-    return sorted(duplicados_potenciales, key=lambda x: x[2], reverse=True)
+    for miembros in posiciones:
+        duplicados_potenciales.extend(
+            (i, j, 1.0) for a, i in enumerate(miembros) for j in miembros[a + 1:]
+        )
+
+    if len(valores_unicos) <= LIMITE_COMPARACION_EXHAUSTIVA:
+        pares = [(i, j) for i in range(len(textos)) for j in range(i + 1, len(textos))]
+    else:
+        pares = _pares_candidatos(textos)
+
+    similitudes = _puntuar_pares([(textos[i], textos[j]) for i, j in pares], umbral_similitud, n_procesos, progreso)
+    for (i, j), similitud in zip(pares, similitudes):
+        if similitud >= umbral_similitud:
+            duplicados_potenciales.extend(
+                (min(a, b), max(a, b), similitud) for a in posiciones[i] for b in posiciones[j]
+            )
+
+    # Mismo orden que la comparación por pares: similitud desc, luego orden de aparición
+    duplicados_potenciales.sort(key=lambda x: (-round(x[2], 2), x[0], x[1]))
+    return [(valores_unicos[i], valores_unicos[j], round(similitud, 2)) for i, j, similitud in duplicados_potenciales]
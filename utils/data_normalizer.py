@@ -3,13 +3,16 @@ Módulo para normalización de datos.
 Centraliza la lógica de limpieza y normalización de DataFrames.
 """
 
+import numpy as np
 import pandas as pd
-from typing import Tuple, Optional
+from typing import Iterable, Optional, Tuple
 from unidecode import unidecode
 from .logger import configurar_logger
 from .constantes import (
     COLUMNAS_SALDO_CANDIDATAS,
     COLUMNAS_VENTAS,
+    COLUMNAS_TEXTO_TIPADAS,
+    COLUMNAS_ENTERAS_COMPACTAS,
     ESTATUS_PAGADO_VARIANTES,
     ALIAS_MAP,
     SCHEMA_VENTAS,
@@ -19,6 +22,13 @@ from .constantes import (
 
 logger = configurar_logger("data_normalizer", nivel="INFO")
 
+# Texto respaldado por Arrow con semántica NaN (el dtype "str" de pandas 3).
+# Sin pyarrow (o en pandas sin `na_value`) las columnas se quedan como object.
+try:
+    DTYPE_TEXTO = pd.StringDtype("pyarrow", na_value=np.nan)
+except (ImportError, TypeError):  # pragma: no cover
+    DTYPE_TEXTO = None
+
 
 def normalizar_columnas(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -344,6 +354,89 @@ def homologar_columnas(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+# =====================================================================
+# TIPADO DE COLUMNAS AL CARGAR
+# =====================================================================
+
+def _es_columna_fecha(col: str) -> bool:
+    return isinstance(col, str) and (col == "fecha" or col.startswith("fecha_"))
+
+
+def tipar_columnas_carga(
+    df: pd.DataFrame,
+    columnas_texto: Optional[Iterable[str]] = None,
+) -> Tuple[pd.DataFrame, dict]:
+    """
+    Tipa una sola vez el DataFrame recién cargado y homologado.
+
+    - Texto repetitivo (cliente, vendedor, línea, producto, moneda...): pasa de
+      object a texto Arrow (DTYPE_TEXTO). Conserva la semántica de object
+      (NaN como faltante, máscaras booleanas numpy, asignación libre de
+      valores nuevos), pero `isin`, `groupby` y `unique` ya no hashean objetos
+      Python. No se usa `category` porque los `groupby` sin `observed=True`
+      devolverían grupos vacíos de categorías no presentes en el filtro.
+    - Fechas (`fecha`, `fecha_*`) en texto: se convierten a datetime. Las
+      columnas `fecha_*` solo si ningún valor se pierde al parsear.
+    - Enteros de identificadores/códigos (COLUMNAS_ENTERAS_COMPACTAS): int64 →
+      int32 cuando el rango lo permite. Cantidades e importes enteros se dejan
+      en int64 (su producto desbordaría int32) y los flotantes en float64.
+
+    Args:
+        df: DataFrame ya homologado (columnas canónicas)
+        columnas_texto: Columnas de texto a tipar (default: COLUMNAS_TEXTO_TIPADAS)
+
+    Returns:
+        Tupla (DataFrame tipado, reporte de memoria) donde el reporte tiene
+        antes_bytes, despues_bytes, ahorro_pct y columnas {col: (antes, después, dtype)}.
+    """
+    columnas_texto = COLUMNAS_TEXTO_TIPADAS if columnas_texto is None else list(columnas_texto)
+    memoria_antes = df.memory_usage(deep=True, index=False)
+    df = df.copy(deep=False)
+    tipadas = []
+
+    # Recorrido por posición: tolera nombres de columna duplicados
+    for i, col in enumerate(df.columns):
+        serie = df.iloc[:, i]
+        nueva = None
+        if serie.dtype == object and _es_columna_fecha(col):
+            fechas = pd.to_datetime(serie, errors="coerce")
+            if col == "fecha" or fechas.notna().sum() == serie.notna().sum():
+                nueva = fechas
+        elif (
+            col in columnas_texto
+            and DTYPE_TEXTO is not None
+            and serie.dtype == object
+            and pd.api.types.infer_dtype(serie, skipna=True) in ("string", "empty")
+        ):
+            nueva = serie.astype(DTYPE_TEXTO)
+        elif col in COLUMNAS_ENTERAS_COMPACTAS and serie.dtype == "int64" and len(serie):
+            limites = np.iinfo(np.int32)
+            if limites.min <= serie.min() and serie.max() <= limites.max:
+                nueva = serie.astype("int32")
+
+        if nueva is not None:
+            df.isetitem(i, nueva)
+            tipadas.append(i)
+
+    memoria_despues = df.memory_usage(deep=True, index=False)
+    antes = int(memoria_antes.sum())
+    despues = int(memoria_despues.sum())
+    reporte = {
+        "antes_bytes": antes,
+        "despues_bytes": despues,
+        "ahorro_pct": round((1 - despues / antes) * 100, 1) if antes else 0.0,
+        "columnas": {
+            df.columns[i]: (int(memoria_antes.iloc[i]), int(memoria_despues.iloc[i]), str(df.dtypes.iloc[i]))
+            for i in tipadas
+        },
+    }
+    logger.info(
+        f"tipar_columnas_carga: {antes / 1e6:.1f} MB → {despues / 1e6:.1f} MB "
+        f"({reporte['ahorro_pct']}% menos) en {len(tipadas)} columnas"
+    )
+    return df, reporte
+
+
 def validar_template(df: pd.DataFrame, schema: str = "ventas") -> dict:
     """
     Valida un DataFrame contra el schema del template FRADMA.
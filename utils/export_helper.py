@@ -5,23 +5,308 @@ Proporciona funciones para generar reportes profesionales con formato
 que pueden compartirse con stakeholders.
 """
 
+import importlib.util
 import logging
 import pandas as pd
 import io
+import os
 import re
-from typing import Dict, Optional, List
+import shutil
+import tempfile
+import time
+import zipfile
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, List
 from datetime import datetime
 from utils.formatos import now_mx
 from utils.formatos import formato_moneda, formato_porcentaje
 
+# xlsxwriter y pyarrow.parquet se importan al exportar (como reportlab):
+# este módulo se carga al arrancar app.py y solo se valida que existan.
+XLSXWRITER_AVAILABLE = importlib.util.find_spec("xlsxwriter") is not None
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
 logger = logging.getLogger(__name__)
 
 
+# ── Exportación con memoria acotada ──────────────────────────────────────────
+#
+# Los libros se escriben con xlsxwriter en modo `constant_memory`: cada fila se
+# vuelca al disco en cuanto se escribe, así que las filas deben ir en orden y
+# el DataFrame se recorre por bloques. El libro se genera en un directorio
+# temporal (no en BytesIO) y solo el .xlsx comprimido final se lee a memoria.
+
+FILAS_POR_BLOQUE_EXPORT = 20_000
+# Sobre este número de filas de detalle conviene ofrecer CSV/Parquet comprimido
+MAX_FILAS_EXCEL_DETALLE = 200_000
+# Filas que se revisan para estimar el ancho de columna
+FILAS_MUESTRA_ANCHO = 1_000
+
+OPCIONES_LIBRO_STREAMING = {
+    "constant_memory": True,
+    "nan_inf_to_errors": True,
+    "remove_timezone": True,
+    "strings_to_urls": False,
+    "default_date_format": "yyyy-mm-dd",
+}
+
+
+@dataclass
+class EstadisticasExport:
+    """Tiempo y tamaño de una exportación generada."""
+    nombre: str
+    formato: str
+    filas: int
+    bytes: int
+    segundos: float
+
+    def resumen(self) -> str:
+        return f"{self.bytes / 1e6:.1f} MB · {self.filas:,} filas · {self.segundos:.1f}s"
+
+
+_historial_exportaciones: deque = deque(maxlen=50)
+
+
+def registrar_exportacion(estadisticas: EstadisticasExport) -> None:
+    """Guarda y registra en log las estadísticas de una exportación."""
+    _historial_exportaciones.append(estadisticas)
+    logger.info(
+        f"Export {estadisticas.nombre} ({estadisticas.formato}): {estadisticas.resumen()}"
+    )
+
+
+def ultimas_exportaciones(n: int = 10) -> List[EstadisticasExport]:
+    """Estadísticas de las últimas `n` exportaciones (la más reciente al final)."""
+    return list(_historial_exportaciones)[-n:]
+
+
+def requiere_export_alterno(df: Optional[pd.DataFrame]) -> bool:
+    """True si el detalle es demasiado grande para ofrecerlo solo como Excel."""
+    return df is not None and len(df) > MAX_FILAS_EXCEL_DETALLE
+
+
+def _bloques_de_filas(df: pd.DataFrame, filas_por_bloque: int) -> Iterator[pd.DataFrame]:
+    for inicio in range(0, len(df), filas_por_bloque):
+        yield df.iloc[inicio:inicio + filas_por_bloque]
+
+
+def _como_texto(worksheet, fila, columna, valor, formato=None):
+    return worksheet.write_string(fila, columna, str(valor), formato)
+
+
+class LibroExcelStreaming:
+    """
+    Libro xlsxwriter en modo `constant_memory` escrito en un directorio temporal.
+
+    Uso:
+        with LibroExcelStreaming("reporte_cxc") as libro:
+            ws = libro.escribir_dataframe("Detalle", df, formato_header=fmt)
+            contenido = libro.cerrar()
+
+    `cerrar()` devuelve los bytes del .xlsx y registra tiempo y tamaño; el
+    directorio temporal se elimina al salir del bloque aunque haya error.
+    Con `progreso(fraccion, mensaje)` se reporta el avance por bloque de cada
+    hoja (lo usa la cola de `utils.export_jobs`).
+    """
+
+    def __init__(
+        self,
+        nombre: str = "reporte",
+        filas_por_bloque: int = FILAS_POR_BLOQUE_EXPORT,
+        progreso: Optional[Callable[[float, str], None]] = None,
+    ):
+        if not XLSXWRITER_AVAILABLE:
+            raise ImportError("xlsxwriter no está instalado. Ejecuta: pip install xlsxwriter")
+        self.nombre = nombre
+        self.filas_por_bloque = filas_por_bloque
+        self.progreso = progreso
+        self.filas = 0
+        self._inicio = time.perf_counter()
+        import xlsxwriter
+
+        self._tmpdir = tempfile.mkdtemp(prefix="export_")
+        self.ruta = os.path.join(self._tmpdir, f"{nombre}.xlsx")
+        self.workbook = xlsxwriter.Workbook(
+            self.ruta, {**OPCIONES_LIBRO_STREAMING, "tmpdir": self._tmpdir}
+        )
+        self._cerrado = False
+
+    def __enter__(self) -> "LibroExcelStreaming":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.descartar()
+
+    def escribir_dataframe(
+        self,
+        nombre_hoja: str,
+        df: pd.DataFrame,
+        fila_inicio: int = 0,
+        index: bool = False,
+        formato_header=None,
+        formatos_columna: Optional[Dict[str, object]] = None,
+        conversiones: Optional[Dict[str, Callable[[pd.Series], pd.Series]]] = None,
+        ancho_max: Optional[int] = None,
+        worksheet=None,
+    ):
+        """
+        Escribe `df` en una hoja fila por fila, por bloques, sin copiarlo entero.
+
+        Args:
+            nombre_hoja: Nombre de la hoja (se crea si no se pasa `worksheet`)
+            df: Datos a escribir
+            fila_inicio: Fila del encabezado (las filas previas ya deben estar escritas)
+            index: Incluir el índice como primeras columnas
+            formato_header: Formato xlsxwriter del encabezado
+            formatos_columna: columna → formato xlsxwriter (num_format, etc.)
+            conversiones: columna → función aplicada a cada bloque antes de escribir
+            ancho_max: Si se indica, auto-ajusta anchos (estimados con una muestra)
+            worksheet: Hoja existente donde escribir
+
+        Returns:
+            La hoja de xlsxwriter
+        """
+        if index:
+            df = df.reset_index()
+        ws = worksheet if worksheet is not None else self.workbook.add_worksheet(nombre_hoja)
+        # Igual que pandas.to_excel: contenedores sin tipo Excel se escriben como texto
+        for tipo in (list, tuple, dict, set):
+            ws.add_write_handler(tipo, _como_texto)
+        columnas = [str(c) for c in df.columns]
+        formatos_columna = formatos_columna or {}
+        conversiones = conversiones or {}
+
+        # Formato y ancho por columna antes de escribir filas
+        muestra = df.head(FILAS_MUESTRA_ANCHO)
+        for idx, col in enumerate(df.columns):
+            ancho = None
+            if ancho_max is not None:
+                largo = muestra[col].astype(str).str.len().max() if len(muestra) else 0
+                ancho = min(max(int(largo or 0), len(str(col))) + 2, ancho_max)
+            formato = formatos_columna.get(col)
+            if ancho is not None or formato is not None:
+                ws.set_column(idx, idx, ancho, formato)
+
+        ws.write_row(fila_inicio, 0, columnas, formato_header)
+        fila = fila_inicio + 1
+        for bloque in _bloques_de_filas(df, self.filas_por_bloque):
+            if conversiones:
+                bloque = bloque.assign(**{
+                    col: fn(bloque[col]) for col, fn in conversiones.items() if col in bloque.columns
+                })
+            valores = bloque.astype(object).where(bloque.notna(), None)
+            for registro in valores.itertuples(index=False, name=None):
+                ws.write_row(fila, 0, registro)
+                fila += 1
+            if self.progreso is not None:
+                escritas = fila - fila_inicio - 1
+                self.progreso(escritas / len(df), f"{nombre_hoja}: {escritas:,}/{len(df):,} filas")
+        self.filas += len(df)
+        return ws
+
+    def cerrar(self) -> bytes:
+        """Cierra el libro y devuelve el contenido del .xlsx."""
+        self.workbook.close()
+        self._cerrado = True
+        with open(self.ruta, "rb") as f:
+            contenido = f.read()
+        registrar_exportacion(EstadisticasExport(
+            nombre=self.nombre,
+            formato="xlsx",
+            filas=self.filas,
+            bytes=len(contenido),
+            segundos=time.perf_counter() - self._inicio,
+        ))
+        return contenido
+
+    def descartar(self) -> None:
+        """Elimina el directorio temporal (cierra el libro si quedó abierto)."""
+        if not self._cerrado:
+            try:
+                self.workbook.close()
+            except Exception:
+                pass
+            self._cerrado = True
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+def exportar_detalle_comprimido(
+    df: pd.DataFrame,
+    nombre: str = "detalle",
+    formato: str = "csv",
+    filas_por_bloque: int = FILAS_POR_BLOQUE_EXPORT,
+    progreso: Optional[Callable[[float, str], None]] = None,
+) -> bytes:
+    """
+    Exporta un detalle grande como .zip con un CSV o un Parquet dentro.
+
+    Alternativa a la hoja de Excel cuando el detalle supera
+    MAX_FILAS_EXCEL_DETALLE: se escribe por bloques a un archivo temporal.
+
+    Args:
+        df: Datos a exportar
+        nombre: Nombre base del archivo dentro del zip
+        formato: "csv" o "parquet" (requiere pyarrow)
+        filas_por_bloque: Filas por bloque de escritura
+        progreso: Callback opcional ``progreso(fraccion, mensaje)`` por bloque
+
+    Returns:
+        bytes: Contenido del .zip
+    """
+    if formato not in ("csv", "parquet"):
+        raise ValueError(f"Formato no soportado: {formato}")
+    if formato == "parquet" and not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow no está instalado. Ejecuta: pip install pyarrow")
+
+    inicio = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="export_") as tmpdir:
+        ruta_zip = os.path.join(tmpdir, f"{nombre}.zip")
+        with zipfile.ZipFile(ruta_zip, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            if formato == "csv":
+                with zf.open(f"{nombre}.csv", "w", force_zip64=True) as destino:
+                    texto = io.TextIOWrapper(destino, encoding="utf-8-sig", newline="")
+                    for i, bloque in enumerate(_bloques_de_filas(df, filas_por_bloque)):
+                        bloque.to_csv(texto, index=False, header=(i == 0))
+                        if progreso is not None:
+                            progreso((i * filas_por_bloque + len(bloque)) / len(df), "Escribiendo CSV")
+                    if len(df) == 0:
+                        df.to_csv(texto, index=False)
+                    texto.flush()
+                    texto.detach()
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                ruta_parquet = os.path.join(tmpdir, f"{nombre}.parquet")
+                esquema = pa.Schema.from_pandas(df, preserve_index=False)
+                with pq.ParquetWriter(ruta_parquet, esquema) as escritor:
+                    for i, bloque in enumerate(_bloques_de_filas(df, filas_por_bloque)):
+                        escritor.write_table(
+                            pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False)
+                        )
+                        if progreso is not None:
+                            progreso((i * filas_por_bloque + len(bloque)) / len(df), "Escribiendo Parquet")
+                zf.write(ruta_parquet, f"{nombre}.parquet")
+        with open(ruta_zip, "rb") as f:
+            contenido = f.read()
+
+    registrar_exportacion(EstadisticasExport(
+        nombre=nombre,
+        formato=f"{formato}.zip",
+        filas=len(df),
+        bytes=len(contenido),
+        segundos=time.perf_counter() - inicio,
+    ))
+    return contenido
+
+
 def crear_excel_metricas_cxc(
     metricas: Dict,
     df_detalle: pd.DataFrame,
     df_antiguedad: Optional[pd.DataFrame] = None,
-    nombre_empresa: str = "CIMA"
+    nombre_empresa: str = "CIMA",
+    progreso: Optional[Callable[[float, str], None]] = None,
 ) -> bytes:
     """
     Crea un archivo Excel con múltiples hojas de métricas CxC.
@@ -31,6 +316,7 @@ def crear_excel_metricas_cxc(
         df_detalle: DataFrame con detalle de cuentas por cobrar
         df_antiguedad: DataFrame con tabla de antigüedad (opcional)
         nombre_empresa: Nombre de la empresa para el reporte
+        progreso: Callback opcional ``progreso(fraccion, mensaje)`` por bloque
         
     Returns:
         bytes: Contenido del archivo Excel
@@ -40,10 +326,8 @@ def crear_excel_metricas_cxc(
         >>> with open('reporte_cxc.xlsx', 'wb') as f:
         ...     f.write(excel_bytes)
     """
-    output = io.BytesIO()
-    
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        workbook = writer.book
+    with LibroExcelStreaming("reporte_cxc", progreso=progreso) as libro:
+        workbook = libro.workbook
         
         # Formatos personalizados
         formato_titulo = workbook.add_format({
@@ -78,7 +362,6 @@ def crear_excel_metricas_cxc(
         
         # Hoja 1: Resumen Ejecutivo
         worksheet = workbook.add_worksheet('Resumen Ejecutivo')
-        writer.sheets['Resumen Ejecutivo'] = worksheet
         
         # Título
         fecha_actual = now_mx().strftime("%d/%m/%Y %H:%M")
@@ -88,10 +371,10 @@ def crear_excel_metricas_cxc(
         
         # Métricas principales
         fila = 4
-        worksheet.write(fila, 0, 'Métrica', formato_header)
-        worksheet.write(fila, 1, 'Valor', formato_header)
         worksheet.set_column('A:A', 30)
         worksheet.set_column('B:B', 20)
+        worksheet.write(fila, 0, 'Métrica', formato_header)
+        worksheet.write(fila, 1, 'Valor', formato_header)
         
         metricas_resumen = [
             ('Total Adeudado', metricas.get('total_adeudado', 0), formato_moneda),
@@ -118,49 +401,25 @@ def crear_excel_metricas_cxc(
             else:
                 worksheet.write(fila, 1, valor)
         
-        # Hoja 2: Detalle de Cuentas
-        df_export = df_detalle.copy()
-        
-        # Formatear columnas para export
-        if 'dias_overdue' in df_export.columns:
-            df_export['dias_overdue'] = df_export['dias_overdue'].fillna(0).astype(int)
-        
-        df_export.to_excel(writer, sheet_name='Detalle CxC', index=False)
-        
-        worksheet_detalle = writer.sheets['Detalle CxC']
-        
-        # Aplicar formato a headers
-        for col_num, value in enumerate(df_export.columns.values):
-            worksheet_detalle.write(0, col_num, value, formato_header)
-        
-        # Auto-ajustar anchos de columna
-        for idx, col in enumerate(df_export.columns):
-            max_len = max(
-                df_export[col].astype(str).apply(len).max(),
-                len(str(col))
-            ) + 2
-            worksheet_detalle.set_column(idx, idx, min(max_len, 50))
+        # Hoja 2: Detalle de Cuentas (por bloques, sin copiar el DataFrame)
+        libro.escribir_dataframe(
+            'Detalle CxC',
+            df_detalle,
+            formato_header=formato_header,
+            conversiones={'dias_overdue': lambda s: s.fillna(0).astype(int)},
+            ancho_max=50,
+        )
         
         # Hoja 3: Tabla de Antigüedad (si está disponible)
         if df_antiguedad is not None and not df_antiguedad.empty:
-            df_antiguedad.to_excel(writer, sheet_name='Antigüedad', index=False)
-            
-            worksheet_ant = writer.sheets['Antigüedad']
-            
-            # Headers
-            for col_num, value in enumerate(df_antiguedad.columns.values):
-                worksheet_ant.write(0, col_num, value, formato_header)
-            
-            # Auto-ajustar anchos
-            for idx, col in enumerate(df_antiguedad.columns):
-                max_len = max(
-                    df_antiguedad[col].astype(str).apply(len).max(),
-                    len(str(col))
-                ) + 2
-                worksheet_ant.set_column(idx, idx, min(max_len, 30))
-    
-    output.seek(0)
-    return output.getvalue()
+            libro.escribir_dataframe(
+                'Antigüedad',
+                df_antiguedad,
+                formato_header=formato_header,
+                ancho_max=30,
+            )
+        
+        return libro.cerrar()
 
 
 def crear_reporte_html(
@@ -850,8 +1109,6 @@ def crear_excel_cobranza_semanal(
     Returns:
         bytes: Contenido del archivo Excel (.xlsx)
     """
-    output = io.BytesIO()
-
     # Colores de fondo por nivel (RGB hex para xlsxwriter: sin #)
     COLOR_BG = {
         "🔴 URGENTE": "FFCCCC",   # rojo claro
@@ -872,8 +1129,8 @@ def crear_excel_cobranza_semanal(
         "🟢 BAJA":    "🔔 Seguimiento de rutina - monitoreo semanal",
     }
 
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        wb = writer.book
+    with LibroExcelStreaming("cobranza_semanal") as libro:
+        wb = libro.workbook
 
         # ── Formatos base ──────────────────────────────────────────────────
         fmt_titulo = wb.add_format({
@@ -891,8 +1148,13 @@ def crear_excel_cobranza_semanal(
         fmt_decimal = wb.add_format({"num_format": '0.0', "align": "center"})
         fmt_center  = wb.add_format({"align": "center", "valign": "vcenter"})
 
-        # Fábrica de formatos por nivel (bg + font)
+        # Fábrica de formatos por nivel (bg + font), uno por combinación
+        _cache_formatos = {}
+
         def _fmt_nivel(nivel, extra=None):
+            clave = (nivel, tuple(sorted((extra or {}).items())))
+            if clave in _cache_formatos:
+                return _cache_formatos[clave]
             cfg = {
                 "bg_color": COLOR_BG.get(nivel, "FFFFFF"),
                 "font_color": COLOR_FONT.get(nivel, "000000"),
@@ -900,15 +1162,21 @@ def crear_excel_cobranza_semanal(
             }
             if extra:
                 cfg.update(extra)
-            return wb.add_format(cfg)
+            _cache_formatos[clave] = wb.add_format(cfg)
+            return _cache_formatos[clave]
 
         # ── Hoja 1: Lista de Cobranza ──────────────────────────────────────
         ws = wb.add_worksheet("Lista Cobranza")
-        writer.sheets["Lista Cobranza"] = ws
 
         fecha_str = now_mx().strftime("%d/%m/%Y %H:%M")
         semana_str = now_mx().strftime("Semana %W · %Y")
 
+        # Anchos de columna
+        anchos = [14, 34, 20, 16, 12, 8, 52, 20, 32, 16]
+        for col_n, w in enumerate(anchos):
+            ws.set_column(col_n, col_n, w)
+
+        # En modo constant_memory las filas se escriben en orden
         ws.set_row(0, 28)
         ws.merge_range("A1:J1", f"Lista de Cobranza — {nombre_empresa}  |  {semana_str}", fmt_titulo)
         ws.write("A2", f"Generado: {fecha_str}", fmt_fecha)
@@ -923,17 +1191,12 @@ def crear_excel_cobranza_semanal(
         for col_n, h in enumerate(headers):
             ws.write(2, col_n, h, fmt_header)
 
-        # Anchos de columna
-        anchos = [14, 34, 20, 16, 12, 8, 52, 20, 32, 16]
-        for col_n, w in enumerate(anchos):
-            ws.set_column(col_n, col_n, w)
-
         # Filas de datos
         df_sorted = df_prioridades.sort_values(
             ["nivel_num", "score"], ascending=[True, False]
         ).reset_index(drop=True)
 
-        for row_n, row in df_sorted.iterrows():
+        for row_n, row in enumerate(df_sorted.to_dict("records")):
             nivel = row.get("nivel", "🟢 BAJA")
             excel_row = row_n + 3   # offset: título + fecha + header
             ws.set_row(excel_row, 20)
@@ -961,7 +1224,12 @@ def crear_excel_cobranza_semanal(
 
         # ── Hoja 2: Resumen ────────────────────────────────────────────────
         ws_res = wb.add_worksheet("Resumen")
-        writer.sheets["Resumen"] = ws_res
+
+        ws_res.set_column(0, 0, 16)
+        ws_res.set_column(1, 1, 12)
+        ws_res.set_column(2, 2, 20)
+        ws_res.set_column(3, 3, 16)
+        ws_res.set_column(4, 4, 18)
 
         ws_res.merge_range("A1:E1", f"Resumen Ejecutivo — {semana_str}", fmt_titulo)
         ws_res.write("A2", f"Generado: {fecha_str}", fmt_fecha)
@@ -971,12 +1239,6 @@ def crear_excel_cobranza_semanal(
         for col_n, h in enumerate(res_headers):
             ws_res.write(2, col_n, h, fmt_header)
 
-        ws_res.set_column(0, 0, 16)
-        ws_res.set_column(1, 1, 12)
-        ws_res.set_column(2, 2, 20)
-        ws_res.set_column(3, 3, 16)
-        ws_res.set_column(4, 4, 18)
-
         total_monto = df_prioridades["monto"].sum() if "monto" in df_prioridades.columns else 0
 
         for row_n, nivel in enumerate(["🔴 URGENTE", "🟠 ALTA", "🟡 MEDIA", "🟢 BAJA"]):
@@ -1010,8 +1272,8 @@ def crear_excel_cobranza_semanal(
         ws_res.write(total_row, 4, 1.0,
                      wb.add_format({"bold": True, "border": 1, "num_format": '0.00%', "align": "center"}))
 
-    output.seek(0)
-    return output.getvalue()
+        libro.filas = len(df_sorted)
+        return libro.cerrar()
 
 
 if __name__ == "__main__":
@@ -1165,7 +1427,6 @@ def crear_reporte_pdf_ejecutivo(
     
     # Contenido del documento
     story = []
-    _temp_chart_path = None  # Para limpieza de archivo temporal de gráfica
     
     # Logo CIMA
     import os
@@ -1423,30 +1684,13 @@ def crear_reporte_pdf_ejecutivo(
     if fig is not None:
         story.append(Paragraph("Visualización", subtitulo_style))
         try:
-            import tempfile
-            import os
-            
-            # Exportar figura a imagen temporal usando kaleido
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-                tmp_path = tmp_file.name
+            # PNG desde el pool de kaleido (memoizado por huella de la figura)
+            from utils.render_figuras import renderizar_figura
+            img_bytes = renderizar_figura(fig, width=800, height=500, scale=2)
             
-            # Convertir figura a PNG (kaleido 0.2.1 sin Chrome)
-            try:
-                fig.write_image(tmp_path, width=800, height=500, scale=2)
-            except Exception:
-                # Fallback: usar engine='orca' o workaround con bytes
-                import plotly.io as pio
-                img_bytes = pio.to_image(fig, format='png', width=800, height=500, scale=2)
-                with open(tmp_path, 'wb') as f:
-                    f.write(img_bytes)
-            
-            # Agregar imagen al PDF (NO borrar aún - ReportLab la lee en doc.build())
-            img = Image(tmp_path, width=6.5*inch, height=4*inch)
+            img = Image(io.BytesIO(img_bytes), width=6.5*inch, height=4*inch)
             story.append(img)
             story.append(Spacer(1, 0.2*inch))
-            
-            # NOTA: tmp_path se borra después de doc.build() - guardarlo para limpieza
-            _temp_chart_path = tmp_path
                 
         except Exception as e:
             logger.warning(f"No se pudo incluir gráfica en PDF: {e}")
@@ -1591,14 +1835,6 @@ def crear_reporte_pdf_ejecutivo(
     # Construir PDF
     doc.build(story)
     
-    # Limpiar archivo temporal de gráfica (si existe)
-    try:
-        if _temp_chart_path:
-            import os
-            os.unlink(_temp_chart_path)
-    except Exception:
-        pass
-    
     # Obtener bytes
     pdf_bytes = output.getvalue()
     output.close()
@@ -0,0 +1,265 @@
+"""
+Cola local de exportaciones en segundo plano (Excel, PDF, HTML, CSV).
+
+Los reportes se generan en un pool de hilos fuera del script de Streamlit:
+la sesión sigue respondiendo mientras el archivo se construye y los reruns
+que vuelven a dibujar el botón de descarga no recalculan nada.
+
+- Cada trabajo se identifica por (tipo de reporte, huellas de los DataFrames,
+  parámetros congelados), la misma clave que usa `memo_vistas`. Pedir de nuevo
+  el mismo reporte devuelve el trabajo en curso o los bytes ya generados.
+- El registro vive en ``st.cache_resource`` (uno por proceso) con límite LRU
+  de resultados guardados; los trabajos fallidos se reintentan al pedirlos.
+- La función del reporte recibe el argumento con nombre
+  ``progreso(fraccion, mensaje)`` para reportar avance (o nada, con
+  ``con_progreso=False``); la UI lo muestra con `mostrar_trabajo_export`.
+
+Las funciones que se encolan no deben llamar a ``st.*`` (corren sin contexto
+de script) y los DataFrames que reciben se tratan como inmutables.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Sequence, Union
+
+import pandas as pd
+import streamlit as st
+
+from utils.cache_helper import memo_vistas
+from utils.logger import configurar_logger
+
+logger = configurar_logger("export_jobs", nivel="INFO")
+
+# Hilos del pool: ReportLab/xlsxwriter son CPU en Python, kaleido es un subproceso
+MAX_HILOS_EXPORT = 2
+# Trabajos terminados que se conservan (cada uno guarda los bytes del archivo)
+MAX_TRABAJOS_EXPORT = 32
+
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+LISTO = "listo"
+ERROR = "error"
+
+
+@dataclass
+class TrabajoExport:
+    """Estado de una exportación encolada."""
+    tipo: str
+    clave: tuple
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    estado: str = PENDIENTE
+    progreso: float = 0.0
+    mensaje: str = "En cola"
+    resultado: Optional[bytes] = None
+    error: Optional[str] = None
+    creado: float = field(default_factory=time.time)
+    inicio: Optional[float] = None
+    fin: Optional[float] = None
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in (LISTO, ERROR)
+
+    @property
+    def duracion(self) -> Optional[float]:
+        if self.inicio is None:
+            return None
+        return (self.fin or time.time()) - self.inicio
+
+
+class ColaExportaciones:
+    """
+    Registro de trabajos de exportación con pool de hilos.
+
+    Examples:
+        >>> cola = obtener_cola_exportaciones()
+        >>> trabajo = cola.enviar(
+        ...     "excel_cxc", df_cxc, {"empresa": "CIMA"},
+        ...     partial(crear_excel_metricas_cxc, metricas, df_cxc),
+        ... )
+        >>> mostrar_trabajo_export(trabajo, "📊 Excel", "reporte_cxc.xlsx", MIME_EXCEL)
+    """
+
+    def __init__(self, max_hilos: int = MAX_HILOS_EXPORT, max_trabajos: int = MAX_TRABAJOS_EXPORT):
+        self.max_trabajos = max_trabajos
+        self._executor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="export")
+        self._trabajos: "OrderedDict[tuple, TrabajoExport]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clave(
+        self,
+        tipo: str,
+        datos: Union[pd.DataFrame, Sequence[Optional[pd.DataFrame]], None],
+        parametros: Any = (),
+    ) -> tuple:
+        """Clave del reporte: tipo, huellas de los datos y parámetros congelados."""
+        return memo_vistas.clave(tipo, datos, parametros)
+
+    def enviar(
+        self,
+        tipo: str,
+        datos: Union[pd.DataFrame, Sequence[Optional[pd.DataFrame]], None],
+        parametros: Any,
+        generar: Callable[..., Union[bytes, str]],
+        con_progreso: bool = True,
+    ) -> TrabajoExport:
+        """
+        Encola un reporte o devuelve el trabajo existente con la misma clave.
+
+        Args:
+            tipo: Tipo de reporte (p. ej. "excel_cxc", "pdf_asistente")
+            datos: DataFrame(s) de los que depende el reporte
+            parametros: Resto de entradas que cambian el archivo (dict, tupla...)
+            generar: Función que devuelve los bytes (texto o BytesIO) del archivo;
+                recibe ``progreso=`` salvo que `con_progreso` sea False. Usar
+                ``functools.partial`` para fijar sus argumentos al encolar.
+            con_progreso: Si `generar` acepta el callback de progreso
+
+        Returns:
+            TrabajoExport (puede estar ya terminado)
+        """
+        llave = self.clave(tipo, datos, parametros)
+        with self._lock:
+            existente = self._trabajos.get(llave)
+            if existente is not None and existente.estado != ERROR:
+                self._trabajos.move_to_end(llave)
+                return existente
+
+            trabajo = TrabajoExport(tipo=tipo, clave=llave)
+            self._trabajos[llave] = trabajo
+            self._recortar()
+
+        self._executor.submit(self._ejecutar, trabajo, generar, con_progreso)
+        return trabajo
+
+    def _ejecutar(
+        self,
+        trabajo: TrabajoExport,
+        generar: Callable[..., Union[bytes, str]],
+        con_progreso: bool,
+    ) -> None:
+        def progreso(fraccion: float, mensaje: str = "") -> None:
+            trabajo.progreso = min(max(float(fraccion), 0.0), 1.0)
+            if mensaje:
+                trabajo.mensaje = mensaje
+
+        trabajo.estado = EN_PROCESO
+        trabajo.inicio = time.time()
+        trabajo.mensaje = "Generando..."
+        try:
+            resultado = generar(progreso=progreso) if con_progreso else generar()
+            if isinstance(resultado, str):
+                resultado = resultado.encode("utf-8")
+            elif hasattr(resultado, "getvalue"):  # BytesIO
+                resultado = resultado.getvalue()
+            trabajo.resultado = resultado
+            trabajo.progreso = 1.0
+            trabajo.mensaje = "Listo"
+            trabajo.estado = LISTO
+        except Exception as e:
+            logger.exception(f"Export {trabajo.tipo} falló: {e}")
+            trabajo.error = str(e)
+            trabajo.mensaje = "Error"
+            trabajo.estado = ERROR
+        finally:
+            trabajo.fin = time.time()
+            if trabajo.estado == LISTO:
+                logger.info(
+                    f"Export {trabajo.tipo} listo en {trabajo.duracion:.1f}s "
+                    f"({len(trabajo.resultado or b'') / 1e6:.1f} MB)"
+                )
+
+    def _recortar(self) -> None:
+        # Descarta los trabajos terminados más antiguos; los activos se conservan
+        sobrantes = len(self._trabajos) - self.max_trabajos
+        if sobrantes <= 0:
+            return
+        for llave in [k for k, t in self._trabajos.items() if t.terminado][:sobrantes]:
+            del self._trabajos[llave]
+
+    def obtener(self, tipo: str, datos, parametros: Any = ()) -> Optional[TrabajoExport]:
+        """Trabajo registrado para esa clave, sin encolar nada."""
+        llave = self.clave(tipo, datos, parametros)
+        with self._lock:
+            return self._trabajos.get(llave)
+
+    def trabajos(self) -> List[TrabajoExport]:
+        """Trabajos registrados, del más antiguo al más reciente."""
+        with self._lock:
+            return list(self._trabajos.values())
+
+    def limpiar(self) -> None:
+        """Olvida los trabajos terminados (los activos siguen su curso)."""
+        with self._lock:
+            for llave in [k for k, t in self._trabajos.items() if t.terminado]:
+                del self._trabajos[llave]
+
+    def esperar(self, trabajo: TrabajoExport, timeout: Optional[float] = None) -> TrabajoExport:
+        """Bloquea hasta que el trabajo termine (scripts y tests)."""
+        limite = None if timeout is None else time.time() + timeout
+        while not trabajo.terminado:
+            if limite is not None and time.time() > limite:
+                raise TimeoutError(f"Export {trabajo.tipo} no terminó en {timeout}s")
+            time.sleep(0.02)
+        return trabajo
+
+
+@st.cache_resource
+def obtener_cola_exportaciones() -> ColaExportaciones:
+    """Cola compartida por todas las sesiones del proceso."""
+    return ColaExportaciones()
+
+
+MIME_EXCEL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def mostrar_trabajo_export(
+    trabajo: TrabajoExport,
+    etiqueta: str,
+    file_name: str,
+    mime: str,
+    key: Optional[str] = None,
+    contenedor=None,
+    **kwargs,
+):
+    """
+    Muestra el estado de un trabajo: barra de progreso mientras corre y botón
+    de descarga al terminar.
+
+    Mientras el trabajo no termina se dibuja dentro de un fragmento que se
+    refresca solo cada segundo, sin rerun completo de la página.
+
+    Args:
+        trabajo: Trabajo devuelto por `ColaExportaciones.enviar`
+        etiqueta: Texto del botón de descarga
+        file_name: Nombre del archivo descargado
+        mime: Tipo MIME del archivo
+        key: Llave del botón (por defecto, derivada del trabajo)
+        contenedor: Contenedor de Streamlit donde dibujar (por defecto, el actual)
+        **kwargs: Resto de argumentos de st.download_button
+    """
+    key = key or f"export_{trabajo.id}"
+    if contenedor is not None:
+        with contenedor:
+            return mostrar_trabajo_export(trabajo, etiqueta, file_name, mime, key=key, **kwargs)
+
+    def _dibujar():
+        if trabajo.estado == LISTO:
+            st.download_button(
+                label=etiqueta, data=trabajo.resultado, file_name=file_name,
+                mime=mime, key=key, **kwargs,
+            )
+            st.caption(f"⏱️ {trabajo.duracion:.1f}s · {len(trabajo.resultado) / 1e6:.2f} MB")
+        elif trabajo.estado == ERROR:
+            st.warning(f"⚠️ {etiqueta} no disponible: {trabajo.error}")
+        else:
+            st.progress(trabajo.progreso, text=f"{etiqueta}: {trabajo.mensaje}")
+
+    if trabajo.terminado:
+        _dibujar()
+    else:
+        st.fragment(_dibujar, run_every=1.0)()
@@ -5,59 +5,166 @@ Proporciona widgets interactivos para filtrar datos de ventas y CxC
 por múltiples criterios.
 """
 
+import numpy as np
 import streamlit as st
 import pandas as pd
-from typing import Tuple, Optional, List
+from typing import Callable, Dict, Hashable, Tuple, Optional, List
 from datetime import datetime, timedelta
 
 
-def aplicar_filtro_fechas(
-    df: pd.DataFrame,
-    columna_fecha: str = 'fecha',
-    mostrar_widget: bool = True
-) -> pd.DataFrame:
+class VistaFiltrada:
     """
-    Aplica filtro de fechas al DataFrame con múltiples modos de comparación.
-    
+    Frame base inmutable con los filtros activos como máscaras booleanas.
+
+    Cada filtro registra una máscara sobre el frame base completo, memoizada
+    por su estado (el valor de sus widgets): en un rerun sin cambios no se
+    recalcula ninguna máscara ni se vuelve a materializar el subconjunto.
+    Las máscaras se combinan con AND, lo que equivale a aplicar los filtros
+    en cascada.
+
+    Ejemplo:
+        vista = VistaFiltrada(df)
+        vista.iniciar()                       # al inicio de cada rerun
+        filtrar_vista_fechas(vista, 'fecha')
+        filtrar_vista_cliente(vista, 'cliente')
+        df_modulo = vista.df                  # base si no hay filtros activos
+    """
+
+    def __init__(self, base: pd.DataFrame):
+        self.base = base
+        self._mascaras: Dict[str, Tuple[Hashable, np.ndarray]] = {}
+        self._activos: Dict[str, Hashable] = {}
+        self._combinada: Optional[Tuple[tuple, np.ndarray, int]] = None
+        self._materializada: Optional[Tuple[tuple, pd.DataFrame]] = None
+        self._unicos: Dict[tuple, List[str]] = {}
+
+    def iniciar(self) -> None:
+        """Desactiva todos los filtros (las máscaras memoizadas se conservan)."""
+        self._activos = {}
+
+    def aplicar(self, nombre: str, estado: Hashable, calcular: Callable[[], np.ndarray]) -> None:
+        """
+        Activa el filtro `nombre` con el estado dado.
+
+        `calcular` devuelve la máscara sobre el frame base y solo se invoca si
+        el estado cambió desde la última vez.
+        """
+        previo = self._mascaras.get(nombre)
+        if previo is None or previo[0] != estado:
+            self._mascaras[nombre] = (estado, np.asarray(calcular(), dtype=bool))
+        self._activos[nombre] = estado
+
+    @property
+    def clave(self) -> tuple:
+        """Estado de todos los filtros activos (llave de memoización)."""
+        return tuple(self._activos.items())
+
+    @property
+    def mascara(self) -> Optional[np.ndarray]:
+        """Máscara combinada de los filtros activos (None si no hay ninguno)."""
+        if not self._activos:
+            return None
+        clave = self.clave
+        if self._combinada is None or self._combinada[0] != clave:
+            mascara = np.logical_and.reduce([self._mascaras[n][1] for n in self._activos])
+            self._combinada = (clave, mascara, int(mascara.sum()))
+        return self._combinada[1]
+
+    @property
+    def n_total(self) -> int:
+        return len(self.base)
+
+    @property
+    def n_filtradas(self) -> int:
+        """Registros que pasan los filtros, leído de la máscara (sin materializar)."""
+        if self.mascara is None:
+            return self.n_total
+        return self._combinada[2]
+
+    @property
+    def hay_filtros(self) -> bool:
+        return self.n_filtradas < self.n_total
+
+    def columna(self, nombre: str) -> pd.Series:
+        """Una sola columna del subconjunto filtrado."""
+        mascara = self.mascara
+        serie = self.base[nombre]
+        return serie if mascara is None else serie[mascara]
+
+    def valores_unicos(self, nombre: str) -> List[str]:
+        """Valores distintos (texto, ordenados, sin vacíos) de una columna del subconjunto."""
+        llave = (nombre, self.clave)
+        if llave not in self._unicos:
+            self._unicos[llave] = sorted(
+                str(c) for c in self.columna(nombre).dropna().unique() if str(c).strip()
+            )
+        return self._unicos[llave]
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        Subconjunto filtrado, materializado una vez por estado de filtros.
+
+        Sin filtros (o si los filtros no excluyen nada) devuelve el propio
+        frame base, sin copiarlo.
+        """
+        if not self.hay_filtros:
+            return self.base
+        clave = self.clave
+        if self._materializada is None or self._materializada[0] != clave:
+            self._materializada = (clave, self.base.take(np.flatnonzero(self.mascara)))
+        return self._materializada[1]
+
+    def es_derivado(self, df: pd.DataFrame) -> bool:
+        """
+        True si `df` es la base, la última vista entregada o un frame con el
+        mismo contenido que la base (p. ej. el archivo re-leído en un rerun).
+        """
+        if df is self.base or (self._materializada is not None and df is self._materializada[1]):
+            return True
+        return (
+            df.shape == self.base.shape
+            and df.columns.equals(self.base.columns)
+            and df.dtypes.equals(self.base.dtypes)
+            and df.equals(self.base)
+        )
+
+
+def _serie_fechas(serie: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    return pd.to_datetime(serie, errors='coerce')
+
+
+def _mascara_rango_fechas(fechas: pd.Series, fecha_inicio, fecha_fin) -> np.ndarray:
+    """Fechas dentro de [fecha_inicio, fecha_fin] (días completos); NaT queda fuera."""
+    inicio = pd.Timestamp(fecha_inicio)
+    fin = pd.Timestamp(fecha_fin) + pd.Timedelta(days=1)
+    tz = getattr(fechas.dt, 'tz', None)
+    if tz is not None:
+        inicio, fin = inicio.tz_localize(tz), fin.tz_localize(tz)
+    return ((fechas >= inicio) & (fechas < fin)).to_numpy()
+
+
+def filtrar_vista_fechas(vista: VistaFiltrada, columna_fecha: str = 'fecha') -> None:
+    """
+    Widget de filtro de fechas que registra su máscara en la vista.
+
     Modos disponibles:
     - Rango de fechas: Selección directa de fecha inicio y fin
     - Periodo vs periodo: Comparación entre periodos (mensual, trimestral, anual)
-    
-    Args:
-        df: DataFrame a filtrar
-        columna_fecha: Nombre de la columna con fechas
-        mostrar_widget: Si mostrar el widget en el sidebar
-        
-    Returns:
-        DataFrame filtrado
-        
-    Examples:
-        >>> df_filtrado = aplicar_filtro_fechas(df, 'fecha_venta')
     """
-    if columna_fecha not in df.columns:
-        if mostrar_widget:
-            st.warning(f"⚠️ Columna '{columna_fecha}' no encontrada")
-        return df
-    
-    # Convertir a datetime si no lo es
-    if not pd.api.types.is_datetime64_any_dtype(df[columna_fecha]):
-        df[columna_fecha] = pd.to_datetime(df[columna_fecha], errors='coerce')
-    
-    # Eliminar valores nulos
-    df_con_fechas = df.dropna(subset=[columna_fecha]).copy()
-    
+    fechas = _serie_fechas(vista.base[columna_fecha])
+    df_con_fechas = fechas if vista.mascara is None else fechas[vista.mascara]
+    df_con_fechas = df_con_fechas.dropna()
+
     if df_con_fechas.empty:
-        if mostrar_widget:
-            st.warning("⚠️ No hay fechas válidas para filtrar")
-        return df
-    
-    if not mostrar_widget:
-        return df
-    
-    fecha_min = df_con_fechas[columna_fecha].min().date()
-    fecha_max = df_con_fechas[columna_fecha].max().date()
+        st.warning("⚠️ No hay fechas válidas para filtrar")
+        return
 
-    df_filtrado = df_con_fechas.copy()
+    fecha_min = df_con_fechas.min().date()
+    fecha_max = df_con_fechas.max().date()
+    nombre = f"fecha:{columna_fecha}"
 
     st.caption(f"📅 Disponible: {fecha_min} — {fecha_max}")
 
@@ -78,123 +185,142 @@ def aplicar_filtro_fechas(
 
         if fecha_inicio > fecha_fin:
             st.error("⚠️ Fecha inicio debe ser ≤ fecha fin")
-            return df
+            return
 
-        mask = (df_con_fechas[columna_fecha].dt.date >= fecha_inicio) & \
-               (df_con_fechas[columna_fecha].dt.date <= fecha_fin)
-        df_filtrado = df_con_fechas[mask].copy()
+        vista.aplicar(
+            nombre,
+            ("rango", fecha_inicio, fecha_fin),
+            lambda: _mascara_rango_fechas(fechas, fecha_inicio, fecha_fin),
+        )
         dias = (fecha_fin - fecha_inicio).days + 1
-        st.info(f"📊 {len(df_filtrado):,} registros · {dias} días")
-
-    elif modo_filtro == "periodo_vs_periodo":
-        df_con_fechas['_año'] = df_con_fechas[columna_fecha].dt.year
-        df_con_fechas['_mes'] = df_con_fechas[columna_fecha].dt.month
-        df_con_fechas['_trimestre'] = df_con_fechas[columna_fecha].dt.quarter
-        años_disponibles = sorted(df_con_fechas['_año'].unique())
-
-        granularidad = st.selectbox(
-            "Granularidad",
-            options=["mensual", "trimestral", "anual"],
-            format_func=lambda x: {"mensual": "📆 Mensual", "trimestral": "📈 Trimestral", "anual": "📅 Anual"}[x],
-            key="granularidad_periodo",
+        st.info(f"📊 {vista.n_filtradas:,} registros · {dias} días")
+        return
+
+    # Periodo vs periodo: componentes de fecha del subconjunto visible
+    _año = df_con_fechas.dt.year
+    _mes = df_con_fechas.dt.month
+    _trimestre = df_con_fechas.dt.quarter
+    años_disponibles = sorted(_año.unique())
+
+    granularidad = st.selectbox(
+        "Granularidad",
+        options=["mensual", "trimestral", "anual"],
+        format_func=lambda x: {"mensual": "📆 Mensual", "trimestral": "📈 Trimestral", "anual": "📅 Anual"}[x],
+        key="granularidad_periodo",
+    )
+
+    if granularidad == "mensual":
+        meses_nombres = {1:"Enero",2:"Febrero",3:"Marzo",4:"Abril",5:"Mayo",6:"Junio",
+                         7:"Julio",8:"Agosto",9:"Septiembre",10:"Octubre",11:"Noviembre",12:"Diciembre"}
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**Periodo 1**")
+            año_1 = st.selectbox("Año", años_disponibles, index=len(años_disponibles)-1, key="periodo1_año", label_visibility="collapsed")
+            meses_año_1 = sorted(_mes[_año == año_1].unique())
+            mes_1 = st.selectbox("Mes", meses_año_1, format_func=lambda x: meses_nombres[x], key="periodo1_mes", label_visibility="collapsed")
+        with col2:
+            st.markdown("**Periodo 2**")
+            año_2 = st.selectbox("Año", años_disponibles, index=max(0,len(años_disponibles)-2), key="periodo2_año", label_visibility="collapsed")
+            meses_año_2 = sorted(_mes[_año == año_2].unique())
+            mes_2 = st.selectbox("Mes", meses_año_2, format_func=lambda x: meses_nombres[x], key="periodo2_mes", label_visibility="collapsed")
+        vista.aplicar(
+            nombre,
+            ("mensual", año_1, mes_1, año_2, mes_2),
+            lambda: (((fechas.dt.year == año_1) & (fechas.dt.month == mes_1)) |
+                     ((fechas.dt.year == año_2) & (fechas.dt.month == mes_2))).to_numpy(),
         )
+        p1 = int(((_año == año_1) & (_mes == mes_1)).sum())
+        p2 = int(((_año == año_2) & (_mes == mes_2)).sum())
+        st.success(f"✅ {meses_nombres[mes_1]} {año_1}: {p1:,} · {meses_nombres[mes_2]} {año_2}: {p2:,}")
 
-        if granularidad == "mensual":
-            meses_nombres = {1:"Enero",2:"Febrero",3:"Marzo",4:"Abril",5:"Mayo",6:"Junio",
-                             7:"Julio",8:"Agosto",9:"Septiembre",10:"Octubre",11:"Noviembre",12:"Diciembre"}
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown("**Periodo 1**")
-                año_1 = st.selectbox("Año", años_disponibles, index=len(años_disponibles)-1, key="periodo1_año", label_visibility="collapsed")
-                meses_año_1 = sorted(df_con_fechas[df_con_fechas['_año']==año_1]['_mes'].unique())
-                mes_1 = st.selectbox("Mes", meses_año_1, format_func=lambda x: meses_nombres[x], key="periodo1_mes", label_visibility="collapsed")
-            with col2:
-                st.markdown("**Periodo 2**")
-                año_2 = st.selectbox("Año", años_disponibles, index=max(0,len(años_disponibles)-2), key="periodo2_año", label_visibility="collapsed")
-                meses_año_2 = sorted(df_con_fechas[df_con_fechas['_año']==año_2]['_mes'].unique())
-                mes_2 = st.selectbox("Mes", meses_año_2, format_func=lambda x: meses_nombres[x], key="periodo2_mes", label_visibility="collapsed")
-            mask = (((df_con_fechas['_año']==año_1)&(df_con_fechas['_mes']==mes_1))|
-                    ((df_con_fechas['_año']==año_2)&(df_con_fechas['_mes']==mes_2)))
-            df_filtrado = df_con_fechas[mask].copy()
-            p1 = len(df_con_fechas[(df_con_fechas['_año']==año_1)&(df_con_fechas['_mes']==mes_1)])
-            p2 = len(df_con_fechas[(df_con_fechas['_año']==año_2)&(df_con_fechas['_mes']==mes_2)])
-            st.success(f"✅ {meses_nombres[mes_1]} {año_1}: {p1:,} · {meses_nombres[mes_2]} {año_2}: {p2:,}")
-
-        elif granularidad == "trimestral":
-            trimestres_nombres = {1:"Q1 (Ene-Mar)",2:"Q2 (Abr-Jun)",3:"Q3 (Jul-Sep)",4:"Q4 (Oct-Dic)"}
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown("**Periodo 1**")
-                año_1 = st.selectbox("Año", años_disponibles, index=len(años_disponibles)-1, key="periodo1_año_trim", label_visibility="collapsed")
-                trims_1 = sorted(df_con_fechas[df_con_fechas['_año']==año_1]['_trimestre'].unique())
-                trim_1 = st.selectbox("Trimestre", trims_1, format_func=lambda x: trimestres_nombres[x], key="periodo1_trim", label_visibility="collapsed")
-            with col2:
-                st.markdown("**Periodo 2**")
-                año_2 = st.selectbox("Año", años_disponibles, index=max(0,len(años_disponibles)-2), key="periodo2_año_trim", label_visibility="collapsed")
-                trims_2 = sorted(df_con_fechas[df_con_fechas['_año']==año_2]['_trimestre'].unique())
-                trim_2 = st.selectbox("Trimestre", trims_2, format_func=lambda x: trimestres_nombres[x], key="periodo2_trim", label_visibility="collapsed")
-            mask = (((df_con_fechas['_año']==año_1)&(df_con_fechas['_trimestre']==trim_1))|
-                    ((df_con_fechas['_año']==año_2)&(df_con_fechas['_trimestre']==trim_2)))
-            df_filtrado = df_con_fechas[mask].copy()
-            p1 = len(df_con_fechas[(df_con_fechas['_año']==año_1)&(df_con_fechas['_trimestre']==trim_1)])
-            p2 = len(df_con_fechas[(df_con_fechas['_año']==año_2)&(df_con_fechas['_trimestre']==trim_2)])
-            st.success(f"✅ {trimestres_nombres[trim_1]} {año_1}: {p1:,} · {trimestres_nombres[trim_2]} {año_2}: {p2:,}")
-
-        elif granularidad == "anual":
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown("**Año 1**")
-                año_1 = st.selectbox("Año 1", años_disponibles, index=len(años_disponibles)-1, key="periodo1_año_anual", label_visibility="collapsed")
-            with col2:
-                st.markdown("**Año 2**")
-                año_2 = st.selectbox("Año 2", años_disponibles, index=max(0,len(años_disponibles)-2), key="periodo2_año_anual", label_visibility="collapsed")
-            mask = (df_con_fechas['_año']==año_1)|(df_con_fechas['_año']==año_2)
-            df_filtrado = df_con_fechas[mask].copy()
-            p1 = len(df_con_fechas[df_con_fechas['_año']==año_1])
-            p2 = len(df_con_fechas[df_con_fechas['_año']==año_2])
-            st.success(f"✅ Año {año_1}: {p1:,} · Año {año_2}: {p2:,}")
-
-        df_filtrado = df_filtrado.drop(columns=['_año', '_mes', '_trimestre'], errors='ignore')
+    elif granularidad == "trimestral":
+        trimestres_nombres = {1:"Q1 (Ene-Mar)",2:"Q2 (Abr-Jun)",3:"Q3 (Jul-Sep)",4:"Q4 (Oct-Dic)"}
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**Periodo 1**")
+            año_1 = st.selectbox("Año", años_disponibles, index=len(años_disponibles)-1, key="periodo1_año_trim", label_visibility="collapsed")
+            trims_1 = sorted(_trimestre[_año == año_1].unique())
+            trim_1 = st.selectbox("Trimestre", trims_1, format_func=lambda x: trimestres_nombres[x], key="periodo1_trim", label_visibility="collapsed")
+        with col2:
+            st.markdown("**Periodo 2**")
+            año_2 = st.selectbox("Año", años_disponibles, index=max(0,len(años_disponibles)-2), key="periodo2_año_trim", label_visibility="collapsed")
+            trims_2 = sorted(_trimestre[_año == año_2].unique())
+            trim_2 = st.selectbox("Trimestre", trims_2, format_func=lambda x: trimestres_nombres[x], key="periodo2_trim", label_visibility="collapsed")
+        vista.aplicar(
+            nombre,
+            ("trimestral", año_1, trim_1, año_2, trim_2),
+            lambda: (((fechas.dt.year == año_1) & (fechas.dt.quarter == trim_1)) |
+                     ((fechas.dt.year == año_2) & (fechas.dt.quarter == trim_2))).to_numpy(),
+        )
+        p1 = int(((_año == año_1) & (_trimestre == trim_1)).sum())
+        p2 = int(((_año == año_2) & (_trimestre == trim_2)).sum())
+        st.success(f"✅ {trimestres_nombres[trim_1]} {año_1}: {p1:,} · {trimestres_nombres[trim_2]} {año_2}: {p2:,}")
 
-    return df_filtrado
+    elif granularidad == "anual":
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**Año 1**")
+            año_1 = st.selectbox("Año 1", años_disponibles, index=len(años_disponibles)-1, key="periodo1_año_anual", label_visibility="collapsed")
+        with col2:
+            st.markdown("**Año 2**")
+            año_2 = st.selectbox("Año 2", años_disponibles, index=max(0,len(años_disponibles)-2), key="periodo2_año_anual", label_visibility="collapsed")
+        vista.aplicar(
+            nombre,
+            ("anual", año_1, año_2),
+            lambda: fechas.dt.year.isin([año_1, año_2]).to_numpy(),
+        )
+        p1 = int((_año == año_1).sum())
+        p2 = int((_año == año_2).sum())
+        st.success(f"✅ Año {año_1}: {p1:,} · Año {año_2}: {p2:,}")
 
 
-def aplicar_filtro_cliente(
+def aplicar_filtro_fechas(
     df: pd.DataFrame,
-    columna_cliente: str = 'cliente',
-    mostrar_widget: bool = True,
-    max_opciones: int = 50
+    columna_fecha: str = 'fecha',
+    mostrar_widget: bool = True
 ) -> pd.DataFrame:
     """
-    Aplica filtro de selección de clientes con búsqueda intuitiva.
+    Aplica filtro de fechas al DataFrame con múltiples modos de comparación.
+    
+    Modos disponibles:
+    - Rango de fechas: Selección directa de fecha inicio y fin
+    - Periodo vs periodo: Comparación entre periodos (mensual, trimestral, anual)
     
     Args:
         df: DataFrame a filtrar
-        columna_cliente: Nombre de la columna con clientes
+        columna_fecha: Nombre de la columna con fechas
         mostrar_widget: Si mostrar el widget en el sidebar
-        max_opciones: Máximo de clientes a mostrar en el selector
         
     Returns:
         DataFrame filtrado
         
     Examples:
-        >>> df_filtrado = aplicar_filtro_cliente(df, 'nombre_cliente')
+        >>> df_filtrado = aplicar_filtro_fechas(df, 'fecha_venta')
     """
-    if columna_cliente not in df.columns:
-        if mostrar_widget:
-            st.warning(f"⚠️ Columna '{columna_cliente}' no encontrada")
-        return df
-    
-    # Obtener clientes únicos y ordenarlos
-    clientes_unicos = sorted([str(c) for c in df[columna_cliente].dropna().unique() if str(c).strip()])
-    
-    if len(clientes_unicos) == 0:
+    if columna_fecha not in df.columns:
         if mostrar_widget:
-            st.warning("⚠️ No hay clientes para filtrar")
+            st.warning(f"⚠️ Columna '{columna_fecha}' no encontrada")
         return df
     
     if not mostrar_widget:
         return df
+
+    vista = VistaFiltrada(df)
+    filtrar_vista_fechas(vista, columna_fecha)
+    return vista.df
+
+
+def filtrar_vista_cliente(
+    vista: VistaFiltrada,
+    columna_cliente: str = 'cliente',
+    max_opciones: int = 50
+) -> None:
+    """Widget de selección de clientes con búsqueda que registra su máscara en la vista."""
+    clientes_unicos = vista.valores_unicos(columna_cliente)
+    
+    if len(clientes_unicos) == 0:
+        st.warning("⚠️ No hay clientes para filtrar")
+        return
     
     st.write(f"**Total de clientes:** {len(clientes_unicos):,}")
     
@@ -226,13 +352,112 @@ def aplicar_filtro_cliente(
     
     # Aplicar filtro si hay clientes seleccionados
     if clientes_seleccionados:
-        df_filtrado = df[df[columna_cliente].isin(clientes_seleccionados)].copy()
-        registros_filtrados = len(df_filtrado)
-        registros_totales = len(df)
-        st.success(f"📊 Filtrando {registros_filtrados:,} de {registros_totales:,} registros ({len(clientes_seleccionados)} cliente(s))")
-        return df_filtrado
+        registros_totales = vista.n_filtradas
+        vista.aplicar(
+            f"cliente:{columna_cliente}",
+            tuple(clientes_seleccionados),
+            lambda: vista.base[columna_cliente].isin(clientes_seleccionados).to_numpy(),
+        )
+        st.success(f"📊 Filtrando {vista.n_filtradas:,} de {registros_totales:,} registros ({len(clientes_seleccionados)} cliente(s))")
+
+
+def aplicar_filtro_cliente(
+    df: pd.DataFrame,
+    columna_cliente: str = 'cliente',
+    mostrar_widget: bool = True,
+    max_opciones: int = 50
+) -> pd.DataFrame:
+    """
+    Aplica filtro de selección de clientes con búsqueda intuitiva.
     
-    return df
+    Args:
+        df: DataFrame a filtrar
+        columna_cliente: Nombre de la columna con clientes
+        mostrar_widget: Si mostrar el widget en el sidebar
+        max_opciones: Máximo de clientes a mostrar en el selector
+        
+    Returns:
+        DataFrame filtrado
+        
+    Examples:
+        >>> df_filtrado = aplicar_filtro_cliente(df, 'nombre_cliente')
+    """
+    if columna_cliente not in df.columns:
+        if mostrar_widget:
+            st.warning(f"⚠️ Columna '{columna_cliente}' no encontrada")
+        return df
+    
+    if not mostrar_widget:
+        return df
+
+    vista = VistaFiltrada(df)
+    filtrar_vista_cliente(vista, columna_cliente, max_opciones=max_opciones)
+    return vista.df
+
+
+def filtrar_vista_monto(vista: VistaFiltrada, columna_monto: str = 'monto') -> None:
+    """Widget de rango de montos que registra su máscara en la vista."""
+    montos = pd.to_numeric(vista.base[columna_monto], errors='coerce')
+    df_con_montos = montos if vista.mascara is None else montos[vista.mascara]
+    df_con_montos = df_con_montos.dropna()
+    
+    if df_con_montos.empty:
+        st.warning("⚠️ No hay montos válidos para filtrar")
+        return
+    
+    monto_min = float(df_con_montos.min())
+    monto_max = float(df_con_montos.max())
+    
+    # Evitar error de slider cuando min == max
+    if monto_min >= monto_max:
+        monto_max = monto_min + 1.0
+    
+    # Rangos predefinidos
+    rangos_predefinidos = {
+        "Todos los montos": (monto_min, monto_max),
+        "Menor a $10,000": (monto_min, 10000),
+        "$10,000 - $50,000": (10000, 50000),
+        "$50,000 - $100,000": (50000, 100000),
+        "Mayor a $100,000": (100000, monto_max)
+    }
+    
+    tipo_filtro = st.radio(
+        "Tipo de filtro",
+        ["Rango personalizado", "Rangos predefinidos"],
+        key="filtro_monto_tipo"
+    )
+    
+    if tipo_filtro == "Rango personalizado":
+        rango_seleccionado = st.slider(
+            "Rango de monto",
+            min_value=monto_min,
+            max_value=monto_max,
+            value=(monto_min, monto_max),
+            format="$%.0f",
+            key="filtro_monto_slider"
+        )
+        monto_inicio, monto_fin = rango_seleccionado
+    else:
+        rango_nombre = st.selectbox(
+            "Seleccionar rango",
+            options=list(rangos_predefinidos.keys()),
+            key="filtro_monto_predefinido"
+        )
+        monto_inicio, monto_fin = rangos_predefinidos[rango_nombre]
+    
+    # Aplicar filtro
+    vista.aplicar(
+        f"monto:{columna_monto}",
+        (monto_inicio, monto_fin),
+        lambda: montos.between(monto_inicio, monto_fin).to_numpy(),
+    )
+    
+    # Mostrar info
+    registros_totales = len(df_con_montos)
+    suma_filtrada = montos[vista.mascara].sum()
+    
+    st.caption(f"📊 {vista.n_filtradas:,} de {registros_totales:,} registros")
+    st.caption(f"💵 Total: ${suma_filtrada:,.2f}")
 
 
 def aplicar_filtro_monto(
@@ -259,74 +484,12 @@ def aplicar_filtro_monto(
             st.warning(f"⚠️ Columna '{columna_monto}' no encontrada")
         return df
     
-    # Convertir a numérico
-    df_con_montos = df.copy()
-    df_con_montos[columna_monto] = pd.to_numeric(df_con_montos[columna_monto], errors='coerce')
-    df_con_montos = df_con_montos.dropna(subset=[columna_monto])
-    
-    if df_con_montos.empty:
-        if mostrar_widget:
-            st.warning("⚠️ No hay montos válidos para filtrar")
+    if not mostrar_widget:
         return df
-    
-    if mostrar_widget:
-        monto_min = float(df_con_montos[columna_monto].min())
-        monto_max = float(df_con_montos[columna_monto].max())
-        
-        # Evitar error de slider cuando min == max
-        if monto_min >= monto_max:
-            monto_max = monto_min + 1.0
-        
-        # Rangos predefinidos
-        rangos_predefinidos = {
-            "Todos los montos": (monto_min, monto_max),
-            "Menor a $10,000": (monto_min, 10000),
-            "$10,000 - $50,000": (10000, 50000),
-            "$50,000 - $100,000": (50000, 100000),
-            "Mayor a $100,000": (100000, monto_max)
-        }
-        
-        tipo_filtro = st.radio(
-            "Tipo de filtro",
-            ["Rango personalizado", "Rangos predefinidos"],
-            key="filtro_monto_tipo"
-        )
-        
-        if tipo_filtro == "Rango personalizado":
-            rango_seleccionado = st.slider(
-                "Rango de monto",
-                min_value=monto_min,
-                max_value=monto_max,
-                value=(monto_min, monto_max),
-                format="$%.0f",
-                key="filtro_monto_slider"
-            )
-            monto_inicio, monto_fin = rango_seleccionado
-        else:
-            rango_nombre = st.selectbox(
-                "Seleccionar rango",
-                options=list(rangos_predefinidos.keys()),
-                key="filtro_monto_predefinido"
-            )
-            monto_inicio, monto_fin = rangos_predefinidos[rango_nombre]
-        
-        # Aplicar filtro
-        mask = (df_con_montos[columna_monto] >= monto_inicio) & \
-               (df_con_montos[columna_monto] <= monto_fin)
-        
-        df_filtrado = df_con_montos[mask]
-        
-        # Mostrar info
-        registros_filtrados = len(df_filtrado)
-        registros_totales = len(df_con_montos)
-        suma_filtrada = df_filtrado[columna_monto].sum()
-        
-        st.caption(f"📊 {registros_filtrados:,} de {registros_totales:,} registros")
-        st.caption(f"💵 Total: ${suma_filtrada:,.2f}")
-        
-        return df_filtrado
-    
-    return df
+
+    vista = VistaFiltrada(df)
+    filtrar_vista_monto(vista, columna_monto)
+    return vista.df
 
 
 def aplicar_filtro_categoria_riesgo(
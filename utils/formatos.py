@@ -3,10 +3,13 @@ Módulo de utilidades para formateo consistente de datos en el dashboard.
 Proporciona funciones helper para monedas, porcentajes y números.
 """
 
-from typing import Optional, Union
+from typing import Dict, Optional, Union
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+import numpy as np
+import pandas as pd
+
 _TZ_MX = ZoneInfo("America/Mexico_City")
 
 
@@ -185,3 +188,85 @@ FORMATO_NUMERO_DICT = '{:,.0f}'
 FORMATO_NUMERO_DECIMAL_DICT = '{:,.2f}'
 FORMATO_PORCENTAJE_DICT = '{:.1f}%'
 FORMATO_PORCENTAJE_2DEC_DICT = '{:.2f}%'
+
+
+# ── Formato de tablas sin copias de texto ────────────────────────────────────
+#
+# Las tablas se muestran con las columnas numéricas intactas y el formato se
+# aplica en el navegador (st.column_config) o en el Styler: no se duplica la
+# columna como texto y el orden sigue siendo numérico. `formatear_columnas`
+# es el camino para exportaciones (CSV/Excel/PDF) que sí necesitan texto.
+
+# tipo → (formato de st.column_config.NumberColumn, step, plantilla str.format)
+FORMATOS_COLUMNA = {
+    "moneda":        ("dollar", 0.01, "${:,.2f}"),
+    "moneda_entera": ("dollar", 1, "${:,.0f}"),
+    "entero":        ("localized", 1, "{:,.0f}"),
+    "decimal":       ("localized", 0.1, "{:,.1f}"),
+    "decimal_2":     ("localized", 0.01, "{:,.2f}"),
+    "porcentaje":    ("%.1f%%", None, "{:.1f}%"),
+    "porcentaje_2":  ("%.2f%%", None, "{:.2f}%"),
+    "dias":          ("%.0f días", None, "{:.0f} días"),
+}
+
+
+def columna_numerica(tipo: str, etiqueta: Optional[str] = None, **kwargs):
+    """
+    `st.column_config.NumberColumn` con el formato estándar de `tipo`.
+
+    Args:
+        tipo: Llave de FORMATOS_COLUMNA ("moneda", "porcentaje", "dias", ...)
+        etiqueta: Encabezado de la columna
+        **kwargs: Resto de argumentos de NumberColumn (width, help, ...)
+
+    Example:
+        st.dataframe(df, column_config={
+            "saldo": columna_numerica("moneda", "Saldo", width="medium"),
+        })
+    """
+    import streamlit as st
+
+    formato, step, _ = FORMATOS_COLUMNA[tipo]
+    if step is not None:
+        kwargs.setdefault("step", step)
+    return st.column_config.NumberColumn(etiqueta, format=formato, **kwargs)
+
+
+def formatos_styler(columnas: Dict[str, str]) -> Dict[str, str]:
+    """
+    Dict columna → plantilla para ``DataFrame.style.format``.
+
+    Example:
+        df.style.format(formatos_styler({"total": "moneda", "pct": "porcentaje"}), na_rep="-")
+    """
+    return {col: FORMATOS_COLUMNA[tipo][2] for col, tipo in columnas.items()}
+
+
+def formatear_serie(serie: pd.Series, tipo: str, nulo: str = "") -> pd.Series:
+    """
+    Serie numérica → texto con el formato de `tipo` (para exportar).
+
+    Formatea con ``str.format`` enlazado sobre la lista de floats, sin
+    lambdas ni ``apply`` por celda; los nulos y no numéricos quedan como
+    `nulo`.
+    """
+    plantilla = FORMATOS_COLUMNA[tipo][2].format
+    valores = pd.to_numeric(serie, errors="coerce").astype("float64")
+    validos = np.isfinite(valores.to_numpy())
+
+    resultado = np.full(len(valores), nulo, dtype=object)
+    resultado[validos] = list(map(plantilla, valores.to_numpy()[validos].tolist()))
+    return pd.Series(resultado, index=serie.index, name=serie.name, dtype=object)
+
+
+def formatear_columnas(df: pd.DataFrame, columnas: Dict[str, str], nulo: str = "") -> pd.DataFrame:
+    """
+    Copia de `df` con las columnas indicadas convertidas a texto formateado.
+
+    Solo para exportaciones; en pantalla usar `columna_numerica` o
+    `formatos_styler` sobre los datos numéricos.
+    """
+    return df.assign(**{
+        col: formatear_serie(df[col], tipo, nulo=nulo)
+        for col, tipo in columnas.items() if col in df.columns
+    })
@@ -0,0 +1,208 @@
+"""
+Huella (fingerprint) barata del contenido de un DataFrame.
+
+Se usa como llave de caché: dos DataFrames con las mismas columnas, dtypes,
+índice y valores (en el mismo orden) tienen la misma huella.
+
+- Cada columna se hashea por bloques de `FILAS_BLOQUE_HUELLA` filas. Las
+  columnas numéricas, booleanas y de fecha se hashean sobre su memoria
+  NumPy cruda (xxhash si está instalado, blake2b si no); el resto con
+  ``pd.util.hash_pandas_object``. Nunca se materializa el frame como arreglo
+  de objetos ni se copia.
+- La huella se guarda asociada al objeto DataFrame (por id, validado con
+  weakref): pedirla de nuevo para el mismo frame no rehashea nada.
+- Tras agregar filas al final solo se rehashean el último bloque incompleto
+  y los bloques nuevos (`huella_tras_append`, o el mismo frame ampliado en
+  sitio).
+
+El DataFrame se trata como inmutable: si se modifican valores en sitio hay
+que pedir la huella con ``usar_cache=False``.
+"""
+
+import hashlib
+import weakref
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# Filas por bloque: tras un append solo se rehashea desde el último bloque incompleto
+FILAS_BLOQUE_HUELLA = 65_536
+
+# Estados de huella en memoria, indexados por id del DataFrame (validado con weakref)
+MAX_HUELLAS_EN_CACHE = 64
+_huellas_cache: "OrderedDict[int, Tuple[weakref.ref, tuple]]" = OrderedDict()
+
+# Dtypes NumPy de ancho fijo que se hashean directamente sobre su memoria
+_KINDS_MEMORIA = "biufcmM"
+
+
+def _digest_memoria(valores: np.ndarray) -> int:
+    """Hash de 64 bits sobre la memoria cruda de un arreglo NumPy."""
+    buffer = memoryview(np.ascontiguousarray(valores).view(np.uint8))
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64_intdigest(buffer)
+    return int.from_bytes(hashlib.blake2b(buffer, digest_size=8).digest(), "little")
+
+
+def _valores_columna(serie: pd.Series):
+    """Arreglo NumPy sin copia para dtypes de ancho fijo; la Serie para el resto."""
+    if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in _KINDS_MEMORIA:
+        return serie.to_numpy(copy=False)
+    return serie
+
+
+def _digest_bloque(valores, inicio: int, fin: int) -> int:
+    """Digest de las filas [inicio, fin) de una columna o índice."""
+    if isinstance(valores, np.ndarray):
+        return _digest_memoria(valores[inicio:fin])
+
+    bloque = valores.iloc[inicio:fin] if isinstance(valores, pd.Series) else valores[inicio:fin]
+    try:
+        filas = pd.util.hash_pandas_object(bloque, index=False)
+    except TypeError:
+        # Celdas no hasheables (listas, dicts): se hashea su representación
+        filas = pd.util.hash_pandas_object(pd.Series(bloque).astype(str), index=False)
+    return _digest_memoria(filas.to_numpy())
+
+
+def _bloques(valores, n: int, previos: Optional[List[int]] = None, n_previo: int = 0) -> List[int]:
+    """Digests por bloque, reutilizando los bloques completos de un estado anterior."""
+    completos = n_previo // FILAS_BLOQUE_HUELLA if previos is not None else 0
+    digests = list(previos[:completos]) if previos is not None else []
+    for inicio in range(completos * FILAS_BLOQUE_HUELLA, n, FILAS_BLOQUE_HUELLA):
+        digests.append(_digest_bloque(valores, inicio, min(inicio + FILAS_BLOQUE_HUELLA, n)))
+    return digests
+
+
+def _estructura(df: pd.DataFrame) -> tuple:
+    return tuple(str(c) for c in df.columns), tuple(str(t) for t in df.dtypes)
+
+
+def _calcular_estado(df: pd.DataFrame, previo: Optional[tuple] = None) -> tuple:
+    """
+    Estado de huella ``(n_filas, estructura, bloques_por_columna, indice)``.
+
+    Si `previo` corresponde a un prefijo de `df` (mismas columnas y dtypes,
+    menos o igual número de filas) sus bloques completos se reutilizan.
+    """
+    n = len(df)
+    estructura = _estructura(df)
+    reutilizable = previo is not None and previo[1] == estructura and previo[0] <= n
+    n_previo = previo[0] if reutilizable else 0
+
+    columnas = [
+        _bloques(_valores_columna(df.iloc[:, pos]), n, previo[2][pos] if reutilizable else None, n_previo)
+        for pos in range(df.shape[1])
+    ]
+
+    if isinstance(df.index, pd.RangeIndex):
+        indice = ("range", df.index.start, df.index.step)
+    else:
+        previos = previo[3] if reutilizable and isinstance(previo[3], list) else None
+        indice = _bloques(df.index, n, previos, n_previo)
+
+    return n, estructura, columnas, indice
+
+
+def _estado_cacheado(df: pd.DataFrame) -> Optional[tuple]:
+    entrada = _huellas_cache.get(id(df))
+    if entrada is not None and entrada[0]() is df:
+        _huellas_cache.move_to_end(id(df))
+        return entrada[1]
+    return None
+
+
+def _guardar_estado(df: pd.DataFrame, estado: tuple) -> None:
+    _huellas_cache[id(df)] = (weakref.ref(df), estado)
+    _huellas_cache.move_to_end(id(df))
+    while len(_huellas_cache) > MAX_HUELLAS_EN_CACHE:
+        _huellas_cache.popitem(last=False)
+
+
+def _hex(estado: tuple, posiciones: Optional[Sequence[int]] = None, con_indice: bool = True) -> str:
+    n, (columnas, dtypes), bloques, indice = estado
+    if not con_indice:
+        indice = None
+    if posiciones is not None:
+        columnas = tuple(columnas[p] for p in posiciones)
+        dtypes = tuple(dtypes[p] for p in posiciones)
+        bloques = [bloques[p] for p in posiciones]
+    firma = (n, columnas, dtypes, bloques, indice)
+    return hashlib.md5(repr(firma).encode()).hexdigest()[:16]
+
+
+def _estado_huella(df: pd.DataFrame, usar_cache: bool = True) -> tuple:
+    previo = _estado_cacheado(df) if usar_cache else None
+    if previo is not None and previo[0] == len(df) and previo[1] == _estructura(df):
+        return previo
+
+    # Un estado previo con menos filas y la misma estructura es un append en sitio
+    estado = _calcular_estado(df, previo)
+    _guardar_estado(df, estado)
+    return estado
+
+
+def huella_dataframe(df: pd.DataFrame, usar_cache: bool = True) -> str:
+    """
+    Huella del contenido de un DataFrame (columnas, dtypes, índice y valores).
+
+    Args:
+        df: DataFrame de pandas
+        usar_cache: Reutilizar la huella ya calculada para este mismo objeto.
+            Pasar False si el frame se modificó en sitio.
+
+    Returns:
+        String hexadecimal de 16 caracteres
+
+    Examples:
+        >>> df = pd.DataFrame({'a': [1, 2, 3]})
+        >>> huella_dataframe(df) == huella_dataframe(df.copy())
+        True
+    """
+    return _hex(_estado_huella(df, usar_cache=usar_cache))
+
+
+def huella_columnas(df: pd.DataFrame, columnas: Sequence[str], con_indice: bool = True) -> str:
+    """
+    Huella de un subconjunto de columnas sin crear el subframe.
+
+    Reutiliza el estado cacheado del frame completo, así que varias consultas
+    sobre distintas columnas del mismo df hashean cada columna una sola vez.
+    Con ``con_indice=False`` el índice no forma parte de la huella.
+    """
+    posiciones = [df.columns.get_loc(c) for c in columnas]
+    if any(not isinstance(p, (int, np.integer)) for p in posiciones):
+        # Nombre duplicado: get_loc no da una posición única
+        return _hex(_estado_huella(df[list(columnas)]), con_indice=con_indice)
+    return _hex(_estado_huella(df), posiciones, con_indice=con_indice)
+
+
+def huella_tras_append(df_base: pd.DataFrame, df_extendido: pd.DataFrame) -> str:
+    """
+    Huella de `df_extendido`, que es `df_base` con filas nuevas al final.
+
+    Solo se rehashean el último bloque incompleto de `df_base` y las filas
+    nuevas. No se verifica que el prefijo coincida: si `df_extendido` no
+    empieza con las filas de `df_base`, usar `huella_dataframe`.
+
+    Examples:
+        >>> nuevo = pd.concat([df, df_dia], ignore_index=True)
+        >>> huella_tras_append(df, nuevo) == huella_dataframe(nuevo, usar_cache=False)
+        True
+    """
+    estado = _calcular_estado(df_extendido, _estado_huella(df_base))
+    _guardar_estado(df_extendido, estado)
+    return _hex(estado)
+
+
+def limpiar_cache_huellas() -> None:
+    """Descarta las huellas en memoria."""
+    _huellas_cache.clear()
@@ -4,25 +4,44 @@ Módulo: Knowledge Base - Motor de Búsqueda e Indexación Wiki
 Motor de búsqueda full-text sobre documentación interna del sistema.
 Soporta:
 - Indexación automática de archivos Markdown
-- Búsqueda full-text con ranking por relevancia
+- Búsqueda full-text con ranking BM25 y prefijos sobre vocabulario ordenado
 - Búsqueda semántica opcional con OpenAI embeddings
 - Categorización automática de documentos
 - Historial de búsquedas
-- Cache de índice para rendimiento
+- Índice invertido incremental con persistencia en disco (warm start por mtime)
 """
 
 import os
 import re
 import json
+import math
+import time
+import bisect
 import hashlib
 import logging
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 
 logger = logging.getLogger("knowledge_base")
 
+# Pesos por campo: cada aparición de un token suma su peso a la frecuencia
+# ponderada del documento para ese token.
+FIELD_WEIGHTS = {"title": 3.0, "heading": 2.0, "content": 1.0, "category": 2.0}
+
+# Parámetros BM25 y peso de las coincidencias por prefijo
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_MATCH_WEIGHT = 0.5
+
+# Índice persistido (relativo a base_dir) y versión de su formato
+INDEX_CACHE_PATH = os.path.join(".cache", "knowledge_base_index.json")
+INDEX_CACHE_VERSION = 1
+
+# Directorios que nunca se indexan
+_IGNORED_DIRS = ('node_modules', '__pycache__', 'htmlcov')
+
 
 # =====================================================================
 # MODELOS DE DATOS
@@ -110,7 +129,7 @@ class MarkdownParser:
             checksum = hashlib.md5(content.encode()).hexdigest()
 
             return Document(
-                id=hashlib.sha256(filepath.encode()).hexdigest()[:12],
+                id=_document_id(filepath),
                 title=title,
                 path=str(path),
                 content=content,
@@ -242,7 +261,20 @@ class SearchEngine:
 
     def __init__(self):
         self.documents: Dict[str, Document] = {}
-        self._inverted_index: Dict[str, List[Tuple[str, float]]] = {}
+        # token -> {doc_id: frecuencia ponderada}
+        self._inverted_index: Dict[str, Dict[str, float]] = {}
+        # doc_id -> {token: frecuencia ponderada} (para quitar postings en sitio)
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        # path -> mtime del archivo al momento de indexarlo
+        self._file_mtimes: Dict[str, float] = {}
+        # doc_id -> longitud (suma de frecuencias ponderadas) para BM25
+        self._doc_lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        # doc_id -> texto en minúsculas de cada sección (heading + contenido)
+        self._section_text: Dict[str, List[str]] = {}
+        # Vocabulario ordenado para búsquedas por prefijo con bisect
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
         self._search_history: List[SearchStats] = []
         self._stopwords = self._load_stopwords()
 
@@ -278,60 +310,209 @@ class SearchEngine:
             logger.warning(f"Directorio no existe: {directory}")
             return 0
 
-        pattern = '**/*.md' if recursive else '*.md'
-        for md_file in sorted(path.glob(pattern)):
-            # Ignorar archivos en directorios ocultos o de build
-            if any(part.startswith('.') or part in ('node_modules', '__pycache__', 'htmlcov')
-                   for part in md_file.parts):
-                continue
-
-            doc = MarkdownParser.parse_file(str(md_file))
-            if doc:
-                self.documents[doc.id] = doc
+        for md_file in _discover_markdown(path, recursive):
+            if self.index_file(str(md_file)):
                 count += 1
 
-        # Construir índice invertido
-        self._build_inverted_index()
         logger.info(f"Indexados {count} documentos de {directory}")
         return count
 
     def index_file(self, filepath: str) -> Optional[Document]:
-        """Indexa un archivo individual."""
+        """Indexa (o re-indexa) un archivo individual sin reconstruir el índice."""
         doc = MarkdownParser.parse_file(filepath)
         if doc:
-            self.documents[doc.id] = doc
-            self._build_inverted_index()
+            self._add_document(doc)
         return doc
 
+    def remove_document(self, doc_id: str) -> bool:
+        """Quita un documento y sus postings del índice."""
+        doc = self.documents.pop(doc_id, None)
+        if doc is None:
+            return False
+        self._remove_postings(doc_id)
+        self._file_mtimes.pop(doc.path, None)
+        return True
+
+    def sync_files(self, filepaths: List[str]) -> Dict[str, int]:
+        """
+        Sincroniza el índice con una lista de archivos.
+
+        Solo re-parsea los archivos cuyo mtime cambió (o que son nuevos) y
+        quita los documentos cuyos archivos ya no están en la lista.
+
+        Returns:
+            Conteos {"reused", "parsed", "removed"}.
+        """
+        stats = {"reused": 0, "parsed": 0, "removed": 0}
+        wanted = set()
+
+        for filepath in filepaths:
+            filepath = str(filepath)
+            wanted.add(filepath)
+            try:
+                mtime = os.path.getmtime(filepath)
+            except OSError:
+                continue
+            if self._file_mtimes.get(filepath) == mtime:
+                stats["reused"] += 1
+                continue
+            stale_id = _document_id(filepath)
+            if not self.index_file(filepath) and stale_id in self.documents:
+                self.remove_document(stale_id)
+            stats["parsed"] += 1
+
+        for doc_id, doc in list(self.documents.items()):
+            if doc.path not in wanted:
+                self.remove_document(doc_id)
+                stats["removed"] += 1
+
+        return stats
+
+    def _add_document(self, doc: Document, terms: Optional[Dict[str, float]] = None,
+                      mtime: Optional[float] = None):
+        """Agrega (o reemplaza) los postings de un documento en sitio."""
+        if doc.id in self.documents:
+            self._remove_postings(doc.id)
+
+        if terms is None:
+            terms = self._term_frequencies(doc)
+        if mtime is None:
+            try:
+                mtime = os.path.getmtime(doc.path)
+            except OSError:
+                mtime = None
+
+        self.documents[doc.id] = doc
+        self._doc_terms[doc.id] = terms
+        for token, freq in terms.items():
+            postings = self._inverted_index.get(token)
+            if postings is None:
+                postings = self._inverted_index[token] = {}
+                self._vocabulary_dirty = True
+            postings[doc.id] = freq
+
+        length = sum(terms.values())
+        self._doc_lengths[doc.id] = length
+        self._total_length += length
+        self._section_text[doc.id] = [
+            (section["heading"] + " " + section["content"]).lower() for section in doc.sections
+        ]
+        if mtime is not None:
+            self._file_mtimes[doc.path] = mtime
+
+    def _remove_postings(self, doc_id: str):
+        """Quita del índice invertido los tokens de un documento."""
+        for token in self._doc_terms.pop(doc_id, {}):
+            postings = self._inverted_index.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._inverted_index[token]
+                self._vocabulary_dirty = True
+        self._total_length -= self._doc_lengths.pop(doc_id, 0.0)
+        self._section_text.pop(doc_id, None)
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        """Tokens del vocabulario que empiezan con `prefix` (O(log V + k))."""
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._inverted_index)
+            self._vocabulary_dirty = False
+        lo = bisect.bisect_left(self._vocabulary, prefix)
+        hi = bisect.bisect_left(self._vocabulary, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        return self._vocabulary[lo:hi]
+
+    def _bm25(self, token: str, avg_length: float) -> Dict[str, float]:
+        """Puntaje BM25 de un token para cada documento que lo contiene."""
+        postings = self._inverted_index.get(token)
+        if not postings:
+            return {}
+        n_docs = len(self.documents)
+        idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+        lengths = self._doc_lengths
+        k1, b = BM25_K1, BM25_B
+        return {
+            doc_id: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[doc_id] / avg_length))
+            for doc_id, tf in postings.items()
+        }
+
+    def _term_frequencies(self, doc: Document) -> Dict[str, float]:
+        """Frecuencia ponderada por token: título, headings, contenido y categoría."""
+        terms: Dict[str, float] = {}
+
+        def _count(text: str, weight: float):
+            for token in self._tokenize(text):
+                terms[token] = terms.get(token, 0.0) + weight
+
+        _count(doc.title, FIELD_WEIGHTS["title"])
+        for section in doc.sections:
+            _count(section["heading"], FIELD_WEIGHTS["heading"])
+        _count(doc.content, FIELD_WEIGHTS["content"])
+        _count(doc.category, FIELD_WEIGHTS["category"])
+        return terms
+
     def _build_inverted_index(self):
-        """Construye un índice invertido para búsqueda rápida."""
+        """Reconstruye por completo el índice invertido (solo para recuperación)."""
         self._inverted_index.clear()
+        self._doc_terms.clear()
+        self._doc_lengths.clear()
+        self._section_text.clear()
+        self._total_length = 0.0
+        self._vocabulary_dirty = True
+        for doc in list(self.documents.values()):
+            self._add_document(doc, mtime=self._file_mtimes.get(doc.path))
+
+    # -----------------------------------------------------------------
+    # Persistencia del índice
+    # -----------------------------------------------------------------
+    def save_index(self, cache_path: str) -> bool:
+        """Guarda documentos, frecuencias y mtimes en disco (escritura atómica)."""
+        payload = {
+            "version": INDEX_CACHE_VERSION,
+            "entries": [
+                {
+                    "mtime": self._file_mtimes.get(doc.path),
+                    "document": asdict(doc),
+                    "terms": self._doc_terms.get(doc_id, {}),
+                }
+                for doc_id, doc in self.documents.items()
+            ],
+        }
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+            return True
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el índice en {cache_path}: {e}")
+            return False
 
-        for doc_id, doc in self.documents.items():
-            # Indexar título (peso alto)
-            for token in self._tokenize(doc.title):
-                if token not in self._inverted_index:
-                    self._inverted_index[token] = []
-                self._inverted_index[token].append((doc_id, 3.0))
-
-            # Indexar headings de secciones (peso medio)
-            for section in doc.sections:
-                for token in self._tokenize(section["heading"]):
-                    if token not in self._inverted_index:
-                        self._inverted_index[token] = []
-                    self._inverted_index[token].append((doc_id, 2.0))
-
-            # Indexar contenido (peso base)
-            for token in self._tokenize(doc.content):
-                if token not in self._inverted_index:
-                    self._inverted_index[token] = []
-                self._inverted_index[token].append((doc_id, 1.0))
-
-            # Indexar categoría (peso medio)
-            for token in self._tokenize(doc.category):
-                if token not in self._inverted_index:
-                    self._inverted_index[token] = []
-                self._inverted_index[token].append((doc_id, 2.0))
+    def load_index(self, cache_path: str) -> bool:
+        """
+        Carga un índice persistido con save_index.
+
+        Los documentos quedan marcados con el mtime guardado; sync_files
+        decide después cuáles re-parsear.
+        """
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                payload = json.load(f)
+            if payload.get("version") != INDEX_CACHE_VERSION:
+                return False
+            for entry in payload["entries"]:
+                doc = Document(**entry["document"])
+                self._add_document(doc, terms=entry["terms"], mtime=entry["mtime"])
+            return True
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Índice en disco inválido ({cache_path}), se re-indexa: {e}")
+            self.documents.clear()
+            self._file_mtimes.clear()
+            self._build_inverted_index()
+            return False
 
     def _tokenize(self, text: str) -> List[str]:
         """Tokeniza texto: lowercase, elimina stopwords, normaliza."""
@@ -356,8 +537,7 @@ class SearchEngine:
         Returns:
             Lista de SearchResult ordenados por relevancia
         """
-        import time
-        start = time.time()
+        start = time.perf_counter()
 
         if not query or not query.strip():
             return []
@@ -366,27 +546,26 @@ class SearchEngine:
         if not query_tokens:
             return []
 
-        # Calcular scores por documento
+        # Calcular scores BM25 por documento
         doc_scores: Dict[str, float] = {}
         doc_matches: Dict[str, List[str]] = {}
+        avg_length = (self._total_length / len(self.documents)) if self.documents else 1.0
 
         for token in query_tokens:
             # Búsqueda exacta
-            if token in self._inverted_index:
-                for doc_id, weight in self._inverted_index[token]:
-                    doc_scores[doc_id] = doc_scores.get(doc_id, 0) + weight
-                    if doc_id not in doc_matches:
-                        doc_matches[doc_id] = []
-                    if token not in doc_matches[doc_id]:
-                        doc_matches[doc_id].append(token)
-
-            # Búsqueda por prefijo (parcial)
-            for indexed_token in self._inverted_index:
-                if indexed_token.startswith(token) and indexed_token != token:
-                    for doc_id, weight in self._inverted_index[indexed_token]:
-                        doc_scores[doc_id] = doc_scores.get(doc_id, 0) + weight * 0.5
-                        if doc_id not in doc_matches:
-                            doc_matches[doc_id] = []
+            for doc_id, score in self._bm25(token, avg_length).items():
+                doc_scores[doc_id] = doc_scores.get(doc_id, 0) + score
+                matches = doc_matches.setdefault(doc_id, [])
+                if token not in matches:
+                    matches.append(token)
+
+            # Búsqueda por prefijo (parcial) sobre el vocabulario ordenado
+            for indexed_token in self._prefix_terms(token):
+                if indexed_token == token:
+                    continue
+                for doc_id, score in self._bm25(indexed_token, avg_length).items():
+                    doc_scores[doc_id] = doc_scores.get(doc_id, 0) + score * PREFIX_MATCH_WEIGHT
+                    doc_matches.setdefault(doc_id, [])
 
         # Bonus por coincidencia de múltiples tokens
         for doc_id in doc_scores:
@@ -416,10 +595,9 @@ class SearchEngine:
         for doc_id, score in sorted_docs:
             doc = self.documents[doc_id]
 
-            # Encontrar secciones que matchean
+            # Encontrar secciones que matchean (texto ya en minúsculas)
             matched_sections = []
-            for section in doc.sections:
-                section_lower = (section["heading"] + " " + section["content"]).lower()
+            for section, section_lower in zip(doc.sections, self._section_text[doc_id]):
                 if any(t in section_lower for t in query_tokens):
                     # Extraer snippet relevante
                     snippet = self._extract_snippet(section["content"], query_tokens)
@@ -448,7 +626,7 @@ class SearchEngine:
                 highlights=highlights,
             ))
 
-        elapsed_ms = (time.time() - start) * 1000
+        elapsed_ms = (time.perf_counter() - start) * 1000
 
         # Registrar estadísticas
         self._search_history.append(SearchStats(
@@ -552,7 +730,7 @@ class SearchEngine:
         scores = {}
         for token in source_tokens:
             if token in self._inverted_index:
-                for other_id, weight in self._inverted_index[token]:
+                for other_id, weight in self._inverted_index[token].items():
                     if other_id != doc_id:
                         scores[other_id] = scores.get(other_id, 0) + weight
 
@@ -660,8 +838,7 @@ class SearchEngine:
                     last_modified=updated.last_modified,
                     checksum=updated.checksum,
                 )
-                self.documents[doc.id] = updated_doc
-                self._build_inverted_index()
+                self._add_document(updated_doc)
             return True
 
         except Exception as e:
@@ -704,10 +881,41 @@ class SearchEngine:
 _engine_instance: Optional[SearchEngine] = None
 
 
-def get_search_engine(base_dir: str = None) -> SearchEngine:
+def _document_id(filepath: str) -> str:
+    """ID estable de un documento (mismo cálculo que MarkdownParser.parse_file)."""
+    return hashlib.sha256(filepath.encode()).hexdigest()[:12]
+
+
+def _discover_markdown(path: Path, recursive: bool = True) -> List[Path]:
+    """Archivos Markdown de un directorio, sin ocultos ni directorios de build."""
+    pattern = '**/*.md' if recursive else '*.md'
+    return [
+        md_file for md_file in sorted(path.glob(pattern))
+        if not any(part.startswith('.') or part in _IGNORED_DIRS for part in md_file.parts)
+    ]
+
+
+def _discover_knowledge_files(base_dir: str) -> List[str]:
+    """docs/ (recursivo), Markdown de la raíz y READMEs de cfdi/ y main/."""
+    files: List[str] = []
+    docs_dir = Path(base_dir, "docs")
+    if docs_dir.exists():
+        files.extend(str(p) for p in _discover_markdown(docs_dir))
+    files.extend(str(p) for p in sorted(Path(base_dir).glob("*.md")))
+    for subdir in ['cfdi', 'main']:
+        subdir_path = Path(base_dir, subdir)
+        if subdir_path.exists():
+            files.extend(str(p) for p in sorted(subdir_path.glob("*.md")))
+    return list(dict.fromkeys(files))
+
+
+def get_search_engine(base_dir: str = None, cache_path: str = None) -> SearchEngine:
     """
     Obtiene o crea la instancia del SearchEngine.
     Usa cache para no re-indexar en cada rerun de Streamlit.
+
+    En el primer uso carga el índice persistido en disco y solo re-parsea
+    los archivos cuyo mtime cambió; si hubo cambios, vuelve a guardarlo.
     """
     global _engine_instance
 
@@ -716,24 +924,18 @@ def get_search_engine(base_dir: str = None) -> SearchEngine:
 
         if base_dir is None:
             base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if cache_path is None:
+            cache_path = os.path.join(base_dir, INDEX_CACHE_PATH)
 
-        # Indexar docs/
-        docs_dir = os.path.join(base_dir, "docs")
-        if os.path.exists(docs_dir):
-            _engine_instance.index_directory(docs_dir)
-
-        # Indexar archivos MD en la raíz
-        for md_file in Path(base_dir).glob("*.md"):
-            _engine_instance.index_file(str(md_file))
+        loaded = _engine_instance.load_index(cache_path)
+        changes = _engine_instance.sync_files(_discover_knowledge_files(base_dir))
+        if not loaded or changes["parsed"] or changes["removed"]:
+            _engine_instance.save_index(cache_path)
 
-        # Indexar READMEs en subdirectorios
-        for subdir in ['cfdi', 'main']:
-            subdir_path = os.path.join(base_dir, subdir)
-            if os.path.exists(subdir_path):
-                for md_file in Path(subdir_path).glob("*.md"):
-                    _engine_instance.index_file(str(md_file))
-
-        logger.info(f"Knowledge Base inicializada: {len(_engine_instance.documents)} documentos")
+        logger.info(
+            f"Knowledge Base inicializada: {len(_engine_instance.documents)} documentos "
+            f"({changes['reused']} desde caché, {changes['parsed']} parseados)"
+        )
 
     return _engine_instance
 
@@ -49,6 +49,7 @@ import numpy as np
 from datetime import date, datetime
 from typing import Dict, List, Optional, Tuple
 
+from utils.constantes import BINS_ANTIGUEDAD, LABELS_ANTIGUEDAD
 from utils.logger import configurar_logger
 
 logger = configurar_logger("modelo_unificado", nivel="INFO")
@@ -62,6 +63,10 @@ ESTATUS_VIGENTE = "Vigente"
 ESTATUS_VENCIDA = "Vencida"
 VALORES_ESTATUS_VALIDOS = frozenset({ESTATUS_PAGADA, ESTATUS_VIGENTE, ESTATUS_VENCIDA})
 
+# Buckets de aging que no salen de dias_vencido
+BUCKET_PAGADA    = "Pagada"
+BUCKET_SIN_FECHA = "Sin fecha"
+
 # Nombres canónicos de columnas en cada tabla
 CAMPOS_VENTAS = {
     "pk":           "id_venta",
@@ -147,6 +152,43 @@ def calcular_estatus_cxc(
     return ESTATUS_VENCIDA
 
 
+def clasificar_estatus_vectorizado(saldos, fechas_vencimiento, hoy=None) -> np.ndarray:
+    """
+    Versión vectorizada de `calcular_estatus_cxc` para columnas completas.
+
+    Misma lógica canónica, incluidos los casos conservadores: saldo no
+    numérico o fecha inválida/ausente → "Vencida".
+
+    Args:
+        saldos:             Serie/arreglo de saldos pendientes.
+        fechas_vencimiento: Serie/arreglo de fechas límite de pago.
+        hoy:                Fecha de referencia. Si None usa la fecha actual.
+
+    Returns:
+        np.ndarray de objetos con "Pagada" | "Vigente" | "Vencida".
+    """
+    hoy_ts = pd.Timestamp(hoy if hoy is not None else date.today()).normalize()
+    if hoy_ts.tzinfo is not None:
+        hoy_ts = hoy_ts.tz_localize(None)
+
+    saldos = pd.to_numeric(pd.Series(saldos), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    fechas = pd.to_datetime(pd.Series(fechas_vencimiento), errors="coerce")
+    if getattr(fechas.dt, "tz", None) is not None:
+        # Igual que .date() sobre un Timestamp con zona: se compara la fecha local
+        fechas = fechas.dt.tz_localize(None)
+    dias_vencimiento = fechas.dt.normalize().to_numpy()
+
+    pagada = saldos == 0
+    # NaT compara como False: sin fecha queda en el default (Vencida)
+    vigente = ~np.isnan(saldos) & (dias_vencimiento >= hoy_ts.to_datetime64())
+
+    return np.select(
+        [pagada, vigente],
+        [ESTATUS_PAGADA, ESTATUS_VIGENTE],
+        default=ESTATUS_VENCIDA,
+    ).astype(object)
+
+
 def aplicar_estatus_a_dataframe(
     df: pd.DataFrame,
     col_saldo: str = "saldo_actual",
@@ -155,7 +197,8 @@ def aplicar_estatus_a_dataframe(
     fecha_corte=None,
 ) -> pd.DataFrame:
     """
-    Aplica `calcular_estatus_cxc` vectorizado a todo un DataFrame de CxC.
+    Aplica la lógica de `calcular_estatus_cxc` a todo un DataFrame de CxC
+    (vía `clasificar_estatus_vectorizado`).
 
     Sobreescribe o crea la columna `col_estatus_out`.
     Nunca lee el estatus de una columna ya existente.
@@ -185,26 +228,14 @@ def aplicar_estatus_a_dataframe(
         df[col_estatus_out] = ESTATUS_VENCIDA
         return df
 
-    saldos = pd.to_numeric(df[col_saldo], errors="coerce")
-    fechas = pd.to_datetime(df[col_vencimiento], errors="coerce")
-
-    condicion_pagada  = saldos == 0
-    condicion_vigente = (~condicion_pagada) & (fechas.dt.date >= hoy) & fechas.notna()
-    condicion_vencida = (~condicion_pagada) & (
-        (fechas.dt.date < hoy) | fechas.isna()
-    )
-
-    df[col_estatus_out] = np.select(
-        [condicion_pagada, condicion_vigente, condicion_vencida],
-        [ESTATUS_PAGADA,   ESTATUS_VIGENTE,   ESTATUS_VENCIDA],
-        default=ESTATUS_VENCIDA,
-    )
+    estatus = clasificar_estatus_vectorizado(df[col_saldo], df[col_vencimiento], hoy)
+    df[col_estatus_out] = estatus
 
     logger.debug(
         "Estatus aplicado: Pagadas=%d Vigentes=%d Vencidas=%d",
-        int(condicion_pagada.sum()),
-        int(condicion_vigente.sum()),
-        int(condicion_vencida.sum()),
+        int((estatus == ESTATUS_PAGADA).sum()),
+        int((estatus == ESTATUS_VIGENTE).sum()),
+        int((estatus == ESTATUS_VENCIDA).sum()),
     )
     return df
 
@@ -705,6 +736,53 @@ def normalizar_cxc_desde_excel(
 # AGING REAL (Sección 6)
 # ─────────────────────────────────────────────────────────────────────────────
 
+def codigos_antiguedad(dias, bins=BINS_ANTIGUEDAD) -> np.ndarray:
+    """
+    Índice del rango de antigüedad de cada valor de días (-1 si no hay dato).
+
+    Rangos cerrados a la derecha, igual que ``pd.cut(dias, bins)``: el código
+    i corresponde a ``bins[i] < dias <= bins[i + 1]``.
+    """
+    valores = pd.to_numeric(pd.Series(dias), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    limites = np.asarray(bins, dtype="float64")
+    codigos = np.searchsorted(limites, valores, side="left") - 1
+    fuera = np.isnan(valores) | (codigos < 0) | (codigos >= len(limites) - 1)
+    codigos[fuera] = -1
+    return codigos
+
+
+def clasificar_buckets_aging(
+    dias,
+    estatus=None,
+    bins=BINS_ANTIGUEDAD,
+    labels=LABELS_ANTIGUEDAD,
+) -> np.ndarray:
+    """
+    Bucket de aging por documento, vectorizado.
+
+    Reglas (en orden): estatus "Pagada" → "Pagada"; sin días → "Sin fecha";
+    si no, el rango de `labels` según `bins` (por defecto Por vencer / 1-30 /
+    31-60 / 61-90 / 91-180 / >180 días).
+
+    Args:
+        dias:    Serie/arreglo con días vencido (negativo = por vencer).
+        estatus: Serie/arreglo de estatus derivado (opcional).
+        bins:    Límites de los rangos (cerrados a la derecha).
+        labels:  Etiqueta de cada rango.
+
+    Returns:
+        np.ndarray de objetos con la etiqueta de cada documento.
+    """
+    codigos = codigos_antiguedad(dias, bins)
+    # El código -1 (sin dato) toma la última posición: "Sin fecha"
+    etiquetas = np.array([*labels, BUCKET_SIN_FECHA], dtype=object)
+    buckets = etiquetas[codigos]
+    if estatus is not None:
+        pagada = np.asarray(pd.Series(estatus).to_numpy(dtype=object) == ESTATUS_PAGADA, dtype=bool)
+        buckets[pagada] = BUCKET_PAGADA
+    return buckets
+
+
 def calcular_aging_real(
     df_cxc: pd.DataFrame,
     df_ventas: Optional[pd.DataFrame] = None,
@@ -744,26 +822,7 @@ def calcular_aging_real(
         df["dias_vencido"] = np.nan
 
     # Clasificar en buckets de aging
-    def _bucket(row):
-        dias = row.get("dias_vencido")
-        estatus = row.get("estatus")
-        if estatus == ESTATUS_PAGADA:
-            return "Pagada"
-        if pd.isna(dias):
-            return "Sin fecha"
-        if dias <= 0:
-            return "Por vencer"
-        if dias <= 30:
-            return "1-30 días"
-        if dias <= 60:
-            return "31-60 días"
-        if dias <= 90:
-            return "61-90 días"
-        if dias <= 180:
-            return "91-180 días"
-        return ">180 días"
-
-    df["bucket"] = df.apply(_bucket, axis=1)
+    df["bucket"] = clasificar_buckets_aging(df["dias_vencido"], df["estatus"])
 
     # Cruzar vendedor desde ventas si hay datos relacionales disponibles
     if (
@@ -0,0 +1,250 @@
+"""
+Carga concurrente y cacheada de consultas independientes a Neon.
+
+Las páginas Fiscal y Universo CFDI necesitan 3-5 consultas que no dependen
+entre sí. `cargar_consultas` las manda en paralelo (un hilo por consulta,
+cada uno con una conexión del pool de `utils.neon_pool`) y guarda cada
+resultado por (empresa_id, id de consulta, parámetros, versión de datos):
+
+- La versión de datos de la empresa (conteos y último ``updated_at`` de
+  cfdi_ventas y cfdi_pagos) se consulta como máximo cada
+  `TTL_VERSION_DATOS_SEG` segundos; cuando cambia, las consultas de esa
+  empresa se vuelven a ejecutar. La ingesta llama a `invalidar_version` para
+  que los datos nuevos se vean de inmediato.
+- Cada resultado trae su tiempo de ejecución y si salió de la caché;
+  `mostrar_tiempos` los muestra cuando el modo debug está activo.
+
+Los errores no se cachean: quedan en ``ResultadoConsulta.error`` para que la
+página decida si mostrarlos (los hilos no pueden llamar a ``st.*``). Los
+DataFrames devueltos son copias: la página puede modificarlos.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from utils.logger import configurar_logger
+from utils.neon_pool import obtener_conexion
+
+logger = configurar_logger("neon_consultas", nivel="INFO")
+
+# Consultas simultáneas por proceso (esperan red, no CPU)
+MAX_HILOS_CONSULTA = 4
+# Resultados guardados entre reruns y sesiones
+MAX_RESULTADOS_EN_CACHE = 64
+# Cada cuánto se vuelve a preguntar a Neon si cambiaron los datos de la empresa
+TTL_VERSION_DATOS_SEG = 30
+
+_SQL_VERSION_DATOS = """
+    SELECT
+        (SELECT COUNT(*)        FROM cfdi_ventas WHERE empresa_id = %(empresa_id)s),
+        (SELECT MAX(updated_at) FROM cfdi_ventas WHERE empresa_id = %(empresa_id)s),
+        (SELECT COUNT(*)        FROM cfdi_pagos  WHERE empresa_id = %(empresa_id)s),
+        (SELECT MAX(updated_at) FROM cfdi_pagos  WHERE empresa_id = %(empresa_id)s)
+"""
+
+
+@dataclass(frozen=True)
+class Consulta:
+    """Consulta parametrizada con un id estable (parte de la llave de caché)."""
+    id: str
+    sql: str
+    params: tuple = ()
+
+
+@dataclass
+class ResultadoConsulta:
+    """DataFrame de una consulta con su tiempo y origen."""
+    id: str
+    df: pd.DataFrame
+    segundos: float
+    desde_cache: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def ejecutar_consulta(neon_url: str, sql: str, params: Sequence = ()) -> pd.DataFrame:
+    """Ejecuta una consulta con una conexión del pool y la devuelve como DataFrame."""
+    conn = obtener_conexion(neon_url)
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        cols = [d[0] for d in cur.description]
+        cur.close()
+        return pd.DataFrame(rows, columns=cols)
+    finally:
+        conn.close()
+
+
+class CargadorConsultas:
+    """
+    Pool de hilos + caché LRU de resultados por versión de datos.
+
+    Examples:
+        >>> resultados = cargador.cargar(empresa_id, neon_url, [
+        ...     Consulta("tendencia", SQL_TENDENCIA, (empresa_id,)),
+        ...     Consulta("retenciones", SQL_RETENCIONES, (empresa_id,)),
+        ... ])
+        >>> df = resultados["tendencia"].df
+    """
+
+    def __init__(
+        self,
+        max_hilos: int = MAX_HILOS_CONSULTA,
+        max_resultados: int = MAX_RESULTADOS_EN_CACHE,
+        ttl_version: float = TTL_VERSION_DATOS_SEG,
+    ):
+        self.max_resultados = max_resultados
+        self.ttl_version = ttl_version
+        self._executor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="neon")
+        self._resultados: "OrderedDict[tuple, ResultadoConsulta]" = OrderedDict()
+        self._versiones: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def _ejecutar(self, neon_url: str, consulta: Consulta) -> ResultadoConsulta:
+        inicio = time.perf_counter()
+        try:
+            df = ejecutar_consulta(neon_url, consulta.sql, consulta.params)
+            error = None
+        except Exception as e:
+            logger.error(f"Error en consulta {consulta.id}: {e}")
+            df, error = pd.DataFrame(), str(e)
+        return ResultadoConsulta(consulta.id, df, time.perf_counter() - inicio, error=error)
+
+    def version_datos(self, empresa_id: str, neon_url: str) -> Optional[str]:
+        """Versión de los datos CFDI de la empresa (None si no se pudo consultar)."""
+        llave = (neon_url, str(empresa_id))
+        ahora = time.monotonic()
+        with self._lock:
+            vigente = self._versiones.get(llave)
+        if vigente and ahora - vigente[0] < self.ttl_version:
+            return vigente[1]
+        try:
+            df = ejecutar_consulta(neon_url, _SQL_VERSION_DATOS, {"empresa_id": empresa_id})
+        except Exception as e:
+            logger.warning(f"No se pudo consultar la versión de datos: {e}")
+            return None
+        version = "|".join(str(v) for v in df.iloc[0].tolist()) if not df.empty else ""
+        with self._lock:
+            self._versiones[llave] = (ahora, version)
+        return version
+
+    def invalidar_version(self, empresa_id: Optional[str] = None) -> None:
+        """Fuerza a revisar la versión de datos (de una empresa o de todas)."""
+        with self._lock:
+            for llave in list(self._versiones):
+                if empresa_id is None or llave[1] == str(empresa_id):
+                    del self._versiones[llave]
+
+    def cargar(
+        self,
+        empresa_id: str,
+        neon_url: str,
+        consultas: Sequence[Consulta],
+    ) -> Dict[str, ResultadoConsulta]:
+        """
+        Ejecuta en paralelo las consultas que no estén en caché para la versión
+        actual de los datos.
+
+        Returns:
+            {id de consulta: ResultadoConsulta}, en el orden de `consultas`
+        """
+        version = self.version_datos(empresa_id, neon_url)
+        resultados: Dict[str, ResultadoConsulta] = {}
+        pendientes = []
+        for consulta in consultas:
+            llave = (str(empresa_id), consulta.id, consulta.params, version)
+            with self._lock:
+                guardado = self._resultados.get(llave) if version is not None else None
+                if guardado is not None:
+                    self._resultados.move_to_end(llave)
+            if guardado is not None:
+                resultados[consulta.id] = ResultadoConsulta(
+                    consulta.id, guardado.df.copy(), guardado.segundos, desde_cache=True,
+                )
+            else:
+                resultados[consulta.id] = None
+                pendientes.append((consulta, llave))
+
+        if len(pendientes) == 1:
+            consulta, llave = pendientes[0]
+            ejecutados = [(llave, self._ejecutar(neon_url, consulta))]
+        else:
+            futuros = [
+                (llave, self._executor.submit(self._ejecutar, neon_url, consulta))
+                for consulta, llave in pendientes
+            ]
+            ejecutados = [(llave, futuro.result()) for llave, futuro in futuros]
+
+        for llave, resultado in ejecutados:
+            if resultado.ok and version is not None:
+                with self._lock:
+                    self._resultados[llave] = resultado
+                    while len(self._resultados) > self.max_resultados:
+                        self._resultados.popitem(last=False)
+                resultado = ResultadoConsulta(resultado.id, resultado.df.copy(), resultado.segundos)
+            resultados[resultado.id] = resultado
+
+        if pendientes:
+            logger.debug(
+                "Consultas "
+                + ", ".join(f"{r.id}={r.segundos:.2f}s" for _, r in ejecutados)
+                + f" (empresa {empresa_id})"
+            )
+        return resultados
+
+    def limpiar(self) -> None:
+        """Descarta resultados y versiones guardados."""
+        with self._lock:
+            self._resultados.clear()
+            self._versiones.clear()
+
+
+# Instancia del proceso: compartida por las sesiones (la llave incluye empresa_id)
+cargador = CargadorConsultas()
+
+
+def cargar_consultas(
+    empresa_id: str, neon_url: str, consultas: Sequence[Consulta]
+) -> Dict[str, ResultadoConsulta]:
+    """Atajo a `cargador.cargar`."""
+    return cargador.cargar(empresa_id, neon_url, consultas)
+
+
+def invalidar_version(empresa_id: Optional[str] = None) -> None:
+    """Atajo a `cargador.invalidar_version` (llamar tras ingerir CFDIs)."""
+    cargador.invalidar_version(empresa_id)
+
+
+def mostrar_tiempos(resultados: Dict[str, ResultadoConsulta]) -> None:
+    """Tabla de tiempos por consulta; solo en modo debug."""
+    if not st.session_state.get("modo_debug"):
+        return
+    filas = [
+        {
+            "consulta": r.id,
+            "segundos": round(r.segundos, 3),
+            "origen": "caché" if r.desde_cache else "Neon",
+            "filas": len(r.df),
+            "error": r.error or "",
+        }
+        for r in resultados.values()
+    ]
+    consultadas = [r.segundos for r in resultados.values() if not r.desde_cache]
+    with st.expander("🛠️ Debug - Tiempos de consulta"):
+        st.dataframe(pd.DataFrame(filas), hide_index=True)
+        if consultadas:
+            st.caption(
+                f"{len(consultadas)} consultas a Neon: {sum(consultadas):.2f}s en serie, "
+                f"~{max(consultadas):.2f}s en paralelo"
+            )
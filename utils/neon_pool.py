@@ -0,0 +1,187 @@
+"""
+Pool de conexiones a Neon PostgreSQL reutilizable entre reruns de Streamlit.
+
+Abrir una conexión a Neon cuesta un handshake TCP + TLS + autenticación
+(100-400 ms, más si el compute estaba suspendido). El pool guarda las
+conexiones ociosas por DSN para que las consultas siguientes del mismo
+proceso las reutilicen.
+
+- `obtener_conexion(dsn)` devuelve una conexión prestada: se usa igual que
+  una de ``psycopg2.connect`` y su ``close()`` la regresa al pool (con
+  rollback si quedó una transacción abierta) en lugar de cerrarla.
+- Las conexiones cerradas, rotas o con más de `MAX_INACTIVIDAD_POOL_SEG`
+  segundos sin uso (Neon corta las sesiones al suspender el compute) se
+  descartan al tomarlas.
+- No hay cupo de conexiones prestadas: si un llamador no cierra la suya, el
+  pool no se agota; la conexión se libera con el recolector como antes.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+from utils.logger import configurar_logger
+
+logger = configurar_logger("neon_pool", nivel="INFO")
+
+# Conexiones ociosas que se conservan por DSN
+MAX_CONEXIONES_OCIOSAS: int = int(os.getenv("NEON_POOL_MAX_OCIOSAS", "4"))
+# Neon suspende el compute tras ~5 min sin actividad y corta las sesiones
+MAX_INACTIVIDAD_POOL_SEG: float = float(os.getenv("NEON_POOL_MAX_INACTIVIDAD", "240"))
+
+
+class ConexionPrestada:
+    """Conexión tomada del pool; ``close()`` la devuelve en vez de cerrarla."""
+
+    __slots__ = ("_pool", "_conn")
+
+    def __init__(self, pool: "PoolConexiones", conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, nombre: str):
+        conn = self._conn
+        if conn is None:
+            raise psycopg2.InterfaceError("conexión ya devuelta al pool")
+        return getattr(conn, nombre)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.devolver(conn)
+
+    def __enter__(self) -> "ConexionPrestada":
+        return self
+
+    def __exit__(self, tipo, *exc) -> None:
+        # A diferencia de psycopg2, salir del bloque también devuelve la conexión
+        if self._conn is not None:
+            if tipo is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        self.close()
+
+
+class PoolConexiones:
+    """Conexiones ociosas (LIFO) a un DSN, compartidas por los hilos del proceso."""
+
+    def __init__(
+        self,
+        dsn: str,
+        max_ociosas: int = MAX_CONEXIONES_OCIOSAS,
+        max_inactividad: float = MAX_INACTIVIDAD_POOL_SEG,
+    ):
+        self.dsn = dsn
+        self.max_ociosas = max_ociosas
+        self.max_inactividad = max_inactividad
+        self._ociosas: deque = deque()
+        self._lock = threading.Lock()
+        self._stats = {"conexiones": 0, "reusos": 0, "descartadas": 0}
+
+    def _conectar(self):
+        return psycopg2.connect(self.dsn)
+
+    def tomar(self) -> ConexionPrestada:
+        """Conexión ociosa vigente o, si no hay, una nueva."""
+        ahora = time.monotonic()
+        vencidas = []
+        conn = None
+        with self._lock:
+            while self._ociosas:
+                candidata, ultimo_uso = self._ociosas.pop()
+                if candidata.closed or ahora - ultimo_uso > self.max_inactividad:
+                    vencidas.append(candidata)
+                    continue
+                conn = candidata
+                break
+            self._stats["descartadas"] += len(vencidas)
+            self._stats["reusos" if conn is not None else "conexiones"] += 1
+        for vencida in vencidas:
+            _cerrar_sin_error(vencida)
+        if conn is None:
+            conn = self._conectar()
+        return ConexionPrestada(self, conn)
+
+    def devolver(self, conn) -> None:
+        """Regresa una conexión al pool si sigue sana y hay lugar; si no, la cierra."""
+        reutilizable = not conn.closed
+        if reutilizable:
+            try:
+                estado = conn.info.transaction_status
+                if estado == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    reutilizable = False
+                elif estado != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                reutilizable = False
+        with self._lock:
+            if reutilizable and len(self._ociosas) < self.max_ociosas:
+                self._ociosas.append((conn, time.monotonic()))
+                return
+            self._stats["descartadas"] += 1
+        _cerrar_sin_error(conn)
+
+    def cerrar(self) -> None:
+        """Cierra las conexiones ociosas."""
+        with self._lock:
+            ociosas = [conn for conn, _ in self._ociosas]
+            self._ociosas.clear()
+        for conn in ociosas:
+            _cerrar_sin_error(conn)
+
+    def estadisticas(self) -> Dict[str, int]:
+        """Conexiones abiertas, reusos, descartes y ociosas actuales."""
+        with self._lock:
+            return {**self._stats, "ociosas": len(self._ociosas)}
+
+
+def _cerrar_sin_error(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pools: Dict[str, PoolConexiones] = {}
+_pools_lock = threading.Lock()
+
+
+def obtener_pool(dsn: str) -> PoolConexiones:
+    """Pool del proceso para un DSN (se crea al primer uso)."""
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = _pools[dsn] = PoolConexiones(dsn)
+        return pool
+
+
+def obtener_conexion(dsn: Optional[str] = None) -> ConexionPrestada:
+    """
+    Conexión prestada del pool (por defecto, a NEON_DATABASE_URL).
+
+    Examples:
+        >>> conn = obtener_conexion()
+        >>> cur = conn.cursor()
+        >>> cur.execute("SELECT 1")
+        >>> conn.close()  # vuelve al pool
+    """
+    return obtener_pool(dsn or os.environ["NEON_DATABASE_URL"]).tomar()
+
+
+def cerrar_pools() -> None:
+    """Cierra las conexiones ociosas de todos los pools (tests, apagado)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.cerrar()
@@ -8,6 +8,7 @@ Características:
 - Traducción NL → SQL con GPT-4o
 - Validación de seguridad (solo SELECT, sin DDL/DML)
 - Límite de filas y timeout de ejecución
+- Guardia de costo con EXPLAIN y lectura acotada por cursor del servidor
 - Interpretación inteligente de resultados
 - Caché de esquema para reducir tokens
 - Historial de consultas
@@ -22,13 +23,13 @@ import re
 import time
 from dataclasses import dataclass, field, replace
 from datetime import datetime
-from decimal import Decimal
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 import pandas as pd
 
 try:
     import psycopg2
+    import psycopg2.extensions
     from psycopg2 import sql as pg_sql
     PSYCOPG2_AVAILABLE = True
 except ImportError:
@@ -41,6 +42,7 @@ except ImportError:
     OPENAI_AVAILABLE = False
 
 from utils.logger import configurar_logger
+from utils import sql_ast
 try:
     from utils.sovereign_periods import build_prompt_context as _sp_build_prompt
 except ImportError:
@@ -65,6 +67,12 @@ QUERY_TIMEOUT_SECONDS = 30
 MAX_SQL_LENGTH = 8000
 MAX_HISTORY_ITEMS = 20
 
+# Guardia de costo: umbrales sobre el plan estimado (EXPLAIN) antes de ejecutar.
+# 0/None desactiva el umbral correspondiente.
+MAX_PLAN_COST = 5_000_000
+MAX_PLAN_ROWS = 10_000_000
+FETCH_BATCH_SIZE = 500
+
 # Patrones SQL peligrosos (case-insensitive)
 FORBIDDEN_PATTERNS = [
     r'\b(INSERT|UPDATE|DELETE|DROP|ALTER|CREATE|TRUNCATE|GRANT|REVOKE)\b',
@@ -99,7 +107,10 @@ TENANT_SCOPED_TABLES = {
     'v_ventas_linea_mes',
 }
 
-SQL_CLAUSE_KEYWORDS = {"where", "join", "on", "group", "order", "limit", "having", "union", "left", "right", "inner", "full", "cross"}
+# Tablas con columna empresa_id propia (cfdi_conceptos se filtra vía su factura)
+TENANT_COLUMN_TABLES = TENANT_SCOPED_TABLES - {'cfdi_conceptos'}
+
+_FORBIDDEN_REGEXES = [(p, re.compile(p, re.IGNORECASE)) for p in FORBIDDEN_PATTERNS]
 
 
 # =====================================================================
@@ -465,6 +476,8 @@ class NL2SQLEngine:
         model: str = "gpt-4o",
         max_rows: int = MAX_ROWS,
         timeout: int = QUERY_TIMEOUT_SECONDS,
+        max_plan_cost: Optional[float] = MAX_PLAN_COST,
+        max_plan_rows: Optional[int] = MAX_PLAN_ROWS,
     ):
         """
         Inicializa el motor NL2SQL.
@@ -475,6 +488,8 @@ class NL2SQLEngine:
             model: Modelo a usar (gpt-4o recomendado para SQL preciso)
             max_rows: Máximo de filas a retornar
             timeout: Timeout de ejecución en segundos
+            max_plan_cost: Costo estimado máximo del plan (EXPLAIN) antes de rechazar
+            max_plan_rows: Filas estimadas máximas que devuelve la consulta (nodo raíz del plan)
         """
         if not PSYCOPG2_AVAILABLE:
             raise ImportError("psycopg2 no está instalado. Ejecuta: pip install psycopg2-binary")
@@ -486,6 +501,8 @@ class NL2SQLEngine:
         self.model = model
         self.max_rows = max_rows
         self.timeout = timeout
+        self.max_plan_cost = max_plan_cost
+        self.max_plan_rows = max_plan_rows
         self.client = OpenAI(api_key=api_key)
         self.history: List[NL2SQLResult] = []
 
@@ -1059,21 +1076,18 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
         sql = sql.replace("≥", ">=").replace("≤", "<=").replace("≠", "<>")
 
         # ── Detectar columna de fecha según tabla principal ─────────────────
-        sql_upper = sql.upper()
-        if "CFDI_PAGOS" in sql_upper and "CFDI_VENTAS" not in sql_upper:
-            fecha_col = "fecha_pago"
-        elif "CFDI_VENTAS" in sql_upper:
-            fecha_col = "fecha_emision"
+        parsed = sql_ast.parse_sql(sql)
+        tablas = parsed.table_names
+        if "cfdi_pagos" in tablas and "cfdi_ventas" not in tablas:
+            tabla, fecha_col = "cfdi_pagos", "fecha_pago"
+        elif "cfdi_ventas" in tablas:
+            tabla, fecha_col = "cfdi_ventas", "fecha_emision"
         else:
             logger.info("_apply_sovereign_filter: tabla no reconocida, omitiendo inyección de fecha")
             return sql
 
-        # ── Extraer fechas literales que el modelo ya generó ────────────────
-        _date_pattern = re.compile(
-            fecha_col + r"\s*(?:>=|>|<=|<|=)\s*'(\d{4}-\d{2}-\d{2})'",
-            re.IGNORECASE,
-        )
-        model_dates = _date_pattern.findall(sql)
+        # ── Fechas literales que el modelo ya generó ────────────────────────
+        model_dates = sql_ast.find_date_literals(parsed, fecha_col)
 
         if model_dates:
             # ── Clampear: ajustar fechas del modelo para que no salgan del rango soberano
@@ -1084,59 +1098,26 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
                     return hasta_excl
                 return d
 
-            def _replace_date(m: re.Match) -> str:
-                original = m.group(0)
-                date_val = m.group(1)
-                clamped = _clamp_date(date_val)
-                if clamped != date_val:
-                    logger.info(f"Sovereign clamp: {date_val} → {clamped}")
-                return original.replace(date_val, clamped)
+            edits = []
+            for literal in model_dates:
+                clamped = _clamp_date(literal.value)
+                if clamped != literal.value:
+                    logger.info(f"Sovereign clamp: {literal.value} → {clamped}")
+                    edits.append((literal.start, literal.end, f"'{clamped}'"))
 
-            sql = _date_pattern.sub(_replace_date, sql)
+            sql = sql_ast.replace_spans(sql, edits)
             logger.info(f"Filtro soberano (clamp): fechas del modelo ajustadas al rango {desde} → {hasta_excl}")
 
         else:
             # ── No hay filtros de fecha del modelo → inyectar rango completo ─
             range_clause = f"{fecha_col} >= '{desde}' AND {fecha_col} < '{hasta_excl}'"
 
-            # Limpiar posibles EXTRACT temporales del modelo
-            for _ in range(4):
-                sql = re.sub(
-                    r'\s*AND\s+EXTRACT\s*\(\s*(?:MONTH|YEAR)\s+FROM\s+' + fecha_col + r'\s*\)\s*=\s*(?:EXTRACT\s*\([^)]*\)(?:\s*-\s*\d+)?|\d+)',
-                    '', sql, flags=re.IGNORECASE
-                )
-                sql = re.sub(
-                    r'EXTRACT\s*\(\s*(?:MONTH|YEAR)\s+FROM\s+' + fecha_col + r'\s*\)\s*=\s*(?:EXTRACT\s*\([^)]*\)(?:\s*-\s*\d+)?|\d+)\s*AND\s*',
-                    '', sql, flags=re.IGNORECASE
-                )
-                sql = re.sub(
-                    r'EXTRACT\s*\(\s*(?:MONTH|YEAR)\s+FROM\s+' + fecha_col + r'\s*\)\s*=\s*(?:EXTRACT\s*\([^)]*\)(?:\s*-\s*\d+)?|\d+)',
-                    '', sql, flags=re.IGNORECASE
-                )
+            # Limpiar posibles EXTRACT temporales del modelo y el WHERE vacío resultante
+            sql = sql_ast.remove_date_part_predicates(sql, fecha_col)
 
-            # Reparar WHERE malformado
-            sql = re.sub(r'WHERE\s+(GROUP|ORDER|LIMIT|HAVING)', r'\1', sql, flags=re.IGNORECASE)
-            sql = re.sub(r'WHERE\s+AND\b', 'WHERE', sql, flags=re.IGNORECASE)
-            sql = re.sub(r'WHERE\s*;', ';', sql, flags=re.IGNORECASE)
-            sql = re.sub(r'\bAND\s+AND\b', 'AND', sql, flags=re.IGNORECASE)
-            sql = re.sub(r'\s+AND\s+(GROUP|ORDER|LIMIT|HAVING)\b', r' \1', sql, flags=re.IGNORECASE)
-
-            # Inyectar rango soberano
-            sql_upper = sql.upper()
-            if 'WHERE' in sql_upper:
-                idx = sql_upper.index('WHERE') + len('WHERE')
-                sql = sql[:idx] + f' {range_clause} AND' + sql[idx:]
-            elif 'GROUP BY' in sql_upper:
-                idx = sql_upper.index('GROUP BY')
-                sql = sql[:idx] + f'WHERE {range_clause} ' + sql[idx:]
-            elif 'ORDER BY' in sql_upper:
-                idx = sql_upper.index('ORDER BY')
-                sql = sql[:idx] + f'WHERE {range_clause} ' + sql[idx:]
-            elif 'LIMIT' in sql_upper:
-                idx = sql_upper.index('LIMIT')
-                sql = sql[:idx] + f'WHERE {range_clause} ' + sql[idx:]
-            else:
-                sql = sql.rstrip(';') + f' WHERE {range_clause};'
+            # Inyectar rango soberano en el SELECT que lee la tabla
+            target = sql_ast.parse_sql(sql).target_scope(tabla)
+            sql = sql_ast.add_condition(sql, range_clause, scope_id=target, prepend=True)
 
             logger.info(f"Filtro soberano inyectado (sin fechas del modelo): {desde} → {hasta_excl}")
 
@@ -1167,39 +1148,11 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
             range_clause = f"fecha_emision >= '{start_date}' AND fecha_emision < '{end_date}'"
 
             # Remover todas las condiciones EXTRACT(MONTH/YEAR FROM fecha_emision) = ...
-            # Cubrir patrones: AND EXTRACT(...) = val, EXTRACT(...) = val AND, standalone
-            for _ in range(4):  # Varias pasadas para limpiar combinaciones
-                sql = re.sub(
-                    r'\s*AND\s+EXTRACT\s*\(\s*(?:MONTH|YEAR)\s+FROM\s+fecha_emision\s*\)\s*=\s*(?:EXTRACT\s*\([^)]*\)(?:\s*-\s*\d+)?|\d+)',
-                    '', sql, flags=re.IGNORECASE
-                )
-                sql = re.sub(
-                    r'EXTRACT\s*\(\s*(?:MONTH|YEAR)\s+FROM\s+fecha_emision\s*\)\s*=\s*(?:EXTRACT\s*\([^)]*\)(?:\s*-\s*\d+)?|\d+)\s*AND\s*',
-                    '', sql, flags=re.IGNORECASE
-                )
-                sql = re.sub(
-                    r'EXTRACT\s*\(\s*(?:MONTH|YEAR)\s+FROM\s+fecha_emision\s*\)\s*=\s*(?:EXTRACT\s*\([^)]*\)(?:\s*-\s*\d+)?|\d+)',
-                    '', sql, flags=re.IGNORECASE
-                )
-            # Limpiar WHERE vacío o malformado
-            sql = re.sub(r'WHERE\s+(GROUP|ORDER|LIMIT|HAVING)', r'\1', sql, flags=re.IGNORECASE)
-            sql = re.sub(r'WHERE\s+AND\b', 'WHERE', sql, flags=re.IGNORECASE)
-            sql = re.sub(r'WHERE\s*;', ';', sql, flags=re.IGNORECASE)
-            sql = re.sub(r'\s+AND\s+(GROUP|ORDER|LIMIT|HAVING)\b', r' \1', sql, flags=re.IGNORECASE)
-
-            sql_upper = sql.upper()
-            if 'WHERE' in sql_upper:
-                idx = sql_upper.index('WHERE') + len('WHERE')
-                sql = sql[:idx] + f' {range_clause} AND' + sql[idx:]
-            elif 'GROUP BY' in sql_upper:
-                idx = sql_upper.index('GROUP BY')
-                sql = sql[:idx] + f'WHERE {range_clause} ' + sql[idx:]
-            elif 'ORDER BY' in sql_upper:
-                idx = sql_upper.index('ORDER BY')
-                sql = sql[:idx] + f'WHERE {range_clause} ' + sql[idx:]
-            elif 'LIMIT' in sql_upper:
-                idx = sql_upper.index('LIMIT')
-                sql = sql[:idx] + f'WHERE {range_clause} ' + sql[idx:]
+            # junto con su conector AND y el WHERE que quede vacío
+            sql = sql_ast.remove_date_part_predicates(sql, "fecha_emision")
+
+            target = sql_ast.parse_sql(sql).target_scope("cfdi_ventas")
+            sql = sql_ast.add_condition(sql, range_clause, scope_id=target, prepend=True)
 
             logger.info(f"Filtro de rango inyectado: {start_date} a {end_date} ('{question}')")
             return sql
@@ -1227,22 +1180,13 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
             sql = self._fix_year_contradictions(sql, explicit_year)
 
         # Si el SQL ya filtra por mes, corregir el año si es necesario
-        if re.search(r'EXTRACT\s*\(\s*MONTH', sql, re.IGNORECASE):
+        parsed = sql_ast.parse_sql(sql)
+        if sql_ast.has_extract_part(parsed, "month"):
             if explicit_year:
                 # Reemplazar EXTRACT(YEAR FROM CURRENT_DATE) por el año literal
-                sql = re.sub(
-                    r'EXTRACT\s*\(\s*YEAR\s+FROM\s+CURRENT_DATE\s*\)',
-                    str(explicit_year),
-                    sql,
-                    flags=re.IGNORECASE,
-                )
+                sql = sql_ast.replace_current_year(sql, str(explicit_year))
             elif month_num > current_month:
-                sql = re.sub(
-                    r'EXTRACT\s*\(\s*YEAR\s+FROM\s+CURRENT_DATE\s*\)',
-                    f'({year_expr})',
-                    sql,
-                    flags=re.IGNORECASE,
-                )
+                sql = sql_ast.replace_current_year(sql, f"({year_expr})")
             return sql
 
         month_clause = (
@@ -1250,19 +1194,7 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
             f"AND EXTRACT(YEAR FROM fecha_emision) = {year_expr}"
         )
 
-        sql_upper = sql.upper()
-        if 'WHERE' in sql_upper:
-            idx = sql_upper.index('WHERE') + len('WHERE')
-            sql = sql[:idx] + f' {month_clause} AND' + sql[idx:]
-        elif 'GROUP BY' in sql_upper:
-            idx = sql_upper.index('GROUP BY')
-            sql = sql[:idx] + f'WHERE {month_clause} ' + sql[idx:]
-        elif 'ORDER BY' in sql_upper:
-            idx = sql_upper.index('ORDER BY')
-            sql = sql[:idx] + f'WHERE {month_clause} ' + sql[idx:]
-        elif 'LIMIT' in sql_upper:
-            idx = sql_upper.index('LIMIT')
-            sql = sql[:idx] + f'WHERE {month_clause} ' + sql[idx:]
+        sql = sql_ast.add_condition(sql, month_clause, scope_id=parsed.target_scope("cfdi_ventas"), prepend=True)
 
         logger.info(f"Filtro de mes inyectado: MONTH={month_num}, YEAR={year_expr} ('{question}')")
         return sql
@@ -1273,34 +1205,18 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
         Si GPT genera tanto EXTRACT(YEAR)=EXTRACT(YEAR FROM CURRENT_DATE) como
         EXTRACT(YEAR)=2025, elimina la de CURRENT_DATE y mantiene la literal.
         """
-        # Detectar si hay un año literal en la query
-        has_literal_year = re.search(
-            r'EXTRACT\s*\(\s*YEAR\s+FROM\s+fecha_emision\s*\)\s*=\s*' + str(explicit_year),
-            sql, re.IGNORECASE
-        )
-        has_current_date_year = re.search(
-            r'EXTRACT\s*\(\s*YEAR\s+FROM\s+fecha_emision\s*\)\s*=\s*EXTRACT\s*\(\s*YEAR\s+FROM\s+CURRENT_DATE\s*\)',
-            sql, re.IGNORECASE
-        )
+        parsed = sql_ast.parse_sql(sql)
+        year_predicates = sql_ast.find_date_part_predicates(parsed, "fecha_emision", parts=("year",))
+        has_literal_year = any(p.literal == explicit_year for p in year_predicates)
+        current_date_predicates = [p for p in year_predicates if p.current_year]
 
-        if has_literal_year and has_current_date_year:
+        if has_literal_year and current_date_predicates:
             # Remover la condición con CURRENT_DATE (la literal es correcta)
-            sql = re.sub(
-                r'\s*AND\s+EXTRACT\s*\(\s*YEAR\s+FROM\s+fecha_emision\s*\)\s*=\s*EXTRACT\s*\(\s*YEAR\s+FROM\s+CURRENT_DATE\s*\)',
-                '', sql, flags=re.IGNORECASE
-            )
-            sql = re.sub(
-                r'EXTRACT\s*\(\s*YEAR\s+FROM\s+fecha_emision\s*\)\s*=\s*EXTRACT\s*\(\s*YEAR\s+FROM\s+CURRENT_DATE\s*\)\s*AND\s*',
-                '', sql, flags=re.IGNORECASE
-            )
+            sql = sql_ast.remove_predicates(parsed, current_date_predicates)
             logger.info(f"Contradicción de año eliminada: manteniendo {explicit_year}")
-        elif has_current_date_year and not has_literal_year:
+        elif current_date_predicates and not has_literal_year:
             # Solo hay CURRENT_DATE → reemplazar por el año explícito
-            sql = re.sub(
-                r'EXTRACT\s*\(\s*YEAR\s+FROM\s+CURRENT_DATE\s*\)',
-                str(explicit_year),
-                sql, flags=re.IGNORECASE
-            )
+            sql = sql_ast.replace_current_year(sql, str(explicit_year))
             logger.info(f"Año CURRENT_DATE reemplazado por {explicit_year}")
 
         return sql
@@ -1318,208 +1234,50 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
         Returns:
             Tupla (es_valido, mensaje_error)
         """
-        # Check largo
-        if len(sql) > MAX_SQL_LENGTH:
-            return False, f"Query excede el límite de {MAX_SQL_LENGTH} caracteres"
-
-        # Rechazar consultas patológicamente anchas aunque no excedan el largo.
-        select_match = re.search(r'^\s*SELECT\s+(.*?)\bFROM\b', sql, re.IGNORECASE | re.DOTALL)
-        if select_match and select_match.group(1).count(',') > 250:
-            return False, "Query excede el ancho máximo permitido"
-
-        # Debe empezar con SELECT o WITH (CTEs) (case-insensitive)
-        if not re.match(r'^\s*(SELECT|WITH)\b', sql, re.IGNORECASE):
-            return False, "Solo se permiten consultas SELECT"
-        
-        # Si empieza con WITH, verificar que contenga SELECT y no sea un CTE malicioso
-        if re.match(r'^\s*WITH\b', sql, re.IGNORECASE):
-            if not re.search(r'\bSELECT\b', sql, re.IGNORECASE):
-                return False, "Las consultas WITH deben contener SELECT"
-
-        # Check patrones prohibidos
-        for pattern in FORBIDDEN_PATTERNS:
-            if re.search(pattern, sql, re.IGNORECASE):
-                return False, f"Patrón SQL no permitido detectado: {pattern}"
-
-        # Verificar que no contenga múltiples statements
-        # (split por ; y filtrar vacíos)
-        statements = [s.strip() for s in sql.split(';') if s.strip()]
-        if len(statements) > 1:
-            return False, "Solo se permite una sentencia SQL"
-
-        # Verificar tablas referenciadas
-        # Excluir FROM dentro de EXTRACT(...FROM...) y DATE_TRUNC
-        # Primero, remover contenido de funciones EXTRACT para evitar falsos positivos
-        sql_cleaned = re.sub(r'EXTRACT\s*\([^)]+\)', '', sql, flags=re.IGNORECASE)
-        
-        # Extraer nombres de CTEs para no rechazarlos como tablas no permitidas
-        cte_names = set(
-            name.lower() for name in re.findall(r'\b(\w+)\s+AS\s*\(', sql_cleaned, re.IGNORECASE)
-        )
-        
-        tables_in_query = re.findall(
-            r'\bFROM\s+(\w+)|\bJOIN\s+(\w+)',
-            sql_cleaned,
-            re.IGNORECASE
-        )
-        allowed = set(ALLOWED_TABLES) | cte_names
-        referenced_tables = set()
-        for match_groups in tables_in_query:
-            for table in match_groups:
-                if table and table.lower() not in allowed:
-                    return False, f"Tabla no permitida: {table}"
-                if table:
-                    referenced_tables.add(table.lower())
-
-        # Si el usuario está acotado a un tenant, exigir que la consulta
-        # incluya explícitamente el filtro de empresa antes de ejecutarse.
-        if empresa_id and referenced_tables.intersection(TENANT_SCOPED_TABLES):
-            sql_lower = sql_cleaned.lower()
-            if "empresa_id" not in sql_lower or empresa_id.lower() not in sql_lower:
-                return False, "Falta filtro obligatorio por empresa_id"
-
-        return True, "OK"
-
-    def _extract_table_aliases(self, sql: str) -> List[Tuple[str, Optional[str]]]:
-        """Extrae tablas y alias simples referenciados en FROM/JOIN."""
-        sql_cleaned = re.sub(r'EXTRACT\s*\([^)]+\)', '', sql, flags=re.IGNORECASE)
-        matches = re.findall(
-            r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?',
-            sql_cleaned,
-            re.IGNORECASE,
-        )
-
-        table_aliases: List[Tuple[str, Optional[str]]] = []
-        for table, alias in matches:
-            alias_value = alias.lower() if alias and alias.lower() not in SQL_CLAUSE_KEYWORDS else None
-            table_aliases.append((table.lower(), alias_value))
-        return table_aliases
-
-    def _find_top_level_clause_index(self, sql: str, keywords: List[str]) -> Optional[int]:
-        """Ubica la primera cláusula SQL al nivel superior, ignorando subexpresiones entre paréntesis."""
-        sql_upper = sql.upper()
-        candidates: List[int] = []
-        depth = 0
-
-        for idx, char in enumerate(sql_upper):
-            if char == '(':
-                depth += 1
-                continue
-            if char == ')':
-                depth = max(0, depth - 1)
-                continue
-
-            if depth != 0:
-                continue
-
-            for keyword in keywords:
-                keyword_upper = keyword.upper()
-                if not sql_upper.startswith(keyword_upper, idx):
-                    continue
-
-                prev_char = sql_upper[idx - 1] if idx > 0 else ' '
-                next_idx = idx + len(keyword_upper)
-                next_char = sql_upper[next_idx] if next_idx < len(sql_upper) else ' '
-                if (prev_char.isalnum() or prev_char == '_') or (next_char.isalnum() or next_char == '_'):
-                    continue
-
-                candidates.append(idx)
-
-        return min(candidates) if candidates else None
-
-    def _get_top_level_from_table(self, sql: str) -> Optional[str]:
-        """Retorna la tabla del FROM principal, ignorando subqueries."""
-        sql_upper = sql.upper()
-        depth = 0
-
-        for idx, char in enumerate(sql_upper):
-            if char == '(':
-                depth += 1
-                continue
-            if char == ')':
-                depth = max(0, depth - 1)
-                continue
-            if depth == 0 and sql_upper.startswith("FROM ", idx):
-                match = re.match(r'FROM\s+(\w+)', sql[idx:], flags=re.IGNORECASE)
-                if match:
-                    return match.group(1).lower()
-        return None
-
-    def _inject_into_cfdi_ventas_subquery(self, sql: str, condition: str) -> str:
-        """Inyecta una condición dentro del primer subquery que consulte cfdi_ventas."""
-        stack: List[int] = []
-        for idx, char in enumerate(sql):
-            if char == '(':
-                stack.append(idx)
-            elif char == ')' and stack:
-                start = stack.pop()
-                inner = sql[start + 1:idx]
-                if re.search(r'\bSELECT\b', inner, re.IGNORECASE) and re.search(r'\bFROM\s+cfdi_ventas\b', inner, re.IGNORECASE):
-                    updated_inner = self._inject_and_condition(inner, condition).rstrip().rstrip(';')
-                    return sql[:start + 1] + updated_inner + sql[idx:]
-        return sql
+        return _validate_sql_structure(sql, empresa_id=empresa_id)
 
     def _inject_and_condition(self, sql: str, condition: str) -> str:
         """Inyecta una condición AND en el WHERE existente o crea uno nuevo."""
-        sql_upper = sql.upper()
-
-        if "WHERE" in sql_upper:
-            idx = self._find_top_level_clause_index(sql, ["GROUP BY", "ORDER BY", "LIMIT", "HAVING"])
-            if idx is not None:
-                return sql[:idx] + f"AND {condition} " + sql[idx:]
-            sql = sql.rstrip(";").rstrip()
-            return sql + f" AND {condition};"
-
-        idx = self._find_top_level_clause_index(sql, ["GROUP BY", "ORDER BY", "LIMIT", "HAVING"])
-        if idx is not None:
-            return sql[:idx] + f"WHERE {condition} " + sql[idx:]
-        sql = sql.rstrip(";").rstrip()
-        return sql + f" WHERE {condition};"
+        return sql_ast.add_condition(sql, condition)
 
     def _ensure_tenant_filter(self, sql: str, empresa_id: Optional[str] = None) -> str:
-        """Auto-inyecta filtro por tenant cuando la consulta aún no lo trae."""
+        """Auto-inyecta filtro por tenant en cada SELECT que aún no lo trae.
+
+        Cada condición se inyecta en el SELECT (principal, subconsulta o rama
+        de UNION / INTERSECT / EXCEPT) donde aparece la tabla, calificada con
+        su alias.
+        """
         if not empresa_id:
             return sql
 
-        sql_lower = sql.lower()
-        if "empresa_id" in sql_lower and empresa_id.lower() in sql_lower:
+        parsed = sql_ast.parse_sql(sql)
+        if not parsed.table_names.intersection(TENANT_SCOPED_TABLES):
             return sql
 
-        table_aliases = self._extract_table_aliases(sql)
-        referenced_tables = {table for table, _alias in table_aliases}
-        if not referenced_tables.intersection(TENANT_SCOPED_TABLES):
-            return sql
+        filtered = _scopes_with_tenant_filter(parsed, empresa_id)
+        tenant_clauses: Dict[int, List[str]] = {}
 
-        top_level_table = self._get_top_level_from_table(sql)
-        tenant_clauses: List[str] = []
-        has_cfdi_ventas = any(table == "cfdi_ventas" for table, _alias in table_aliases)
-
-        for table, alias in table_aliases:
-            qualifier = alias or table
-            if table in {"cfdi_ventas", "cfdi_pagos", "clientes_master", "v_cartera_clientes", "v_ventas_linea_mes"}:
-                if table == "cfdi_ventas" and top_level_table != "cfdi_ventas":
-                    continue
-                tenant_clauses.append(f"{qualifier}.empresa_id = '{empresa_id}'")
-            elif table == "cfdi_conceptos" and not has_cfdi_ventas:
-                tenant_clauses.append(
+        for ref in parsed.table_refs:
+            if ref.name not in TENANT_SCOPED_TABLES or ref.scope in filtered:
+                continue
+            scope_tables = {r.name for r in parsed.scopes[ref.scope].tables}
+            if ref.name in TENANT_COLUMN_TABLES:
+                clause = f"{ref.qualifier}.empresa_id = '{empresa_id}'"
+            elif "cfdi_ventas" not in scope_tables:
+                clause = (
                     "EXISTS ("
                     "SELECT 1 FROM cfdi_ventas cv_tenant "
-                    f"WHERE cv_tenant.id = {qualifier}.cfdi_venta_id AND cv_tenant.empresa_id = '{empresa_id}'"
+                    f"WHERE cv_tenant.id = {ref.qualifier}.cfdi_venta_id AND cv_tenant.empresa_id = '{empresa_id}'"
                     ")"
                 )
+            else:
+                continue
 
-        deduped_clauses = []
-        for clause in tenant_clauses:
-            if clause not in deduped_clauses:
-                deduped_clauses.append(clause)
-
-        for clause in deduped_clauses:
-            sql = self._inject_and_condition(sql, clause)
-
-        if top_level_table != "cfdi_ventas" and has_cfdi_ventas:
-            sql = self._inject_into_cfdi_ventas_subquery(sql, f"cfdi_ventas.empresa_id = '{empresa_id}'")
+            scope_clauses = tenant_clauses.setdefault(ref.scope, [])
+            if clause not in scope_clauses:
+                scope_clauses.append(clause)
 
-        return sql
+        return sql_ast.add_conditions(sql, tenant_clauses)
 
     # -----------------------------------------------------------------
     # 2b. Auto-corrección de patrones SQL problemáticos
@@ -1614,10 +1372,9 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
         # con scope de tenant pero no se proporcionó empresa_id.
         # Excepción: superadmin (empresa_id=None con acceso explícito a todas).
         if empresa_id is None:
-            sql_lower = sql.lower()
-            tables_referenced = {
-                t for t in TENANT_SCOPED_TABLES if t in sql_lower
-            }
+            tables_referenced = set(
+                sql_ast.parse_sql(sql).table_names.intersection(TENANT_SCOPED_TABLES)
+            )
             if tables_referenced:
                 logger.warning(
                     "execute_query llamado sin empresa_id para tablas "
@@ -1630,34 +1387,31 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
         if not is_valid:
             raise RuntimeError(error_msg)
 
+        # Acotar en el servidor: nunca pedir más de max_rows + 1 filas
+        bounded_sql = sql_ast.cap_limit(sql, self.max_rows + 1)
+
         conn = None
         try:
             conn = psycopg2.connect(self.connection_string)
+            register_numeric_float_casts(conn)
 
             # Establecer readonly y timeout via SQL (compatible con Neon pooler)
             cursor = conn.cursor()
             cursor.execute("SET default_transaction_read_only = true;")
             cursor.execute(f"SET statement_timeout = '{self.timeout * 1000}ms';")
+
+            # Guardia de costo con el plan estimado antes de ejecutar
+            self._check_query_cost(cursor, bounded_sql)
             cursor.close()
 
-            # Ejecutar query
-            df = pd.read_sql_query(sql, conn)
+            # Ejecutar query con cursor del lado del servidor (memoria acotada)
+            df = self._fetch_bounded(conn, bounded_sql)
 
             # Aplicar límite de filas
             if len(df) > self.max_rows:
                 df = df.head(self.max_rows)
                 logger.warning(f"Resultados truncados a {self.max_rows} filas")
 
-            # Convertir Decimal a float para compatibilidad con Streamlit
-            for col in df.columns:
-                if df[col].dtype == object:
-                    try:
-                        df[col] = df[col].apply(
-                            lambda x: float(x) if isinstance(x, Decimal) else x
-                        )
-                    except (ValueError, TypeError):
-                        pass
-
             logger.info(f"Query ejecutado: {len(df)} filas retornadas")
             return df
 
@@ -1673,6 +1427,51 @@ SQL: WITH por_trimestre AS (SELECT receptor_nombre AS cliente, DATE_TRUNC('quart
             if conn:
                 conn.close()
 
+    def _check_query_cost(self, cursor, sql: str) -> None:
+        """
+        Rechaza la consulta si el plan estimado excede los umbrales.
+
+        Usa `EXPLAIN (FORMAT JSON)` (no ejecuta la consulta) y compara el costo
+        total del plan y las filas estimadas que devuelve (nodo raíz) contra
+        `max_plan_cost` / `max_plan_rows`. Los recorridos grandes bajo un
+        agregado ya cuentan en el costo; no en las filas devueltas.
+
+        Raises:
+            RuntimeError: Si el plan excede algún umbral
+        """
+        if not self.max_plan_cost and not self.max_plan_rows:
+            return
+
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        row = cursor.fetchone()
+        if not row:
+            return
+        total_cost, plan_rows = _plan_estimates(row[0])
+        logger.info(f"Plan estimado: costo={total_cost:,.0f}, filas devueltas={plan_rows:,}")
+
+        if self.max_plan_cost and total_cost > self.max_plan_cost:
+            raise RuntimeError(
+                f"La consulta es demasiado costosa (costo estimado {total_cost:,.0f} > "
+                f"{self.max_plan_cost:,.0f}). Acota la pregunta por periodo, cliente o línea."
+            )
+        if self.max_plan_rows and plan_rows > self.max_plan_rows:
+            raise RuntimeError(
+                f"La consulta devolvería demasiadas filas (~{plan_rows:,} > "
+                f"{self.max_plan_rows:,}). Acota la pregunta por periodo, cliente o línea."
+            )
+
+    def _fetch_bounded(self, conn, sql: str) -> pd.DataFrame:
+        """Ejecuta con cursor del servidor y trae como máximo max_rows + 1 filas."""
+        cursor = conn.cursor(name="nl2sql_resultado")
+        cursor.itersize = FETCH_BATCH_SIZE
+        try:
+            cursor.execute(sql)
+            rows = cursor.fetchmany(self.max_rows + 1)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        finally:
+            cursor.close()
+        return pd.DataFrame.from_records(rows, columns=columns)
+
     # -----------------------------------------------------------------
     # 4. Interpretación de resultados
     # -----------------------------------------------------------------
@@ -2513,61 +2312,145 @@ Si el usuario pidió explícitamente una orientación (ej: "vertical", "horizont
 
 
 # =====================================================================
-# Helper de validación (sin conexión a DB, útil para tests)
+# Helper de plan de ejecución
 # =====================================================================
-def validate_sql_static(sql: str) -> Tuple[bool, str]:
+def _plan_estimates(explain_output) -> Tuple[float, int]:
     """
-    Validación estática de SQL sin necesidad de instanciar el engine.
+    Extrae (costo total, filas estimadas que devuelve la consulta) del nodo
+    raíz de un resultado de `EXPLAIN (FORMAT JSON)`.
 
-    Args:
-        sql: Query SQL a validar
+    Acepta la salida ya decodificada por psycopg2 (lista) o como texto JSON.
+    """
+    data = json.loads(explain_output) if isinstance(explain_output, str) else explain_output
+    if isinstance(data, list):
+        data = data[0] if data else {}
+    root = data.get("Plan", {}) if isinstance(data, dict) else {}
+    return float(root.get("Total Cost", 0.0)), int(root.get("Plan Rows", 0))
 
-    Returns:
-        Tupla (es_valido, mensaje_error)
+
+# =====================================================================
+# Adaptadores de tipos psycopg2
+# =====================================================================
+def _cast_numeric_to_float(value, cursor):
+    """Typecaster NUMERIC → float (None se respeta como NULL)."""
+    return None if value is None else float(value)
+
+
+if PSYCOPG2_AVAILABLE:
+    _NUMERIC_FLOAT = psycopg2.extensions.new_type(
+        psycopg2.extensions.DECIMAL.values, "NUMERIC_FLOAT", _cast_numeric_to_float
+    )
+    _NUMERIC_FLOAT_ARRAY = psycopg2.extensions.new_array_type(
+        (1231,), "NUMERIC_FLOAT_ARRAY", _NUMERIC_FLOAT
+    )
+
+
+def register_numeric_float_casts(conn) -> None:
+    """
+    Registra en la conexión la conversión NUMERIC → float.
+
+    Así los resultados llegan como float64 desde el driver y no hay que
+    convertir celda por celda objetos Decimal en pandas. El registro es por
+    conexión (no global) para no alterar otros módulos que requieran Decimal.
+    """
+    psycopg2.extensions.register_type(_NUMERIC_FLOAT, conn)
+    psycopg2.extensions.register_type(_NUMERIC_FLOAT_ARRAY, conn)
+
+
+# =====================================================================
+# Helper de validación (sin conexión a DB, útil para tests)
+# =====================================================================
+def _validate_sql_structure(sql: str, empresa_id: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    Valida el SQL sobre su estructura analizada (`utils.sql_ast`).
+
+    Un solo análisis lineal alimenta todas las reglas: sentencia inicial,
+    ancho del SELECT, patrones prohibidos (fuera de literales), número de
+    sentencias, tablas permitidas y filtro obligatorio por tenant.
     """
+    # Check largo (antes de analizar para acotar el costo)
     if len(sql) > MAX_SQL_LENGTH:
         return False, f"Query excede el límite de {MAX_SQL_LENGTH} caracteres"
 
-    select_match = re.search(r'^\s*SELECT\s+(.*?)\bFROM\b', sql, re.IGNORECASE | re.DOTALL)
-    if select_match and select_match.group(1).count(',') > 250:
-        return False, "Query excede el ancho máximo permitido"
+    parsed = sql_ast.parse_sql(sql)
 
-    if not re.match(r'^\s*(SELECT|WITH)\b', sql, re.IGNORECASE):
+    # Debe empezar con SELECT o WITH (CTEs)
+    first_keyword = parsed.first_keyword
+    if first_keyword not in ("select", "with"):
         return False, "Solo se permiten consultas SELECT"
 
+    # Rechazar consultas patológicamente anchas aunque no excedan el largo.
+    if first_keyword == "select" and parsed.top.select_commas > 250:
+        return False, "Query excede el ancho máximo permitido"
+
     # Si empieza con WITH, verificar que contenga SELECT
-    if re.match(r'^\s*WITH\b', sql, re.IGNORECASE):
-        if not re.search(r'\bSELECT\b', sql, re.IGNORECASE):
-            return False, "Las consultas WITH deben contener SELECT"
+    if first_keyword == "with" and not parsed.has_identifier("select"):
+        return False, "Las consultas WITH deben contener SELECT"
+
+    # Check patrones prohibidos y múltiples statements sobre el SQL crudo:
+    # no dependen de cómo el tokenizador delimite los literales.
+    for pattern, regex in _FORBIDDEN_REGEXES:
+        if regex.search(sql):
+            return False, f"Patrón SQL no permitido detectado: {pattern}"
+    if parsed.statement_count > 1 or len([s for s in sql.split(';') if s.strip()]) > 1:
+        return False, "Solo se permite una sentencia SQL"
 
-    for pattern in FORBIDDEN_PATTERNS:
-        if re.search(pattern, sql, re.IGNORECASE):
-            return False, f"Patrón SQL no permitido: {pattern}"
+    # Literales $tag$...$tag$ y parámetros $n: el LLM no los necesita y
+    # permitirían ocultar texto al resto de las reglas.
+    if any(tok.text.startswith('$') for tok in parsed.significant):
+        return False, "Literales con $ no permitidos"
+
+    # Verificar tablas referenciadas en FROM/JOIN (los CTEs cuentan como permitidas)
+    allowed = set(ALLOWED_TABLES) | parsed.ctes
+    for ref in parsed.all_table_refs:
+        if ref.name not in allowed:
+            return False, f"Tabla no permitida: {ref.text}"
+
+    # Si el usuario está acotado a un tenant, exigir el filtro de empresa en
+    # cada SELECT (incluidas las ramas de UNION / INTERSECT / EXCEPT) que lee
+    # una tabla con scope de tenant.
+    if empresa_id:
+        filtered = _scopes_with_tenant_filter(parsed, empresa_id)
+        for scope in parsed.scopes:
+            reads_tenant = any(
+                ref.name in TENANT_SCOPED_TABLES and ref.name not in parsed.ctes
+                for ref in scope.tables
+            )
+            if reads_tenant and scope.id not in filtered:
+                return False, "Falta filtro obligatorio por empresa_id"
 
-    statements = [s.strip() for s in sql.split(';') if s.strip()]
-    if len(statements) > 1:
-        return False, "Solo se permite una sentencia SQL"
+    return True, "OK"
 
-    # Remover EXTRACT(...) para evitar falsos positivos con FROM dentro de funciones
-    sql_cleaned = re.sub(r'EXTRACT\s*\([^)]+\)', '', sql, flags=re.IGNORECASE)
-    
-    # Extraer nombres de CTEs para no rechazarlos como tablas no permitidas
-    cte_names = set(
-        name.lower() for name in re.findall(r'\b(\w+)\s+AS\s*\(', sql_cleaned, re.IGNORECASE)
-    )
-    
-    tables_in_query = re.findall(
-        r'\bFROM\s+(\w+)|\bJOIN\s+(\w+)',
-        sql_cleaned,
-        re.IGNORECASE
+
+def _scopes_with_tenant_filter(parsed: "sql_ast.ParsedSQL", empresa_id: str) -> FrozenSet[int]:
+    """
+    Ids de los SELECT que ya comparan empresa_id con el tenant.
+
+    Un SELECT que solo lee cfdi_conceptos (sin columna empresa_id) se acepta
+    si el filtro está en una subconsulta suya (EXISTS / IN sobre cfdi_ventas).
+    """
+    own = sql_ast.equality_scopes(parsed, "empresa_id", empresa_id)
+    nested = sql_ast.equality_scopes(parsed, "empresa_id", empresa_id, nested=True)
+    return frozenset(
+        scope.id for scope in parsed.scopes
+        if scope.id in own or (
+            scope.id in nested
+            and all(ref.name not in TENANT_COLUMN_TABLES for ref in scope.tables)
+        )
     )
-    allowed = set(ALLOWED_TABLES) | cte_names
-    for match_groups in tables_in_query:
-        for table in match_groups:
-            if table and table.lower() not in allowed:
-                return False, f"Tabla no permitida: {table}"
 
-    return True, "OK"
+
+def validate_sql_static(sql: str) -> Tuple[bool, str]:
+    """
+    Validación estática de SQL sin necesidad de instanciar el engine.
+
+    Args:
+        sql: Query SQL a validar
+
+    Returns:
+        Tupla (es_valido, mensaje_error)
+    """
+    return _validate_sql_structure(sql)
 
 
 def get_example_questions() -> List[Dict]:
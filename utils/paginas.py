@@ -0,0 +1,110 @@
+"""
+Registro de páginas del dashboard con importación diferida.
+
+Cada página de ``main/`` arrastra dependencias pesadas (plotly, openai,
+matplotlib/seaborn, reportlab, psycopg2...). Importarlas todas al arrancar
+`app.py` retrasa la pantalla de login y cada arranque de worker, aunque el
+usuario solo visite una o dos páginas.
+
+- `pagina(nombre)` devuelve un proxy que no importa nada; el módulo real se
+  importa al primer acceso a un atributo (``kpi_cpc.run(...)``), es decir, al
+  navegar a la página por primera vez. Después es un módulo más de
+  ``sys.modules`` y el costo es el de un ``getattr``.
+- `tiempos_carga()` da cuánto tardó en importarse cada página visitada.
+
+    >>> kpi_cpc = pagina("kpi_cpc")      # no importa main.kpi_cpc
+    >>> kpi_cpc.run(archivo, habilitar_ia=False)  # se importa aquí
+"""
+
+import importlib
+import sys
+import time
+from types import ModuleType
+from typing import Dict, List
+
+from utils.logger import configurar_logger
+
+logger = configurar_logger("paginas", nivel="INFO")
+
+# Nombre de la página → módulo que la implementa
+PAGINAS: Dict[str, str] = {
+    nombre: f"main.{nombre}"
+    for nombre in (
+        "main_kpi",
+        "main_comparativo",
+        "heatmap_ventas",
+        "kpi_cpc",
+        "reporte_ejecutivo",
+        "ytd_lineas",
+        "ytd_productos",
+        "reporte_consolidado",
+        "vendedores_cxc",
+        "herramientas_financieras",
+        "ingesta_cfdi",
+        "universo_cfdi",
+        "fiscal",
+        "mapa_clientes",
+        "knowledge_base",
+        "data_assistant",
+        "wiki_problemas",
+        "carga_inteligente_datos",
+    )
+}
+
+_tiempos_carga: Dict[str, float] = {}
+
+
+def cargar_pagina(nombre: str) -> ModuleType:
+    """
+    Importa (una sola vez) el módulo de una página registrada.
+
+    Raises:
+        KeyError: si la página no está en `PAGINAS`
+    """
+    modulo = PAGINAS[nombre]
+    if modulo in sys.modules:
+        return importlib.import_module(modulo)
+
+    inicio = time.perf_counter()
+    cargado = importlib.import_module(modulo)
+    duracion = time.perf_counter() - inicio
+    _tiempos_carga.setdefault(nombre, duracion)
+    logger.info(f"Página {nombre} importada en {duracion:.2f}s")
+    return cargado
+
+
+class PaginaDiferida:
+    """Proxy de una página: importa su módulo al primer acceso a un atributo."""
+
+    __slots__ = ("nombre",)
+
+    def __init__(self, nombre: str):
+        if nombre not in PAGINAS:
+            raise KeyError(f"Página no registrada: {nombre}")
+        self.nombre = nombre
+
+    @property
+    def cargada(self) -> bool:
+        return PAGINAS[self.nombre] in sys.modules
+
+    def __getattr__(self, atributo: str):
+        return getattr(cargar_pagina(self.nombre), atributo)
+
+    def __repr__(self) -> str:
+        estado = "cargada" if self.cargada else "sin cargar"
+        return f"<PaginaDiferida {PAGINAS[self.nombre]} ({estado})>"
+
+
+def pagina(nombre: str) -> PaginaDiferida:
+    """Proxy diferido de la página `nombre`."""
+    return PaginaDiferida(nombre)
+
+
+def paginas_cargadas() -> List[str]:
+    """Páginas cuyo módulo ya está importado en este proceso."""
+    return [nombre for nombre, modulo in PAGINAS.items() if modulo in sys.modules]
+
+
+def tiempos_carga() -> Dict[str, float]:
+    """Segundos que tardó la primera importación de cada página visitada."""
+    return dict(_tiempos_carga)
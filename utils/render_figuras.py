@@ -0,0 +1,239 @@
+"""
+Servicio de render de figuras Plotly a imagen (PNG) para reportes.
+
+Cada conversión con kaleido en frío arranca un subproceso de Chromium
+(1-3 s). Este módulo mantiene un pool de scopes de kaleido ya calientes,
+memoiza las imágenes por huella del JSON de la figura y renderiza varias
+figuras en paralelo (un scope por hilo).
+
+- `renderizar_figura(fig)` devuelve los bytes del PNG; pedir la misma figura
+  con las mismas dimensiones no vuelve a llamar a kaleido.
+- `renderizar_figuras(figs)` reparte las figuras entre los scopes del pool.
+- `precalentar()` arranca un scope en segundo plano para que el primer
+  reporte no pague el arranque de Chromium.
+- `estadisticas()` da renders, hits de caché y tiempos por render.
+
+Con kaleido >= 1 (que administra su propio navegador) o si el scope no se
+puede crear, se delega en ``plotly.io.to_image``.
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from utils.logger import configurar_logger
+
+try:
+    import plotly
+    import plotly.io as pio
+    from plotly.io._utils import validate_coerce_fig_to_dict
+    PLOTLY_AVAILABLE = True
+except ImportError:
+    PLOTLY_AVAILABLE = False
+
+try:
+    import kaleido
+    from kaleido.scopes.plotly import PlotlyScope
+    KALEIDO_SCOPE_AVAILABLE = int(kaleido.__version__.split(".")[0]) < 1
+except (ImportError, AttributeError, ValueError):
+    KALEIDO_SCOPE_AVAILABLE = False
+
+logger = configurar_logger("render_figuras", nivel="INFO")
+
+# Scopes (subprocesos de Chromium) en el pool; más no ayuda con un solo núcleo
+MAX_SCOPES_RENDER = max(1, min(2, os.cpu_count() or 1))
+# Imágenes memoizadas (PNG de ~20-200 KB cada una)
+MAX_IMAGENES_EN_CACHE = 64
+
+# Dimensiones por defecto de las gráficas en los PDF
+ANCHO_DEFECTO = 800
+ALTO_DEFECTO = 500
+ESCALA_DEFECTO = 2
+
+
+def huella_figura(fig) -> str:
+    """Huella del JSON de una figura Plotly (o dict de figura)."""
+    if hasattr(fig, "to_json"):
+        contenido = fig.to_json()
+    else:
+        contenido = pio.to_json(fig, validate=False)
+    return hashlib.blake2b(contenido.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class RenderizadorFiguras:
+    """
+    Pool de scopes de kaleido con caché LRU de imágenes por huella.
+
+    Examples:
+        >>> png = renderizador.renderizar(fig, width=800, height=500, scale=2)
+        >>> pngs = renderizador.renderizar_varias([fig1, fig2, fig3])
+    """
+
+    def __init__(self, max_scopes: int = MAX_SCOPES_RENDER, max_imagenes: int = MAX_IMAGENES_EN_CACHE):
+        self.max_scopes = max_scopes
+        self.max_imagenes = max_imagenes
+        self._libres: "queue.Queue" = queue.Queue()
+        self._creados = 0
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._stats = {"renders": 0, "hits": 0, "errores": 0, "tiempo_render": 0.0, "tiempo_max": 0.0}
+        self._precalentado = False
+
+    # ── Pool de scopes ──────────────────────────────────────────────────
+
+    def _crear_scope(self):
+        if not KALEIDO_SCOPE_AVAILABLE:
+            return None
+        # Mismo plotly.js que plotly.io (el de kaleido 0.2 no entiende arreglos binarios)
+        plotlyjs = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+        return PlotlyScope(plotlyjs=plotlyjs, mathjax=False)
+
+    def _tomar_scope(self):
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            crear = self._creados < self.max_scopes
+            if crear:
+                self._creados += 1
+        if crear:
+            try:
+                return self._crear_scope()
+            except Exception as e:
+                logger.warning(f"No se pudo crear scope de kaleido, se usa plotly.io: {e}")
+                return None
+        return self._libres.get()
+
+    def _devolver_scope(self, scope) -> None:
+        if scope is None:
+            # Sin scope propio: libera el cupo para reintentar más adelante
+            with self._lock:
+                self._creados -= 1
+            return
+        self._libres.put(scope)
+
+    def _convertir(self, fig, formato: str, width: int, height: int, scale: float) -> bytes:
+        scope = self._tomar_scope()
+        try:
+            if scope is None:
+                return pio.to_image(fig, format=formato, width=width, height=height, scale=scale)
+            return scope.transform(
+                validate_coerce_fig_to_dict(fig, True),
+                format=formato, width=width, height=height, scale=scale,
+            )
+        finally:
+            self._devolver_scope(scope)
+
+    # ── API ─────────────────────────────────────────────────────────────
+
+    def renderizar(
+        self,
+        fig,
+        formato: str = "png",
+        width: int = ANCHO_DEFECTO,
+        height: int = ALTO_DEFECTO,
+        scale: float = ESCALA_DEFECTO,
+    ) -> bytes:
+        """
+        Renderiza una figura a imagen, reutilizando la caché si ya se hizo.
+
+        Args:
+            fig: Figura Plotly (o dict de figura)
+            formato: "png", "jpeg", "svg"...
+            width, height: Dimensiones en pixeles de layout
+            scale: Factor de resolución
+
+        Returns:
+            bytes: Contenido de la imagen
+        """
+        if not PLOTLY_AVAILABLE:
+            raise ImportError("plotly no está instalado. Ejecuta: pip install plotly kaleido")
+
+        llave = (huella_figura(fig), formato, width, height, scale)
+        with self._lock:
+            if llave in self._cache:
+                self._cache.move_to_end(llave)
+                self._stats["hits"] += 1
+                return self._cache[llave]
+
+        inicio = time.perf_counter()
+        try:
+            imagen = self._convertir(fig, formato, width, height, scale)
+        except Exception:
+            with self._lock:
+                self._stats["errores"] += 1
+            raise
+        duracion = time.perf_counter() - inicio
+
+        with self._lock:
+            self._stats["renders"] += 1
+            self._stats["tiempo_render"] += duracion
+            self._stats["tiempo_max"] = max(self._stats["tiempo_max"], duracion)
+            self._cache[llave] = imagen
+            while len(self._cache) > self.max_imagenes:
+                self._cache.popitem(last=False)
+        logger.debug(f"Figura {llave[0]} renderizada en {duracion:.2f}s ({len(imagen) / 1e3:.0f} KB)")
+        return imagen
+
+    def renderizar_varias(self, figs: Sequence, **opciones) -> List[bytes]:
+        """Renderiza varias figuras en paralelo (un hilo por scope), en orden."""
+        if len(figs) <= 1:
+            return [self.renderizar(fig, **opciones) for fig in figs]
+        with ThreadPoolExecutor(max_workers=min(self.max_scopes, len(figs)),
+                                thread_name_prefix="render") as executor:
+            return list(executor.map(lambda fig: self.renderizar(fig, **opciones), figs))
+
+    def precalentar(self) -> Optional[threading.Thread]:
+        """Arranca un scope en segundo plano con una figura mínima (una vez por proceso)."""
+        if not PLOTLY_AVAILABLE or not KALEIDO_SCOPE_AVAILABLE:
+            return None
+        with self._lock:
+            if self._precalentado:
+                return None
+            self._precalentado = True
+
+        def _calentar():
+            try:
+                inicio = time.perf_counter()
+                self._convertir({"data": [], "layout": {}}, "png", 10, 10, 1)
+                logger.info(f"Scope de kaleido listo en {time.perf_counter() - inicio:.1f}s")
+            except Exception as e:
+                logger.warning(f"No se pudo precalentar kaleido: {e}")
+
+        hilo = threading.Thread(target=_calentar, name="render-precalentar", daemon=True)
+        hilo.start()
+        return hilo
+
+    def estadisticas(self) -> Dict[str, float]:
+        """Renders, hits de caché, errores y tiempos (total, promedio, máximo)."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["imagenes_en_cache"] = len(self._cache)
+            stats["scopes"] = self._creados
+        stats["tiempo_promedio"] = stats["tiempo_render"] / stats["renders"] if stats["renders"] else 0.0
+        return stats
+
+    def limpiar_cache(self) -> None:
+        """Descarta las imágenes memoizadas (los scopes siguen calientes)."""
+        with self._lock:
+            self._cache.clear()
+
+
+# Instancia del proceso: la usan los reportes desde los hilos de export_jobs
+renderizador = RenderizadorFiguras()
+
+
+def renderizar_figura(fig, **opciones) -> bytes:
+    """Atajo a `renderizador.renderizar`."""
+    return renderizador.renderizar(fig, **opciones)
+
+
+def renderizar_figuras(figs: Sequence, **opciones) -> List[bytes]:
+    """Atajo a `renderizador.renderizar_varias`."""
+    return renderizador.renderizar_varias(figs, **opciones)
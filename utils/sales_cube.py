@@ -0,0 +1,276 @@
+"""
+Cubo de ventas precalculado.
+
+Agrega una sola vez por dataset las transacciones de venta por día y por mes
+sobre las dimensiones comerciales (línea, producto, cliente, vendedor). Los
+reportes (YTD, Comparativo, Heatmap, Consolidado) consultan el cubo en lugar
+de re-filtrar y re-agrupar millones de filas en cada rerun de Streamlit.
+
+Tablas del cubo:
+- diario:  fecha (día), dimensiones, valor, operaciones, año, mes
+- mensual: año, mes, dimensiones, valor, operaciones
+
+Las tablas son "esparcidas": solo existen las combinaciones con ventas. La
+tabla diaria conserva los nombres de columna originales, por lo que puede
+usarse como sustituto directo del DataFrame crudo en código existente.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.huella import huella_columnas
+from utils.logger import configurar_logger
+
+logger = configurar_logger("sales_cube", nivel="INFO")
+
+# Dimensiones comerciales estándar del cubo (se usan las que existan en el df)
+DIMENSIONES_CUBO = ("linea_de_negocio", "producto", "cliente", "vendedor")
+
+# Columna con el número de transacciones agregadas en cada fila del cubo
+COLUMNA_OPERACIONES = "operaciones"
+
+# Cubos en memoria (por huella del dataset); pocos porque cada uno es un agregado
+MAX_CUBOS_EN_CACHE = 8
+_cubos_cache: "OrderedDict[tuple, CuboVentas]" = OrderedDict()
+
+
+@dataclass
+class CuboVentas:
+    """Cubo de ventas agregado por día y mes sobre dimensiones comerciales."""
+
+    diario: pd.DataFrame
+    mensual: pd.DataFrame
+    columna_fecha: str
+    columna_valor: str
+    dimensiones: Tuple[str, ...]
+    filas_origen: int = 0
+    _totales_diarios: Optional[pd.DataFrame] = field(default=None, repr=False)
+
+    # -----------------------------------------------------------------
+    # Consultas
+    # -----------------------------------------------------------------
+    def filtrar(self, **filtros: Iterable) -> "CuboVentas":
+        """
+        Restringe el cubo a los valores indicados por dimensión.
+
+        Ejemplo: ``cubo.filtrar(linea_de_negocio=["Dykem", "ACMOS"])``.
+        Las dimensiones que no existan en el cubo se ignoran.
+        """
+        mask_diario = np.ones(len(self.diario), dtype=bool)
+        mask_mensual = np.ones(len(self.mensual), dtype=bool)
+        for dimension, valores in filtros.items():
+            if valores is None or dimension not in self.dimensiones:
+                continue
+            valores = list(valores)
+            mask_diario &= self.diario[dimension].isin(valores).to_numpy()
+            mask_mensual &= self.mensual[dimension].isin(valores).to_numpy()
+
+        return CuboVentas(
+            diario=self.diario[mask_diario],
+            mensual=self.mensual[mask_mensual],
+            columna_fecha=self.columna_fecha,
+            columna_valor=self.columna_valor,
+            dimensiones=self.dimensiones,
+            filas_origen=self.filas_origen,
+        )
+
+    def totales(self, por: Sequence[str] = (), desde=None, hasta=None) -> pd.DataFrame:
+        """
+        Suma valor y operaciones agrupando por `por` dentro de un rango de fechas.
+
+        `por` admite dimensiones, 'año', 'mes' o la columna de fecha. Sin rango
+        de fechas (o con agrupación solo por año/mes) se usa la tabla mensual.
+        """
+        por = list(por)
+        usa_diario = desde is not None or hasta is not None or self.columna_fecha in por
+        tabla = self.diario if usa_diario else self.mensual
+
+        if usa_diario:
+            fechas = tabla[self.columna_fecha]
+            mask = np.ones(len(tabla), dtype=bool)
+            if desde is not None:
+                mask &= (fechas >= pd.Timestamp(desde)).to_numpy()
+            if hasta is not None:
+                mask &= (fechas <= pd.Timestamp(hasta)).to_numpy()
+            tabla = tabla[mask]
+
+        medidas = [self.columna_valor, COLUMNA_OPERACIONES]
+        if not por:
+            return tabla[medidas].sum().to_frame().T
+        return tabla.groupby(por, as_index=False, sort=True, observed=True)[medidas].sum()
+
+    def serie_mensual(self, por: Sequence[str] = ()) -> pd.DataFrame:
+        """Ventas por (año, mes[, por]) con el acumulado dentro de cada año."""
+        por = list(por)
+        serie = self.totales(["año", "mes", *por]).sort_values(["año", *por, "mes"])
+        serie["acumulado"] = serie.groupby(["año", *por], sort=False, observed=True)[self.columna_valor].cumsum()
+        return serie.sort_values(["año", "mes", *por]).reset_index(drop=True)
+
+    def pivot_mensual(self, filas: str = "año", columnas: str = "mes") -> pd.DataFrame:
+        """Matriz filas × columnas (por defecto año × mes) con ceros en huecos."""
+        return self.mensual.pivot_table(
+            index=filas,
+            columns=columnas,
+            values=self.columna_valor,
+            aggfunc="sum",
+            fill_value=0,
+            observed=True,
+        )
+
+    def pareto(self, dimension: str, desde=None, hasta=None) -> pd.DataFrame:
+        """Ranking de una dimensión con participación y participación acumulada (%)."""
+        ranking = self.totales([dimension], desde=desde, hasta=hasta)
+        ranking = ranking.sort_values(self.columna_valor, ascending=False).reset_index(drop=True)
+        total = ranking[self.columna_valor].sum()
+        ranking["participacion_pct"] = ranking[self.columna_valor] / total * 100 if total else 0.0
+        ranking["acumulado_pct"] = ranking["participacion_pct"].cumsum()
+        return ranking
+
+    def crecimiento_anual(self, por: Sequence[str] = ()) -> pd.DataFrame:
+        """Totales anuales con variación % contra el año previo (por grupo)."""
+        por = list(por)
+        anual = self.totales([*por, "año"]).sort_values([*por, "año"])
+        previo = anual.groupby(por, sort=False, observed=True)[self.columna_valor].shift(1) if por \
+            else anual[self.columna_valor].shift(1)
+        anual["crecimiento_pct"] = (anual[self.columna_valor] - previo) / previo.where(previo != 0) * 100
+        return anual.reset_index(drop=True)
+
+    @property
+    def totales_diarios(self) -> pd.DataFrame:
+        """Serie densa por día (solo días con venta) con acumulado dentro de cada año."""
+        if self._totales_diarios is None:
+            diario = self.diario.groupby(self.columna_fecha, sort=True)[self.columna_valor].sum().to_frame()
+            diario["acumulado"] = diario.groupby(diario.index.year)[self.columna_valor].cumsum()
+            self._totales_diarios = diario
+        return self._totales_diarios
+
+
+# =====================================================================
+# Construcción
+# =====================================================================
+
+def _fechas_del_df(df: pd.DataFrame, columna_fecha: Optional[str]) -> pd.Series:
+    """Fechas naive normalizadas a día; sin columna de fecha usa año/mes (día 1)."""
+    if columna_fecha is not None and columna_fecha in df.columns:
+        fechas = pd.to_datetime(df[columna_fecha], errors="coerce")
+        if getattr(fechas.dt, "tz", None) is not None:
+            fechas = fechas.dt.tz_localize(None)
+        return fechas.dt.normalize()
+
+    partes = pd.DataFrame({
+        "year": pd.to_numeric(df["año"], errors="coerce"),
+        "month": pd.to_numeric(df["mes"], errors="coerce"),
+        "day": 1,
+    })
+    return pd.to_datetime(partes, errors="coerce")
+
+
+def construir_cubo(
+    df: pd.DataFrame,
+    columna_valor: str,
+    columna_fecha: Optional[str] = "fecha",
+    dimensiones: Sequence[str] = DIMENSIONES_CUBO,
+) -> CuboVentas:
+    """
+    Construye el cubo a partir de transacciones crudas (sin caché).
+
+    Args:
+        df: Transacciones con fecha (o año/mes), valor y dimensiones.
+        columna_valor: Columna numérica a sumar (ventas_usd, valor_mxn, ...).
+        columna_fecha: Columna de fecha; None para derivarla de 'año' y 'mes'.
+        dimensiones: Dimensiones a conservar (se ignoran las que no existan).
+    """
+    nombre_fecha = columna_fecha or "fecha"
+    dims = tuple(
+        d for d in dict.fromkeys(dimensiones)
+        if d in df.columns and d not in (columna_valor, nombre_fecha, "año", "mes")
+    )
+
+    fechas = _fechas_del_df(df, columna_fecha)
+    validas = fechas.notna().to_numpy()
+
+    base = pd.DataFrame({nombre_fecha: fechas.to_numpy()[validas]})
+    for dim in dims:
+        base[dim] = df[dim].to_numpy()[validas]
+    base[columna_valor] = pd.to_numeric(df[columna_valor], errors="coerce").fillna(0).to_numpy()[validas]
+
+    llaves = [nombre_fecha, *dims]
+    diario = (
+        base.groupby(llaves, sort=True, dropna=False, observed=True)[columna_valor]
+        .agg(["sum", "size"])
+        .rename(columns={"sum": columna_valor, "size": COLUMNA_OPERACIONES})
+        .reset_index()
+    )
+    diario["año"] = diario[nombre_fecha].dt.year.astype("int32")
+    diario["mes"] = diario[nombre_fecha].dt.month.astype("int8")
+
+    mensual = (
+        diario.groupby(["año", "mes", *dims], sort=True, dropna=False, observed=True)
+        [[columna_valor, COLUMNA_OPERACIONES]]
+        .sum()
+        .reset_index()
+    )
+
+    logger.info(
+        f"Cubo de ventas: {len(df):,} filas → {len(diario):,} diarias / {len(mensual):,} mensuales "
+        f"(dimensiones: {', '.join(dims) or 'ninguna'})"
+    )
+    return CuboVentas(
+        diario=diario,
+        mensual=mensual,
+        columna_fecha=nombre_fecha,
+        columna_valor=columna_valor,
+        dimensiones=dims,
+        filas_origen=len(df),
+    )
+
+
+def _huella_dataset(df: pd.DataFrame, columnas: Sequence[str]) -> str:
+    """Huella de las columnas que alimentan el cubo (cacheada en el propio df)."""
+    return huella_columnas(df, columnas, con_indice=False)
+
+
+def obtener_cubo(
+    df: pd.DataFrame,
+    columna_valor: str,
+    columna_fecha: Optional[str] = "fecha",
+    dimensiones: Sequence[str] = DIMENSIONES_CUBO,
+) -> CuboVentas:
+    """
+    Devuelve el cubo del dataset, construyéndolo solo la primera vez.
+
+    La caché se indexa por una huella de las columnas usadas, así que copias
+    del mismo DataFrame (p. ej. ``df.copy()`` en cada rerun) reutilizan el cubo.
+    """
+    columnas_tiempo = [columna_fecha] if columna_fecha in df.columns else ["año", "mes"]
+    dims = tuple(d for d in dict.fromkeys(dimensiones) if d in df.columns)
+    columnas = [*columnas_tiempo, columna_valor, *dims]
+
+    llave = (len(df), tuple(columnas), _huella_dataset(df, columnas), columna_fecha)
+    cubo = _cubos_cache.get(llave)
+    if cubo is not None:
+        _cubos_cache.move_to_end(llave)
+        return cubo
+
+    cubo = construir_cubo(df, columna_valor, columna_fecha=columna_fecha, dimensiones=dims)
+    _cubos_cache[llave] = cubo
+    while len(_cubos_cache) > MAX_CUBOS_EN_CACHE:
+        _cubos_cache.popitem(last=False)
+    return cubo
+
+
+def limpiar_cache_cubos() -> None:
+    """Descarta los cubos en memoria (p. ej. al cargar un archivo nuevo)."""
+    _cubos_cache.clear()
+
+
+def estadisticas_cubos() -> Dict[str, int]:
+    """Tamaño de la caché de cubos (para diagnóstico)."""
+    return {
+        "cubos": len(_cubos_cache),
+        "filas_diarias": sum(len(c.diario) for c in _cubos_cache.values()),
+    }
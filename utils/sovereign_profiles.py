@@ -15,8 +15,8 @@ aplica como filtro post-generación en el SQL.
 """
 
 from __future__ import annotations
-import re
-from typing import Optional
+
+from utils.sql_ast import add_conditions, parse_sql
 
 # ── Catálogos estáticos ─────────────────────────────────────────────────────
 
@@ -197,131 +197,41 @@ def apply_profile_sql_filter(sql: str, perfil: dict) -> str:
     Inyecta filtros de tipo_comprobante y metodo_pago en el SQL generado
     si el perfil restringe esos campos y el SQL no los incluye ya.
 
-    Solo actúa sobre la tabla cfdi_ventas.
+    Solo actúa sobre la tabla cfdi_ventas: en la consulta principal si la lee
+    directamente, o en la primera subconsulta que la lea.
     """
     tipos = perfil.get("tipos_comprobante", [])
     metodos = perfil.get("metodos_pago", [])
 
-    sql_upper = sql.upper()
-
-    def _top_level_from_table(sql_text: str) -> Optional[str]:
-        depth = 0
-        sql_upper_text = sql_text.upper()
-        idx = 0
-        while idx < len(sql_upper_text):
-            char = sql_upper_text[idx]
-            if char == '(':
-                depth += 1
-                idx += 1
-                continue
-            if char == ')':
-                depth = max(0, depth - 1)
-                idx += 1
-                continue
-            if depth == 0 and sql_upper_text.startswith("FROM ", idx):
-                match = re.match(r'FROM\s+(\w+)', sql_text[idx:], flags=re.IGNORECASE)
-                if match:
-                    return match.group(1).lower()
-            idx += 1
-        return None
-
-    def _inject_into_cfdi_ventas_subquery(sql_text: str, condition: str) -> str:
-        stack: list[int] = []
-        for idx, char in enumerate(sql_text):
-            if char == '(':
-                stack.append(idx)
-            elif char == ')' and stack:
-                start = stack.pop()
-                inner = sql_text[start + 1:idx]
-                if re.search(r'\bSELECT\b', inner, re.IGNORECASE) and re.search(r'\bFROM\s+cfdi_ventas\b', inner, re.IGNORECASE):
-                    updated_inner = _inject_and_condition(inner, condition).rstrip().rstrip(';')
-                    return sql_text[:start + 1] + updated_inner + sql_text[idx:]
-        return sql_text
-
-    top_level_table = _top_level_from_table(sql)
+    parsed = parse_sql(sql)
 
     # Solo actuar si la query principal es cfdi_ventas o si hay un subquery explícito a cfdi_ventas.
-    if top_level_table != "cfdi_ventas" and "CFDI_VENTAS" not in sql_upper:
+    if "cfdi_ventas" not in parsed.table_names:
         return sql
 
+    if parsed.top_level_table == "cfdi_ventas":
+        target = 0
+    else:
+        target = parsed.scope_reading("cfdi_ventas")
+        if target is None:
+            return sql
+
+    condiciones: list[str] = []
+
     # ── Filtro tipo_comprobante ───────────────────────────────────────────
-    if tipos and "TIPO_COMPROBANTE" not in sql_upper:
+    if tipos and not parsed.has_identifier("tipo_comprobante"):
         if len(tipos) == 1:
-            tipo_clause = f"tipo_comprobante = '{tipos[0]}'"
+            condiciones.append(f"tipo_comprobante = '{tipos[0]}'")
         else:
             lista = ", ".join(f"'{t}'" for t in tipos)
-            tipo_clause = f"tipo_comprobante IN ({lista})"
-
-        if top_level_table == "cfdi_ventas":
-            sql = _inject_and_condition(sql, tipo_clause)
-        else:
-            sql = _inject_into_cfdi_ventas_subquery(sql, tipo_clause)
+            condiciones.append(f"tipo_comprobante IN ({lista})")
 
     # ── Filtro metodo_pago ──────────────────────────────────────────────────
-    if metodos and "METODO_PAGO" not in sql_upper:
+    if metodos and not parsed.has_identifier("metodo_pago"):
         if len(metodos) == 1:
-            mp_clause = f"metodo_pago = '{metodos[0]}'"
+            condiciones.append(f"metodo_pago = '{metodos[0]}'")
         else:
             lista = ", ".join(f"'{m}'" for m in metodos)
-            mp_clause = f"metodo_pago IN ({lista})"
+            condiciones.append(f"metodo_pago IN ({lista})")
 
-        if top_level_table == "cfdi_ventas":
-            sql = _inject_and_condition(sql, mp_clause)
-        else:
-            sql = _inject_into_cfdi_ventas_subquery(sql, mp_clause)
-
-    return sql
-
-
-def _inject_and_condition(sql: str, condition: str) -> str:
-    """
-    Inyecta una condición AND en el WHERE existente, o crea uno new.
-    Inyecta antes de GROUP BY / ORDER BY / LIMIT si no hay WHERE.
-    """
-    def _find_top_level_clause_index(sql_text: str, keywords: list[str]) -> Optional[int]:
-        sql_upper = sql_text.upper()
-        candidates: list[int] = []
-        depth = 0
-
-        for idx, char in enumerate(sql_upper):
-            if char == '(':
-                depth += 1
-                continue
-            if char == ')':
-                depth = max(0, depth - 1)
-                continue
-
-            if depth != 0:
-                continue
-
-            for keyword in keywords:
-                keyword_upper = keyword.upper()
-                if not sql_upper.startswith(keyword_upper, idx):
-                    continue
-
-                prev_char = sql_upper[idx - 1] if idx > 0 else ' '
-                next_idx = idx + len(keyword_upper)
-                next_char = sql_upper[next_idx] if next_idx < len(sql_upper) else ' '
-                if (prev_char.isalnum() or prev_char == '_') or (next_char.isalnum() or next_char == '_'):
-                    continue
-
-                candidates.append(idx)
-
-        return min(candidates) if candidates else None
-
-    sql_upper = sql.upper()
-
-    if "WHERE" in sql_upper:
-        # Agregar al final del bloque WHERE (antes de GROUP/ORDER/LIMIT)
-        idx = _find_top_level_clause_index(sql, ["GROUP BY", "ORDER BY", "LIMIT", "HAVING"])
-        if idx is not None:
-            return sql[:idx] + f"AND {condition} " + sql[idx:]
-        # WHERE sin GROUP/ORDER/LIMIT → agregar al final antes de ;
-        sql = sql.rstrip(";").rstrip()
-        return sql + f" AND {condition};"
-    else:
-        idx = _find_top_level_clause_index(sql, ["GROUP BY", "ORDER BY", "LIMIT", "HAVING"])
-        if idx is not None:
-            return sql[:idx] + f"WHERE {condition} " + sql[idx:]
-        sql = sql.rstrip(";").rstrip()
-        return sql + f" WHERE {condition};"
+    return add_conditions(sql, {target: condiciones})
@@ -0,0 +1,929 @@
+"""
+Analizador ligero de SQL para el motor NL2SQL.
+
+Tokeniza la consulta en una sola pasada lineal (sin expresiones regulares
+con backtracking sobre el texto completo) y construye una estructura
+reutilizable con tablas, alias, CTEs, cláusulas por nivel y subconsultas.
+
+Los validadores y reescritores de `utils.nl2sql` y
+`utils.sovereign_profiles` operan sobre esta estructura en lugar de volver
+a escanear el SQL con regex y recorridos manuales de paréntesis.
+
+Uso:
+    >>> parsed = parse_sql("SELECT * FROM cfdi_ventas v WHERE v.total > 0 LIMIT 10")
+    >>> parsed.top_level_table
+    'cfdi_ventas'
+    >>> add_condition(parsed.sql, "v.empresa_id = 'x'")
+    "SELECT * FROM cfdi_ventas v WHERE v.total > 0 AND v.empresa_id = 'x' LIMIT 10"
+
+Autor: Fradma Dashboard Team
+Fecha: Marzo 2026
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# =====================================================================
+# Tokenizador
+# =====================================================================
+# Cada regex se aplica con .match() en una posición fija y consume un solo
+# token, por lo que el costo total es lineal en el largo del SQL.
+_SPACE_RE = re.compile(r'\s+')
+# Postgres admite "$" dentro de identificadores (no al inicio): "x$a$" es un
+# solo identificador, no el inicio de un literal $a$...$a$.
+_WORD_RE = re.compile(r'[^\W\d][\w$]*')
+_DOLLAR_TAG_RE = re.compile(r'\$(?:[^\W\d]\w*)?\$')
+_NUMBER_RE = re.compile(r'\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?')
+_DATE_LITERAL_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+_OPERATORS = ('->>', '::', '<=', '>=', '<>', '!=', '||', '->')
+
+# Palabras que, seguidas de "(", no forman una llamada a función.
+_NON_FUNCTION_WORDS = frozenset({
+    'in', 'exists', 'and', 'or', 'not', 'on', 'as', 'from', 'join', 'using',
+    'where', 'having', 'select', 'with', 'union', 'all', 'any', 'some',
+    'then', 'else', 'when', 'lateral', 'materialized', 'values', 'by',
+})
+
+# Palabras que nunca se interpretan como alias de tabla.
+_NON_ALIAS_WORDS = frozenset({
+    'where', 'join', 'on', 'group', 'order', 'limit', 'having', 'union',
+    'left', 'right', 'inner', 'full', 'cross', 'outer', 'natural', 'using',
+    'except', 'intersect', 'window', 'offset', 'fetch', 'for', 'lateral',
+    'tablesample', 'as', 'select', 'from', 'and', 'or', 'returning',
+})
+
+# Cláusulas que cierran el bloque WHERE de un scope (orden SQL estándar).
+TAIL_CLAUSES: Tuple[str, ...] = (
+    'group by', 'having', 'window', 'union', 'intersect', 'except',
+    'order by', 'limit', 'offset', 'fetch',
+)
+
+_SIMPLE_CLAUSES = frozenset({
+    'where', 'having', 'limit', 'offset', 'fetch', 'window', 'on', 'using',
+})
+
+# Operadores de conjunto: cada SELECT que los sigue es una rama con su propio WHERE.
+_SET_OPERATORS = frozenset({'union', 'intersect', 'except'})
+
+# Tokens tras los que termina un predicado (para no cortar expresiones).
+_PREDICATE_BOUNDARY_WORDS = frozenset({'and', 'or', 'group', 'order', 'limit', 'having', 'union'})
+
+
+class Token(NamedTuple):
+    """Token léxico con su posición en el SQL original."""
+    kind: str      # word, qident, string, number, op, lparen, rparen, comma, semicolon, dot, comment
+    text: str      # texto original
+    start: int
+    end: int
+    depth: int     # paréntesis abiertos antes del token
+    value: str     # minúsculas para palabras; contenido para strings/identificadores
+
+
+def _scan_quoted(sql: str, start: int, quote: str, backslash: bool = False) -> int:
+    """Retorna el índice posterior a la comilla de cierre (o len(sql) si no cierra)."""
+    n = len(sql)
+    j = start + 1
+    if not backslash:
+        while True:
+            k = sql.find(quote, j)
+            if k == -1:
+                return n
+            if k + 1 < n and sql[k + 1] == quote:
+                j = k + 2
+                continue
+            return k + 1
+    while j < n:
+        ch = sql[j]
+        if ch == '\\':
+            j += 2
+        elif ch == quote:
+            if j + 1 < n and sql[j + 1] == quote:
+                j += 2
+            else:
+                return j + 1
+        else:
+            j += 1
+    return n
+
+
+def tokenize(sql: str) -> List[Token]:
+    """
+    Convierte el SQL en una lista de tokens en tiempo O(n).
+
+    Reconoce literales '...' (incluyendo E'...' con escapes) y $tag$...$tag$,
+    identificadores "...", comentarios -- y /* */, números, operadores y
+    paréntesis.
+    Los espacios en blanco no generan tokens.
+    """
+    tokens: List[Token] = []
+    n = len(sql)
+    i = 0
+    depth = 0
+
+    while i < n:
+        ch = sql[i]
+
+        if ch.isspace():
+            i = _SPACE_RE.match(sql, i).end()
+            continue
+
+        if ch == "'" or (ch in 'eE' and i + 1 < n and sql[i + 1] == "'"):
+            is_escape = ch != "'"
+            quote_at = i + 1 if is_escape else i
+            end = _scan_quoted(sql, quote_at, "'", backslash=is_escape)
+            inner = sql[quote_at + 1:end - 1] if end - quote_at >= 2 else sql[quote_at + 1:end]
+            tokens.append(Token('string', sql[i:end], i, end, depth, inner.replace("''", "'")))
+            i = end
+            continue
+
+        if ch == '$':
+            m = _DOLLAR_TAG_RE.match(sql, i)
+            if m:
+                close = sql.find(m.group(0), m.end())
+                end = n if close == -1 else close + len(m.group(0))
+                inner = sql[m.end():n if close == -1 else close]
+                tokens.append(Token('string', sql[i:end], i, end, depth, inner))
+                i = end
+                continue
+
+        if ch == '"':
+            end = _scan_quoted(sql, i, '"')
+            inner = sql[i + 1:end - 1] if end - i >= 2 else sql[i + 1:end]
+            tokens.append(Token('qident', sql[i:end], i, end, depth, inner.replace('""', '"').lower()))
+            i = end
+            continue
+
+        if ch == '-' and sql.startswith('--', i):
+            end = sql.find('\n', i)
+            end = n if end == -1 else end
+            tokens.append(Token('comment', sql[i:end], i, end, depth, ''))
+            i = end
+            continue
+
+        if ch == '/' and sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            tokens.append(Token('comment', sql[i:end], i, end, depth, ''))
+            i = end
+            continue
+
+        if ch == '(':
+            tokens.append(Token('lparen', ch, i, i + 1, depth, ch))
+            depth += 1
+            i += 1
+            continue
+
+        if ch == ')':
+            depth = max(0, depth - 1)
+            tokens.append(Token('rparen', ch, i, i + 1, depth, ch))
+            i += 1
+            continue
+
+        if ch == ',':
+            tokens.append(Token('comma', ch, i, i + 1, depth, ch))
+            i += 1
+            continue
+
+        if ch == ';':
+            tokens.append(Token('semicolon', ch, i, i + 1, depth, ch))
+            i += 1
+            continue
+
+        if ch.isdigit() or (ch == '.' and i + 1 < n and sql[i + 1].isdigit()):
+            m = _NUMBER_RE.match(sql, i)
+            tokens.append(Token('number', m.group(0), i, m.end(), depth, m.group(0)))
+            i = m.end()
+            continue
+
+        if ch == '.':
+            tokens.append(Token('dot', ch, i, i + 1, depth, ch))
+            i += 1
+            continue
+
+        m = _WORD_RE.match(sql, i)
+        if m:
+            word = m.group(0)
+            tokens.append(Token('word', word, i, m.end(), depth, word.lower()))
+            i = m.end()
+            continue
+
+        for op in _OPERATORS:
+            if sql.startswith(op, i):
+                tokens.append(Token('op', op, i, i + len(op), depth, op))
+                i += len(op)
+                break
+        else:
+            tokens.append(Token('op', ch, i, i + 1, depth, ch))
+            i += 1
+
+    return tokens
+
+
+# =====================================================================
+# Estructura
+# =====================================================================
+@dataclass
+class TableRef:
+    """Referencia a una tabla en FROM/JOIN."""
+    name: str                 # nombre en minúsculas (incluye esquema si lo trae)
+    text: str                 # nombre como aparece en el SQL
+    alias: Optional[str]
+    scope: int                # id del scope donde aparece
+    keyword: str              # 'from' o 'join'
+    start: int
+
+    @property
+    def qualifier(self) -> str:
+        """Alias si existe; si no, el nombre de la tabla."""
+        return self.alias or self.name
+
+
+@dataclass
+class SQLScope:
+    """
+    Un SELECT: la consulta principal (id 0), una subconsulta entre paréntesis
+    o una rama posterior a UNION / INTERSECT / EXCEPT.
+
+    Las ramas comparten `parent`, `depth` y `end` con la primera rama
+    (`branch_of`); `branch_end` marca dónde empieza el operador que cierra
+    cada rama salvo la última.
+    """
+    id: int
+    parent: Optional[int]
+    depth: int
+    start: int                # primer carácter del contenido
+    end: int                  # posición del ")" de cierre (o fin de la sentencia)
+    clauses: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    tables: List[TableRef] = field(default_factory=list)
+    select_commas: int = 0
+    cte_name: Optional[str] = None
+    branch_of: Optional[int] = None
+    branch_end: Optional[int] = None
+
+    def clause_index(self, keywords: Iterable[str]) -> Optional[int]:
+        """Posición de la primera cláusula de `keywords` presente en este scope."""
+        positions = [self.clauses[k][0] for k in keywords if k in self.clauses]
+        return min(positions) if positions else None
+
+
+@dataclass
+class ParsedSQL:
+    """Resultado de `parse_sql`. Se cachea: tratar como solo lectura."""
+    sql: str
+    tokens: List[Token]
+    significant: List[Token]      # tokens sin comentarios
+    scopes: List[SQLScope]
+    ctes: FrozenSet[str]
+    statement_count: int
+    code: str                     # SQL con el contenido de literales en blanco
+    identifiers: FrozenSet[str]
+    string_literals: Tuple[str, ...]
+    scope_tokens: Tuple[Tuple[Token, ...], ...]   # tokens propios de cada scope (por id)
+
+    @property
+    def top(self) -> SQLScope:
+        return self.scopes[0]
+
+    @property
+    def first_keyword(self) -> Optional[str]:
+        if not self.significant or self.significant[0].kind != 'word':
+            return None
+        return self.significant[0].value
+
+    @property
+    def table_refs(self) -> List[TableRef]:
+        """Todas las referencias a tablas reales (excluye nombres de CTE)."""
+        return [ref for scope in self.scopes for ref in scope.tables if ref.name not in self.ctes]
+
+    @property
+    def all_table_refs(self) -> List[TableRef]:
+        return [ref for scope in self.scopes for ref in scope.tables]
+
+    @property
+    def table_names(self) -> FrozenSet[str]:
+        return frozenset(ref.name for ref in self.table_refs)
+
+    @property
+    def top_level_table(self) -> Optional[str]:
+        """Tabla del primer FROM de la consulta principal."""
+        for ref in self.top.tables:
+            if ref.keyword == 'from':
+                return ref.name
+        return None
+
+    def has_identifier(self, name: str) -> bool:
+        return name.lower() in self.identifiers
+
+    def mentions_literal(self, value: str) -> bool:
+        value = value.lower()
+        return any(value in literal.lower() for literal in self.string_literals)
+
+    def scope_reading(self, table: str) -> Optional[int]:
+        """Primera subconsulta (la más interna primero) cuyo FROM lee `table`."""
+        candidates = [
+            scope for scope in self.scopes[1:]
+            if any(ref.keyword == 'from' and ref.name == table for ref in scope.tables)
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda s: s.end).id
+
+    def branches(self, scope_id: int) -> List[SQLScope]:
+        """Ramas del SELECT compuesto al que pertenece `scope_id`, en orden."""
+        owner = self.scopes[scope_id].branch_of
+        owner = scope_id if owner is None else owner
+        return [s for s in self.scopes if s.id == owner or s.branch_of == owner]
+
+    def own_tokens(self, scope_id: int) -> Tuple[Token, ...]:
+        """Tokens del scope sin los de sus subconsultas ni los de otras ramas."""
+        return self.scope_tokens[scope_id]
+
+    def target_scope(self, table: str) -> int:
+        """Scope donde filtrar columnas de `table`: la consulta principal si la lee."""
+        if any(ref.name == table for ref in self.top.tables):
+            return 0
+        found = self.scope_reading(table)
+        return 0 if found is None else found
+
+
+def _blank_literals(sql: str, tokens: Sequence[Token]) -> str:
+    """Reemplaza el contenido de los literales por espacios (mismas posiciones)."""
+    pieces: List[str] = []
+    last = 0
+    for tok in tokens:
+        if tok.kind != 'string':
+            continue
+        text = tok.text
+        if text.startswith('$'):
+            opening = text.index('$', 1) + 1
+            closed = len(text) >= 2 * opening and text.endswith(text[:opening])
+            closing = opening if closed else 0
+        else:
+            opening = text.index("'") + 1
+            closing = 1 if len(text) > opening and text.endswith("'") else 0
+        inner_start, inner_end = tok.start + opening, tok.end - closing
+        pieces.append(sql[last:inner_start])
+        pieces.append(' ' * (inner_end - inner_start))
+        last = inner_end
+    pieces.append(sql[last:])
+    return ''.join(pieces)
+
+
+@lru_cache(maxsize=256)
+def parse_sql(sql: str) -> ParsedSQL:
+    """
+    Analiza el SQL una sola vez y retorna su estructura.
+
+    El análisis es lineal en el número de tokens y tolera SQL mal formado
+    (paréntesis desbalanceados, literales sin cerrar): nunca lanza excepciones.
+
+    Args:
+        sql: Sentencia SQL (típicamente generada por el LLM)
+
+    Returns:
+        ParsedSQL con tokens, scopes, tablas, CTEs y cláusulas
+    """
+    tokens = tokenize(sql)
+    sig = [t for t in tokens if t.kind != 'comment']
+    n_sig = len(sig)
+
+    top_end = len(sql)
+    for tok in reversed(sig):
+        if tok.kind != 'semicolon':
+            top_end = tok.end
+            break
+
+    scopes: List[SQLScope] = [SQLScope(id=0, parent=None, depth=0, start=0, end=top_end)]
+    scope_stack: List[int] = [0]
+    paren_stack: List[Tuple[str, Optional[int]]] = []
+    ctes: set = set()
+    clause_state: Dict[int, str] = {0: ''}
+    expect_table: Dict[int, Optional[str]] = {0: None}
+    branches: Dict[int, List[int]] = {}
+
+    statements = 0
+    in_statement = False
+    # Scope dueño de cada token significativo (se registra en la misma pasada)
+    owners: List[int] = [0] * n_sig
+
+    idx = 0
+    while idx < n_sig:
+        tok = sig[idx]
+        kind = tok.kind
+        cur = scopes[scope_stack[-1]]
+        prev = sig[idx - 1] if idx else None
+        owners[idx] = cur.id
+
+        if kind == 'semicolon':
+            in_statement = False
+            idx += 1
+            continue
+        if not in_statement:
+            statements += 1
+            in_statement = True
+
+        if kind == 'lparen':
+            nxt = sig[idx + 1] if idx + 1 < n_sig else None
+            if nxt is not None and nxt.kind == 'word' and nxt.value in ('select', 'with'):
+                scope = SQLScope(
+                    id=len(scopes), parent=cur.id, depth=tok.depth + 1,
+                    start=tok.end, end=len(sql),
+                )
+                # "<nombre> AS (" / "<nombre> AS MATERIALIZED (" → cuerpo de CTE
+                back = idx - 1
+                while back >= 0 and sig[back].kind == 'word' and sig[back].value in ('materialized', 'not'):
+                    back -= 1
+                if back >= 1 and sig[back].kind == 'word' and sig[back].value == 'as' \
+                        and sig[back - 1].kind in ('word', 'qident'):
+                    scope.cte_name = sig[back - 1].value
+                scopes.append(scope)
+                scope_stack.append(scope.id)
+                clause_state[scope.id] = ''
+                expect_table[scope.id] = None
+                paren_stack.append(('scope', scope.id))
+            else:
+                is_function = (
+                    prev is not None and prev.kind in ('word', 'qident')
+                    and prev.value not in _NON_FUNCTION_WORDS
+                )
+                paren_stack.append(('function' if is_function else 'group', None))
+            expect_table[cur.id] = None
+            idx += 1
+            continue
+
+        if kind == 'rparen':
+            if paren_stack:
+                paren_kind, scope_id = paren_stack.pop()
+                if paren_kind == 'scope' and len(scope_stack) > 1:
+                    scopes[scope_id].end = tok.start
+                    for branch_id in branches.get(scope_id, ()):
+                        scopes[branch_id].end = tok.start
+                    scope_stack.pop()
+                    owners[idx] = scope_stack[-1]
+            idx += 1
+            continue
+
+        in_function = bool(paren_stack) and paren_stack[-1][0] == 'function'
+        at_scope = tok.depth == cur.depth
+
+        if kind == 'comma':
+            if at_scope and clause_state[cur.id] == 'select':
+                cur.select_commas += 1
+            elif clause_state[cur.id] == 'from' and not in_function:
+                expect_table[cur.id] = 'from'
+            idx += 1
+            continue
+
+        if kind in ('word', 'qident') and expect_table[cur.id] and not in_function:
+            keyword = expect_table[cur.id]
+            if kind == 'word' and tok.value in ('lateral', 'only'):
+                idx += 1
+                continue
+            if kind == 'word' and tok.value in _NON_ALIAS_WORDS:
+                expect_table[cur.id] = None
+            else:
+                name_parts = [tok.value]
+                text_parts = [tok.text]
+                j = idx
+                while j + 2 < n_sig and sig[j + 1].kind == 'dot' and sig[j + 2].kind in ('word', 'qident'):
+                    name_parts.append(sig[j + 2].value)
+                    text_parts.append(sig[j + 2].text)
+                    j += 2
+                alias = None
+                k = j + 1
+                if k < n_sig and sig[k].kind == 'word' and sig[k].value == 'as':
+                    k += 1
+                if k < n_sig and sig[k].kind in ('word', 'qident') and sig[k].value not in _NON_ALIAS_WORDS:
+                    alias = sig[k].value
+                cur.tables.append(TableRef(
+                    name='.'.join(name_parts),
+                    text='.'.join(text_parts),
+                    alias=alias,
+                    scope=cur.id,
+                    keyword=keyword,
+                    start=tok.start,
+                ))
+                expect_table[cur.id] = None
+                owners[idx:j + 1] = [cur.id] * (j + 1 - idx)
+                idx = j + 1
+                continue
+
+        if kind == 'word':
+            value = tok.value
+            nxt = sig[idx + 1] if idx + 1 < n_sig else None
+
+            if value == 'as' and nxt is not None and prev is not None and prev.kind in ('word', 'qident'):
+                look = idx + 1
+                while look < n_sig and sig[look].kind == 'word' and sig[look].value in ('materialized', 'not'):
+                    look += 1
+                if look < n_sig and sig[look].kind == 'lparen':
+                    ctes.add(prev.value)
+
+            if value == 'from' and not in_function and not (prev is not None and prev.value == 'distinct'):
+                if at_scope:
+                    cur.clauses.setdefault('from', (tok.start, tok.end))
+                    clause_state[cur.id] = 'from'
+                expect_table[cur.id] = 'from'
+            elif value == 'join' and not in_function:
+                if at_scope:
+                    cur.clauses.setdefault('join', (tok.start, tok.end))
+                expect_table[cur.id] = 'join'
+            elif at_scope:
+                if value == 'select':
+                    cur.clauses.setdefault('select', (tok.start, tok.end))
+                    clause_state[cur.id] = 'select'
+                elif value == 'with' and 'with' not in cur.clauses and not cur.clauses:
+                    cur.clauses['with'] = (tok.start, tok.end)
+                    clause_state[cur.id] = 'with'
+                elif value in _SET_OPERATORS:
+                    # Cierra la rama actual y abre la siguiente en el mismo nivel
+                    cur.clauses.setdefault(value, (tok.start, tok.end))
+                    cur.branch_end = tok.start
+                    owner = cur.id if cur.branch_of is None else cur.branch_of
+                    branch = SQLScope(
+                        id=len(scopes), parent=cur.parent, depth=cur.depth,
+                        start=tok.end, end=scopes[owner].end, branch_of=owner,
+                    )
+                    scopes.append(branch)
+                    branches.setdefault(owner, []).append(branch.id)
+                    scope_stack[-1] = branch.id
+                    owners[idx] = branch.id
+                    clause_state[branch.id] = ''
+                    expect_table[branch.id] = None
+                elif value in ('group', 'order') and nxt is not None and nxt.kind == 'word' and nxt.value == 'by':
+                    cur.clauses.setdefault(f'{value} by', (tok.start, nxt.end))
+                    clause_state[cur.id] = f'{value} by'
+                elif value in _SIMPLE_CLAUSES:
+                    cur.clauses.setdefault(value, (tok.start, tok.end))
+                    clause_state[cur.id] = value
+
+        idx += 1
+
+    identifiers = frozenset(t.value for t in sig if t.kind in ('word', 'qident'))
+    literals = tuple(t.value for t in sig if t.kind == 'string')
+    by_scope: List[List[Token]] = [[] for _ in scopes]
+    for tok, owner in zip(sig, owners):
+        by_scope[owner].append(tok)
+
+    return ParsedSQL(
+        sql=sql,
+        tokens=tokens,
+        significant=sig,
+        scopes=scopes,
+        ctes=frozenset(ctes),
+        statement_count=statements,
+        code=_blank_literals(sql, tokens),
+        identifiers=identifiers,
+        string_literals=literals,
+        scope_tokens=tuple(tuple(toks) for toks in by_scope),
+    )
+
+
+# =====================================================================
+# Reescritura
+# =====================================================================
+def replace_spans(sql: str, edits: Iterable[Tuple[int, int, str]]) -> str:
+    """Aplica reemplazos (inicio, fin, texto) que no se traslapan, en una pasada."""
+    pieces: List[str] = []
+    last = 0
+    for start, end, text in sorted(edits, key=lambda e: (e[0], e[1])):
+        start = max(start, last)
+        pieces.append(sql[last:start])
+        pieces.append(text)
+        last = max(end, start)
+    pieces.append(sql[last:])
+    return ''.join(pieces)
+
+
+def _condition_edit(sql: str, scope: SQLScope, condition: str, prepend: bool) -> Tuple[int, int, str]:
+    """Calcula dónde y cómo insertar `condition` en el WHERE de `scope`."""
+    where = scope.clauses.get('where')
+    if prepend and where:
+        return where[1], where[1], f" {condition} AND"
+
+    connector = 'AND' if where else 'WHERE'
+    idx = scope.clause_index(TAIL_CLAUSES)
+    if idx is not None:
+        return idx, idx, f"{connector} {condition} "
+
+    content_end = scope.end
+    while content_end > scope.start and sql[content_end - 1].isspace():
+        content_end -= 1
+    if scope.parent is None:
+        return content_end, len(sql), f" {connector} {condition};"
+    return content_end, scope.end, f" {connector} {condition}"
+
+
+def add_conditions(sql: str, conditions_by_scope: Dict[int, List[str]], prepend: bool = False) -> str:
+    """
+    Inyecta condiciones en el WHERE de cada scope indicado.
+
+    Si el scope ya tiene WHERE las condiciones se agregan con AND antes de
+    GROUP BY / ORDER BY / LIMIT / etc. (o al inicio del WHERE si
+    `prepend=True`); si no, se crea el WHERE en la posición correcta. Cada
+    rama de un UNION / INTERSECT / EXCEPT es un scope aparte.
+
+    Args:
+        sql: Query SQL original
+        conditions_by_scope: {id de scope: [condiciones]} según `parse_sql(sql).scopes`
+        prepend: Insertar inmediatamente después de WHERE en lugar de al final
+
+    Returns:
+        SQL reescrito
+    """
+    parsed = parse_sql(sql)
+    edits = []
+    for scope_id, conditions in conditions_by_scope.items():
+        if not conditions or scope_id >= len(parsed.scopes):
+            continue
+        condition = " AND ".join(conditions)
+        edits.append(_condition_edit(sql, parsed.scopes[scope_id], condition, prepend))
+    return replace_spans(sql, edits)
+
+
+def add_condition(sql: str, condition: str, scope_id: int = 0, prepend: bool = False) -> str:
+    """Inyecta una condición AND en el WHERE del scope (o crea el WHERE)."""
+    return add_conditions(sql, {scope_id: [condition]}, prepend=prepend)
+
+
+def cap_limit(sql: str, max_rows: int) -> str:
+    """
+    Acota la consulta principal a `max_rows` filas.
+
+    Respeta un LIMIT numérico menor, reemplaza uno mayor (o LIMIT ALL) y
+    agrega LIMIT si no existe. Si la consulta usa OFFSET/FETCH sin LIMIT o
+    un LIMIT no literal, la envuelve en `SELECT * FROM (...) LIMIT n`.
+    El resultado no lleva punto y coma final.
+
+    Args:
+        sql: Query SQL validada (una sola sentencia)
+        max_rows: Máximo de filas que puede producir el servidor
+
+    Returns:
+        SQL acotado
+    """
+    parsed = parse_sql(sql)
+    top = parsed.top
+    body = sql[:top.end].rstrip()
+    wrapped = f"SELECT * FROM ({body}) AS _nl2sql_acotado LIMIT {max_rows}"
+
+    # En un UNION / INTERSECT / EXCEPT el LIMIT final queda en la última rama
+    tail = parsed.branches(0)[-1]
+    limit = tail.clauses.get('limit')
+    if limit is None:
+        if 'offset' in tail.clauses or 'fetch' in tail.clauses:
+            return wrapped
+        return f"{body} LIMIT {max_rows}"
+
+    sig = parsed.significant
+    position = next((i for i, tok in enumerate(sig) if tok.start == limit[0]), None)
+    value = sig[position + 1] if position is not None and position + 1 < len(sig) else None
+    if value is None:
+        return wrapped
+    if value.kind == 'number' and value.value.isdigit():
+        if int(value.value) <= max_rows:
+            return body
+        return body[:value.start] + str(max_rows) + body[value.end:]
+    if value.kind == 'word' and value.value == 'all':
+        return body[:value.start] + str(max_rows) + body[value.end:]
+    return wrapped
+
+
+def _has_equality(toks: Sequence[Token], column: str, value: str) -> bool:
+    for i, tok in enumerate(toks):
+        if tok.kind != 'op' or tok.value != '=':
+            continue
+        left, right = toks[i - 1] if i else None, toks[i + 1] if i + 1 < len(toks) else None
+        # Saltar un cast "::tipo" a la izquierda ("empresa_id::text = ...")
+        if left is not None and i >= 3 and toks[i - 2].value == '::':
+            left = toks[i - 3]
+        sides = (left, right)
+        if any(t is not None and t.kind in ('word', 'qident') and t.value == column for t in sides) \
+                and any(t is not None and t.kind == 'string' and t.value == value for t in sides):
+            return True
+    return False
+
+
+def equality_scopes(parsed: ParsedSQL, column: str, value: str, nested: bool = False) -> FrozenSet[int]:
+    """
+    Scopes que comparan `columna = 'valor'` (con o sin calificador, en
+    cualquier orden y con un cast ``::tipo`` opcional).
+
+    Con `nested=True` también cuentan los scopes que lo hacen en alguna
+    subconsulta propia. Lineal en el número de tokens.
+    """
+    column = column.lower()
+    found = {
+        scope.id for scope in parsed.scopes
+        if _has_equality(parsed.own_tokens(scope.id), column, value)
+    }
+    if nested:
+        for scope_id in list(found):
+            parent = parsed.scopes[scope_id].parent
+            # Cada ancestro se agrega una sola vez: el recorrido total es lineal
+            while parent is not None and parent not in found:
+                found.add(parent)
+                parent = parsed.scopes[parent].parent
+    return frozenset(found)
+
+
+# =====================================================================
+# Predicados de fecha
+# =====================================================================
+@dataclass
+class ExtractCall:
+    """Una expresión EXTRACT(<parte> FROM <fuente>)."""
+    first: int        # índice en `significant` del token EXTRACT
+    last: int         # índice del ")" de cierre
+    part: str         # 'month', 'year', ...
+    source: str       # columna (sin calificador) o 'current_date'
+    start: int
+    end: int
+
+
+@dataclass
+class DatePartPredicate:
+    """Un predicado EXTRACT(<parte> FROM <columna>) = <valor>."""
+    first: int
+    last: int
+    part: str
+    column: str
+    literal: Optional[int]        # valor si el lado derecho es un número
+    current_year: bool            # lado derecho empieza con EXTRACT(YEAR FROM CURRENT_DATE)
+
+
+def find_extract_calls(parsed: ParsedSQL) -> List[ExtractCall]:
+    """Localiza expresiones EXTRACT(parte FROM fuente) simples."""
+    sig = parsed.significant
+    n = len(sig)
+    calls: List[ExtractCall] = []
+    for i, tok in enumerate(sig):
+        if tok.kind != 'word' or tok.value != 'extract':
+            continue
+        if i + 4 >= n or sig[i + 1].kind != 'lparen' or sig[i + 2].kind != 'word' or sig[i + 3].value != 'from':
+            continue
+        j = i + 4
+        if sig[j].kind not in ('word', 'qident'):
+            continue
+        source = sig[j].value
+        while j + 2 < n and sig[j + 1].kind == 'dot' and sig[j + 2].kind in ('word', 'qident'):
+            j += 2
+            source = sig[j].value
+        if j + 1 >= n or sig[j + 1].kind != 'rparen':
+            continue
+        calls.append(ExtractCall(i, j + 1, sig[i + 2].value, source, tok.start, sig[j + 1].end))
+    return calls
+
+
+def _is_predicate_boundary(tok: Optional[Token]) -> bool:
+    if tok is None:
+        return True
+    if tok.kind in ('rparen', 'semicolon'):
+        return True
+    return tok.kind == 'word' and tok.value in _PREDICATE_BOUNDARY_WORDS
+
+
+def find_date_part_predicates(
+    parsed: ParsedSQL,
+    column: str,
+    parts: Sequence[str] = ('month', 'year'),
+) -> List[DatePartPredicate]:
+    """
+    Localiza predicados `EXTRACT(parte FROM columna) = valor`.
+
+    El valor puede ser un número o `EXTRACT(...)` con un `- n` opcional.
+    Los predicados cuyo lado derecho continúa con otra expresión se ignoran.
+    """
+    sig = parsed.significant
+    n = len(sig)
+    calls = find_extract_calls(parsed)
+    calls_by_first = {call.first: call for call in calls}
+    column = column.lower()
+    predicates: List[DatePartPredicate] = []
+
+    for call in calls:
+        if call.source != column or call.part not in parts:
+            continue
+        eq = call.last + 1
+        if eq >= n or sig[eq].kind != 'op' or sig[eq].value != '=':
+            continue
+        rhs = eq + 1
+        if rhs >= n:
+            continue
+        literal = None
+        current_year = False
+        if sig[rhs].kind == 'number':
+            last = rhs
+            literal = int(float(sig[rhs].value))
+        elif rhs in calls_by_first:
+            rhs_call = calls_by_first[rhs]
+            last = rhs_call.last
+            current_year = rhs_call.part == 'year' and rhs_call.source == 'current_date'
+            if last + 2 < n and sig[last + 1].value == '-' and sig[last + 2].kind == 'number':
+                last += 2
+        else:
+            continue
+        if not _is_predicate_boundary(sig[last + 1] if last + 1 < n else None):
+            continue
+        predicates.append(DatePartPredicate(call.first, last, call.part, column, literal, current_year))
+    return predicates
+
+
+def remove_predicates(parsed: ParsedSQL, predicates: Sequence[DatePartPredicate]) -> str:
+    """
+    Elimina predicados junto con su conector AND y limpia WHERE vacíos.
+
+    Reemplaza la serie de `re.sub` de varias pasadas: cada predicado se
+    elimina una sola vez a partir de sus índices de token.
+    """
+    if not predicates:
+        return parsed.sql
+    sig = parsed.significant
+    n = len(sig)
+    removed = [False] * n
+
+    def _is_and(i: int) -> bool:
+        return 0 <= i < n and sig[i].kind == 'word' and sig[i].value == 'and'
+
+    for pred in sorted(predicates, key=lambda p: p.first):
+        first, last = pred.first, pred.last
+        if _is_and(first - 1) and not removed[first - 1]:
+            first -= 1
+        elif _is_and(last + 1):
+            last += 1
+        for i in range(first, last + 1):
+            removed[i] = True
+
+    # WHERE que queda sin condiciones (o con un AND colgante)
+    for i, tok in enumerate(sig):
+        if removed[i] or tok.kind != 'word' or tok.value != 'where':
+            continue
+        j = i + 1
+        while j < n and removed[j]:
+            j += 1
+        nxt = sig[j] if j < n else None
+        if _is_and(j):
+            removed[j] = True
+        elif nxt is None or nxt.kind in ('rparen', 'semicolon') or (
+            nxt.kind == 'word' and nxt.value in ('group', 'order', 'limit', 'having', 'union', 'window', 'offset')
+        ):
+            removed[i] = True
+
+    edits = []
+    i = 0
+    while i < n:
+        if not removed[i]:
+            i += 1
+            continue
+        j = i
+        while j + 1 < n and removed[j + 1]:
+            j += 1
+        prev_kept = sig[i - 1] if i > 0 else None
+        next_kept = sig[j + 1] if j + 1 < n else None
+        if (sig[i].kind == 'word' and sig[i].value in ('and', 'where')) and prev_kept is not None:
+            edits.append((prev_kept.end, sig[j].end, ''))
+        else:
+            edits.append((sig[i].start, next_kept.start if next_kept is not None else sig[j].end, ''))
+        i = j + 1
+    return replace_spans(parsed.sql, edits)
+
+
+def remove_date_part_predicates(sql: str, column: str, parts: Sequence[str] = ('month', 'year')) -> str:
+    """Quita todos los `EXTRACT(parte FROM columna) = valor` del SQL."""
+    parsed = parse_sql(sql)
+    return remove_predicates(parsed, find_date_part_predicates(parsed, column, parts))
+
+
+def replace_current_year(sql: str, replacement: str) -> str:
+    """Sustituye cada `EXTRACT(YEAR FROM CURRENT_DATE)` por `replacement`."""
+    parsed = parse_sql(sql)
+    edits = [
+        (call.start, call.end, replacement)
+        for call in find_extract_calls(parsed)
+        if call.part == 'year' and call.source == 'current_date'
+    ]
+    return replace_spans(sql, edits)
+
+
+def has_extract_part(parsed: ParsedSQL, part: str) -> bool:
+    """True si el SQL contiene algún EXTRACT(<part> FROM ...)."""
+    return any(call.part == part for call in find_extract_calls(parsed))
+
+
+def find_date_literals(parsed: ParsedSQL, column: str) -> List[Token]:
+    """Literales 'YYYY-MM-DD' comparados directamente contra `columna`."""
+    sig = parsed.significant
+    column = column.lower()
+    found: List[Token] = []
+    for i in range(len(sig) - 2):
+        tok = sig[i]
+        if tok.kind not in ('word', 'qident') or tok.value != column:
+            continue
+        op, literal = sig[i + 1], sig[i + 2]
+        if op.kind == 'op' and op.value in ('>=', '>', '<=', '<', '=') and literal.kind == 'string' \
+                and _DATE_LITERAL_RE.fullmatch(literal.value):
+            found.append(literal)
+    return found
@@ -0,0 +1,213 @@
+"""
+Motor YTD de una sola pasada.
+
+Ordena las ventas por fecha una única vez y precalcula:
+- el índice año → posiciones [inicio, fin) dentro del arreglo ordenado,
+- el acumulado global de ventas,
+- por dimensión (línea, producto, cliente...), una clave compuesta
+  (grupo, fecha) ordenada con su propio acumulado.
+
+Con eso cualquier combinación año / fecha de corte se responde con
+``np.searchsorted`` sobre los arreglos acumulados, sin volver a filtrar ni
+copiar el DataFrame. Lo usan ytd_lineas y ytd_productos, junto con
+`series_acumuladas_mensuales` para las curvas acumuladas por línea/producto.
+"""
+
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Motores en memoria, indexados por id del DataFrame (validado con weakref)
+MAX_MOTORES_EN_CACHE = 16
+_motores_cache: "OrderedDict[tuple, Tuple[weakref.ref, MotorYTD]]" = OrderedDict()
+
+
+def _a_ns(fecha) -> int:
+    """Convierte una fecha (date, datetime, Timestamp, con o sin tz) a ns naive."""
+    ts = pd.Timestamp(fecha)
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return int(ts.as_unit("ns").value)
+
+
+class MotorYTD:
+    """Índice ordenado por fecha con acumulados para consultas YTD."""
+
+    def __init__(self, df: pd.DataFrame, columna_fecha: str = "fecha", columna_valor: str = "ventas_usd"):
+        self.columna_fecha = columna_fecha
+        self.columna_valor = columna_valor
+
+        fechas = df[columna_fecha]
+        if not pd.api.types.is_datetime64_any_dtype(fechas):
+            fechas = pd.to_datetime(fechas, errors="coerce")
+        if getattr(fechas.dt, "tz", None) is not None:
+            fechas = fechas.dt.tz_localize(None)
+        # NaT queda como el mínimo int64: se ordena al inicio y nunca cae en un año
+        fechas_ns = fechas.to_numpy(dtype="datetime64[ns]").view("i8")
+
+        self._orden = np.argsort(fechas_ns, kind="stable")
+        self._fechas = fechas_ns[self._orden]
+        self._valores = (
+            pd.to_numeric(df[columna_valor], errors="coerce").fillna(0).to_numpy(dtype="float64")[self._orden]
+        )
+        self._acumulado = np.concatenate(([0.0], np.cumsum(self._valores)))
+
+        # Única copia: el frame ordenado, del que se devuelven rebanadas contiguas
+        self._df_ordenado = df.take(self._orden)
+
+        validas = self._fechas[self._fechas != np.iinfo("i8").min]
+        años = np.unique(validas.view("datetime64[ns]").astype("datetime64[Y]").astype("i8") + 1970)
+        inicios = np.searchsorted(self._fechas, [_a_ns(f"{a}-01-01") for a in años], side="left")
+        fines = np.searchsorted(self._fechas, [_a_ns(f"{a + 1}-01-01") for a in años], side="left")
+        self._indice_años: Dict[int, Tuple[int, int]] = {
+            int(a): (int(i), int(f)) for a, i, f in zip(años, inicios, fines)
+        }
+
+        # Días distintos (rango denso) para construir claves (grupo, fecha)
+        self._fechas_unicas = np.unique(self._fechas)
+        self._dimensiones: Dict[str, tuple] = {}
+
+    # -----------------------------------------------------------------
+    # Consultas por año / fecha de corte
+    # -----------------------------------------------------------------
+    @property
+    def años(self) -> List[int]:
+        return sorted(self._indice_años)
+
+    def fecha_maxima(self, año: int) -> Optional[pd.Timestamp]:
+        """Última fecha con datos en el año (None si el año no tiene ventas)."""
+        rango = self._indice_años.get(int(año))
+        if rango is None or rango[0] == rango[1]:
+            return None
+        return pd.Timestamp(self._fechas[rango[1] - 1])
+
+    def posiciones(self, año: int, fecha_corte) -> Tuple[int, int]:
+        """Rango [inicio, fin) de filas ordenadas del año hasta la fecha de corte (inclusive)."""
+        rango = self._indice_años.get(int(año))
+        if rango is None:
+            return 0, 0
+        inicio, fin_año = rango
+        if fecha_corte is None:
+            return inicio, fin_año
+        fin = int(np.searchsorted(self._fechas, _a_ns(fecha_corte), side="right"))
+        return inicio, max(inicio, min(fin, fin_año))
+
+    def filas(self, año: int, fecha_corte=None) -> pd.DataFrame:
+        """
+        Filas del año hasta la fecha de corte, ordenadas por fecha.
+
+        Es una rebanada del frame ordenado (no una copia): copiar antes de
+        modificarla.
+        """
+        inicio, fin = self.posiciones(año, fecha_corte)
+        return self._df_ordenado.iloc[inicio:fin]
+
+    def total(self, año: int, fecha_corte=None) -> float:
+        """Suma de ventas del año hasta la fecha de corte, en O(log n)."""
+        inicio, fin = self.posiciones(año, fecha_corte)
+        return float(self._acumulado[fin] - self._acumulado[inicio])
+
+    # -----------------------------------------------------------------
+    # Consultas por dimensión
+    # -----------------------------------------------------------------
+    def _indice_dimension(self, dimension: str) -> tuple:
+        """Claves (grupo, día) ordenadas y su acumulado, construidas una vez por dimensión."""
+        if dimension not in self._dimensiones:
+            codigos, categorias = pd.factorize(self._df_ordenado[dimension], sort=True)
+            rango_fecha = np.searchsorted(self._fechas_unicas, self._fechas)
+            validos = codigos >= 0  # los NaN no forman grupo (igual que groupby)
+
+            claves = codigos[validos].astype("i8") * len(self._fechas_unicas) + rango_fecha[validos]
+            orden = np.argsort(claves, kind="stable")
+            claves = claves[orden]
+            acumulado = np.concatenate(([0.0], np.cumsum(self._valores[validos][orden])))
+            self._dimensiones[dimension] = (categorias, claves, acumulado)
+        return self._dimensiones[dimension]
+
+    def _sumas_por_grupo(
+        self, dimension: str, desde_ns: int, cortes_ns: np.ndarray
+    ) -> Tuple[pd.Index, np.ndarray, np.ndarray]:
+        """Matrices grupos × cortes con suma y número de filas desde `desde_ns` hasta cada corte."""
+        categorias, claves, acumulado = self._indice_dimension(dimension)
+        n_fechas = len(self._fechas_unicas)
+        base = np.arange(len(categorias), dtype="i8")[:, None] * n_fechas
+
+        rango_desde = np.searchsorted(self._fechas_unicas, desde_ns, side="left")
+        rango_cortes = np.searchsorted(self._fechas_unicas, cortes_ns, side="right")
+
+        inicio = np.searchsorted(claves, base + rango_desde, side="left")
+        fin = np.searchsorted(claves, base + rango_cortes[None, :], side="left")
+        fin = np.maximum(fin, inicio)
+        return categorias, acumulado[fin] - acumulado[inicio], fin - inicio
+
+    def totales_por(self, dimension: str, año: int, fecha_corte=None) -> pd.Series:
+        """Ventas YTD por valor de la dimensión (solo grupos con ventas en el periodo)."""
+        rango = self._indice_años.get(int(año))
+        if rango is None or rango[0] == rango[1]:
+            return pd.Series(
+                dtype="float64", name=self.columna_valor, index=pd.Index([], dtype=object, name=dimension)
+            )
+
+        corte = _a_ns(fecha_corte) if fecha_corte is not None else _a_ns(f"{int(año) + 1}-01-01") - 1
+        categorias, sumas, filas = self._sumas_por_grupo(dimension, _a_ns(f"{int(año)}-01-01"), np.array([corte]))
+
+        # Solo grupos con filas en el periodo (equivale a groupby sobre el recorte)
+        presentes = filas[:, 0] > 0
+        serie = pd.Series(sumas[presentes, 0], index=categorias[presentes], name=self.columna_valor)
+        serie.index.name = dimension
+        return serie
+
+
+def series_acumuladas_mensuales(
+    df: pd.DataFrame,
+    dimension: str,
+    columna_fecha: str = "fecha",
+    columna_valor: str = "ventas_usd",
+) -> pd.DataFrame:
+    """
+    Acumulado mensual de todas las series de una dimensión en una sola pasada.
+
+    Equivale a recorrer cada valor de `dimension` y hacer
+    ``groupby(mes).sum().cumsum()``, pero con un único groupby + unstack.
+
+    Returns:
+        DataFrame índice mes × columna por grupo (en orden de aparición). Los
+        meses sin ventas de un grupo quedan en NaN, igual que en el recorrido
+        por grupo, donde ese mes no existía en la serie. Con una dimensión
+        categórica solo se agrupan las combinaciones observadas.
+    """
+    meses = df[columna_fecha].dt.month.rename("mes")
+    ventas_mes = df.groupby([df[dimension], meses], sort=True, observed=True)[columna_valor].sum().unstack(dimension)
+    orden = pd.unique(df[dimension].dropna())
+    return ventas_mes.cumsum().reindex(columns=orden)
+
+
+def obtener_motor_ytd(
+    df: pd.DataFrame, columna_fecha: str = "fecha", columna_valor: str = "ventas_usd"
+) -> MotorYTD:
+    """
+    Devuelve el motor del DataFrame, construyéndolo solo la primera vez.
+
+    La caché se indexa por la identidad del objeto: el mismo `df` recibido por
+    varios gráficos comparte un único ordenamiento. El motor no observa
+    modificaciones posteriores del DataFrame.
+    """
+    llave = (id(df), columna_fecha, columna_valor, len(df))
+    entrada = _motores_cache.get(llave)
+    if entrada is not None and entrada[0]() is df:
+        _motores_cache.move_to_end(llave)
+        return entrada[1]
+
+    motor = MotorYTD(df, columna_fecha=columna_fecha, columna_valor=columna_valor)
+    _motores_cache[llave] = (weakref.ref(df), motor)
+    while len(_motores_cache) > MAX_MOTORES_EN_CACHE:
+        _motores_cache.popitem(last=False)
+    return motor
+
+
+def limpiar_cache_motores() -> None:
+    """Descarta los motores en memoria."""
+    _motores_cache.clear()